@@ -91,7 +91,14 @@ class ArchiveFormatRegistry(registry.Registry):
 
 
 def create_archive(
-    format, tree, name, root=None, subdir=None, force_mtime=None, recurse_nested=False
+    format,
+    tree,
+    name,
+    root=None,
+    subdir=None,
+    force_mtime=None,
+    recurse_nested=False,
+    jobs=1,
 ) -> Iterator[bytes]:
     """Create an archive of the specified format.
 
@@ -103,6 +110,8 @@ def create_archive(
         subdir: Optional subdirectory to archive.
         force_mtime: Optional modification time to force.
         recurse_nested: Whether to recurse into nested trees.
+        jobs: The number of threads to compress with, for the formats that
+            support it.
 
     Returns:
         Iterator yielding archive data as bytes.
@@ -123,6 +132,7 @@ def create_archive(
             subdir=subdir,
             force_mtime=force_mtime,
             recurse_nested=recurse_nested,
+            jobs=jobs,
         ),
     )
 
@@ -14,18 +14,46 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
-"""Export a tree to a tarball."""
+"""Export a tree to a tarball.
 
+Compressed tarballs can be compressed by several threads at once. The
+tarball is then split into blocks that are compressed independently, and the
+resulting gzip members or bzip2 or xz streams are concatenated, as pigz and
+pbzip2 do. Such files are decompressed by the usual tools as if they had been
+compressed in one go.
+"""
+
+import collections
+import itertools
 import os
 import tarfile
-from contextlib import closing
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 
 from .. import errors, osutils
 from ..export import _export_iter_entries
 
+# The number of entries for which file texts are retrieved from the tree at
+# once.
+_TEXT_BATCH_SIZE = 100
+
+# File texts larger than this are kept in a temporary file rather than in
+# memory until they are added to the tarball.
+_SPOOL_SIZE = 256 * 1024
+
+# The size of the blocks that are compressed independently when compressing
+# with several threads, by compression format.
+_COMPRESSION_BLOCK_SIZES = {
+    "gz": 1024 * 1024,
+    "bz2": 900 * 1000,
+    "xz": 8 * 1024 * 1024,
+}
 
-def prepare_tarball_item(tree, root, final_path, tree_path, entry, force_mtime=None):
+
+def prepare_tarball_item(
+    tree, root, final_path, tree_path, entry, force_mtime=None, fileobj=None
+):
     """Prepare a tarball item for exporting.
 
     :param tree: Tree to export
@@ -34,6 +62,8 @@ def prepare_tarball_item(tree, root, final_path, tree_path, entry, force_mtime=N
     :param entry: Entry to export
     :param force_mtime: Option mtime to force, instead of using tree
         timestamps.
+    :param fileobj: Seekable file object with the contents of the file, if
+        they have already been retrieved from the tree.
 
     Returns a (tarinfo, fileobj) tuple
     """
@@ -49,13 +79,17 @@ def prepare_tarball_item(tree, root, final_path, tree_path, entry, force_mtime=N
             item.mode = 0o755
         else:
             item.mode = 0o644
-        # This brings the whole file into memory, but that's almost needed for
-        # the tarfile contract, which wants the size of the file up front.  We
-        # want to make sure it doesn't change, and we need to read it in one
-        # go for content filtering.
-        content = tree.get_file_text(tree_path)
-        item.size = len(content)
-        fileobj = BytesIO(content)
+        if fileobj is None:
+            # This brings the whole file into memory, but that's almost
+            # needed for the tarfile contract, which wants the size of the
+            # file up front.  We want to make sure it doesn't change, and we
+            # need to read it in one go for content filtering.
+            content = tree.get_file_text(tree_path)
+            item.size = len(content)
+            fileobj = BytesIO(content)
+        else:
+            item.size = fileobj.seek(0, os.SEEK_END)
+            fileobj.seek(0)
     elif entry.kind in ("directory", "tree-reference"):
         item.type = tarfile.DIRTYPE
         item.name += "/"
@@ -75,8 +109,201 @@ def prepare_tarball_item(tree, root, final_path, tree_path, entry, force_mtime=N
     return (item, fileobj)
 
 
+def _prepare_tarball_items(tree, root, entries, force_mtime=None):
+    """Prepare tarball items for a batch of entries.
+
+    The texts of the files are retrieved with a single call to
+    tree.iter_files_bytes, and kept in temporary files that only stay in
+    memory while they are small.
+
+    :param entries: List of (final_path, tree_path, entry) tuples.
+    :return: Iterator over (tarinfo, fileobj) tuples, in the order of entries.
+    """
+    to_fetch = [
+        (tree_path, i)
+        for i, (final_path, tree_path, entry) in enumerate(entries)
+        if entry.kind == "file"
+    ]
+    contents = {}
+    try:
+        for i, chunks in tree.iter_files_bytes(to_fetch):
+            contents[i] = tempfile.SpooledTemporaryFile(_SPOOL_SIZE)
+            contents[i].writelines(chunks)
+        for i, (final_path, tree_path, entry) in enumerate(entries):
+            yield prepare_tarball_item(
+                tree,
+                root,
+                final_path,
+                tree_path,
+                entry,
+                force_mtime,
+                fileobj=contents.get(i),
+            )
+    finally:
+        for fileobj in contents.values():
+            fileobj.close()
+
+
+def _tarball_chunks(tree, root, subdir=None, force_mtime=None, recurse_nested=False):
+    """Generate an uncompressed tarball of a tree.
+
+    This writes the same tarball as tarfile.TarFile.addfile would, but
+    without holding the contents of a file in memory.
+    """
+    offset = 0
+    with tree.lock_read():
+        entries = _export_iter_entries(tree, subdir, recurse_nested=recurse_nested)
+        while True:
+            batch = list(itertools.islice(entries, _TEXT_BATCH_SIZE))
+            if not batch:
+                break
+            for item, fileobj in _prepare_tarball_items(tree, root, batch, force_mtime):
+                header = item.tobuf(
+                    tarfile.DEFAULT_FORMAT, tarfile.ENCODING, "surrogateescape"
+                )
+                offset += len(header)
+                yield header
+                if fileobj is None:
+                    continue
+                yield from osutils.file_iterator(fileobj)
+                remainder = item.size % tarfile.BLOCKSIZE
+                if remainder:
+                    yield tarfile.NUL * (tarfile.BLOCKSIZE - remainder)
+                offset += item.size + (-item.size % tarfile.BLOCKSIZE)
+    # End of archive marker, padded to a whole record.
+    end = tarfile.NUL * (tarfile.BLOCKSIZE * 2)
+    offset += len(end)
+    yield end + tarfile.NUL * (-offset % tarfile.RECORDSIZE)
+
+
+def _compress_in_blocks(chunks, compress_block, block_size, jobs):
+    """Compress a stream in independent blocks, several at a time.
+
+    :param chunks: Iterator over the data to compress.
+    :param compress_block: Function compressing a block of data into a self
+        contained gzip member, or bzip2 or xz stream.
+    :param block_size: The minimum size of the blocks to compress.
+    :param jobs: The number of threads to compress with.
+    :return: Iterator over the compressed blocks, in order.
+    """
+
+    def iter_blocks():
+        block = []
+        size = 0
+        for chunk in chunks:
+            block.append(chunk)
+            size += len(chunk)
+            if size >= block_size:
+                yield b"".join(block)
+                block = []
+                size = 0
+        if block:
+            yield b"".join(block)
+
+    # The compressors release the GIL, so the blocks are compressed in
+    # parallel. Only a few blocks are read ahead of the compressed data that
+    # has been consumed.
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="archive") as executor:
+        pending = collections.deque()
+        try:
+            for block in iter_blocks():
+                pending.append(executor.submit(compress_block, block))
+                if len(pending) >= jobs * 2:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+def _compress(chunks, compressor):
+    """Compress a stream with a compressor object, such as bz2.BZ2Compressor."""
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _gzip_member(data, basename, mtime):
+    import gzip
+
+    buf = BytesIO()
+    with gzip.GzipFile(basename, "w", fileobj=buf, mtime=mtime) as zipstream:
+        zipstream.write(data)
+    return buf.getvalue()
+
+
+def _gzip_chunks(chunks, basename, mtime, jobs=1):
+    """Compress a stream with gzip.
+
+    :param basename: The file name to record in the gzip header.
+    :param mtime: The modification time to record in the gzip header.
+    :param jobs: The number of threads to compress with.
+    """
+    import gzip
+
+    if jobs > 1:
+        yield from _compress_in_blocks(
+            chunks,
+            lambda block: _gzip_member(block, basename, mtime),
+            _COMPRESSION_BLOCK_SIZES["gz"],
+            jobs,
+        )
+        return
+    buf = BytesIO()
+    zipstream = gzip.GzipFile(basename, "w", fileobj=buf, mtime=mtime)
+    for chunk in chunks:
+        zipstream.write(chunk)
+        # Yield the data that was written so far, rinse, repeat.
+        yield buf.getvalue()
+        buf.truncate(0)
+        buf.seek(0)
+    # Closing zipstream may trigger writes to stream
+    zipstream.close()
+    yield buf.getvalue()
+
+
+def _bz2_chunks(chunks, jobs=1):
+    """Compress a stream with bzip2, using jobs threads."""
+    import bz2
+
+    if jobs > 1:
+        return _compress_in_blocks(
+            chunks, bz2.compress, _COMPRESSION_BLOCK_SIZES["bz2"], jobs
+        )
+    return _compress(chunks, bz2.BZ2Compressor())
+
+
+def _lzma_chunks(chunks, compression_format, jobs=1):
+    """Compress a stream with lzma.
+
+    Only xz streams can be concatenated, so other formats are always
+    compressed by a single thread.
+    """
+    try:
+        import lzma
+    except ModuleNotFoundError as exc:
+        raise errors.DependencyNotPresent("lzma", exc) from exc
+
+    format = {
+        "xz": lzma.FORMAT_XZ,
+        "raw": lzma.FORMAT_RAW,
+        "alone": lzma.FORMAT_ALONE,
+    }[compression_format]
+    if jobs > 1 and format == lzma.FORMAT_XZ:
+        return _compress_in_blocks(
+            chunks,
+            lambda block: lzma.compress(block, format=format),
+            _COMPRESSION_BLOCK_SIZES["xz"],
+            jobs,
+        )
+    return _compress(chunks, lzma.LZMACompressor(format=format))
+
+
 def tarball_generator(
-    tree, root, subdir=None, force_mtime=None, format="", recurse_nested=False
+    tree, root, subdir=None, force_mtime=None, format="", recurse_nested=False, jobs=1
 ):
     """Export tree contents to a tarball.
 
@@ -86,35 +313,33 @@ def tarball_generator(
       subdir: Sub directory to export
       force_mtime: Option mtime to force, instead of using tree
         timestamps.
-      format: Tarball format to use (tgz, tar, tbz, etc)
+      format: Compression to use ("", "gz", "bz2" or "xz")
       recurse_nested: Whether to recurse into nested trees.
+      jobs: The number of threads to compress with.
     Returns: A generator that will produce file content chunks.
     """
-    buf = BytesIO()
-    with closing(tarfile.open(None, f"w:{format}", buf)) as ball, tree.lock_read():
-        for final_path, tree_path, entry in _export_iter_entries(
-            tree, subdir, recurse_nested=recurse_nested
-        ):
-            (item, fileobj) = prepare_tarball_item(
-                tree, root, final_path, tree_path, entry, force_mtime
-            )
-            ball.addfile(item, fileobj)
-            # Yield the data that was written so far, rinse, repeat.
-            yield buf.getvalue()
-            buf.truncate(0)
-            buf.seek(0)
-    yield buf.getvalue()
+    chunks = _tarball_chunks(tree, root, subdir, force_mtime, recurse_nested)
+    if format == "":
+        return chunks
+    elif format == "gz":
+        return _gzip_chunks(chunks, "", None, jobs)
+    elif format == "bz2":
+        return _bz2_chunks(chunks, jobs)
+    elif format == "xz":
+        return _lzma_chunks(chunks, "xz", jobs)
+    else:
+        raise errors.NoSuchExportFormat(format)
 
 
-def tgz_generator(tree, dest, root, subdir, force_mtime=None, recurse_nested=False):
+def tgz_generator(
+    tree, dest, root, subdir, force_mtime=None, recurse_nested=False, jobs=1
+):
     """Export this tree to a new tar file.
 
     `dest` will be created holding the contents of this tree; if it
     already exists, it will be clobbered, like with "tar -c".
     """
     with tree.lock_read():
-        import gzip
-
         if force_mtime is not None:
             root_mtime = force_mtime
         elif getattr(tree, "repository", None) and getattr(
@@ -128,39 +353,41 @@ def tgz_generator(tree, dest, root, subdir, force_mtime=None, recurse_nested=Fal
         else:
             root_mtime = None
 
-        basename = None
         # gzip file is used with an explicit fileobj so that
         # the basename can be stored in the gzip file rather than
         # dest. (bug 102234)
         basename = os.path.basename(dest)
-        buf = BytesIO()
-        zipstream = gzip.GzipFile(basename, "w", fileobj=buf, mtime=root_mtime)
-        for chunk in tarball_generator(
-            tree, root, subdir, force_mtime, recurse_nested=recurse_nested
-        ):
-            zipstream.write(chunk)
-            # Yield the data that was written so far, rinse, repeat.
-            yield buf.getvalue()
-            buf.truncate(0)
-            buf.seek(0)
-        # Closing zipstream may trigger writes to stream
-        zipstream.close()
-        yield buf.getvalue()
+        yield from _gzip_chunks(
+            tarball_generator(
+                tree, root, subdir, force_mtime, recurse_nested=recurse_nested
+            ),
+            basename,
+            root_mtime,
+            jobs,
+        )
 
 
-def tbz_generator(tree, dest, root, subdir, force_mtime=None, recurse_nested=False):
+def tbz_generator(
+    tree, dest, root, subdir, force_mtime=None, recurse_nested=False, jobs=1
+):
     """Export this tree to a new tar file.
 
     `dest` will be created holding the contents of this tree; if it
     already exists, it will be clobbered, like with "tar -c".
     """
     return tarball_generator(
-        tree, root, subdir, force_mtime, format="bz2", recurse_nested=recurse_nested
+        tree,
+        root,
+        subdir,
+        force_mtime,
+        format="bz2",
+        recurse_nested=recurse_nested,
+        jobs=jobs,
     )
 
 
 def plain_tar_generator(
-    tree, dest, root, subdir, force_mtime=None, recurse_nested=False
+    tree, dest, root, subdir, force_mtime=None, recurse_nested=False, jobs=1
 ):
     """Export this tree to a new tar file.
 
@@ -172,7 +399,9 @@ def plain_tar_generator(
     )
 
 
-def tar_xz_generator(tree, dest, root, subdir, force_mtime=None, recurse_nested=False):
+def tar_xz_generator(
+    tree, dest, root, subdir, force_mtime=None, recurse_nested=False, jobs=1
+):
     """Generate a tar file compressed with xz.
 
     Args:
@@ -182,12 +411,20 @@ def tar_xz_generator(tree, dest, root, subdir, force_mtime=None, recurse_nested=
         subdir: Subdirectory to archive.
         force_mtime: Optional modification time to force.
         recurse_nested: Whether to recurse into nested trees.
+        jobs: The number of threads to compress with.
 
     Returns:
         Generator yielding tar.xz archive data.
     """
     return tar_lzma_generator(
-        tree, dest, root, subdir, force_mtime, "xz", recurse_nested=recurse_nested
+        tree,
+        dest,
+        root,
+        subdir,
+        force_mtime,
+        "xz",
+        recurse_nested=recurse_nested,
+        jobs=jobs,
     )
 
 
@@ -199,28 +436,17 @@ def tar_lzma_generator(
     force_mtime=None,
     compression_format="alone",
     recurse_nested=False,
+    jobs=1,
 ):
     """Export this tree to a new .tar.lzma file.
 
     `dest` will be created holding the contents of this tree; if it
     already exists, it will be clobbered, like with "tar -c".
     """
-    try:
-        import lzma
-    except ModuleNotFoundError as exc:
-        raise errors.DependencyNotPresent("lzma", e) from exc
-
-    compressor = lzma.LZMACompressor(
-        format={
-            "xz": lzma.FORMAT_XZ,
-            "raw": lzma.FORMAT_RAW,
-            "alone": lzma.FORMAT_ALONE,
-        }[compression_format]
+    return _lzma_chunks(
+        tarball_generator(
+            tree, root, subdir, force_mtime=force_mtime, recurse_nested=recurse_nested
+        ),
+        compression_format,
+        jobs,
     )
-
-    for chunk in tarball_generator(
-        tree, root, subdir, force_mtime=force_mtime, recurse_nested=recurse_nested
-    ):
-        yield compressor.compress(chunk)
-
-    yield compressor.flush()
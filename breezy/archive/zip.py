@@ -37,12 +37,14 @@ _DIR_ATTR = stat.S_IFDIR | ZIP_DIRECTORY_BIT | DIR_PERMISSIONS
 
 
 def zip_archive_generator(
-    tree, dest, root, subdir=None, force_mtime=None, recurse_nested=False
+    tree, dest, root, subdir=None, force_mtime=None, recurse_nested=False, jobs=1
 ):
     """Export this tree to a new zip file.
 
     `dest` will be created holding the contents of this tree; if it
     already exists, it will be overwritten".
+
+    Zip members are always compressed by a single thread; jobs is ignored.
     """
     compression = zipfile.ZIP_DEFLATED
     with tempfile.SpooledTemporaryFile() as buf:
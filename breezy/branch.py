@@ -32,6 +32,7 @@ from dromedary import errors as transport_errors
 
 from . import config as _mod_config
 from . import debug, errors, registry, repository, urlutils
+from . import merge_sort_cache as _mod_merge_sort_cache
 from . import revision as _mod_revision
 from .controldir import (
     ControlComponent,
@@ -542,11 +543,7 @@ class Branch(ControlComponent):
             # we need the full graph to get stable numbers, regardless of the
             # start_revision_id.
             if self._merge_sorted_revisions_cache is None:
-                last_revision = self.last_revision()
-                known_graph = self.repository.get_known_graph_ancestry([last_revision])
-                self._merge_sorted_revisions_cache = known_graph.merge_sort(
-                    last_revision
-                )
+                self._merge_sorted_revisions_cache = self._gen_merge_sorted_revisions()
             filtered = self._filter_merge_sorted_revisions(
                 self._merge_sorted_revisions_cache,
                 start_revision_id,
@@ -563,6 +560,66 @@ class Branch(ControlComponent):
             else:
                 raise ValueError(f"invalid direction {direction!r}")
 
+    def _merge_sort_cache_location(self):
+        """Return where the persistent merge sort cache of this branch lives.
+
+        Returns: A (transport, filename) tuple, or None if this branch does
+            not keep a merge sort cache.
+        """
+        return None
+
+    def _gen_merge_sorted_revisions(self):
+        """Merge sort the ancestry of the branch tip.
+
+        The result is read from, or derived from, the persistent merge sort
+        cache where the branch has one, and stored back in it.
+
+        Returns: A list of (revision_id, depth, revno, end_of_merge) tuples.
+        """
+        last_revision = self.last_revision()
+        location = None
+        if not _mod_revision.is_null(last_revision):
+            location = self._merge_sort_cache_location()
+        nodes = None
+        if location is not None:
+            transport, name = location
+            try:
+                cached = _mod_merge_sort_cache.deserialise(transport.get_bytes(name))
+            except transport_errors.NoSuchFile:
+                cached = None
+            if cached is not None:
+                cached_revision, cached_nodes = cached
+                if cached_revision == last_revision:
+                    return cached_nodes
+                nodes = _mod_merge_sort_cache.update_merge_sort(
+                    self.repository, last_revision, cached_nodes
+                )
+                if nodes is None:
+                    mutter(
+                        "merge sort cache for %s is not an ancestor of %s",
+                        cached_revision,
+                        last_revision,
+                    )
+        if nodes is None:
+            known_graph = self.repository.get_known_graph_ancestry([last_revision])
+            nodes = [
+                (node.key, node.merge_depth, node.revno, node.end_of_merge)
+                for node in known_graph.merge_sort(last_revision)
+            ]
+        if location is not None:
+            try:
+                transport.put_bytes(
+                    name, _mod_merge_sort_cache.serialise(last_revision, nodes)
+                )
+            except (
+                transport_errors.TransportNotPossible,
+                transport_errors.PermissionDenied,
+            ):
+                # The cache is only an optimisation; read-only branches just
+                # don't get one.
+                pass
+        return nodes
+
     def _filter_merge_sorted_revisions(
         self, merge_sorted_revisions, start_revision_id, stop_revision_id, stop_rule
     ):
@@ -570,7 +627,7 @@ class Branch(ControlComponent):
         rev_iter = iter(merge_sorted_revisions)
         if start_revision_id is not None:
             for node in rev_iter:
-                rev_id = node.key
+                rev_id = node[0]
                 if rev_id != start_revision_id:
                     continue
                 else:
@@ -581,19 +638,17 @@ class Branch(ControlComponent):
                     break
         if stop_revision_id is None:
             # Yield everything
-            for node in rev_iter:
-                rev_id = node.key
-                yield (rev_id, node.merge_depth, node.revno, node.end_of_merge)
+            yield from rev_iter
         elif stop_rule == "exclude":
             for node in rev_iter:
-                rev_id = node.key
+                rev_id = node[0]
                 if rev_id == stop_revision_id:
                     return
-                yield (rev_id, node.merge_depth, node.revno, node.end_of_merge)
+                yield node
         elif stop_rule == "include":
             for node in rev_iter:
-                rev_id = node.key
-                yield (rev_id, node.merge_depth, node.revno, node.end_of_merge)
+                rev_id = node[0]
+                yield node
                 if rev_id == stop_revision_id:
                     return
         elif stop_rule == "with-merges-without-common-ancestry":
@@ -604,10 +659,10 @@ class Branch(ControlComponent):
                 start_revision_id, [stop_revision_id]
             )
             for node in rev_iter:
-                rev_id = node.key
+                rev_id = node[0]
                 if rev_id not in ancestors:
                     continue
-                yield (rev_id, node.merge_depth, node.revno, node.end_of_merge)
+                yield node
         elif stop_rule == "with-merges":
             stop_rev = self.repository.get_revision(stop_revision_id)
             if stop_rev.parent_ids:
@@ -619,12 +674,12 @@ class Branch(ControlComponent):
             reached_stop_revision_id = False
             revision_id_whitelist = []
             for node in rev_iter:
-                rev_id = node.key
+                rev_id = node[0]
                 if rev_id == left_parent:
                     # reached the left parent after the stop_revision
                     return
                 if not reached_stop_revision_id or rev_id in revision_id_whitelist:
-                    yield (rev_id, node.merge_depth, node.revno, node.end_of_merge)
+                    yield node
                     if reached_stop_revision_id or rev_id == stop_revision_id:
                         # only do the merged revs of rev_id from now on
                         rev = self.repository.get_revision(rev_id)
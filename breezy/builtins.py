@@ -42,6 +42,7 @@ from breezy import (
     gpg,
     hooks,
     log,
+    log_index,
     merge as _mod_merge,
     osutils,
     patch,
@@ -1190,6 +1191,11 @@ class cmd_mv(Command):  # noqa: D101
     The same is valid when moving many SOURCE files to a DESTINATION.
 
     Files cannot be moved between branches.
+
+    With --auto, unversioned files are matched to missing files with the
+    same or similar contents. --similarity sets how similar, as a
+    percentage, a file must be to a missing file to be considered a
+    rename, and --jobs compares the files in several processes.
     """
 
     takes_args = ["names*"]
@@ -1201,11 +1207,31 @@ class cmd_mv(Command):  # noqa: D101
         ),
         Option("auto", help="Automatically guess renames."),
         Option("dry-run", help="Avoid making changes when guessing renames."),
+        Option(
+            "similarity",
+            type=int,
+            argname="PERCENT",
+            help="Minimum similarity of renames guessed by --auto.",
+        ),
+        Option(
+            "jobs",
+            type=int,
+            argname="N",
+            help="Number of processes to guess renames in.",
+        ),
     ]
     aliases = ["move", "rename"]
     encoding_type = "replace"
 
-    def run(self, names_list, after=False, auto=False, dry_run=False):
+    def run(
+        self,
+        names_list,
+        after=False,
+        auto=False,
+        dry_run=False,
+        similarity=None,
+        jobs=None,
+    ):
         """Execute the mv command.
 
         Args:
@@ -1213,13 +1239,19 @@ class cmd_mv(Command):  # noqa: D101
             after: Record move that has already occurred.
             auto: Automatically guess renames.
             dry_run: Show what would be done without making changes.
+            similarity: Minimum similarity, in percent, of guessed renames.
+            jobs: Number of processes to guess renames in.
         """
         from .workingtree import WorkingTree
 
         if auto:
-            return self.run_auto(names_list, after, dry_run)
+            return self.run_auto(names_list, after, dry_run, similarity, jobs)
         elif dry_run:
             raise errors.CommandError(gettext("--dry-run requires --auto."))
+        elif similarity is not None or jobs is not None:
+            raise errors.CommandError(
+                gettext("--similarity and --jobs require --auto.")
+            )
         if names_list is None:
             names_list = []
         if len(names_list) < 2:
@@ -1233,7 +1265,7 @@ class cmd_mv(Command):  # noqa: D101
         self.enter_context(tree.lock_tree_write())
         self._run(tree, names_list, rel_names, after)
 
-    def run_auto(self, names_list, after, dry_run):
+    def run_auto(self, names_list, after, dry_run, similarity=None, jobs=None):
         """Automatically detect and perform file renames.
 
         Args:
@@ -1242,6 +1274,8 @@ class cmd_mv(Command):  # noqa: D101
             after: If True, record that files have already been renamed.
                   Cannot be used with --auto.
             dry_run: If True, show what would be renamed without making changes.
+            similarity: Minimum similarity, in percent, of guessed renames.
+            jobs: Number of processes to guess renames in.
 
         Raises:
             CommandError: If more than one path specified with --auto or if
@@ -1262,11 +1296,27 @@ class cmd_mv(Command):  # noqa: D101
             raise errors.CommandError(
                 gettext("--after cannot be specified with --auto.")
             )
+        if similarity is None:
+            similarity = 0
+        elif not 0 <= similarity <= 100:
+            raise errors.CommandError(
+                gettext("--similarity must be between 0 and 100.")
+            )
+        if jobs is None:
+            jobs = 1
+        elif jobs < 1:
+            raise errors.CommandError(gettext("--jobs must be at least 1."))
         work_tree, _file_list = WorkingTree.open_containing_paths(
             names_list, default_directory="."
         )
         self.enter_context(work_tree.lock_tree_write())
-        RenameMap.guess_renames(work_tree.basis_tree(), work_tree, dry_run)
+        RenameMap.guess_renames(
+            work_tree.basis_tree(),
+            work_tree,
+            dry_run,
+            threshold=similarity / 100,
+            jobs=jobs,
+        )
 
     def _run(self, tree, names_list, rel_names, after):
         into_existing = osutils.isdir(names_list[-1])
@@ -3596,9 +3646,15 @@ class cmd_log(Command):  # noqa: D101
         # evil when adding features", we continue to use the
         # original algorithm - per-file-graph - for the "single
         # file that isn't a directory without showing a delta" case.
+        # The file history index makes the default algorithm fast for deep
+        # history too, so it is always used when there is an index.
         partial_history = revision and b.repository._format.supports_chks
         match_using_deltas = (
-            len(files) != 1 or filter_by_dir or delta_type or partial_history
+            len(files) != 1
+            or filter_by_dir
+            or delta_type
+            or partial_history
+            or log_index.FileHistoryIndex.exists(b.repository)
         )
 
         match_dict = {}
@@ -3718,6 +3774,58 @@ def get_log_format(long=False, short=False, line=False, default="long"):
     return log_format
 
 
+class cmd_log_index(Command):  # noqa: D101
+    __doc__ = """Build or update the file history index used by log.
+
+    The index records the paths changed by each revision in the ancestry of
+    the branch, so that "brz log FILE" only has to compute deltas for the
+    revisions that may have changed FILE. Once the index exists, log adds
+    new revisions to it as they are seen.
+
+    The index is kept next to the repository, which must be local.
+    """
+
+    _see_also = ["log"]
+    takes_args = ["location?"]
+    takes_options = [
+        Option("remove", help="Delete the index instead."),
+    ]
+
+    def run(self, location=".", remove=False):
+        """Execute the log-index command.
+
+        Args:
+            location: Branch whose ancestry to index.
+            remove: Delete the index instead.
+        """
+        branch = _mod_branch.Branch.open_containing(location)[0]
+        self.enter_context(branch.lock_read())
+        repository = branch.repository
+        if remove:
+            transport = repository._log_index_transport()
+            if transport is not None:
+                with contextlib.suppress(NoSuchFile):
+                    transport.delete(log_index.INDEX_NAME)
+            return
+        index = log_index.FileHistoryIndex.open(repository, create=True)
+        if index is None:
+            raise errors.CommandError(
+                gettext("Repository at %s can not have a file history index.")
+                % repository.user_url
+            )
+        try:
+            revision_ids = [
+                revision_id
+                for revision_id, _depth, _revno, _eom in (
+                    branch.iter_merge_sorted_revisions()
+                )
+            ]
+            count = index.update(repository, revision_ids)
+        finally:
+            index.close()
+        note(ngettext("Indexed %d revision.", "Indexed %d revisions.", count) % count)
+
+
 class cmd_touching_revisions(Command):  # noqa: D101
     __doc__ = """Return revision-ids which affected a particular file.
 
@@ -4146,6 +4254,11 @@ class cmd_export(Command):  # noqa: D101
 
     Note: Export of tree with non-ASCII filenames to zip is not supported.
 
+    With --jobs, tgz, tbz2 and txz archives are compressed by that many
+    threads. The archive is split into blocks that are compressed
+    independently; it is slightly larger, but can be decompressed by the
+    usual tools. The default is taken from the export.jobs option.
+
       =================       =========================
       Supported formats       Autodetected by extension
       =================       =========================
@@ -4180,6 +4293,12 @@ class cmd_export(Command):  # noqa: D101
             "last revision.",
         ),
         Option("recurse-nested", help="Include contents of nested trees."),
+        Option(
+            "jobs",
+            type=int,
+            argname="N",
+            help="Number of threads to compress archives with.",
+        ),
     ]
 
     def run(
@@ -4194,6 +4313,7 @@ class cmd_export(Command):  # noqa: D101
         uncommitted=False,
         directory=".",
         recurse_nested=False,
+        jobs=None,
     ):
         """Execute the export command.
 
@@ -4208,9 +4328,13 @@ class cmd_export(Command):  # noqa: D101
             uncommitted: Export working tree instead of last revision.
             directory: Directory containing the branch.
             recurse_nested: Include nested tree contents.
+            jobs: Number of threads to compress archives with.
         """
         from .export import export, get_root_name, guess_format
 
+        if jobs is not None and jobs < 1:
+            raise errors.CommandError(gettext("--jobs must be at least 1."))
+
         if branch_or_subdir is None:
             branch_or_subdir = directory
 
@@ -4231,6 +4355,9 @@ class cmd_export(Command):  # noqa: D101
                 "export", revision, branch=b, tree=tree
             )
 
+        if jobs is None:
+            jobs = b.get_config_stack().get("export.jobs")
+
         if format is None:
             format = guess_format(dest)
 
@@ -4258,6 +4385,7 @@ class cmd_export(Command):  # noqa: D101
                 subdir,
                 per_file_timestamps=per_file_timestamps,
                 recurse_nested=recurse_nested,
+                jobs=jobs,
             )
         except errors.NoSuchExportFormat as exc:
             raise errors.CommandError(
@@ -4931,6 +5059,13 @@ class cmd_check(Command):  # noqa: D101
     If no restrictions are specified, all data that is found at the given
     location will be checked.
 
+    Verifying the contents of a large repository can take a long time. With
+    --jobs, the inventories and texts of the repository are verified by
+    several processes at once. With --incremental, a list of the packs that
+    have been verified is kept in the repository, and only the inventories
+    and texts in packs that were added since the last incremental check
+    without problems are verified again.
+
     :Examples:
 
         Check the tree and branch at 'foo'::
@@ -4944,6 +5079,11 @@ class cmd_check(Command):  # noqa: D101
         Check everything at 'baz'::
 
             brz check baz
+
+        Check the repository at 'bar' in four processes, skipping what an
+        earlier incremental check verified::
+
+            brz check --repo --jobs 4 --incremental bar
     """
 
     _see_also = ["reconcile"]
@@ -4953,9 +5093,29 @@ class cmd_check(Command):  # noqa: D101
         Option("branch", help="Check the branch related to the current directory."),
         Option("repo", help="Check the repository related to the current directory."),
         Option("tree", help="Check the working tree related to the current directory."),
+        Option(
+            "jobs",
+            type=int,
+            argname="N",
+            help="Number of processes to verify repository contents in.",
+        ),
+        Option(
+            "incremental",
+            help="Only verify repository contents added since the last "
+            "incremental check.",
+        ),
     ]
 
-    def run(self, path=None, verbose=False, branch=False, repo=False, tree=False):
+    def run(
+        self,
+        path=None,
+        verbose=False,
+        branch=False,
+        repo=False,
+        tree=False,
+        jobs=None,
+        incremental=False,
+    ):
         """Execute the check command.
 
         Args:
@@ -4964,14 +5124,29 @@ class cmd_check(Command):  # noqa: D101
             branch: Check the branch only.
             repo: Check the repository only.
             tree: Check the working tree only.
+            jobs: Number of processes to verify repository contents in.
+            incremental: Only verify contents added since the last
+                incremental check.
         """
         from .check import check_dwim
 
+        if jobs is None:
+            jobs = 1
+        elif jobs < 1:
+            raise errors.CommandError(gettext("--jobs must be at least 1."))
         if path is None:
             path = "."
         if not branch and not repo and not tree:
             branch = repo = tree = True
-        check_dwim(path, verbose, do_branch=branch, do_repo=repo, do_tree=tree)
+        check_dwim(
+            path,
+            verbose,
+            do_branch=branch,
+            do_repo=repo,
+            do_tree=tree,
+            jobs=jobs,
+            incremental=incremental,
+        )
 
 
 class cmd_upgrade(Command):  # noqa: D101
@@ -6653,20 +6828,29 @@ class cmd_pack(Command):  # noqa: D101
     during or immediately after repacking, you may be left with a state
     where the deletion has been written to disk but the new packs have not
     been. In this case the repository may be unusable.
+
+    With --incremental, only the cheap packing that is normally done after
+    each commit is performed. This is useful for repositories that have the
+    repository.defer_autopack option set.
     """
 
     _see_also = ["repositories"]
     takes_args = ["branch_or_repo?"]
     takes_options = [
         Option("clean-obsolete-packs", "Delete obsolete packs to save disk space."),
+        Option(
+            "incremental",
+            "Only combine small packs, as is done automatically after a commit.",
+        ),
     ]
 
-    def run(self, branch_or_repo=".", clean_obsolete_packs=False):
+    def run(self, branch_or_repo=".", clean_obsolete_packs=False, incremental=False):
         """Execute the pack command.
 
         Args:
             branch_or_repo: Branch or repository to pack.
             clean_obsolete_packs: Delete obsolete packs to save disk space.
+            incremental: Only do the packing normally done after a commit.
         """
         dir = controldir.ControlDir.open_containing(branch_or_repo)[0]
         try:
@@ -6674,7 +6858,10 @@ class cmd_pack(Command):  # noqa: D101
             repository = branch.repository
         except errors.NotBranchError:
             repository = dir.open_repository()
-        repository.pack(clean_obsolete_packs=clean_obsolete_packs)
+        if incremental:
+            repository.autopack()
+        else:
+            repository.pack(clean_obsolete_packs=clean_obsolete_packs)
 
 
 class cmd_plugins(Command):  # noqa: D101
@@ -7209,6 +7396,16 @@ class cmd_serve(Command):  # noqa: D101
             type=float,
             help="Override the default idle client timeout (5min).",
         ),
+        RegistryOption.from_kwargs(
+            "engine",
+            help="How connections are handled by the bzr protocol server"
+            " (default: the serve.engine configuration option).",
+            threads="Serve each connection from its own thread.",
+            **{
+                "async": "Watch idle connections from a single thread and"
+                " process requests in a bounded pool of worker threads."
+            },
+        ),
     ]
 
     def run(
@@ -7220,6 +7417,7 @@ class cmd_serve(Command):  # noqa: D101
         allow_writes=False,
         protocol=None,
         client_timeout=None,
+        engine=None,
     ):
         """Execute the serve command.
 
@@ -7231,6 +7429,7 @@ class cmd_serve(Command):  # noqa: D101
             allow_writes: Allow write access to served data.
             protocol: Protocol to use for serving.
             client_timeout: Client idle timeout in seconds.
+            engine: Connection handling engine for the bzr protocol.
         """
         from . import location, transport
 
@@ -7238,11 +7437,20 @@ class cmd_serve(Command):  # noqa: D101
             directory = osutils.getcwd()
         if protocol is None:
             protocol = transport.transport_server_registry.get()
+        if engine is not None and protocol is not (
+            transport.transport_server_registry.get("bzr")
+        ):
+            raise errors.CommandError(
+                gettext("--engine is only supported by the bzr protocol.")
+            )
         url = location.location_to_url(directory)
         if not allow_writes:
             url = "readonly+" + url
         t = transport.get_transport_from_url(url)
-        protocol(t, listen, port, inet, client_timeout)
+        if engine is None:
+            protocol(t, listen, port, inet, client_timeout)
+        else:
+            protocol(t, listen, port, inet, client_timeout, engine=engine)
 
 
 class cmd_join(Command):  # noqa: D101
@@ -8985,6 +9193,17 @@ class cmd_grep(Command):
             type=_parse_levels,
         ),
         Option("line-number", short_name="n", help="Show 1-based line number."),
+        Option(
+            "jobs",
+            type=int,
+            argname="N",
+            help="Number of processes to use for matching when searching revisions.",
+        ),
+        Option(
+            "bulk-read",
+            help="Read the file texts for many revisions at once when "
+            "searching revisions.",
+        ),
         Option(
             "no-recursive",
             help="Don't recurse into subdirectories. (default is --recursive)",
@@ -9017,6 +9236,8 @@ class cmd_grep(Command):
         files_without_match=False,
         color=None,
         diff=False,
+        jobs=None,
+        bulk_read=False,
     ):
         """Execute the grep command.
 
@@ -9038,6 +9259,8 @@ class cmd_grep(Command):
             files_without_match: Show only files without matches.
             color: Use colored output.
             diff: Show diffs for matches.
+            jobs: Number of processes to match file texts in.
+            bulk_read: Read file texts for many revisions at once.
         """
         import re
 
@@ -9065,6 +9288,11 @@ class cmd_grep(Command):
         if color is None:
             color = "auto"
 
+        if jobs is None:
+            jobs = 1
+        elif jobs < 1:
+            raise errors.CommandError("--jobs must be at least 1.")
+
         if color not in ["always", "never", "auto"]:
             raise errors.CommandError(
                 'Valid values for --color are "always", "never" or "auto".'
@@ -9127,6 +9355,8 @@ class cmd_grep(Command):
         opts.files_without_match = files_without_match
         opts.color = color
         opts.diff = False
+        opts.jobs = jobs
+        opts.bulk_read = bulk_read
 
         opts.eol_marker = eol_marker
         opts.print_revno = print_revno
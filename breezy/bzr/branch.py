@@ -463,6 +463,9 @@ class BzrBranch(Branch, _RelockDebugMixin):
             "last-revision", out_string, mode=self.controldir._get_file_mode()
         )
 
+    def _merge_sort_cache_location(self):
+        return self._transport, "merge-sort-cache"
+
     def update_feature_flags(self, updated_flags):
         """Update the feature flags for this branch.
 
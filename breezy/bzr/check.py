@@ -52,25 +52,42 @@ import vcsgraph.errors
 from .. import errors, ui
 from ..branch import Branch
 from ..check import Check
-from ..i18n import gettext
+from ..i18n import N_, gettext
 from ..revision import NULL_REVISION
 from ..trace import note
 from ..workingtree import WorkingTree
 
+# The phases of a check, as shown on the progress bar. All but the last are
+# done by VersionedFileCheck.iter_check_repository.
+_CHECK_PHASES = [
+    N_("checking revisions"),
+    N_("checking commit contents"),
+    N_("checking file graphs"),
+    N_("checking branches and trees"),
+]
+
 
 class VersionedFileCheck(Check):
     """Check a versioned file repository."""
 
     # The Check object interacts with InventoryEntry.check, etc.
 
-    def __init__(self, repository, check_repo=True):
+    def __init__(self, repository, check_repo=True, jobs=1, incremental=False):
         """Initialize a VersionedFileCheck instance.
 
         Args:
             repository: The repository to check.
             check_repo: Whether to check the repository (default True).
+            jobs: The number of processes to verify inventories and texts in.
+            incremental: Whether to only verify the inventories and texts
+                added since the last successful incremental check.
         """
         self.repository = repository
+        self.jobs = jobs
+        self.incremental = incremental
+        # When checking incrementally, the keys of the records by kind that
+        # were not verified by an earlier check; None to verify all.
+        self.unchecked_keys = None
         self.checked_rev_cnt = 0
         self.ghosts = set()
         self.missing_parent_links = {}
@@ -106,17 +123,11 @@ class VersionedFileCheck(Check):
             self.repository.lock_read(),
             ui.ui_factory.nested_progress_bar() as self.progress,
         ):
-            self.progress.update(gettext("check"), 0, 4)
+            self.progress.update(gettext("check"), 0, len(_CHECK_PHASES))
             if self.check_repo:
-                self.progress.update(gettext("checking revisions"), 0)
-                self.check_revisions()
-                self.progress.update(gettext("checking commit contents"), 1)
-                self.repository._check_inventories(self)
-                self.progress.update(gettext("checking file graphs"), 2)
-                # check_weaves is done after the revision scan so that
-                # revision index is known to be valid.
-                self.check_weaves()
-            self.progress.update(gettext("checking branches and trees"), 3)
+                for phase in self.iter_check_repository():
+                    self.progress.update(gettext(_CHECK_PHASES[phase]), phase)
+            self.progress.update(gettext(_CHECK_PHASES[-1]), len(_CHECK_PHASES) - 1)
             if callback_refs:
                 repo = self.repository
                 # calculate all refs, and callback the objects requesting them.
@@ -163,6 +174,110 @@ class VersionedFileCheck(Check):
                     if isinstance(item, Branch):
                         self.other_results.append(item.check(refs))
 
+    def iter_check_repository(self):
+        """Check the contents of the repository, one phase at a time.
+
+        The repository must be read locked.
+
+        :return: An iterator yielding the index in _CHECK_PHASES of each
+            phase before it is started.
+        """
+        yield 0
+        if self.incremental:
+            token, self.unchecked_keys = self.repository._get_unchecked_content()
+        self.check_revisions()
+        yield 1
+        self.repository._check_inventories(self)
+        yield 2
+        # check_weaves is done after the revision scan so that
+        # revision index is known to be valid.
+        self.check_weaves()
+        if self.incremental and not self._has_findings():
+            self.repository._content_checked(token)
+
+    def _has_findings(self):
+        """Return True if checking the repository found any problem.
+
+        Ghosts are not problems and are not considered.
+        """
+        return bool(
+            self._report_items
+            or self.inconsistent_parents
+            or self.missing_inventory_sha_cnt
+            or self.missing_revision_cnt
+            or self.missing_parent_links
+            or self.revs_with_bad_parents_in_index
+            or self.unreferenced_versions
+        )
+
+    def _results_to_dict(self):
+        """Return the findings of the repository check as a bencodable dict."""
+        results = {
+            b"checked_rev_cnt": self.checked_rev_cnt,
+            b"checked_weaves": sorted(self.checked_weaves),
+            b"unreferenced_versions": [list(v) for v in self.unreferenced_versions],
+            b"missing_inventory_sha_cnt": self.missing_inventory_sha_cnt,
+            b"missing_revision_cnt": self.missing_revision_cnt,
+            b"ghosts": sorted(self.ghosts),
+            b"missing_parent_links": [
+                [link, list(linkers)]
+                for link, linkers in self.missing_parent_links.items()
+            ],
+            b"inconsistent_parents": [
+                [revision_id, file_id, list(found_parents), list(correct_parents)]
+                for (
+                    revision_id,
+                    file_id,
+                    found_parents,
+                    correct_parents,
+                ) in self.inconsistent_parents
+            ],
+            b"report_items": [item.encode("utf-8") for item in self._report_items],
+        }
+        if self.revs_with_bad_parents_in_index is not None:
+            results[b"revs_with_bad_parents_in_index"] = [
+                [revision_id, list(index_parents), list(actual_parents)]
+                for (
+                    revision_id,
+                    index_parents,
+                    actual_parents,
+                ) in self.revs_with_bad_parents_in_index
+            ]
+        return results
+
+    def _results_from_dict(self, results):
+        """Set the findings of the repository check from a dict.
+
+        This is the inverse of _results_to_dict.
+        """
+        self.checked_rev_cnt = results[b"checked_rev_cnt"]
+        self.checked_weaves = set(results[b"checked_weaves"])
+        self.unreferenced_versions = {
+            tuple(v) for v in results[b"unreferenced_versions"]
+        }
+        self.missing_inventory_sha_cnt = results[b"missing_inventory_sha_cnt"]
+        self.missing_revision_cnt = results[b"missing_revision_cnt"]
+        self.ghosts = set(results[b"ghosts"])
+        self.missing_parent_links = dict(results[b"missing_parent_links"])
+        self.inconsistent_parents = [
+            (revision_id, file_id, tuple(found_parents), tuple(correct_parents))
+            for (
+                revision_id,
+                file_id,
+                found_parents,
+                correct_parents,
+            ) in results[b"inconsistent_parents"]
+        ]
+        self._report_items = [item.decode("utf-8") for item in results[b"report_items"]]
+        bad_parents = results.get(b"revs_with_bad_parents_in_index")
+        if bad_parents is None:
+            self.revs_with_bad_parents_in_index = None
+        else:
+            self.revs_with_bad_parents_in_index = [
+                (revision_id, tuple(index_parents), tuple(actual_parents))
+                for (revision_id, index_parents, actual_parents) in bad_parents
+            ]
+
     def _check_revisions(self, revisions_iterator):
         """Check revision objects by decorating a generator.
 
@@ -352,8 +467,10 @@ class VersionedFileCheck(Check):
 
     def _check_weaves(self, storebar):
         storebar.update("text-index", 0, 2)
-        if self.repository._format.fast_deltas:
-            # We haven't considered every fileid instance so far.
+        if self.repository._format.fast_deltas or self.unchecked_keys is not None:
+            # We haven't considered every fileid instance so far: either
+            # inventories were checked as deltas, or only those that earlier
+            # incremental checks did not verify were checked.
             weave_checker = self.repository._get_versioned_file_checker(
                 ancestors=self.ancestors
             )
@@ -384,3 +501,37 @@ class VersionedFileCheck(Check):
         self.text_key_references.setdefault(key, False)
         if entry.revision == inv.revision_id:
             self.text_key_references[key] = True
+
+
+class StreamedVersionedFileCheck(VersionedFileCheck):
+    """Check a repository whose contents are checked elsewhere.
+
+    The contents of remote repositories are checked by the smart server,
+    which streams back each phase of the check as it starts it and then
+    its findings. Branches and trees are still checked locally.
+    """
+
+    def __init__(self, repository, records):
+        """Initialize a StreamedVersionedFileCheck instance.
+
+        Args:
+            repository: The repository to check.
+            records: An iterator over (b"progress", phase) and
+                (b"result", results) pairs, where phase is an index in
+                _CHECK_PHASES and results is as returned by
+                _results_to_dict.
+        """
+        super().__init__(repository, check_repo=True)
+        self._records = records
+
+    def iter_check_repository(self):
+        """Read the progress and findings of the repository check.
+
+        :return: An iterator yielding the index in _CHECK_PHASES of each
+            phase as the server starts it.
+        """
+        for name, value in self._records:
+            if name == b"progress":
+                yield value
+            elif name == b"result":
+                self._results_from_dict(value)
@@ -51,6 +51,7 @@ from bzrformats import index as _mod_index
 from bzrformats.errors import BzrCheckError, ObjectNotLocked
 from bzrformats.pack_repo import RetryWithNewPacks
 from bzrformats.serializer import InventorySerializer, RevisionSerializer
+from dromedary import errors as transport_errors
 
 from .. import debug, errors, lockdir, osutils
 from .. import transport as _mod_transport
@@ -849,6 +850,46 @@ class RepositoryPackCollection:
         """Provide an order to the underlying names."""
         return sorted(self._names.keys())
 
+    def _read_verified_pack_names(self):
+        """Read the names of the packs that an earlier check verified.
+
+        :return: A set of pack names.
+        """
+        try:
+            content = self.transport.get_bytes("verified-packs")
+        except _mod_transport.NoSuchFile:
+            return set()
+        return {name.decode("ascii") for name in content.splitlines()}
+
+    def _save_verified_pack_names(self, names):
+        """Record that the packs with names have been verified by a check.
+
+        Failure to write the list is not an error; the packs will be
+        verified again by the next incremental check.
+
+        The check only holds a read lock, so a concurrent pack or autopack
+        may have replaced some of the packs since the check started. The
+        pack-names index is read again and only packs that are still listed
+        in it are recorded; packs it added were not checked and are never in
+        names. Names recorded by a concurrent check are kept. put_bytes
+        replaces the file atomically, so readers see either the old or the
+        new list.
+
+        :param names: The names of the packs.
+        """
+        current = {key[0].decode("ascii") for _, key, _ in self._iter_disk_pack_index()}
+        names = (set(names) | self._read_verified_pack_names()) & current
+        content = b"".join(name.encode("ascii") + b"\n" for name in sorted(names))
+        try:
+            self.transport.put_bytes(
+                "verified-packs", content, mode=self.repo.controldir._get_file_mode()
+            )
+        except (
+            transport_errors.TransportNotPossible,
+            transport_errors.PermissionDenied,
+        ) as e:
+            mutter("unable to record verified packs: %s", e)
+
     def _obsolete_packs(self, packs):
         """Move a number of packs which have been obsoleted out of the way.
 
@@ -1281,7 +1322,10 @@ class RepositoryPackCollection:
             any_new_content = True
         del self._resumed_packs[:]
         if any_new_content:
-            result = self.autopack()
+            if self._autopack_deferred():
+                result = None
+            else:
+                result = self.autopack()
             if not result:
                 # when autopack takes no steps, the names list is still
                 # unsaved.
@@ -1289,6 +1333,24 @@ class RepositoryPackCollection:
             return result
         return []
 
+    def _autopack_deferred(self):
+        """Should combining packs be left to a later explicit autopack?
+
+        This is the case when the repository.defer_autopack option is set,
+        unless the repository already has repository.max_packs packs.
+        """
+        if not self.config_stack.get("repository.defer_autopack"):
+            return False
+        total_packs = len(self._names)
+        if total_packs >= self.config_stack.get("repository.max_packs"):
+            return False
+        mutter(
+            "Deferring auto-packing of repository %s, which has %d pack files",
+            str(self),
+            total_packs,
+        )
+        return True
+
     def _suspend_write_group(self):
         tokens = [pack.name for pack in self._resumed_packs]
         self._remove_pack_indices(self._new_pack)
@@ -1389,6 +1451,28 @@ class PackRepository(MetaDirVersionedFileRepository):
             _LazyListJoin([self._unstacked_provider], self._fallback_repositories)
         )
 
+    def _get_unchecked_content(self):
+        """See VersionedFileRepository._get_unchecked_content()."""
+        collection = self._pack_collection
+        collection.ensure_loaded()
+        names = collection.names()
+        verified = collection._read_verified_pack_names()
+        keys = {"inventories": set(), "texts": set(), "chk_bytes": set()}
+        for name in names:
+            if name in verified:
+                continue
+            pack = collection.get_pack_by_name(name)
+            indices = {"inventories": pack.inventory_index, "texts": pack.text_index}
+            if pack.chk_index is not None:
+                indices["chk_bytes"] = pack.chk_index
+            for kind, index in indices.items():
+                keys[kind].update(node[1] for node in index.iter_all_entries())
+        return names, keys
+
+    def _content_checked(self, token):
+        """See VersionedFileRepository._content_checked()."""
+        self._pack_collection._save_verified_pack_names(token)
+
     def _refresh_data(self):
         if not self.is_locked():
             return
@@ -1532,6 +1616,15 @@ class PackRepository(MetaDirVersionedFileRepository):
                 hint=hint, clean_obsolete_packs=clean_obsolete_packs
             )
 
+    def autopack(self):
+        """Combine pack files if there are more than the autopack policy allows.
+
+        This is the incremental packing normally done when a write group is
+        committed, which is skipped when repository.defer_autopack is set.
+        """
+        with self.lock_write():
+            self._pack_collection.autopack()
+
     def reconcile(self, other=None, thorough=False):
         """Reconcile this repository."""
         from .reconcile import PackReconciler
@@ -82,6 +82,11 @@ from .smart.client import _SmartClient
 
 _DEFAULT_SEARCH_DEPTH = 100
 
+# Compression requested for Repository.get_parent_map_stream responses. A low
+# zlib level is much cheaper for the server than bz2, and the body is
+# dominated by revision ids which compress well even at low levels.
+_PARENT_MAP_COMPRESSION = b"zlib:1"
+
 
 class UnknownErrorFromSmartServer(errors.BzrError):
     """An ErrorFromSmartServer could not be translated into a typical breezy
@@ -1621,6 +1626,7 @@ class RemoteInventoryTree(InventoryRevisionTree):
         subdir=None,
         force_mtime=None,
         recurse_nested=False,
+        jobs=1,
     ):
         """Create an archive of this tree.
 
@@ -1631,6 +1637,8 @@ class RemoteInventoryTree(InventoryRevisionTree):
             subdir: Subdirectory to archive.
             force_mtime: Force modification time for entries.
             recurse_nested: Recurse into nested trees.
+            jobs: Number of threads to compress with when the archive is
+                created locally. The server uses its ``export.jobs`` setting.
         """
         if recurse_nested:
             # For now, just fall back to non-HPSS mode if nested trees are involved.
@@ -1641,6 +1649,7 @@ class RemoteInventoryTree(InventoryRevisionTree):
                 subdir,
                 force_mtime=force_mtime,
                 recurse_nested=recurse_nested,
+                jobs=jobs,
             )
         ret = self._repository._revision_archive(
             self.get_revision_id(), format, name, root, subdir, force_mtime=force_mtime
@@ -1653,6 +1662,7 @@ class RemoteInventoryTree(InventoryRevisionTree):
                 subdir,
                 force_mtime=force_mtime,
                 recurse_nested=recurse_nested,
+                jobs=jobs,
             )
         return ret
 
@@ -2355,8 +2365,17 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
             revision_id that they contain. The inventory texts from all present
             revision ids are assessed to generate this report.
         """
-        self._ensure_real()
-        return self._real_repository.find_text_key_references()
+        records = self._call_for_check_records(b"Repository.find_text_key_references")
+        if records is None:
+            self._ensure_real()
+            return self._real_repository.find_text_key_references()
+        references = {}
+        for name, batch in records:
+            if name != b"references":
+                continue
+            for file_id, revision_id, referenced in batch:
+                references[(file_id, revision_id)] = bool(referenced)
+        return references
 
     def _generate_text_key_index(self):
         """Generate a new text key index for the repository.
@@ -2366,8 +2385,64 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
         :return: A dict mapping (file_id, revision_id) tuples to a list of
             parents, also (file_id, revision_id) tuples.
         """
-        self._ensure_real()
-        return self._real_repository._generate_text_key_index()
+        records = self._call_for_check_records(b"Repository.generate_text_key_index")
+        if records is None:
+            self._ensure_real()
+            return self._real_repository._generate_text_key_index()
+        text_index = {}
+        for name, batch in records:
+            if name != b"index":
+                continue
+            for file_id, revision_id, parents in batch:
+                text_index[(file_id, revision_id)] = [
+                    tuple(parent) if isinstance(parent, list) else parent
+                    for parent in parents
+                ]
+        return text_index
+
+    def _call_for_check_records(self, verb):
+        """Call a verb that streams back records about the whole repository.
+
+        The verbs used to check a repository read all of it on the server,
+        which can not see the fallback repositories of a stacked repository.
+        Their streams end with a "result" record, so that a stream that was
+        cut off is not mistaken for a repository without problems.
+
+        Args:
+            verb: The name of the verb to call.
+
+        Returns:
+            An iterator over the (name, value) records sent by the server, or
+            None if the server does not support the verb or the repository
+            has fallback repositories. The iterator raises
+            UnexpectedSmartServerResponse if the stream ends without a
+            "result" record.
+        """
+        if self._fallback_repositories:
+            return None
+        path = self.controldir._path_for_remote_call(self._client)
+        try:
+            response, handler = self._call_expecting_body(verb, path)
+        except transport_errors.UnknownSmartMethod:
+            return None
+        if response != (b"ok",):
+            raise transport_errors.UnexpectedSmartServerResponse(response)
+        return self._require_result_record(
+            response, smart_repo._byte_stream_to_records(handler.read_streamed_body())
+        )
+
+    def _require_result_record(self, response, records):
+        for name, value in records:
+            if name == b"result":
+                # Read the rest of the body before handing out the result,
+                # so that the request is finished even if the caller stops
+                # there. Nothing may follow the result record.
+                for _ in records:
+                    raise transport_errors.UnexpectedSmartServerResponse(response)
+                yield name, value
+                return
+            yield name, value
+        raise transport_errors.UnexpectedSmartServerResponse(response)
 
     def _get_revision_graph(self, revision_id: RevisionID):
         """Private method for using with old (< 1.2) servers to fallback."""
@@ -3617,6 +3692,11 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
         for key in keys:
             if not isinstance(key, bytes):
                 raise ValueError(f"key {key!r} not a bytes string")
+        if not medium._is_remote_before((3, 4)):
+            try:
+                return self._get_parent_map_stream_rpc(path, keys, body)
+            except transport_errors.UnknownSmartMethod:
+                medium._remember_remote_is_before((3, 4))
         verb = b"Repository.get_parent_map"
         args = (path, b"include-missing:") + tuple(keys)
         try:
@@ -3645,23 +3725,55 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
             if coded == b"":
                 # no revisions found
                 return {}
-            lines = coded.split(b"\n")
             revision_graph = {}
-            for line in lines:
-                d = tuple(line.split())
-                if len(d) > 1:
-                    revision_graph[d[0]] = d[1:]
-                else:
-                    # No parents:
-                    if d[0].startswith(b"missing:"):
-                        revid = d[0][8:]
-                        self._unstacked_provider.note_missing_key(revid)
-                    else:
-                        # no parents - so give the Graph result
-                        # (NULL_REVISION,).
-                        revision_graph[d[0]] = (NULL_REVISION,)
+            self._parse_parent_map_lines(coded.split(b"\n"), revision_graph)
             return revision_graph
 
+    def _get_parent_map_stream_rpc(self, path, keys, body):
+        """Get parent data with the streaming Repository.get_parent_map_stream.
+
+        The server sends zlib compressed lines, flushed after every level of
+        its search, which are parsed as they arrive.
+        """
+        args = (path, _PARENT_MAP_COMPRESSION, b"include-missing:") + tuple(keys)
+        response_tuple, response_handler = self._call_with_body_bytes_expecting_body(
+            b"Repository.get_parent_map_stream", args, body
+        )
+        if response_tuple[0] != b"ok":
+            response_handler.cancel_read_body()
+            raise transport_errors.UnexpectedSmartServerResponse(response_tuple)
+        revision_graph = {}
+        decompressor = zlib.decompressobj()
+        pending = b""
+        for chunk in response_handler.read_streamed_body():
+            lines = (pending + decompressor.decompress(chunk)).split(b"\n")
+            pending = lines.pop()
+            self._parse_parent_map_lines(lines, revision_graph)
+        pending += decompressor.flush()
+        self._parse_parent_map_lines(pending.split(b"\n"), revision_graph)
+        return revision_graph
+
+    def _parse_parent_map_lines(self, lines, revision_graph):
+        """Add the parents from get_parent_map response lines to revision_graph.
+
+        Missing revisions are recorded with the unstacked parents provider.
+        """
+        for line in lines:
+            d = tuple(line.split())
+            if not d:
+                continue
+            if len(d) > 1:
+                revision_graph[d[0]] = d[1:]
+            else:
+                # No parents:
+                if d[0].startswith(b"missing:"):
+                    revid = d[0][8:]
+                    self._unstacked_provider.note_missing_key(revid)
+                else:
+                    # no parents - so give the Graph result
+                    # (NULL_REVISION,).
+                    revision_graph[d[0]] = (NULL_REVISION,)
+
     def get_signature_text(self, revision_id):
         """Get the signature text for a revision.
 
@@ -3824,23 +3936,51 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
             self._ensure_real()
             return self._real_repository.get_revision_reconcile(revision_id)
 
-    def check(self, revision_ids=None, callback_refs=None, check_repo=True):
+    def check(
+        self,
+        revision_ids=None,
+        callback_refs=None,
+        check_repo=True,
+        jobs=1,
+        incremental=False,
+    ):
         """Check the repository for consistency.
 
+        The contents are checked by the server if it supports it, in which
+        case jobs and incremental have no effect.
+
         Args:
             revision_ids: Specific revision IDs to check.
             callback_refs: Callback references for progress.
             check_repo: Whether to check the repository structure.
+            jobs: Number of processes to verify the contents in.
+            incremental: Whether to only verify contents added since the
+                last incremental check.
 
         Returns:
             CheckResult: Result of the consistency check.
         """
+        from .check import StreamedVersionedFileCheck, VersionedFileCheck
+
         with self.lock_read():
+            if not check_repo:
+                # Only branches and trees are checked, which can be done
+                # through this repository.
+                result = VersionedFileCheck(self, check_repo=False)
+                result.check(callback_refs)
+                return result
+            records = self._call_for_check_records(b"Repository.check")
+            if records is not None:
+                result = StreamedVersionedFileCheck(self, records)
+                result.check(callback_refs)
+                return result
             self._ensure_real()
             return self._real_repository.check(
                 revision_ids=revision_ids,
                 callback_refs=callback_refs,
                 check_repo=check_repo,
+                jobs=jobs,
+                incremental=incremental,
             )
 
     def copy_content_into(self, destination, revision_id=None):
@@ -4159,6 +4299,17 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
         Returns:
             List of inconsistent revision IDs.
         """
+        if revisions_iterator is None:
+            records = self._call_for_check_records(
+                b"Repository.find_inconsistent_revision_parents"
+            )
+            if records is not None:
+                return [
+                    (revision_id, tuple(index_parents), tuple(revision_parents))
+                    for name, batch in records
+                    if name == b"inconsistent"
+                    for revision_id, index_parents, revision_parents in batch
+                ]
         self._ensure_real()
         return self._real_repository._find_inconsistent_revision_parents(
             revisions_iterator
@@ -4167,11 +4318,12 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
     def _check_for_inconsistent_revision_parents(self):
         """Check for inconsistent revision parents in the repository.
 
-        Returns:
-            List of inconsistent revision parent issues.
+        Raises:
+            BzrCheckError: If any revision has inconsistent parents.
         """
-        self._ensure_real()
-        return self._real_repository._check_for_inconsistent_revision_parents()
+        inconsistencies = self._find_inconsistent_revision_parents()
+        if inconsistencies:
+            raise BzrCheckError("Revision knit has inconsistent parents.")
 
     def _make_parents_provider(self, other=None):
         providers = [self._unstacked_provider]
@@ -4231,7 +4383,7 @@ class RemoteRepository(_mod_repository.Repository, _RpcHelper, lock._RelockDebug
         except transport_errors.UnknownSmartMethod:
             return None
         if response[0] == b"ok":
-            return iter([protocol.read_body_bytes()])
+            return protocol.read_streamed_body()
         raise transport_errors.UnexpectedSmartServerResponse(response)
 
     def _annotate_file_revision(self, revid, tree_path, file_id, default_revision):
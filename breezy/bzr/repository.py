@@ -78,6 +78,9 @@ class MetaDirRepository(Repository):
         """Returns the policy for making working trees on new branches."""
         return not self._transport.has("no-working-trees")
 
+    def _log_index_transport(self):
+        return self._transport
+
     def update_feature_flags(self, updated_flags):
         """Update the feature flags for this branch.
 
@@ -334,7 +334,10 @@ class SmartServerStreamMedium(SmartMedium):
 
         :returns: a SmartServerRequestProtocol.
         """
-        self._wait_for_bytes_with_timeout(self._client_timeout)
+        if self._push_back_buffer is None:
+            # A pipelined request may already be buffered, in which case
+            # there is no need to wait for the client.
+            self._wait_for_bytes_with_timeout(self._client_timeout)
         if self.finished:
             # We're stopping, so don't try to do any more work
             return None
@@ -35,8 +35,9 @@ from bzrformats.versionedfile import (
     NetworkRecordStream,
     record_to_fulltext_bytes,
 )
+from vcsgraph.tsort import topo_sort
 
-from ... import errors, osutils, trace, ui, zlib_util
+from ... import config, errors, lru_cache, osutils, trace, ui, zlib_util
 from ... import revision as _mod_revision
 from ...repository import _strip_NULL_ghosts, network_format_registry
 from .. import vf_search
@@ -47,6 +48,14 @@ from .request import (
     SuccessfulSmartServerResponse,
 )
 
+# The number of chunks of an inserted stream that can be waiting to be
+# inserted. Further chunks are not read until the inserter catches up.
+_INSERT_QUEUE_SIZE = 100
+
+# How often, in seconds, to check that the inserter thread is still running
+# while waiting for room in its queue.
+_INSERT_QUEUE_POLL_INTERVAL = 0.1
+
 
 class SmartServerRepositoryRequest(SmartServerRequest):
     """Common base class for Repository requests."""
@@ -174,6 +183,216 @@ class SmartServerRepositoryBreakLock(SmartServerRepositoryRequest):
 _lsprof_count = 0
 
 
+class _ParentMapCache:
+    """Parent data of a pack repository, shared between requests.
+
+    The data is only valid for the set of packs it was read from; a new
+    cache is created whenever pack-names lists different packs.
+    """
+
+    def __init__(self, packs, max_revisions):
+        self.packs = packs
+        self._lock = threading.Lock()
+        self._parents = lru_cache.LRUCache(max_revisions)
+
+    def get_parent_map(self, graph, revision_ids):
+        """Get the parents of revision_ids, consulting graph for unknown ones."""
+        result = {}
+        missing = []
+        with self._lock:
+            for revision_id in revision_ids:
+                try:
+                    parents = self._parents[revision_id]
+                except KeyError:
+                    missing.append(revision_id)
+                else:
+                    if parents is not None:
+                        result[revision_id] = parents
+        if missing:
+            parent_map = graph.get_parent_map(missing)
+            with self._lock:
+                for revision_id in missing:
+                    parents = parent_map.get(revision_id)
+                    # Absent revisions are cached too; they can only appear
+                    # with a change to pack-names.
+                    self._parents[revision_id] = parents
+                    if parents is not None:
+                        result[revision_id] = parents
+        return result
+
+
+class _CachingParentsProvider:
+    """Parents provider answering from a _ParentMapCache."""
+
+    def __init__(self, cache, graph):
+        self._cache = cache
+        self._graph = graph
+
+    def get_parent_map(self, revision_ids):
+        return self._cache.get_parent_map(self._graph, revision_ids)
+
+
+_parent_map_caches = lru_cache.LRUCache(10)
+_parent_map_caches_lock = threading.Lock()
+
+
+def _get_parents_provider(repository):
+    """Get a parents provider for a read-locked repository.
+
+    For pack repositories without fallbacks the parent data is cached across
+    requests, until the list of packs in pack-names changes.
+    """
+    pack_collection = getattr(repository, "_pack_collection", None)
+    if pack_collection is None or repository._fallback_repositories:
+        return repository.get_graph()
+    pack_collection.ensure_loaded()
+    packs = frozenset(pack_collection._packs_at_load)
+    key = repository.control_transport.base
+    with _parent_map_caches_lock:
+        cache = _parent_map_caches.get(key)
+        if cache is None or cache.packs != packs:
+            max_revisions = config.GlobalStack().get("serve.parent_map_cache_size")
+            cache = _ParentMapCache(packs, max_revisions)
+            _parent_map_caches[key] = cache
+    return _CachingParentsProvider(cache, repository.get_graph())
+
+
+# The inventory cache holds deserialized inventories, which are shared by
+# the threads serving concurrent requests and must not be modified. A
+# CHKInventory loads its pages on demand through the repository that
+# deserialized it, which is unlocked when its request ends, and whose indices
+# and block caches are not safe to share between threads; CHK inventories
+# are therefore fully loaded into a plain Inventory before they are cached.
+_inventory_cache = None
+_inventory_cache_lock = threading.Lock()
+
+# Estimated memory used by an entry of a deserialized inventory.
+_INVENTORY_ENTRY_SIZE = 300
+
+
+def _inventory_cache_value_size(inv):
+    return len(inv) * _INVENTORY_ENTRY_SIZE
+
+
+def _get_inventory_cache_key(repository):
+    """Get the part of the inventory cache key that identifies repository.
+
+    Returns:
+        Tuple of (repository location, packs in pack-names), or None if the
+        inventories of repository can not be cached.
+    """
+    pack_collection = getattr(repository, "_pack_collection", None)
+    if pack_collection is None or repository._fallback_repositories:
+        return None
+    pack_collection.ensure_loaded()
+    return (
+        repository.control_transport.base,
+        frozenset(pack_collection._packs_at_load),
+    )
+
+
+def _get_inventory_cache():
+    global _inventory_cache
+
+    with _inventory_cache_lock:
+        if _inventory_cache is None:
+            _inventory_cache = lru_cache.LRUSizeCache(
+                max_size=config.GlobalStack().get("serve.inventory_cache_size"),
+                after_cleanup_size=None,
+                compute_size=_inventory_cache_value_size,
+            )
+        return _inventory_cache
+
+
+def _detach_inventory(inv):
+    """Load all of a CHK inventory into an Inventory of its own."""
+    detached = _mod_inventory.Inventory(root_id=None, revision_id=inv.revision_id)
+    for _path, entry in inv.iter_entries_by_dir():
+        detached.add(entry.copy())
+    return detached
+
+
+def _order_revision_ids(repository, revision_ids, ordering):
+    """Order revision ids the way Repository._iter_inventories is asked to.
+
+    Not all repositories sort the inventories they iterate over, so this is
+    done here. Revisions without an inventory come first.
+
+    Args:
+        repository: The read-locked repository the inventories are in.
+        revision_ids: The revision ids of the inventories.
+        ordering: "topological" to sort parents before their children, or
+            anything else to keep the order of revision_ids.
+
+    Returns:
+        A list of revision ids.
+    """
+    if ordering != "topological":
+        return list(revision_ids)
+    parent_map = repository.inventories.get_parent_map(
+        [(revision_id,) for revision_id in revision_ids]
+    )
+    graph = {
+        key[-1]: tuple(parent[-1] for parent in parents or ())
+        for key, parents in parent_map.items()
+    }
+    absent = [revision_id for revision_id in revision_ids if revision_id not in graph]
+    return absent + topo_sort(graph)
+
+
+def _iter_inventories(repository, revision_ids, ordering=None):
+    """Iterate over inventories of a read-locked repository.
+
+    This behaves like Repository._iter_inventories, but always honours a
+    topological ordering. The inventories of pack repositories without
+    fallbacks are kept deserialized in a cache that is shared by all
+    requests in the process, keyed on the repository location, the packs in
+    pack-names and the revision id. Inventories of CHK formats are cached as
+    plain Inventory objects.
+    """
+    revision_ids = _order_revision_ids(repository, revision_ids, ordering)
+    repository_key = _get_inventory_cache_key(repository)
+    if repository_key is None:
+        yield from repository._iter_inventories(revision_ids, None)
+        return
+    cache = _get_inventory_cache()
+    invs = {}
+    missing = []
+    with _inventory_cache_lock:
+        for revision_id in revision_ids:
+            inv = cache.get(repository_key + (revision_id,))
+            if inv is None:
+                missing.append(revision_id)
+            else:
+                invs[revision_id] = inv
+    if missing:
+        for inv, revision_id in repository._iter_inventories(missing, "unordered"):
+            if inv is None:
+                continue
+            if repository._format.supports_chks:
+                inv = _detach_inventory(inv)
+            invs[revision_id] = inv
+            with _inventory_cache_lock:
+                cache[repository_key + (revision_id,)] = inv
+    for revision_id in revision_ids:
+        yield invs.get(revision_id), revision_id
+
+
+def _revision_tree(repository, revision_id):
+    """Get a revision tree, using the inventory cache if possible."""
+    from ..inventorytree import InventoryRevisionTree
+
+    if revision_id == _mod_revision.NULL_REVISION:
+        return repository.revision_tree(revision_id)
+    with repository.lock_read():
+        if _get_inventory_cache_key(repository) is None:
+            return repository.revision_tree(revision_id)
+        [(inv, revision_id)] = _iter_inventories(repository, [revision_id])
+        if inv is None:
+            raise errors.NoSuchRevision(repository, revision_id)
+        return InventoryRevisionTree(repository, inv, revision_id)
+
+
 class SmartServerRepositoryGetParentMap(SmartServerRepositoryRequest):
     """Bzr 1.2+ - get parent data for revisions during a graph search."""
 
@@ -209,7 +428,7 @@ class SmartServerRepositoryGetParentMap(SmartServerRepositoryRequest):
         with repository.lock_read():
             return self._do_repository_request(body_bytes)
 
-    def _expand_requested_revs(
+    def _iter_requested_revs(
         self,
         repo_graph,
         revision_ids,
@@ -217,7 +436,7 @@ class SmartServerRepositoryGetParentMap(SmartServerRepositoryRequest):
         include_missing,
         max_size=65536,
     ):
-        """Expand requested revisions with additional parent data.
+        """Iterate over requested revisions and additional parent data.
 
         Starting from the requested revision IDs, this method performs a
         breadth-first traversal to include parent revisions that the client
@@ -230,11 +449,11 @@ class SmartServerRepositoryGetParentMap(SmartServerRepositoryRequest):
             include_missing: If True, include missing revisions in results.
             max_size: Maximum compressed size in bytes for the response.
 
-        Returns:
-            Dict mapping revision IDs (or 'missing:' prefixed IDs) to their
-            parent lists, filtered to exclude revisions the client already has.
+        Yields:
+            For every level of the search, a list of (revision_id, parents)
+            tuples for the revisions the client does not have yet. Missing
+            revisions are prefixed with 'missing:'.
         """
-        result = {}
         queried_revs = set()
         estimator = zlib_util.ZLibEstimator(max_size)
         next_revs = revision_ids
@@ -244,6 +463,7 @@ class SmartServerRepositoryGetParentMap(SmartServerRepositoryRequest):
             parent_map = repo_graph.get_parent_map(next_revs)
             current_revs = next_revs
             next_revs = set()
+            level = []
             for revision_id in current_revs:
                 missing_rev = False
                 parents = parent_map.get(revision_id)
@@ -263,10 +483,11 @@ class SmartServerRepositoryGetParentMap(SmartServerRepositoryRequest):
                 ):
                     # Client does not have this revision, give it to it.
                     # add parents to the result
-                    result[encoded_id] = parents
+                    level.append((encoded_id, parents))
                     # Approximate the serialized cost of this revision_id.
                     line = encoded_id + b" " + b" ".join(parents) + b"\n"
                     estimator.add_content(line)
+            yield level
             # get all the directly asked for parents, and then flesh out to
             # 64K (compressed) or so. We do one level of depth at a time to
             # stay in sync with the client. The 250000 magic number is
@@ -279,26 +500,40 @@ class SmartServerRepositoryGetParentMap(SmartServerRepositoryRequest):
                         estimator._compressed_size_added,
                     )
                 )
-                next_revs = set()
                 break
             # don't query things we've already queried
             next_revs = next_revs.difference(queried_revs)
             first_loop_done = True
-        return result
 
-    def _do_repository_request(self, body_bytes):
-        """Process the repository request with search state from body.
+    def _expand_requested_revs(
+        self,
+        repo_graph,
+        revision_ids,
+        client_seen_revs,
+        include_missing,
+        max_size=65536,
+    ):
+        """Expand requested revisions with additional parent data.
 
-        This method recreates the search state from the request body,
-        determines which revisions the client has already seen, and
-        expands the requested revisions with additional parent data.
+        See _iter_requested_revs for the details of the search.
 
-        Args:
-            body_bytes: Body bytes containing the serialized search state.
+        Returns:
+            Dict mapping revision IDs (or 'missing:' prefixed IDs) to their
+            parent lists, filtered to exclude revisions the client already has.
+        """
+        result = {}
+        for level in self._iter_requested_revs(
+            repo_graph, revision_ids, client_seen_revs, include_missing, max_size
+        ):
+            result.update(level)
+        return result
+
+    def _recreate_client_search(self, body_bytes):
+        """Work out what the client has already seen from the request body.
 
         Returns:
-            SuccessfulSmartServerResponse with compressed parent map data,
-            or FailedSmartServerResponse if search recreation fails.
+            Tuple of (requested revision ids, revision ids seen by the client,
+            whether to include missing revisions, error response or None).
         """
         repository = self._repository
         revision_ids = set(self._revision_ids)
@@ -308,14 +543,37 @@ class SmartServerRepositoryGetParentMap(SmartServerRepositoryRequest):
         body_lines = body_bytes.split(b"\n")
         search_result, error = self.recreate_search_from_recipe(repository, body_lines)
         if error is not None:
-            return error
+            return None, None, None, error
         # TODO might be nice to start up the search again; but thats not
         # written or tested yet.
         client_seen_revs = set(search_result.get_keys())
         # Always include the requested ids.
         client_seen_revs.difference_update(revision_ids)
+        return revision_ids, client_seen_revs, include_missing, None
+
+    def _do_repository_request(self, body_bytes):
+        """Process the repository request with search state from body.
+
+        This method recreates the search state from the request body,
+        determines which revisions the client has already seen, and
+        expands the requested revisions with additional parent data.
+
+        Args:
+            body_bytes: Body bytes containing the serialized search state.
 
-        repo_graph = repository.get_graph()
+        Returns:
+            SuccessfulSmartServerResponse with compressed parent map data,
+            or FailedSmartServerResponse if search recreation fails.
+        """
+        (
+            revision_ids,
+            client_seen_revs,
+            include_missing,
+            error,
+        ) = self._recreate_client_search(body_bytes)
+        if error is not None:
+            return error
+        repo_graph = _get_parents_provider(self._repository)
         result = self._expand_requested_revs(
             repo_graph, revision_ids, client_seen_revs, include_missing
         )
@@ -329,6 +587,109 @@ class SmartServerRepositoryGetParentMap(SmartServerRepositoryRequest):
         return SuccessfulSmartServerResponse((b"ok",), bz2.compress(b"\n".join(lines)))
 
 
+class SmartServerRepositoryGetParentMapStream(SmartServerRepositoryGetParentMap):
+    """Get parent data for revisions during a graph search, streamed.
+
+    This is like Repository.get_parent_map, except that the parent data is
+    sent as a stream while the graph is being searched, and is compressed
+    with a method chosen by the client. The compression argument is either
+    b"identity" or b"zlib" optionally followed by ":" and a level, e.g.
+    b"zlib:1". Compressed streams are flushed after every level of the
+    search, so the client can process the data as it arrives.
+
+    New in 3.4.
+    """
+
+    max_size = 262144
+
+    def do_repository_request(self, repository, compression, *revision_ids):
+        """Get parent details for some revisions.
+
+        :param repository: The repository to query in.
+        :param compression: The compression to use for the body.
+        :param revision_ids: The utf8 encoded revision_id to answer for.
+        """
+        self._compressor = _make_parent_map_compressor(compression)
+        if self._compressor is None:
+            return FailedSmartServerResponse((b"UnknownCompression", compression))
+        return super().do_repository_request(repository, *revision_ids)
+
+    def _do_repository_request(self, body_bytes):
+        (
+            revision_ids,
+            client_seen_revs,
+            include_missing,
+            error,
+        ) = self._recreate_client_search(body_bytes)
+        if error is not None:
+            return error
+        return SuccessfulSmartServerResponse(
+            (b"ok",),
+            body_stream=self.body_stream(
+                revision_ids, client_seen_revs, include_missing
+            ),
+        )
+
+    def body_stream(self, revision_ids, client_seen_revs, include_missing):
+        """Stream the compressed parent data, one search level at a time.
+
+        Yields:
+            bytes: Compressed lines of revision ids followed by their parents.
+        """
+        compressor = self._compressor
+        with self._repository.lock_read():
+            repo_graph = _get_parents_provider(self._repository)
+            for level in self._iter_requested_revs(
+                repo_graph,
+                revision_ids,
+                client_seen_revs,
+                include_missing,
+                self.max_size,
+            ):
+                lines = [
+                    b" ".join((revision,) + tuple(parents)) + b"\n"
+                    for revision, parents in sorted(level)
+                ]
+                data = compressor.compress(b"".join(lines))
+                data += compressor.flush(zlib.Z_SYNC_FLUSH)
+                if data:
+                    yield data
+            data = compressor.flush()
+            if data:
+                yield data
+
+
+class _IdentityCompressor:
+    """Compressor lookalike that leaves the data alone."""
+
+    def compress(self, data):
+        return data
+
+    def flush(self, mode=None):
+        return b""
+
+
+def _make_parent_map_compressor(compression):
+    """Create a compressor for Repository.get_parent_map_stream.
+
+    :return: A compressor object, or None if compression is not supported.
+    """
+    name, _, level = compression.partition(b":")
+    if name == b"identity" and not level:
+        return _IdentityCompressor()
+    if name == b"zlib":
+        if not level:
+            return zlib.compressobj()
+        try:
+            level = int(level)
+        except ValueError:
+            return None
+        if not 0 <= level <= 9:
+            return None
+        return zlib.compressobj(level)
+    return None
+
+
 class SmartServerRepositoryGetRevisionGraph(SmartServerRepositoryReadLocked):
     """Get a revision graph from the repository.
 
@@ -1089,7 +1450,7 @@ class SmartServerRepositoryInsertStreamLocked(SmartServerRepositoryRequest):
         tokens = [token.decode("utf-8") for token in resume_tokens.split(b" ") if token]
         self.tokens = tokens
         self.repository = repository
-        self.queue = queue.Queue()
+        self.queue = queue.Queue(_INSERT_QUEUE_SIZE)
         self.insert_thread = threading.Thread(target=self._inserter_thread)
         self.insert_thread.start()
 
@@ -1102,7 +1463,22 @@ class SmartServerRepositoryInsertStreamLocked(SmartServerRepositoryRequest):
         Args:
             body_stream_chunk: A chunk of bytes from the network stream.
         """
-        self.queue.put(body_stream_chunk)
+        self._queue_put(body_stream_chunk)
+
+    def _queue_put(self, item):
+        """Queue an item for the inserter thread.
+
+        This blocks while the queue is full, so that the stream is read from
+        the network no faster than it is inserted. Items are dropped once
+        the inserter thread has stopped, which it does early if inserting
+        fails; do_end reports the failure.
+        """
+        while self.insert_thread.is_alive():
+            try:
+                self.queue.put(item, timeout=_INSERT_QUEUE_POLL_INTERVAL)
+            except queue.Full:
+                continue
+            return
 
     def _inserter_thread(self):
         """Worker thread that processes the incoming stream data.
@@ -1149,7 +1525,7 @@ class SmartServerRepositoryInsertStreamLocked(SmartServerRepositoryRequest):
                 or 'missing-basis' (with encoded missing keys), or re-raises
                 any exceptions from the inserter thread.
         """
-        self.queue.put(StopIteration)
+        self._queue_put(StopIteration)
         if self.insert_thread is not None:
             self.insert_thread.join()
         if not self.insert_ok:
@@ -1667,7 +2043,7 @@ class SmartServerRepositoryGetInventories(SmartServerRepositoryRequest):
             repository.supports_rich_root(), repository._format.supports_tree_reference
         )
         with repository.lock_read():
-            for inv, _revid in repository._iter_inventories(revids, ordering):
+            for inv, _revid in _iter_inventories(repository, revids, ordering):
                 if inv is None:
                     continue
                 inv_delta = make_inventory_delta(inv, prev_inv)
@@ -1823,7 +2199,7 @@ class SmartServerRepositoryRevisionArchive(SmartServerRepositoryRequest):
         Returns:
             SuccessfulSmartServerResponse with archive stream.
         """
-        tree = repository.revision_tree(revision_id)
+        tree = _revision_tree(repository, revision_id)
         if subdir is not None:
             subdir = subdir.decode("utf-8")
         if root is not None:
@@ -1856,7 +2232,14 @@ class SmartServerRepositoryRevisionArchive(SmartServerRepositoryRequest):
             Archive data stream.
         """
         with tree.lock_read():
-            return tree.archive(format, name, root, subdir, force_mtime)
+            return tree.archive(
+                format,
+                name,
+                root,
+                subdir,
+                force_mtime,
+                jobs=config.GlobalStack().get("export.jobs"),
+            )
 
 
 class SmartServerRepositoryAnnotateFileRevision(SmartServerRepositoryRequest):
@@ -1877,9 +2260,235 @@ class SmartServerRepositoryAnnotateFileRevision(SmartServerRepositoryRequest):
         Returns:
             SuccessfulSmartServerResponse with encoded annotation data.
         """
-        tree = repository.revision_tree(revision_id)
+        tree = _revision_tree(repository, revision_id)
         with tree.lock_read():
             body = bencode.bencode(
                 list(tree.annotate_iter(tree_path.decode("utf-8"), default_revision))
             )
             return SuccessfulSmartServerResponse((b"ok",), body=body)
+
+
+# The number of entries to put in a single record of a bencoded record stream.
+_RECORD_BATCH_SIZE = 1000
+
+
+def _records_to_byte_stream(records):
+    """Convert (name, value) pairs to a self-delimited byte stream.
+
+    Each value is bencoded into a record of the pack container format, with
+    name as its record name.
+
+    Args:
+        records: An iterable of (name, value) pairs.
+
+    Yields:
+        bytes: Chunks of the serialized byte stream.
+    """
+    pack_writer = pack.ContainerSerialiser()
+    yield pack_writer.begin()
+    for name, value in records:
+        yield pack_writer.bytes_record(bencode.bencode(value), [(name,)])
+    yield pack_writer.end()
+
+
+def _byte_stream_to_records(byte_stream):
+    """Convert a byte stream made by _records_to_byte_stream back to records.
+
+    Args:
+        byte_stream: An iterable of bytes chunks.
+
+    Yields:
+        Tuple[bytes, object]: The (name, value) pairs of the records.
+    """
+    parser = pack.ContainerPushParser()
+    for bytes in byte_stream:
+        parser.accept_bytes(bytes)
+        for record_names, record_bytes in parser.read_pending_records():
+            ((name,),) = record_names
+            yield name, bencode.bdecode(record_bytes)
+
+
+def _batched_records(name, items):
+    """Group items into lists of _RECORD_BATCH_SIZE records named name.
+
+    The records are followed by a "result" record with the number of items,
+    so that clients can tell a complete stream from one that was cut off.
+    """
+    iterator = iter(items)
+    count = 0
+    while batch := list(itertools.islice(iterator, _RECORD_BATCH_SIZE)):
+        count += len(batch)
+        yield name, batch
+    yield b"result", count
+
+
+class SmartServerRepositoryCheck(SmartServerRepositoryRequest):
+    """Check the contents of a repository on the server.
+
+    The response body is a stream of records (see _records_to_byte_stream):
+    a "progress" record with the index of each phase of the check as it is
+    started, followed by a "result" record with the findings of the check.
+
+    New in 3.4.
+    """
+
+    def do_repository_request(self, repository):
+        """Check a repository.
+
+        Args:
+            repository: Repository to check.
+
+        Returns:
+            SuccessfulSmartServerResponse with 'ok' and a stream of progress
+            and result records.
+        """
+        return SuccessfulSmartServerResponse(
+            (b"ok",),
+            body_stream=_records_to_byte_stream(self.iter_records(repository)),
+        )
+
+    def iter_records(self, repository):
+        """Check repository, yielding progress and result records.
+
+        Args:
+            repository: Repository to check.
+
+        Yields:
+            Tuple[bytes, object]: (name, value) pairs.
+        """
+        from ..check import VersionedFileCheck
+
+        with repository.lock_read():
+            checker = VersionedFileCheck(repository)
+            for phase in checker.iter_check_repository():
+                yield b"progress", phase
+            yield b"result", checker._results_to_dict()
+
+
+class SmartServerRepositoryFindTextKeyReferences(SmartServerRepositoryRequest):
+    """Find the text key references within a repository.
+
+    The response body is a stream of "references" records (see
+    _records_to_byte_stream), each a list of [file_id, revision_id,
+    referenced] entries where referenced is 1 if the text was referred to
+    by the inventory of its revision and 0 otherwise.
+
+    New in 3.4.
+    """
+
+    def do_repository_request(self, repository):
+        """Find the text key references within a repository.
+
+        Args:
+            repository: Repository to inspect.
+
+        Returns:
+            SuccessfulSmartServerResponse with 'ok' and a stream of records.
+        """
+        with repository.lock_read():
+            references = repository.find_text_key_references()
+        return SuccessfulSmartServerResponse(
+            (b"ok",),
+            body_stream=_records_to_byte_stream(
+                _batched_records(
+                    b"references",
+                    (
+                        [file_id, revision_id, int(referenced)]
+                        for (file_id, revision_id), referenced in references.items()
+                    ),
+                )
+            ),
+        )
+
+
+class SmartServerRepositoryGenerateTextKeyIndex(SmartServerRepositoryRequest):
+    """Generate a text key index for a repository.
+
+    The response body is a stream of "index" records (see
+    _records_to_byte_stream), each a list of [file_id, revision_id, parents]
+    entries where parents is a list of [file_id, revision_id] keys or
+    NULL_REVISION.
+
+    New in 3.4.
+    """
+
+    def do_repository_request(self, repository):
+        """Generate a text key index for a repository.
+
+        Args:
+            repository: Repository to index.
+
+        Returns:
+            SuccessfulSmartServerResponse with 'ok' and a stream of records.
+        """
+        with repository.lock_read():
+            text_index = repository._generate_text_key_index()
+        return SuccessfulSmartServerResponse(
+            (b"ok",),
+            body_stream=_records_to_byte_stream(
+                _batched_records(
+                    b"index",
+                    (
+                        [
+                            file_id,
+                            revision_id,
+                            [
+                                list(parent) if isinstance(parent, tuple) else parent
+                                for parent in parents
+                            ],
+                        ]
+                        for (file_id, revision_id), parents in text_index.items()
+                    ),
+                )
+            ),
+        )
+
+
+class SmartServerRepositoryFindInconsistentRevisionParents(
+    SmartServerRepositoryRequest
+):
+    """Find revisions whose parents differ in the revision and the index.
+
+    The response body is a stream of "inconsistent" records (see
+    _records_to_byte_stream), each a list of [revision_id,
+    parents_in_index, parents_in_revision] entries, followed by a "result"
+    record with the number of entries sent.
+
+    New in 3.4.
+    """
+
+    def do_repository_request(self, repository):
+        """Find revisions with inconsistent parents.
+
+        Args:
+            repository: Repository to inspect.
+
+        Returns:
+            SuccessfulSmartServerResponse with 'ok' and a stream of records.
+        """
+        return SuccessfulSmartServerResponse(
+            (b"ok",),
+            body_stream=_records_to_byte_stream(self.iter_records(repository)),
+        )
+
+    def iter_records(self, repository):
+        """Yield records of the revisions with inconsistent parents.
+
+        Args:
+            repository: Repository to inspect.
+
+        Yields:
+            Tuple[bytes, object]: (name, value) pairs.
+        """
+        with repository.lock_read():
+            yield from _batched_records(
+                b"inconsistent",
+                (
+                    [revision_id, list(index_parents), list(revision_parents)]
+                    for (
+                        revision_id,
+                        index_parents,
+                        revision_parents,
+                    ) in repository._find_inconsistent_revision_parents()
+                ),
+            )
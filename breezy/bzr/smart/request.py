@@ -1091,6 +1091,12 @@ request_handlers.register_lazy(
     "SmartServerRepositoryGetParentMap",
     info="read",
 )
+request_handlers.register_lazy(
+    b"Repository.get_parent_map_stream",
+    "breezy.bzr.smart.repository",
+    "SmartServerRepositoryGetParentMapStream",
+    info="read",
+)
 request_handlers.register_lazy(
     b"Repository.get_revision_graph",
     "breezy.bzr.smart.repository",
@@ -1199,6 +1205,24 @@ request_handlers.register_lazy(
     "SmartServerRepositoryGetStreamForMissingKeys",
     info="read",
 )
+request_handlers.register_lazy(
+    b"Repository.find_inconsistent_revision_parents",
+    "breezy.bzr.smart.repository",
+    "SmartServerRepositoryFindInconsistentRevisionParents",
+    info="read",
+)
+request_handlers.register_lazy(
+    b"Repository.find_text_key_references",
+    "breezy.bzr.smart.repository",
+    "SmartServerRepositoryFindTextKeyReferences",
+    info="read",
+)
+request_handlers.register_lazy(
+    b"Repository.generate_text_key_index",
+    "breezy.bzr.smart.repository",
+    "SmartServerRepositoryGenerateTextKeyIndex",
+    info="read",
+)
 request_handlers.register_lazy(
     b"Repository.iter_revisions",
     "breezy.bzr.smart.repository",
@@ -1229,6 +1253,12 @@ request_handlers.register_lazy(
     "SmartServerRepositoryAbortWriteGroup",
     info="semi",
 )
+request_handlers.register_lazy(
+    b"Repository.check",
+    "breezy.bzr.smart.repository",
+    "SmartServerRepositoryCheck",
+    info="read",
+)
 request_handlers.register_lazy(
     b"Repository.check_write_group",
     "breezy.bzr.smart.repository",
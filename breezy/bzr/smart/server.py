@@ -19,6 +19,8 @@
 import contextlib
 import errno
 import os.path
+import queue
+import selectors
 import socket
 import sys
 import threading
@@ -89,11 +91,13 @@ class SmartTCPServer:
         # we disconnect.
         self._gracefully_stopping = False
 
-    def start_server(self, host, port):
+    def start_server(self, host, port, backlog=1):
         """Create the server listening socket.
 
         :param host: Name of the interface to listen on.
         :param port: TCP port to listen on, or 0 to allocate a transient port.
+        :param backlog: Maximum number of pending connections the operating
+            system should queue before refusing new ones.
         """
         # let connections timeout so that we get a chance to terminate
         # Keep a reference to the exceptions we want to catch because the socket
@@ -119,7 +123,7 @@ class SmartTCPServer:
             raise errors.CannotBindAddress(host, port, message) from message
         self._sockname = self._server_socket.getsockname()
         self.port = self._sockname[1]
-        self._server_socket.listen(1)
+        self._server_socket.listen(backlog)
         self._server_socket.settimeout(self._ACCEPT_TIMEOUT)
         # Once we start accept()ing connections, we set started.
         self._started = threading.Event()
@@ -439,6 +443,284 @@ class SmartServerHooks(Hooks):
 SmartTCPServer.hooks = SmartServerHooks()  # type: ignore
 
 
+class SmartSelectorTCPServer(SmartTCPServer):
+    """A SmartTCPServer that multiplexes idle connections on a selector.
+
+    SmartTCPServer dedicates a thread to every connection for its whole
+    lifetime, even while the client is idle.  This server instead watches all
+    idle connections from the single thread running serve().  When a client
+    starts sending a request, its connection is handed to a bounded pool of
+    worker threads, which serves exactly one request through the usual
+    SmartServerSocketStreamMedium (and therefore the usual protocol decoders)
+    before giving the connection back to the selector.
+
+    At most max_concurrency requests are processed at a time; further
+    requests wait in a queue until a worker becomes available.
+    """
+
+    _DEFAULT_MAX_CONCURRENCY = 8
+
+    def __init__(
+        self,
+        backing_transport,
+        root_client_path="/",
+        client_timeout=None,
+        max_concurrency=None,
+    ):
+        """Construct a new server.
+
+        :param backing_transport: The transport to serve.
+        :param root_client_path: The client path that will correspond to root
+            of backing_transport.
+        :param client_timeout: See SmartServerSocketStreamMedium's timeout
+            parameter.  Idle connections are dropped by the selector loop
+            after this many seconds.
+        :param max_concurrency: The maximum number of requests to process
+            at the same time, i.e. the size of the worker pool.
+        """
+        super().__init__(
+            backing_transport,
+            root_client_path=root_client_path,
+            client_timeout=client_timeout,
+        )
+        if max_concurrency is None:
+            max_concurrency = self._DEFAULT_MAX_CONCURRENCY
+        if max_concurrency < 1:
+            raise ValueError(max_concurrency)
+        self._max_concurrency = max_concurrency
+        # Connections waiting for their next request, handler -> time at
+        # which the connection became idle.  Only touched by the serve()
+        # thread.
+        self._idle_connections = {}
+        # Number of connections handed to the workers and not yet returned.
+        # Only touched by the serve() thread.
+        self._in_flight = 0
+        self._workers = []
+        self._pending_requests = queue.Queue()
+        self._finished_requests = queue.Queue()
+        self._selector = None
+        self._wakeup_reader = self._wakeup_writer = None
+
+    def _wakeup(self):
+        """Interrupt the selector loop so it notices new state."""
+        # Shutdown can close and clear the writer from another thread, so
+        # read it once; sending on a closed socket raises OSError.
+        writer = self._wakeup_writer
+        if writer is None:
+            return
+        with contextlib.suppress(OSError):
+            writer.send(b"\0")
+
+    def _stop_gracefully(self):
+        """Request the server to stop gracefully.
+
+        Idle connections are closed once the selector loop exits; requests
+        that are currently being processed are allowed to complete.
+        """
+        trace.note(gettext("Requested to stop gracefully"))
+        self._should_terminate = True
+        self._gracefully_stopping = True
+        self._wakeup()
+
+    def serve_conn(self, conn, thread_name_suffix):
+        """Start watching a newly accepted client connection.
+
+        Args:
+            conn: The socket connection from the client.
+            thread_name_suffix (str): Suffix for the names of worker threads.
+
+        Returns:
+            SmartServerSocketStreamMedium: The handler for the connection.
+        """
+        conn.setblocking(True)
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        handler = self._make_handler(conn)
+        self._watch(handler)
+        return handler
+
+    def _watch(self, handler):
+        """Wait on the selector for the next request from handler's client."""
+        self._idle_connections[handler] = self._timer()
+        self._selector.register(handler.socket, selectors.EVENT_READ, handler)
+
+    def _dispatch(self, handler, thread_name_suffix):
+        """Queue handler to have its next request served by a worker."""
+        self._in_flight += 1
+        if len(self._workers) < min(self._in_flight, self._max_concurrency):
+            worker = threading.Thread(
+                None,
+                self._worker,
+                name="smart-server-worker" + thread_name_suffix,
+                daemon=True,
+            )
+            self._workers.append(worker)
+            worker.start()
+        self._pending_requests.put(handler)
+
+    def _worker(self):
+        """Serve requests handed over by the selector loop until told to stop."""
+        # Keep a reference to stderr because the sys module's globals get set to
+        # None during interpreter shutdown.
+        from sys import stderr
+
+        while True:
+            handler = self._pending_requests.get()
+            if handler is None:
+                return
+            try:
+                handler._serve_one_request(handler._build_protocol())
+            except errors.ConnectionTimeout as e:
+                trace.note(f"{e}")
+                trace.log_exception_quietly()
+                handler.finished = True
+            except Exception as e:
+                stderr.write(f"{handler} terminating on exception {e}\n")
+                trace.log_exception_quietly()
+                handler.finished = True
+            finally:
+                self._finished_requests.put(handler)
+                self._wakeup()
+
+    def _collect_finished_requests(self, thread_name_suffix):
+        """Take back connections whose request has been served."""
+        while True:
+            try:
+                handler = self._finished_requests.get_nowait()
+            except queue.Empty:
+                return
+            self._in_flight -= 1
+            if handler.finished or self._should_terminate:
+                handler._disconnect_client()
+            elif handler._push_back_buffer is not None:
+                # The client pipelined another request, which is already
+                # buffered, so the socket may never become readable for it.
+                self._dispatch(handler, thread_name_suffix)
+            else:
+                self._watch(handler)
+
+    def _disconnect_idle_clients(self):
+        """Hang up on clients that have not sent a request for too long."""
+        if self._client_timeout is None:
+            return
+        now = self._timer()
+        for handler, idle_since in list(self._idle_connections.items()):
+            if now - idle_since >= self._client_timeout:
+                trace.note(
+                    f"disconnecting client after {self._client_timeout:.1f} seconds"
+                )
+                self._selector.unregister(handler.socket)
+                del self._idle_connections[handler]
+                handler._disconnect_client()
+
+    def _accept_connections(self, thread_name_suffix):
+        """Accept all connections waiting on the listening socket."""
+        while True:
+            try:
+                conn, _client_addr = self._server_socket.accept()
+            except (BlockingIOError, self._socket_timeout):
+                return
+            except self._socket_error as e:
+                # See SmartTCPServer.serve.
+                if e.args[0] not in (errno.EBADF, errno.EINTR):
+                    trace.warning(gettext("listening socket error: %s") % (e,))
+                return
+            if self._should_terminate:
+                conn.close()
+                return
+            self.serve_conn(conn, thread_name_suffix)
+
+    def _serve_loop(self, thread_name_suffix):
+        """Run the selector loop until asked to terminate."""
+        while not self._should_terminate:
+            for key, _events in self._selector.select(self._ACCEPT_TIMEOUT):
+                if key.fileobj is self._server_socket:
+                    self._accept_connections(thread_name_suffix)
+                elif key.fileobj is self._wakeup_reader:
+                    with contextlib.suppress(OSError):
+                        self._wakeup_reader.recv(4096)
+                else:
+                    handler = key.data
+                    self._selector.unregister(handler.socket)
+                    del self._idle_connections[handler]
+                    self._dispatch(handler, thread_name_suffix)
+            self._collect_finished_requests(thread_name_suffix)
+            self._disconnect_idle_clients()
+
+    def serve(self, thread_name_suffix=""):
+        """Start serving connections on the server socket.
+
+        Args:
+            thread_name_suffix (str): Suffix to append to thread names for
+                better identification in debugging.
+        """
+        # See SmartTCPServer.serve for why this needs a real reference.
+        stop_gracefully = self._stop_gracefully
+        signals.register_on_hangup(id(self), stop_gracefully)
+        self._should_terminate = False
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._wakeup_writer.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        self._server_socket.setblocking(False)
+        self._selector.register(self._server_socket, selectors.EVENT_READ)
+        self.run_server_started_hooks()
+        self._started.set()
+        try:
+            try:
+                self._serve_loop(thread_name_suffix)
+            except KeyboardInterrupt:
+                # dont log when CTRL-C'd.
+                raise
+            except Exception:
+                trace.report_exception(sys.exc_info(), sys.stderr)
+                raise
+        finally:
+            with contextlib.suppress(self._socket_error):
+                self._server_socket.close()
+            for handler in list(self._idle_connections):
+                handler._disconnect_client()
+            self._idle_connections.clear()
+            for _worker in self._workers:
+                self._pending_requests.put(None)
+            self._stopped.set()
+            signals.unregister_on_hangup(id(self))
+            self.run_server_stopped_hooks()
+        if self._gracefully_stopping:
+            self._wait_for_clients_to_disconnect()
+        self._selector.close()
+        writer, self._wakeup_writer = self._wakeup_writer, None
+        writer.close()
+        self._wakeup_reader.close()
+        self._fully_stopped.set()
+
+    def _poll_active_connections(self, timeout=0.0):
+        """Wait for up to timeout seconds for busy workers to finish.
+
+        :param timeout: The timeout to pass to thread.join().
+        :return: None
+        """
+        self._workers = [w for w in self._workers if w.is_alive()]
+        for worker in self._workers:
+            worker.join(timeout)
+        self._workers = [w for w in self._workers if w.is_alive()]
+        # Requests in progress hand their connection back when done, but the
+        # selector loop is no longer running to close them.
+        while True:
+            try:
+                handler = self._finished_requests.get_nowait()
+            except queue.Empty:
+                break
+            handler._disconnect_client()
+        self._active_connections = [(None, w) for w in self._workers]
+
+    def stop_background_thread(self):
+        """Stop the background server thread."""
+        self._should_terminate = True
+        self._wakeup()
+        super().stop_background_thread()
+
+
 def _local_path_for_transport(transport):
     """Return a local path for transport, if reasonably possible.
 
@@ -574,7 +856,7 @@ class BzrServerFactory:
         """
         return sys.stdin.buffer, sys.stdout.buffer
 
-    def _make_smart_server(self, host, port, inet, timeout):
+    def _make_smart_server(self, host, port, inet, timeout, engine=None):
         """Create the appropriate smart server based on the connection type.
 
         Args:
@@ -582,9 +864,12 @@ class BzrServerFactory:
             port (int): The port to bind to (ignored for inet mode).
             inet (bool): If True, use stdin/stdout for communication.
             timeout (float): Client connection timeout in seconds.
+            engine (str, optional): How TCP connections are handled, either
+                "threads" or "async". If None, uses the value from
+                configuration.
         """
+        c = config.GlobalStack()
         if timeout is None:
-            c = config.GlobalStack()
             timeout = c.get("serve.client_timeout")
         if inet:
             stdin, stdout = self._get_stdin_stdout()
@@ -596,8 +881,21 @@ class BzrServerFactory:
                 host = medium.BZR_DEFAULT_INTERFACE
             if port is None:
                 port = medium.BZR_DEFAULT_PORT
-            smart_server = SmartTCPServer(self.transport, client_timeout=timeout)
-            smart_server.start_server(host, port)
+            if engine is None:
+                engine = c.get("serve.engine")
+            if engine == "threads":
+                smart_server = SmartTCPServer(self.transport, client_timeout=timeout)
+            elif engine == "async":
+                smart_server = SmartSelectorTCPServer(
+                    self.transport,
+                    client_timeout=timeout,
+                    max_concurrency=c.get("serve.max_concurrency"),
+                )
+            else:
+                raise errors.CommandError(
+                    gettext("Unknown server engine: %s") % (engine,)
+                )
+            smart_server.start_server(host, port, backlog=c.get("serve.listen_backlog"))
             trace.note(gettext("listening on port: %s"), str(smart_server.port))
         self.smart_server = smart_server
 
@@ -634,7 +932,7 @@ class BzrServerFactory:
 
         self.cleanups.append(restore_signals)
 
-    def set_up(self, transport, host, port, inet, timeout):
+    def set_up(self, transport, host, port, inet, timeout, engine=None):
         """Set up the server with all necessary components.
 
         Args:
@@ -643,9 +941,10 @@ class BzrServerFactory:
             port (int): The port to bind to.
             inet (bool): If True, use stdin/stdout for communication.
             timeout (float): Client connection timeout in seconds.
+            engine (str, optional): The TCP server engine to use.
         """
         self._make_backing_transport(transport)
-        self._make_smart_server(host, port, inet, timeout)
+        self._make_smart_server(host, port, inet, timeout, engine)
         self._change_globals()
 
     def tear_down(self):
@@ -657,7 +956,7 @@ class BzrServerFactory:
             cleanup()
 
 
-def serve_bzr(transport, host=None, port=None, inet=False, timeout=None):
+def serve_bzr(transport, host=None, port=None, inet=False, timeout=None, engine=None):
     """This is the default implementation of 'bzr serve'.
 
     It creates a TCP or pipe smart server on 'transport, and runs it.  The
@@ -675,6 +974,9 @@ def serve_bzr(transport, host=None, port=None, inet=False, timeout=None):
             of TCP. Defaults to False.
         timeout (float, optional): Timeout in seconds for client connections.
             If None, uses the value from configuration.
+        engine (str, optional): "threads" to serve each TCP connection from
+            its own thread, or "async" to multiplex connections on a
+            selector. If None, uses the value from configuration.
 
     Raises:
         Any exception raised during server operation, unless caught by
@@ -682,7 +984,7 @@ def serve_bzr(transport, host=None, port=None, inet=False, timeout=None):
     """
     bzr_server = BzrServerFactory()
     try:
-        bzr_server.set_up(transport, host, port, inet, timeout)
+        bzr_server.set_up(transport, host, port, inet, timeout, engine)
         bzr_server.smart_server.serve()
     except BaseException:
         hook_caught_exception = False
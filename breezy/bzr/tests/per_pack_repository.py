@@ -30,7 +30,17 @@ from bzrformats.inventory import InventoryDirectory
 from dromedary import errors as transport_errors
 from dromedary import memory
 
-from ... import controldir, errors, gpg, osutils, repository, tests, transport, ui
+from ... import (
+    config,
+    controldir,
+    errors,
+    gpg,
+    osutils,
+    repository,
+    tests,
+    transport,
+    ui,
+)
 from ... import revision as _mod_revision
 from ...tests import TestCaseWithTransport, TestNotApplicable, test_server
 from ..groupcompress_repo import RepositoryFormat2a
@@ -235,6 +245,39 @@ class TestPackRepository(TestCaseWithTransport):
         pack_names = [node[1][0] for node in index.iter_all_entries()]
         self.assertTrue(large_pack_name in pack_names)
 
+    def test_deferred_autopack(self):
+        format = self.get_format()
+        tree = self.make_branch_and_tree(".", format=format)
+        trans = tree.branch.repository.controldir.get_repository_transport(None)
+        config.GlobalStack().set("repository.defer_autopack", True)
+        for x in range(10):
+            tree.commit(f"commit {x}")
+        # Committing the 10th revision did not combine the packs.
+        index = self.index_class(trans, "pack-names", None)
+        self.assertEqual(10, len(list(index.iter_all_entries())))
+        # Until explicitly asked to.
+        tree.branch.repository.autopack()
+        index = self.index_class(trans, "pack-names", None)
+        self.assertEqual(1, len(list(index.iter_all_entries())))
+        tree.branch.repository.check([tree.branch.last_revision()])
+
+    def test_deferred_autopack_max_packs(self):
+        format = self.get_format()
+        tree = self.make_branch_and_tree(".", format=format)
+        trans = tree.branch.repository.controldir.get_repository_transport(None)
+        stack = config.GlobalStack()
+        stack.set("repository.defer_autopack", True)
+        stack.set("repository.max_packs", 12)
+        for x in range(11):
+            tree.commit(f"commit {x}")
+        index = self.index_class(trans, "pack-names", None)
+        self.assertEqual(11, len(list(index.iter_all_entries())))
+        # The 12th pack reaches the limit, so packing is done inline: ten
+        # single revision packs are combined, the other two are kept.
+        tree.commit("commit triggering pack")
+        index = self.index_class(trans, "pack-names", None)
+        self.assertEqual(3, len(list(index.iter_all_entries())))
+
     def test_commit_write_group_returns_new_pack_names(self):
         # This test doesn't need real disk.
         self.vfs_transport_factory = memory.MemoryServer
@@ -387,6 +430,140 @@ class TestPackRepository(TestCaseWithTransport):
         # Content should be preserved as well
         self.assertEqual(inv, next(repo.iter_inventories([b"C-id"])))
 
+    def test_check_jobs(self):
+        format = self.get_format()
+        builder = self.make_branch_builder(".", format=format)
+        builder.start_series()
+        builder.build_snapshot(
+            None, [("add", ("", b"root-id", "directory", None))], revision_id=b"A-id"
+        )
+        for i, revision_id in enumerate([b"B-id", b"C-id", b"D-id"]):
+            builder.build_snapshot(
+                None,
+                [("add", (f"file{i}", b"file-id-%d" % i, "file", b"content\n"))],
+                revision_id=revision_id,
+            )
+        builder.finish_series()
+        repo = builder.get_branch().repository
+        serial = repo.check()
+        parallel = repo.check(jobs=2)
+        self.assertEqual([], parallel._report_items)
+        self.assertEqual(serial.checked_rev_cnt, parallel.checked_rev_cnt)
+        self.assertEqual(serial.text_key_references, parallel.text_key_references)
+
+    def test_check_incremental_records_verified_packs(self):
+        format = self.get_format()
+        tree = self.make_branch_and_tree(".", format=format)
+        tree.commit("start")
+        repo = tree.branch.repository
+        trans = repo.controldir.get_repository_transport(None)
+        result = repo.check(incremental=True)
+        self.assertEqual([], result._report_items)
+        with repo.lock_read():
+            names = repo._pack_collection.names()
+        self.assertEqual(
+            "".join(name + "\n" for name in names),
+            trans.get_bytes("verified-packs").decode("ascii"),
+        )
+
+    def test_save_verified_pack_names_drops_removed_packs(self):
+        format = self.get_format()
+        tree = self.make_branch_and_tree(".", format=format)
+        tree.commit("start")
+        repo = tree.branch.repository
+        trans = repo.controldir.get_repository_transport(None)
+        with repo.lock_read():
+            names = repo._pack_collection.names()
+            # A pack that a concurrent pack operation has removed.
+            repo._content_checked(names + ["removed-pack"])
+        self.assertEqual(
+            "".join(name + "\n" for name in sorted(names)),
+            trans.get_bytes("verified-packs").decode("ascii"),
+        )
+
+    def test_check_incremental_only_new_packs(self):
+        format = self.get_format()
+        tree = self.make_branch_and_tree(".", format=format)
+        tree.commit("start", rev_id=b"rev-1")
+        repo = tree.branch.repository
+        repo.check(incremental=True)
+        tree.commit("more work", rev_id=b"rev-2")
+        with repo.lock_read():
+            _names, keys = repo._get_unchecked_content()
+        self.assertEqual({(b"rev-2",)}, keys["inventories"])
+        result = repo.check(incremental=True)
+        self.assertEqual([], result._report_items)
+        self.assertEqual(2, result.checked_rev_cnt)
+
+    def test_check_incremental_changed_file(self):
+        format = self.get_format()
+        tree = self.make_branch_and_tree(".", format=format)
+        self.build_tree_contents([("a", b"a content\n")])
+        tree.add(["a"], ids=[b"a-file-id"])
+        tree.commit("start", rev_id=b"rev-1")
+        repo = tree.branch.repository
+        repo.check(incremental=True)
+        self.build_tree_contents([("a", b"changed\n")])
+        tree.commit("change", rev_id=b"rev-2")
+        result = repo.check(incremental=True)
+        self.assertEqual([], result._report_items)
+        self.assertEqual([], result.inconsistent_parents)
+        self.assertEqual(set(), result.unreferenced_versions)
+        with repo.lock_read():
+            _names, keys = repo._get_unchecked_content()
+        self.assertEqual(set(), keys["inventories"])
+
+    def test_check_incremental_problems_not_recorded(self):
+        format = self.get_format()
+        tree = self.make_branch_and_tree(".", format=format)
+        self.build_tree_contents([("a", b"a content\n")])
+        tree.add(["a"], ids=[b"a-file-id"])
+        tree.commit("start", rev_id=b"rev-1")
+        repo = tree.branch.repository
+        repo.check(incremental=True)
+        trans = repo.controldir.get_repository_transport(None)
+        verified = trans.get_bytes("verified-packs")
+        # Add a revision without parents, whose text of a-file-id claims the
+        # text in rev-1 as its parent.
+        with repo.lock_write(), repository.WriteGroup(repo):
+            inv = inventory.Inventory(revision_id=b"rev-2")
+            _set_root_revision(inv, b"rev-2")
+            inv.add(
+                inventory.InventoryFile(
+                    file_id=b"a-file-id",
+                    name="a",
+                    parent_id=inv.root.file_id,
+                    revision=b"rev-2",
+                    text_size=len(b"changed\n"),
+                    text_sha1=osutils.sha_string(b"changed\n"),
+                )
+            )
+            if repo.supports_rich_root():
+                repo.texts.add_lines((inv.root.file_id, b"rev-2"), [], [])
+            repo.texts.add_lines(
+                (b"a-file-id", b"rev-2"), [(b"a-file-id", b"rev-1")], [b"changed\n"]
+            )
+            sha1 = repo.add_inventory(b"rev-2", inv, [])
+            rev = _mod_revision.Revision(
+                timestamp=0,
+                timezone=None,
+                committer="Foo Bar <foo@example.com>",
+                properties={},
+                message="Message",
+                inventory_sha1=sha1,
+                parent_ids=[],
+                revision_id=b"rev-2",
+            )
+            repo.add_revision(b"rev-2", rev)
+        result = repo.check(incremental=True)
+        self.assertEqual(
+            [(b"rev-2", b"a-file-id", (b"rev-1",), ())], result.inconsistent_parents
+        )
+        self.assertEqual(verified, trans.get_bytes("verified-packs"))
+        with repo.lock_read():
+            _names, keys = repo._get_unchecked_content()
+        self.assertEqual({(b"rev-2",)}, keys["inventories"])
+
     def test_pack_layout(self):
         # Test that the ordering of revisions in pack repositories is
         # tip->ancestor
@@ -32,7 +32,7 @@ from io import BytesIO
 import fastbencode as bencode
 from bzrformats import inventory, inventory_delta, versionedfile
 from bzrformats._bzr_rs import revision_bencode_serializer
-from bzrformats.errors import RevisionNotPresent
+from bzrformats.errors import BzrCheckError, RevisionNotPresent
 from bzrformats.revision import Revision
 from dromedary import errors as transport_errors
 from dromedary.errors import NoSuchFile
@@ -74,6 +74,7 @@ from ..smart.client import _SmartClient
 from ..smart.repository import (
     SmartServerRepositoryGetParentMap,
     SmartServerRepositoryGetStream_1_19,
+    _records_to_byte_stream,
     _stream_to_byte_stream,
 )
 
@@ -2905,6 +2906,145 @@ class TestRepositoryReconcile(TestRemoteRepository):
         self.assertEqual(3, reconciler.inconsistent_parents)
 
 
+class TestRepositoryCheck(TestRemoteRepository):
+    def add_records_response(self, client, records):
+        client.add_success_response_with_body(
+            b"".join(_records_to_byte_stream(records)), b"ok"
+        )
+
+    def test_check(self):
+        repo, client = self.setup_fake_client_and_repository("quack")
+        repo._format = controldir.format_registry.get("2a")().repository_format
+        results = {
+            b"checked_rev_cnt": 2,
+            b"checked_weaves": [b"file-id"],
+            b"unreferenced_versions": [],
+            b"missing_inventory_sha_cnt": 0,
+            b"missing_revision_cnt": 0,
+            b"ghosts": [b"ghost"],
+            b"missing_parent_links": [],
+            b"inconsistent_parents": [],
+            b"report_items": [b"Missing inventory {rev2}"],
+        }
+        self.add_records_response(
+            client,
+            [
+                (b"progress", 0),
+                (b"progress", 1),
+                (b"progress", 2),
+                (b"result", results),
+            ],
+        )
+        result = repo.check()
+        self.assertEqual(
+            [("call_expecting_body", b"Repository.check", (b"quack/",))],
+            client._calls,
+        )
+        self.assertEqual(2, result.checked_rev_cnt)
+        self.assertEqual({b"file-id"}, result.checked_weaves)
+        self.assertEqual({b"ghost"}, result.ghosts)
+        self.assertEqual(["Missing inventory {rev2}"], result._report_items)
+        self.assertIs(None, result.revs_with_bad_parents_in_index)
+
+    def test_check_without_result(self):
+        repo, client = self.setup_fake_client_and_repository("quack")
+        repo._format = controldir.format_registry.get("2a")().repository_format
+        self.add_records_response(client, [(b"progress", 0), (b"progress", 1)])
+        self.assertRaises(transport_errors.UnexpectedSmartServerResponse, repo.check)
+
+    def test_check_records_after_result(self):
+        repo, client = self.setup_fake_client_and_repository("quack")
+        repo._format = controldir.format_registry.get("2a")().repository_format
+        self.add_records_response(
+            client, [(b"result", {}), (b"progress", 0), (b"result", {})]
+        )
+        self.assertRaises(transport_errors.UnexpectedSmartServerResponse, repo.check)
+
+    def test_find_text_key_references(self):
+        repo, client = self.setup_fake_client_and_repository("quack")
+        self.add_records_response(
+            client,
+            [
+                (b"references", [[b"file-id", b"rev1", 1], [b"file-id", b"rev2", 0]]),
+                (b"result", 2),
+            ],
+        )
+        self.assertEqual(
+            {(b"file-id", b"rev1"): True, (b"file-id", b"rev2"): False},
+            repo.find_text_key_references(),
+        )
+        self.assertEqual(
+            [
+                (
+                    "call_expecting_body",
+                    b"Repository.find_text_key_references",
+                    (b"quack/",),
+                )
+            ],
+            client._calls,
+        )
+
+    def test_generate_text_key_index(self):
+        repo, client = self.setup_fake_client_and_repository("quack")
+        self.add_records_response(
+            client,
+            [
+                (
+                    b"index",
+                    [
+                        [b"file-id", b"rev1", [NULL_REVISION]],
+                        [b"file-id", b"rev2", [[b"file-id", b"rev1"]]],
+                    ],
+                ),
+                (b"result", 2),
+            ],
+        )
+        self.assertEqual(
+            {
+                (b"file-id", b"rev1"): [NULL_REVISION],
+                (b"file-id", b"rev2"): [(b"file-id", b"rev1")],
+            },
+            repo._generate_text_key_index(),
+        )
+
+    def test_find_inconsistent_revision_parents(self):
+        repo, client = self.setup_fake_client_and_repository("quack")
+        self.add_records_response(
+            client,
+            [(b"inconsistent", [[b"rev2", [b"rev1"], []]]), (b"result", 1)],
+        )
+        self.assertEqual(
+            [(b"rev2", (b"rev1",), ())],
+            repo._find_inconsistent_revision_parents(),
+        )
+        self.assertEqual(
+            [
+                (
+                    "call_expecting_body",
+                    b"Repository.find_inconsistent_revision_parents",
+                    (b"quack/",),
+                )
+            ],
+            client._calls,
+        )
+
+    def test_check_for_inconsistent_revision_parents(self):
+        repo, client = self.setup_fake_client_and_repository("quack")
+        self.add_records_response(
+            client,
+            [(b"inconsistent", [[b"rev2", [b"rev1"], []]]), (b"result", 1)],
+        )
+        self.assertRaises(BzrCheckError, repo._check_for_inconsistent_revision_parents)
+
+    def test_find_inconsistent_revision_parents_without_result(self):
+        repo, client = self.setup_fake_client_and_repository("quack")
+        self.add_records_response(client, [])
+        self.assertRaises(
+            transport_errors.UnexpectedSmartServerResponse,
+            repo._find_inconsistent_revision_parents,
+        )
+
+
 class TestRepositoryGetRevisionSignatureText(TestRemoteRepository):
     def test_text(self):
         # ('ok',), body with signature text
@@ -2994,6 +3134,7 @@ class TestRepositoryGetParentMap(TestRemoteRepository):
 
         transport_path = "quack"
         repo, client = self.setup_fake_client_and_repository(transport_path)
+        client._medium._remember_remote_is_before((3, 4))
         client.add_success_response_with_body(encoded_body, b"ok")
         client.add_success_response_with_body(encoded_body, b"ok")
         repo.lock_read()
@@ -3045,6 +3186,7 @@ class TestRepositoryGetParentMap(TestRemoteRepository):
         transport_path = "quack"
         rev_id = b"revision-id"
         repo, client = self.setup_fake_client_and_repository(transport_path)
+        client._medium._remember_remote_is_before((3, 4))
         client.add_unknown_method_response(b"Repository.get_parent_map")
         client.add_success_response_with_body(rev_id, b"ok")
         self.assertFalse(client._medium._is_remote_before((1, 2)))
@@ -3070,6 +3212,61 @@ class TestRepositoryGetParentMap(TestRemoteRepository):
         self.assertTrue(client._medium._is_remote_before((1, 2)))
         self.assertEqual({rev_id: (b"null:",)}, parents)
 
+    def test_get_parent_map_stream(self):
+        r1 = b"r1"
+        r2 = b"r2"
+        compressor = zlib.compressobj()
+        chunks = [
+            compressor.compress(b"r2 r1\n") + compressor.flush(zlib.Z_SYNC_FLUSH),
+            compressor.compress(b"r1\nmissing:r0\n") + compressor.flush(),
+        ]
+        transport_path = "quack"
+        repo, client = self.setup_fake_client_and_repository(transport_path)
+        client.add_success_response_with_body(chunks, b"ok")
+        repo.lock_read()
+        self.addCleanup(repo.unlock)
+        self.assertEqual({r2: (r1,)}, repo.get_parent_map([r2]))
+        self.assertEqual(
+            [
+                (
+                    "call_with_body_bytes_expecting_body",
+                    b"Repository.get_parent_map_stream",
+                    (b"quack/", b"zlib:1", b"include-missing:", r2),
+                    b"\n\n0",
+                )
+            ],
+            client._calls,
+        )
+        self.assertEqual({r1: (NULL_REVISION,)}, repo.get_cached_parent_map([r1]))
+        self.assertEqual({b"r0"}, repo._unstacked_provider.missing_keys)
+
+    def test_get_parent_map_stream_unknown_method(self):
+        transport_path = "quack"
+        rev_id = b"revision-id"
+        repo, client = self.setup_fake_client_and_repository(transport_path)
+        client.add_unknown_method_response(b"Repository.get_parent_map_stream")
+        client.add_success_response_with_body(bz2.compress(rev_id), b"ok")
+        parents = repo.get_parent_map([rev_id])
+        self.assertEqual(
+            [
+                (
+                    "call_with_body_bytes_expecting_body",
+                    b"Repository.get_parent_map_stream",
+                    (b"quack/", b"zlib:1", b"include-missing:", rev_id),
+                    b"\n\n0",
+                ),
+                (
+                    "call_with_body_bytes_expecting_body",
+                    b"Repository.get_parent_map",
+                    (b"quack/", b"include-missing:", rev_id),
+                    b"\n\n0",
+                ),
+            ],
+            client._calls,
+        )
+        self.assertTrue(client._medium._is_remote_before((3, 4)))
+        self.assertEqual({rev_id: (b"null:",)}, parents)
+
     def test_get_parent_map_fallback_parentless_node(self):
         """get_parent_map falls back to get_revision_graph on old servers.  The
         results from get_revision_graph are tweaked to match the get_parent_map
@@ -3203,6 +3400,7 @@ class TestRepositoryGetParentMap(TestRemoteRepository):
 
         transport_path = "quack"
         repo, client = self.setup_fake_client_and_repository(transport_path)
+        client._medium._remember_remote_is_before((3, 4))
         client.add_success_response_with_body(encoded_body, b"ok")
         repo.lock_read()
         # get_cached_parent_map should *not* trigger an RPC
@@ -3242,6 +3440,24 @@ class TestGetParentMapAllowsNew(tests.TestCaseWithTransport):
         self.assertEqual({b"rev1": (b"null:",)}, graph.get_parent_map([b"rev1"]))
 
 
+class TestRepositoryCheckFinishesRequest(tests.TestCaseWithTransport):
+    def test_call_after_check(self):
+        """The medium can be used again once a check has been streamed."""
+        smart_server = test_server.SmartTCPServer_for_testing()
+        self.start_server(smart_server)
+        tree = self.make_branch_and_tree("tree")
+        revid = tree.commit("message")
+        repo = repository.Repository.open(smart_server.get_url() + "/tree")
+        self.assertIsInstance(repo, RemoteRepository)
+        with repo.lock_read():
+            self.assertEqual(
+                {(tree.path2id(""), revid): True}, repo.find_text_key_references()
+            )
+            self.assertEqual(revid, repo.get_revision(revid).revision_id)
+            repo.check([revid])
+            self.assertEqual(revid, repo.get_revision(revid).revision_id)
+
+
 class TestRepositoryGetRevisions(TestRemoteRepository):
     def test_hpss_missing_revision(self):
         transport_path = "quack"
@@ -5097,7 +5313,7 @@ class TestRepositoryRevisionTreeArchive(TestRemoteRepository):
             (b"quack/", b"somerevid", b"tar", b"foo.tar", b"", b"", None),
             b"success",
             (b"ok",),
-            f.getvalue(),
+            [f.getvalue()],
         )
         tree = repo.revision_tree(b"somerevid")
         self.assertEqual(f.getvalue(), b"".join(tree.archive("tar", "foo.tar")))
@@ -1760,6 +1760,67 @@ class TestSmartServerRepositoryGetParentMap(tests.TestCaseWithMemoryTransport):
         )
 
 
+class TestSmartServerRepositoryGetParentMapStream(tests.TestCaseWithMemoryTransport):
+    def make_history(self):
+        tree = self.make_branch_and_memory_tree(".")
+        tree.lock_write()
+        tree.add("")
+        r1 = tree.commit("1st commit")
+        r2 = tree.commit("2nd commit")
+        tree.unlock()
+        return r1, r2
+
+    def test_zlib(self):
+        r1, r2 = self.make_history()
+        backing = self.get_transport()
+        request = smart_repo.SmartServerRepositoryGetParentMapStream(backing)
+        self.assertEqual(
+            None,
+            request.execute(b"", b"zlib:1", r2, b"missing-id", b"include-missing:"),
+        )
+        response = request.do_body(b"\n\n0\n")
+        self.assertEqual((b"ok",), response.args)
+        body = zlib.decompress(b"".join(response.body_stream))
+        self.assertEqual(
+            sorted([b"missing:missing-id", r2 + b" " + r1, r1, b""]),
+            sorted(body.split(b"\n")),
+        )
+
+    def test_identity(self):
+        r1, r2 = self.make_history()
+        backing = self.get_transport()
+        request = smart_repo.SmartServerRepositoryGetParentMapStream(backing)
+        self.assertEqual(None, request.execute(b"", b"identity", r2))
+        response = request.do_body(b"\n\n0\n")
+        self.assertEqual(
+            [r2 + b" " + r1 + b"\n", r1 + b"\n"], list(response.body_stream)
+        )
+
+    def test_unknown_compression(self):
+        self.make_history()
+        backing = self.get_transport()
+        request = smart_repo.SmartServerRepositoryGetParentMapStream(backing)
+        self.assertEqual(
+            smart_req.FailedSmartServerResponse((b"UnknownCompression", b"zlib:11")),
+            request.execute(b"", b"zlib:11", b"rev"),
+        )
+
+    def test_cache_invalidated_by_new_pack(self):
+        r1, r2 = self.make_history()
+        repo = _mod_branch.Branch.open(self.get_url()).repository
+        with repo.lock_read():
+            provider = smart_repo._get_parents_provider(repo)
+            self.assertEqual({}, provider.get_parent_map([b"r3"]))
+            self.assertEqual({r2: (r1,)}, provider.get_parent_map([r2]))
+        tree = _mod_branch.Branch.open(self.get_url()).create_memorytree()
+        with tree.lock_write():
+            tree.commit("3rd commit", rev_id=b"r3")
+        repo = _mod_branch.Branch.open(self.get_url()).repository
+        with repo.lock_read():
+            provider = smart_repo._get_parents_provider(repo)
+            self.assertEqual({b"r3": (r2,)}, provider.get_parent_map([b"r3"]))
+
+
 class TestSmartServerRepositoryGetRevisionGraph(tests.TestCaseWithMemoryTransport):
     def test_none_argument(self):
         backing = self.get_transport()
@@ -2379,6 +2440,60 @@ class TestSmartServerRepositoryReconcile(tests.TestCaseWithTransport):
         )
 
 
+class TestSmartServerRepositoryCheck(tests.TestCaseWithMemoryTransport):
+    def make_tree_with_commit(self):
+        tree = self.make_branch_and_memory_tree(".", format="2a")
+        tree.lock_write()
+        self.addCleanup(tree.unlock)
+        tree.add("")
+        tree.commit("Message", rev_id=b"rev1")
+        return tree
+
+    def get_records(self, request_class):
+        backing = self.get_transport()
+        request = request_class(backing)
+        response = request.execute(b"")
+        self.assertEqual((b"ok",), response.args)
+        return list(smart_repo._byte_stream_to_records(response.body_stream))
+
+    def test_check(self):
+        self.make_tree_with_commit()
+        records = self.get_records(smart_repo.SmartServerRepositoryCheck)
+        self.assertEqual(
+            [(b"progress", 0), (b"progress", 1), (b"progress", 2)], records[:-1]
+        )
+        name, results = records[-1]
+        self.assertEqual(b"result", name)
+        self.assertEqual(1, results[b"checked_rev_cnt"])
+        self.assertEqual([], results[b"ghosts"])
+        self.assertEqual([], results[b"report_items"])
+
+    def test_find_text_key_references(self):
+        tree = self.make_tree_with_commit()
+        root_id = tree.path2id("")
+        self.assertEqual(
+            [(b"references", [[root_id, b"rev1", 1]]), (b"result", 1)],
+            self.get_records(smart_repo.SmartServerRepositoryFindTextKeyReferences),
+        )
+
+    def test_generate_text_key_index(self):
+        tree = self.make_tree_with_commit()
+        root_id = tree.path2id("")
+        self.assertEqual(
+            [(b"index", [[root_id, b"rev1", [b"null:"]]]), (b"result", 1)],
+            self.get_records(smart_repo.SmartServerRepositoryGenerateTextKeyIndex),
+        )
+
+    def test_find_inconsistent_revision_parents(self):
+        self.make_tree_with_commit()
+        self.assertEqual(
+            [(b"result", 0)],
+            self.get_records(
+                smart_repo.SmartServerRepositoryFindInconsistentRevisionParents
+            ),
+        )
+
+
 class TestSmartServerIsReadonly(tests.TestCaseWithMemoryTransport):
     def test_is_readonly_no(self):
         backing = self.get_transport()
@@ -2708,6 +2823,10 @@ class TestHandlers(tests.TestCase):
         self.assertHandlerEqual(
             b"Repository.get_parent_map", smart_repo.SmartServerRepositoryGetParentMap
         )
+        self.assertHandlerEqual(
+            b"Repository.get_parent_map_stream",
+            smart_repo.SmartServerRepositoryGetParentMapStream,
+        )
         self.assertHandlerEqual(
             b"Repository.get_physical_lock_status",
             smart_repo.SmartServerRepositoryGetPhysicalLockStatus,
@@ -2764,6 +2883,21 @@ class TestHandlers(tests.TestCase):
         self.assertHandlerEqual(
             b"Repository.reconcile", smart_repo.SmartServerRepositoryReconcile
         )
+        self.assertHandlerEqual(
+            b"Repository.check", smart_repo.SmartServerRepositoryCheck
+        )
+        self.assertHandlerEqual(
+            b"Repository.find_inconsistent_revision_parents",
+            smart_repo.SmartServerRepositoryFindInconsistentRevisionParents,
+        )
+        self.assertHandlerEqual(
+            b"Repository.find_text_key_references",
+            smart_repo.SmartServerRepositoryFindTextKeyReferences,
+        )
+        self.assertHandlerEqual(
+            b"Repository.generate_text_key_index",
+            smart_repo.SmartServerRepositoryGenerateTextKeyIndex,
+        )
         self.assertHandlerEqual(
             b"Repository.tarball", smart_repo.SmartServerRepositoryTarball
         )
@@ -2930,6 +3064,107 @@ class TestSmartServerRepositoryGetInventories(tests.TestCaseWithTransport):
         )
 
 
+class TestInventoryCache(tests.TestCaseWithTransport):
+    def setUp(self):
+        super().setUp()
+        self.overrideAttr(smart_repo, "_inventory_cache", None)
+
+    def test_cached_across_requests(self):
+        t = self.make_branch_and_tree(".", format="2a")
+        self.build_tree_contents([("file", b"somecontents")])
+        t.add(["file"], ids=[b"thefileid"])
+        t.commit(rev_id=b"rev1", message="add file")
+        repo = _mod_branch.Branch.open(self.get_url()).repository
+        with repo.lock_read():
+            self.assertEqual(
+                [(b"rev1", b"rev1"), (None, b"missing")],
+                [
+                    (inv and inv.revision_id, revid)
+                    for inv, revid in smart_repo._iter_inventories(
+                        repo, [b"rev1", b"missing"]
+                    )
+                ],
+            )
+            key = smart_repo._get_inventory_cache_key(repo)
+        self.assertIsNot(None, smart_repo._inventory_cache.get(key + (b"rev1",)))
+        repo = _mod_branch.Branch.open(self.get_url()).repository
+        tree = smart_repo._revision_tree(repo, b"rev1")
+        with tree.lock_read():
+            self.assertEqual(b"somecontents", tree.get_file_text("file"))
+
+    def test_new_pack_changes_key(self):
+        t = self.make_branch_and_tree(".", format="2a")
+        t.commit(rev_id=b"rev1", message="first")
+        repo = _mod_branch.Branch.open(self.get_url()).repository
+        with repo.lock_read():
+            key1 = smart_repo._get_inventory_cache_key(repo)
+        t.commit(rev_id=b"rev2", message="second")
+        repo = _mod_branch.Branch.open(self.get_url()).repository
+        with repo.lock_read():
+            key2 = smart_repo._get_inventory_cache_key(repo)
+        self.assertEqual(key1[0], key2[0])
+        self.assertNotEqual(key1[1], key2[1])
+
+    def test_deserialized_without_chks(self):
+        t = self.make_branch_and_tree(".", format="1.9")
+        t.commit(rev_id=b"rev1", message="first")
+        repo = _mod_branch.Branch.open(self.get_url()).repository
+        with repo.lock_read():
+            [(inv1, _)] = smart_repo._iter_inventories(repo, [b"rev1"])
+        repo = _mod_branch.Branch.open(self.get_url()).repository
+        with repo.lock_read():
+            [(inv2, _)] = smart_repo._iter_inventories(repo, [b"rev1"])
+        self.assertEqual(b"rev1", inv1.revision_id)
+        self.assertIs(inv1, inv2)
+
+    def test_deserialized_with_chks(self):
+        t = self.make_branch_and_tree(".", format="2a")
+        self.build_tree_contents([("file", b"somecontents")])
+        t.add(["file"], ids=[b"thefileid"])
+        t.commit(rev_id=b"rev1", message="first")
+        repo = _mod_branch.Branch.open(self.get_url()).repository
+        with repo.lock_read():
+            [(inv1, _)] = smart_repo._iter_inventories(repo, [b"rev1"])
+        repo = _mod_branch.Branch.open(self.get_url()).repository
+        with repo.lock_read():
+            [(inv2, _)] = smart_repo._iter_inventories(repo, [b"rev1"])
+        self.assertIs(inv1, inv2)
+        # The inventory can be used once its repository is unlocked.
+        self.assertEqual(b"thefileid", inv1.path2id("file"))
+
+    def test_topological(self):
+        t = self.make_branch_and_tree(".", format="2a")
+        for revid in [b"rev1", b"rev2", b"rev3"]:
+            t.commit(rev_id=revid, message=revid.decode("ascii"))
+        repo = _mod_branch.Branch.open(self.get_url()).repository
+        with repo.lock_read():
+            # The first call fills the cache, the second is served from it.
+            for _ in range(2):
+                self.assertEqual(
+                    [b"missing", b"rev1", b"rev2", b"rev3"],
+                    [
+                        revid
+                        for _inv, revid in smart_repo._iter_inventories(
+                            repo, [b"rev3", b"missing", b"rev1", b"rev2"], "topological"
+                        )
+                    ],
+                )
+            self.assertEqual(
+                [b"rev3", b"rev1", b"rev2"],
+                [
+                    revid
+                    for _inv, revid in smart_repo._iter_inventories(
+                        repo, [b"rev3", b"rev1", b"rev2"]
+                    )
+                ],
+            )
+
+    def test_not_cached_without_packs(self):
+        repo = self.make_repository(".", format="knit")
+        with repo.lock_read():
+            self.assertIs(None, smart_repo._get_inventory_cache_key(repo))
+
+
 class TestSmartServerRepositoryGetStreamForMissingKeys(GetStreamTestBase):
     def test_missing(self):
         """The search argument may be a 'ancestry-of' some heads'."""
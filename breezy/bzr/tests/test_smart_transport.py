@@ -37,7 +37,7 @@ import breezy
 from breezy import transport as _mod_transport
 from breezy.transport import remote
 
-from ... import controldir, debug, errors, osutils, tests, urlutils
+from ... import config, controldir, debug, errors, osutils, tests, urlutils
 from ...tests import features, test_server
 from .. import bzrdir
 from ..remote import UnknownErrorFromSmartServer
@@ -1506,6 +1506,119 @@ class TestSmartTCPServer(tests.TestCase):
         server_thread.join()
 
 
+class TestSmartSelectorTCPServer(tests.TestCase):
+    def make_server(self, client_timeout=4.0, max_concurrency=1):
+        """Create a SmartSelectorTCPServer and start it in another thread.
+
+        :return: (server, server_thread)
+        """
+        t = _mod_transport.get_transport_from_url("memory:///")
+        server = _mod_server.SmartSelectorTCPServer(
+            t, client_timeout=client_timeout, max_concurrency=max_concurrency
+        )
+        server._ACCEPT_TIMEOUT = 0.1
+        server.start_server("127.0.0.1", 0, backlog=5)
+        server_thread = threading.Thread(target=server.serve, args=(self.id(),))
+        server_thread.start()
+        self.addCleanup(server_thread.join)
+        self.addCleanup(server._stop_gracefully)
+        server._started.wait()
+        return server, server_thread
+
+    def connect_to_server(self, server):
+        client_sock = socket.socket()
+        client_sock.connect(server._server_socket.getsockname())
+        self.addCleanup(client_sock.close)
+        return client_sock
+
+    def say_hello(self, client_sock):
+        client_sock.send(b"hello\n")
+        self.assertEqual(b"ok\x012\n", client_sock.recv(5))
+
+    def test_rejects_invalid_max_concurrency(self):
+        self.assertRaises(
+            ValueError,
+            _mod_server.SmartSelectorTCPServer,
+            None,
+            client_timeout=4.0,
+            max_concurrency=0,
+        )
+
+    def test_idle_connections_do_not_use_workers(self):
+        server, _server_thread = self.make_server(max_concurrency=1)
+        client_socks = [self.connect_to_server(server) for i in range(3)]
+        for client_sock in client_socks:
+            self.say_hello(client_sock)
+        # Requests from all three clients were served by a single worker.
+        self.assertEqual(1, len(server._workers))
+        # The connections are all still usable.
+        for client_sock in reversed(client_socks):
+            self.say_hello(client_sock)
+
+    def test_serves_pipelined_requests(self):
+        server, _server_thread = self.make_server()
+        client_sock = self.connect_to_server(server)
+        client_sock.send(b"hello\nhello\n")
+        response = b""
+        while len(response) < 10:
+            response += client_sock.recv(10 - len(response))
+        self.assertEqual(b"ok\x012\nok\x012\n", response)
+
+    def test_disconnects_idle_clients(self):
+        server, _server_thread = self.make_server(client_timeout=0.1)
+        client_sock = self.connect_to_server(server)
+        self.say_hello(client_sock)
+        # The server hangs up once the client has been idle for too long.
+        self.assertEqual(b"", client_sock.recv(1))
+        self.assertContainsRe(self.get_log(), "disconnecting client after 0.1 seconds")
+
+    def test_graceful_shutdown_closes_connections(self):
+        server, server_thread = self.make_server()
+        client_sock = self.connect_to_server(server)
+        self.say_hello(client_sock)
+        server._stop_gracefully()
+        server._stopped.wait()
+        server_thread.join()
+        self.assertTrue(server._fully_stopped.is_set())
+        self.assertEqual(b"", client_sock.recv(1))
+        self.assertEqual([], server._active_connections)
+
+
+class TestBzrServerFactoryEngine(tests.TestCaseInTempDir):
+    def make_smart_server(self, engine):
+        factory = _mod_server.BzrServerFactory()
+        factory.transport = _mod_transport.get_transport_from_url("memory:///")
+        factory._make_smart_server("127.0.0.1", 0, False, 4.0, engine)
+        self.addCleanup(factory.smart_server._server_socket.close)
+        return factory.smart_server
+
+    def test_threads(self):
+        smart_server = self.make_smart_server("threads")
+        self.assertIs(_mod_server.SmartTCPServer, type(smart_server))
+
+    def test_async(self):
+        smart_server = self.make_smart_server("async")
+        self.assertIsInstance(smart_server, _mod_server.SmartSelectorTCPServer)
+
+    def test_default_from_config(self):
+        config.GlobalStack().set("serve.engine", "async")
+        smart_server = self.make_smart_server(None)
+        self.assertIsInstance(smart_server, _mod_server.SmartSelectorTCPServer)
+
+    def test_unknown(self):
+        factory = _mod_server.BzrServerFactory()
+        factory.transport = _mod_transport.get_transport_from_url("memory:///")
+        self.assertRaises(
+            errors.CommandError,
+            factory._make_smart_server,
+            "127.0.0.1",
+            0,
+            False,
+            4.0,
+            "fibers",
+        )
+
+
 class SmartTCPTests(tests.TestCase):
     """Tests for connection/end to end behaviour using the TCP server.
 
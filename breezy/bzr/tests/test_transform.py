@@ -20,9 +20,10 @@ import time
 
 from dromedary.local import file_kind
 
-from ... import errors, filters, osutils, rules
+from ... import config, errors, filters, osutils, rules
 from ...controldir import ControlDir
 from ...tests import UnavailableFeature, features
+from .. import transform as bzr_transform
 from ..conflicts import DuplicateEntry
 from ..transform import build_tree
 from . import TestCaseWithTransport
@@ -552,3 +553,70 @@ class TestBuildTree(TestCaseWithTransport):
         self.assertEqual(entry2_sha, target.get_file_sha1("dir/file2"))
         self.assertEqual(entry1_state, entry1[1][0])
         self.assertEqual(entry2_state, entry2[1][0])
+
+
+class TestParallelBuildTree(TestCaseWithTransport):
+    def setUp(self):
+        super().setUp()
+        config.GlobalStack().set("build_tree.jobs", 3)
+
+    def make_source(self):
+        source = self.make_branch_and_tree("source")
+        paths = ["dir/"] + ["dir/file%d" % i for i in range(20)]
+        self.build_tree(["source/" + path for path in paths])
+        source.add([path.rstrip("/") for path in paths])
+        source.commit("add files")
+        source.lock_read()
+        self.addCleanup(source.unlock)
+        return source
+
+    def test_build_tree(self):
+        source = self.make_source()
+        target = self.make_branch_and_tree("target")
+        revision_tree = source.basis_tree()
+        revision_tree.lock_read()
+        self.addCleanup(revision_tree.unlock)
+        build_tree(revision_tree, target)
+        target.lock_read()
+        self.addCleanup(target.unlock)
+        self.assertEqual([], list(target.iter_changes(revision_tree)))
+        self.assertFileEqual(b"contents of source/dir/file7\n", "target/dir/file7")
+
+    def test_accelerator_tree_copied(self):
+        source = self.make_source()
+        calls = []
+        real_source_get_file = source.get_file
+
+        def get_file(path):
+            calls.append(path)
+            return real_source_get_file(path)
+
+        source.get_file = get_file
+        target = self.make_branch_and_tree("target")
+        target.lock_write()
+        self.addCleanup(target.unlock)
+        state = target.current_dirstate()
+        state._cutoff_time = int(time.time()) + 60
+        revision_tree = source.basis_tree()
+        revision_tree.lock_read()
+        self.addCleanup(revision_tree.unlock)
+        build_tree(revision_tree, target, source)
+        self.assertEqual([], calls)
+        self.assertEqual([], list(target.iter_changes(revision_tree)))
+        entry = state._get_entry(0, path_utf8=b"dir/file3")
+        self.assertEqual(osutils.sha_file_by_name("source/dir/file3"), entry[1][0][1])
+
+    def test_write_error(self):
+        source = self.make_source()
+        target = self.make_branch_and_tree("target")
+
+        def write_limbo_file(name, contents, mtime):
+            raise OSError("no space left")
+
+        self.overrideAttr(bzr_transform, "_write_limbo_file", write_limbo_file)
+        revision_tree = source.basis_tree()
+        revision_tree.lock_read()
+        self.addCleanup(revision_tree.unlock)
+        self.assertRaises(OSError, build_tree, revision_tree, target)
+        self.assertPathDoesNotExist("target/dir")
+        self.assertPathDoesNotExist("target/.bzr/checkout/limbo")
@@ -17,16 +17,24 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
 
+import collections
 import contextlib
 import errno
 import os
 import shutil
+import sys
 import tempfile
 import time
 import weakref
+from concurrent.futures import ThreadPoolExecutor
 from stat import S_IEXEC, S_ISREG
 from typing import Any
 
+try:
+    import fcntl
+except ModuleNotFoundError:  # Windows
+    fcntl = None
+
 from bzrformats import generate_ids, inventory, multiparent
 from bzrformats.errors import BadFileKindError as _BzrFormatsBadFileKindError
 from bzrformats.inventory import NoSuchId
@@ -2787,7 +2795,14 @@ def _build_tree(tree, wt, accelerator_tree, hardlink, delta_from_tree):
                     _reparent_children(tt, old_parent, new_trans_id)
             offset = num + 1 - len(deferred_contents)
             _create_files(
-                tt, tree, deferred_contents, pb, offset, accelerator_tree, hardlink
+                tt,
+                tree,
+                deferred_contents,
+                pb,
+                offset,
+                accelerator_tree,
+                hardlink,
+                jobs=wt.get_config_stack().get("build_tree.jobs"),
             )
         pp.next_phase()
         divert_trans = {file_trans_id[f] for f in divert}
@@ -2810,55 +2825,192 @@ def _build_tree(tree, wt, accelerator_tree, hardlink, delta_from_tree):
     return result
 
 
-def _create_files(tt, tree, desired_files, pb, offset, accelerator_tree, hardlink):
+# The FICLONE ioctl, which makes a file share the data of another file on
+# file systems that support it (btrfs, XFS, ...).
+_FICLONE = 0x40049409
+
+# The maximum number of bytes to ask os.copy_file_range for at once.
+_COPY_CHUNK_SIZE = 1 << 30
+
+
+def _copy_file_contents(source, target):
+    """Copy the contents of an open file into another one.
+
+    The data is cloned if the file system supports it, and otherwise copied
+    inside the kernel where possible.
+    """
+    if fcntl is not None and sys.platform.startswith("linux"):
+        try:
+            fcntl.ioctl(target.fileno(), _FICLONE, source.fileno())
+        except OSError:
+            pass
+        else:
+            return
+    copy_file_range = getattr(os, "copy_file_range", None)
+    if copy_file_range is not None:
+        try:
+            while copy_file_range(source.fileno(), target.fileno(), _COPY_CHUNK_SIZE):
+                pass
+        except OSError:
+            # Not supported for these files; copy whatever is left below.
+            pass
+        else:
+            return
+    shutil.copyfileobj(source, target)
+
+
+def _write_limbo_file(name, contents, mtime):
+    with open(name, "wb") as f:
+        f.writelines(contents)
+    os.utime(name, (mtime, mtime))
+    return osutils.lstat(name)
+
+
+def _copy_limbo_file(name, source_path, mtime):
+    with open(source_path, "rb") as source, open(name, "wb") as target:
+        _copy_file_contents(source, target)
+    os.utime(name, (mtime, mtime))
+    return osutils.lstat(name)
+
+
+class _ParallelFileCreator:
+    """Write the contents of new files into limbo in worker threads.
+
+    The calling thread keeps extracting texts while the workers write the
+    previous ones to disk. The transform itself is only updated from the
+    calling thread, once a file has been written.
+
+    This is only used for files at new paths, which have no existing mode
+    to preserve.
+    """
+
+    def __init__(self, tt, jobs):
+        self._tt = tt
+        self._executor = ThreadPoolExecutor(
+            max_workers=jobs, thread_name_prefix="build-tree"
+        )
+        self._pending = collections.deque()
+        self._window = jobs * 4
+        if tt._creation_mtime is None:
+            tt._creation_mtime = time.time()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # Wait for all writes, so that nothing is left writing into limbo
+        # when the transform is finalized.
+        error = None
+        while self._pending:
+            try:
+                self._finish(self._pending.popleft())
+            except BaseException as e:
+                if error is None:
+                    error = e
+        self._executor.shutdown(wait=True)
+        if exc_type is None and error is not None:
+            raise error
+        return False
+
+    def _submit(self, trans_id, sha1, fn, *args):
+        # _limbo_name() updates the transform, so it is called here rather
+        # than in the worker.
+        name = self._tt._limbo_name(trans_id)
+        future = self._executor.submit(fn, name, *args, self._tt._creation_mtime)
+        self._pending.append((trans_id, sha1, future))
+        while len(self._pending) > self._window:
+            self._finish(self._pending.popleft())
+
+    def _finish(self, pending):
+        trans_id, sha1, future = pending
+        stat_value = future.result()
+        unique_add(self._tt._new_contents, trans_id, "file")
+        if sha1 is not None:
+            self._tt._observed_sha1s[trans_id] = (sha1, stat_value)
+
+    def create_file(self, contents, trans_id, sha1=None):
+        """Schedule creation of a new file, like TreeTransform.create_file."""
+        self._submit(trans_id, sha1, _write_limbo_file, list(contents))
+
+    def copy_file(self, path, trans_id, sha1=None):
+        """Schedule creation of a new file with the contents of path."""
+        self._submit(trans_id, sha1, _copy_limbo_file, path)
+
+
+def _create_files(
+    tt, tree, desired_files, pb, offset, accelerator_tree, hardlink, jobs=1
+):
     total = len(desired_files) + offset
     wt = tt._tree
-    if accelerator_tree is None:
-        new_desired_files = desired_files
-    else:
-        iter = accelerator_tree.iter_changes(tree, include_unchanged=True)
-        unchanged = [
-            change.path
-            for change in iter
-            if not (
-                change.changed_content or change.executable[0] != change.executable[1]
-            )
-        ]
-        if accelerator_tree.supports_content_filtering():
+    with contextlib.ExitStack() as exit_stack:
+        if jobs > 1 and isinstance(tt, DiskTreeTransform):
+            creator = exit_stack.enter_context(_ParallelFileCreator(tt, jobs))
+        else:
+            creator = None
+        if accelerator_tree is None:
+            new_desired_files = desired_files
+        else:
+            iter = accelerator_tree.iter_changes(tree, include_unchanged=True)
             unchanged = [
-                (tp, ap)
-                for (tp, ap) in unchanged
-                if not next(accelerator_tree.iter_search_rules([ap]))
+                change.path
+                for change in iter
+                if not (
+                    change.changed_content
+                    or change.executable[0] != change.executable[1]
+                )
             ]
-        unchanged = dict(unchanged)
-        new_desired_files = []
-        count = 0
-        for _unused_tree_path, (trans_id, tree_path, text_sha1) in desired_files:
-            accelerator_path = unchanged.get(tree_path)
-            if accelerator_path is None:
-                new_desired_files.append((tree_path, (trans_id, tree_path, text_sha1)))
-                continue
-            pb.update(gettext("Adding file contents"), count + offset, total)
-            if hardlink:
-                tt.create_hardlink(accelerator_tree.abspath(accelerator_path), trans_id)
+            if accelerator_tree.supports_content_filtering():
+                unchanged = [
+                    (tp, ap)
+                    for (tp, ap) in unchanged
+                    if not next(accelerator_tree.iter_search_rules([ap]))
+                ]
+            unchanged = dict(unchanged)
+            can_copy = creator is not None and hasattr(accelerator_tree, "abspath")
+            new_desired_files = []
+            count = 0
+            for _unused_tree_path, (trans_id, tree_path, text_sha1) in desired_files:
+                accelerator_path = unchanged.get(tree_path)
+                if accelerator_path is None:
+                    new_desired_files.append(
+                        (tree_path, (trans_id, tree_path, text_sha1))
+                    )
+                    continue
+                pb.update(gettext("Adding file contents"), count + offset, total)
+                if hardlink:
+                    tt.create_hardlink(
+                        accelerator_tree.abspath(accelerator_path), trans_id
+                    )
+                elif can_copy and not (
+                    wt.supports_content_filtering()
+                    and wt._content_filter_stack(tree_path)
+                ):
+                    creator.copy_file(
+                        accelerator_tree.abspath(accelerator_path),
+                        trans_id,
+                        sha1=text_sha1,
+                    )
+                else:
+                    with accelerator_tree.get_file(accelerator_path) as f:
+                        chunks = osutils.file_iterator(f)
+                        if wt.supports_content_filtering():
+                            filters = wt._content_filter_stack(tree_path)
+                            chunks = filtered_output_bytes(
+                                chunks, filters, ContentFilterContext(tree_path, tree)
+                            )
+                        tt.create_file(chunks, trans_id, sha1=text_sha1)
+                count += 1
+            offset += count
+        for count, ((trans_id, tree_path, text_sha1), contents) in enumerate(
+            tree.iter_files_bytes(new_desired_files)
+        ):
+            if wt.supports_content_filtering():
+                filters = wt._content_filter_stack(tree_path)
+                contents = filtered_output_bytes(
+                    contents, filters, ContentFilterContext(tree_path, tree)
+                )
+            if creator is not None:
+                creator.create_file(contents, trans_id, sha1=text_sha1)
             else:
-                with accelerator_tree.get_file(accelerator_path) as f:
-                    chunks = osutils.file_iterator(f)
-                    if wt.supports_content_filtering():
-                        filters = wt._content_filter_stack(tree_path)
-                        chunks = filtered_output_bytes(
-                            chunks, filters, ContentFilterContext(tree_path, tree)
-                        )
-                    tt.create_file(chunks, trans_id, sha1=text_sha1)
-            count += 1
-        offset += count
-    for count, ((trans_id, tree_path, text_sha1), contents) in enumerate(
-        tree.iter_files_bytes(new_desired_files)
-    ):
-        if wt.supports_content_filtering():
-            filters = wt._content_filter_stack(tree_path)
-            contents = filtered_output_bytes(
-                contents, filters, ContentFilterContext(tree_path, tree)
-            )
-        tt.create_file(contents, trans_id, sha1=text_sha1)
-        pb.update(gettext("Adding file contents"), count + offset, total)
+                tt.create_file(contents, trans_id, sha1=text_sha1)
+            pb.update(gettext("Adding file contents"), count + offset, total)
@@ -16,7 +16,10 @@
 
 """Repository formats built around versioned files."""
 
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
+from multiprocessing.util import Finalize
 
 import vcsgraph.graph as graph
 from vcsgraph.graph import HeadsCache
@@ -70,6 +73,7 @@ from bzrformats.inventory import (
 )
 from bzrformats.inventory import _make_delta as make_inventory_delta
 from bzrformats.inventory_delta import InventoryDelta
+from dromedary import errors as transport_errors
 
 from .. import debug, errors, osutils
 from ..decorators import only_raises
@@ -113,6 +117,56 @@ def _to_bzr_revision(revision):
     )
 
 
+# The number of key ranges to split records into for each check job.
+_CHECK_RANGES_PER_JOB = 4
+
+# The repository opened by a check worker process.
+_check_worker_repository = None
+
+
+def _check_process_context():
+    """Return the multiprocessing context to run check workers in.
+
+    Workers are forked where possible, so that they start with the formats
+    and plugins that are already loaded, and spawned elsewhere. Either way
+    each worker opens the repository itself, in _init_check_worker.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+
+def _init_check_worker(path):
+    """Open and read lock the repository at path in a check worker process.
+
+    The repository stays locked for the life of the worker and is unlocked
+    when the worker exits.
+    """
+    global _check_worker_repository
+    _check_worker_repository = Repository.open(path)
+    _check_worker_repository.lock_read()
+    Finalize(_check_worker_repository, _check_worker_repository.unlock, exitpriority=0)
+
+
+def _check_records_in_worker(kind, keys, item_data):
+    """Check a range of records in a worker process.
+
+    :param kind: The kind of the records, e.g. "texts".
+    :param keys: The keys of the records to check.
+    :param item_data: The (kind, sha1, referer) that each record in keys is
+        expected to match.
+    :return: A tuple (report_items, pending_keys, text_key_references) with
+        the findings of the check.
+    """
+    repository = _check_worker_repository
+    checker = check.VersionedFileCheck(repository)
+    current_keys = {
+        (kind,) + key: data for key, data in zip(keys, item_data, strict=True)
+    }
+    repository._check_records(checker, kind, keys, current_keys)
+    return checker._report_items, checker.pending_keys, checker.text_key_references
+
+
 class VersionedFileRepositoryFormat(RepositoryFormat):
     """Base class for all repository formats that are VersionedFiles-based."""
 
@@ -963,7 +1017,6 @@ class VersionedFileRepository(Repository):
         """Helper for _check_inventories."""
         keys = {"chk_bytes": set(), "inventories": set(), "texts": set()}
         kinds = ["chk_bytes", "texts"]
-        len(checker.pending_keys)
         bar.update(gettext("inventories"), 0, 2)
         current_keys = checker.pending_keys
         checker.pending_keys = {}
@@ -978,18 +1031,7 @@ class VersionedFileRepository(Repository):
             # to just delta against. However, pre-CHK formats didn't
             # try to optimise inventory layout on disk. As such the
             # pre-CHK code path does not use inventory deltas.
-            last_object = None
-            for record in self.inventories.check(keys=keys["inventories"]):
-                if record.storage_kind == "absent":
-                    checker._report_items.append(f"Missing inventory {{{record.key}}}")
-                else:
-                    last_object = self._check_record(
-                        "inventories",
-                        record,
-                        checker,
-                        last_object,
-                        current_keys[("inventories",) + record.key],
-                    )
+            self._check_keys(checker, "inventories", keys["inventories"], current_keys)
             del keys["inventories"]
         else:
             return
@@ -1006,23 +1048,122 @@ class VersionedFileRepository(Repository):
             # Check the outermost kind only - inventories || chk_bytes || texts
             for kind in kinds:
                 if keys[kind]:
-                    last_object = None
-                    for record in getattr(self, kind).check(keys=keys[kind]):
-                        if record.storage_kind == "absent":
-                            checker._report_items.append(
-                                f"Missing {kind} {{{record.key}}}"
-                            )
-                        else:
-                            last_object = self._check_record(
-                                kind,
-                                record,
-                                checker,
-                                last_object,
-                                current_keys[(kind,) + record.key],
-                            )
+                    self._check_keys(checker, kind, keys[kind], current_keys)
                     keys[kind] = set()
                     break
 
+    def _check_keys(self, checker, kind, keys, current_keys):
+        """Check the records of one kind.
+
+        Records that an earlier check verified, as listed in
+        checker.unchecked_keys, are only checked to be present. The others
+        are checked in checker.jobs processes.
+
+        :param checker: The VersionedFileCheck to record findings on.
+        :param kind: The kind of the records, e.g. "texts".
+        :param keys: The keys of the records to check.
+        :param current_keys: A dict mapping (kind,) + key to the
+            (kind, sha1, referer) that the record is expected to match.
+        """
+        if checker.unchecked_keys is not None:
+            verified = keys.difference(checker.unchecked_keys[kind])
+            present = getattr(self, kind).get_parent_map(verified)
+            for key in verified.difference(present):
+                checker._report_items.append(self._missing_record_message(kind, key))
+            keys = keys.intersection(checker.unchecked_keys[kind])
+        if checker.jobs > 1 and len(keys) > 1:
+            try:
+                path = self.controldir.root_transport.local_abspath(".")
+            except transport_errors.NotLocalUrl:
+                pass
+            else:
+                self._check_records_in_processes(
+                    checker, path, kind, keys, current_keys
+                )
+                return
+        self._check_records(checker, kind, keys, current_keys)
+
+    def _check_records(self, checker, kind, keys, current_keys):
+        """Check records one after the other. See _check_keys."""
+        last_object = None
+        for record in getattr(self, kind).check(keys=keys):
+            if record.storage_kind == "absent":
+                checker._report_items.append(
+                    self._missing_record_message(kind, record.key)
+                )
+            else:
+                last_object = self._check_record(
+                    kind,
+                    record,
+                    checker,
+                    last_object,
+                    current_keys[(kind,) + record.key],
+                )
+
+    def _missing_record_message(self, kind, key):
+        if kind == "inventories":
+            return f"Missing inventory {{{key}}}"
+        return f"Missing {kind} {{{key}}}"
+
+    def _check_records_in_processes(self, checker, path, kind, keys, current_keys):
+        """Check records in a pool of worker processes. See _check_keys.
+
+        The keys are split into ranges, each checked by a worker process
+        against its own copy of the repository at path. The findings of the
+        workers are merged into checker.
+        """
+        keys = sorted(keys)
+        # Several ranges per job so that a slow range does not leave the
+        # other workers idle, but few enough that inventories within a range
+        # can still be checked as deltas against each other.
+        size = -(-len(keys) // (checker.jobs * _CHECK_RANGES_PER_JOB))
+        ranges = [keys[i : i + size] for i in range(0, len(keys), size)]
+        with (
+            ui.ui_factory.nested_progress_bar() as pb,
+            ProcessPoolExecutor(
+                max_workers=checker.jobs,
+                mp_context=_check_process_context(),
+                initializer=_init_check_worker,
+                initargs=(path,),
+            ) as executor,
+        ):
+            futures = [
+                executor.submit(
+                    _check_records_in_worker,
+                    kind,
+                    key_range,
+                    [current_keys[(kind,) + key] for key in key_range],
+                )
+                for key_range in ranges
+            ]
+            for i, future in enumerate(futures):
+                pb.update(gettext("checking ranges"), i, len(futures))
+                report_items, pending_keys, text_key_references = future.result()
+                checker._report_items.extend(report_items)
+                for key, (item_kind, sha1, referer) in pending_keys.items():
+                    checker.add_pending_item(referer, key, item_kind, sha1)
+                for key, referenced in text_key_references.items():
+                    if referenced:
+                        checker.text_key_references[key] = True
+                    else:
+                        checker.text_key_references.setdefault(key, False)
+
+    def _get_unchecked_content(self):
+        """Find the content that was not verified by an earlier check.
+
+        :return: A tuple (token, keys). keys is None if all content should be
+            checked, or a dict mapping "inventories", "texts" and "chk_bytes"
+            to sets of the keys of records that were not verified yet. Once
+            they have been, token should be passed to _content_checked.
+        """
+        return None, None
+
+    def _content_checked(self, token):
+        """Record that a check verified the content found unchecked.
+
+        :param token: The token returned by _get_unchecked_content.
+        """
+
     def _check_record(self, kind, record, checker, last_object, item_data):
         """Check a single text from this repository."""
         if kind == "inventories":
@@ -1848,9 +1989,13 @@ class VersionedFileRepository(Repository):
                 raise errors.NoSuchRevision(self, revision_id)
             return record.get_bytes_as("fulltext")
 
-    def _check(self, revision_ids, callback_refs, check_repo):
+    def _check(
+        self, revision_ids, callback_refs, check_repo, jobs=1, incremental=False
+    ):
         with self.lock_read():
-            result = check.VersionedFileCheck(self, check_repo=check_repo)
+            result = check.VersionedFileCheck(
+                self, check_repo=check_repo, jobs=jobs, incremental=incremental
+            )
             result.check(callback_refs)
             return result
 
@@ -104,11 +104,29 @@ def scan_tree(base_tree, tree, needed_refs, exit_stack):
         reflist.append(tree)
 
 
-def check_dwim(path, verbose, do_branch=False, do_repo=False, do_tree=False):
+def check_dwim(
+    path,
+    verbose,
+    do_branch=False,
+    do_repo=False,
+    do_tree=False,
+    jobs=1,
+    incremental=False,
+):
     """Check multiple objects.
 
     If errors occur they are accumulated and reported as far as possible, and
     an exception raised at the end of the process.
+
+    Args:
+      path: The location to check.
+      verbose: Whether to report in more detail.
+      do_branch: Whether to check the branches.
+      do_repo: Whether to check the repository.
+      do_tree: Whether to check the working trees.
+      jobs: The number of processes to verify the repository contents in.
+      incremental: Whether to only verify the repository contents added
+        since the last incremental check.
     """
     try:
         base_tree, branch, repo, _relpath = (
@@ -153,7 +171,13 @@ def check_dwim(path, verbose, do_branch=False, do_repo=False, do_tree=False):
             if do_repo or do_branch or do_tree:
                 if do_repo:
                     note(gettext("Checking repository at '%s'.") % (repo.user_url,))
-                result = repo.check(None, callback_refs=needed_refs, check_repo=do_repo)
+                result = repo.check(
+                    None,
+                    callback_refs=needed_refs,
+                    check_repo=do_repo,
+                    jobs=jobs,
+                    incremental=incremental,
+                )
                 result.report_results(verbose)
         else:
             if do_tree:
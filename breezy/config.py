@@ -76,8 +76,12 @@ up=pull
 
 __docformat__ = "google"
 
+import collections
+import functools
 import os
 import sys
+import threading
+import time
 from collections.abc import Callable, Iterable
 from io import BytesIO
 from typing import cast
@@ -1352,42 +1356,77 @@ def _iter_for_location_by_parts(sections, location):
     ``location`` will always be a local path and never a 'file://' url but the
     section names themselves can be in either form.
     """
+    return _compile_location_sections(tuple(sections)).iter_matches(location)
+
+
+def _compile_path_part(pattern):
+    """Return a function matching a path component against a glob pattern."""
     import fnmatch
 
-    location_parts = location.rstrip("/").split("/")
+    pattern = os.path.normcase(pattern)
+    if not any(c in pattern for c in "*?["):
+        return pattern.__eq__
+    return re.compile(fnmatch.translate(pattern)).match
 
-    for section in sections:
-        # location is a local path if possible, so we need to convert 'file://'
-        # urls in section names to local paths if necessary.
 
-        # This also avoids having file:///path be a more exact
-        # match than '/path'.
+class _LocationSections:
+    """The section names of a store, compiled to be matched with locations.
 
-        # FIXME: This still raises an issue if a user defines both file:///path
-        # *and* /path. Should we raise an error in this case -- vila 20110505
+    Each path component of a section name is a glob pattern that has to
+    match the corresponding component of the location.
+    """
 
-        if section.startswith("file://"):
-            section_path = urlutils.local_path_from_url(section)
-        else:
-            section_path = section
-        section_parts = section_path.rstrip("/").split("/")
+    def __init__(self, sections):
+        """Compile the section names.
+
+        Args:
+          sections: A sequence of section names.
+        """
+        self._sections = []
+        for section in sections:
+            # location is a local path if possible, so we need to convert
+            # 'file://' urls in section names to local paths if necessary.
+
+            # This also avoids having file:///path be a more exact
+            # match than '/path'.
+
+            # FIXME: This still raises an issue if a user defines both
+            # file:///path *and* /path. Should we raise an error in this case
+            # -- vila 20110505
+            if section.startswith("file://"):
+                section_path = urlutils.local_path_from_url(section)
+            else:
+                section_path = section
+            parts = [
+                _compile_path_part(part) for part in section_path.rstrip("/").split("/")
+            ]
+            self._sections.append((section, parts))
+
+    def iter_matches(self, location):
+        """Yield (section, extra_path, nb_parts) for the sections matching location.
+
+        See _iter_for_location_by_parts().
+        """
+        location_parts = location.rstrip("/").split("/")
+        normalized_parts = [os.path.normcase(part) for part in location_parts]
+        for section, parts in self._sections:
+            if len(parts) > len(location_parts):
+                # More path components in the section, they can't match
+                continue
+            if not all(
+                match(name)
+                for match, name in zip(parts, normalized_parts, strict=False)
+            ):
+                continue
+            # build the path difference between the section and the location
+            extra_path = "/".join(location_parts[len(parts) :])
+            yield section, extra_path, len(parts)
 
-        matched = True
-        if len(section_parts) > len(location_parts):
-            # More path components in the section, they can't match
-            matched = False
-        else:
-            # Rely on zip truncating in length to the length of the shortest
-            # argument sequence.
-            for name in zip(location_parts, section_parts, strict=False):
-                if not fnmatch.fnmatch(name[0], name[1]):
-                    matched = False
-                    break
-        if not matched:
-            continue
-        # build the path difference between the section and the location
-        extra_path = "/".join(location_parts[len(section_parts) :])
-        yield section, extra_path, len(section_parts)
+
+@functools.lru_cache(maxsize=16)
+def _compile_location_sections(sections):
+    """Compile a tuple of section names, reusing recent compilations."""
+    return _LocationSections(sections)
 
 
 class LocationConfig(LockableConfig):
@@ -3132,6 +3171,24 @@ Whether revisions associated with tags should be fetched.
 option_registry.register_lazy(
     "transform.orphan_policy", "breezy.transform", "opt_transform_orphan"
 )
+option_registry.register(
+    Option(
+        "build_tree.jobs",
+        default=1,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Number of threads to use for writing files when building a working tree.
+
+This is used when a new working tree is populated, e.g. by ``brz checkout``
+and ``brz branch``. When larger than one, file texts are written out by
+this many threads while the next texts are being extracted, and unchanged
+files are copied from an accelerator tree (such as the source working tree
+of ``brz branch``) by the kernel, or cloned on file systems that support
+it. Use e.g. ``-Obuild_tree.jobs=8`` to set it for a single command.
+""",
+    )
+)
 option_registry.register(
     Option(
         "bzr.workingtree.worth_saving_limit",
@@ -3249,6 +3306,23 @@ option_registry.register(
         help="The users identity",
     )
 )
+option_registry.register(
+    Option(
+        "export.jobs",
+        default=1,
+        from_unicode=int_from_store,
+        invalid="warning",
+        help="""\
+Number of threads to use for compressing archives.
+
+This is used by ``brz export`` when no ``--jobs`` option is given, and by
+the smart server when creating archives for clients. When larger than one,
+tgz, tbz2 and txz archives are split into blocks that are compressed
+independently, like pigz and pbzip2 do. The result is slightly larger but
+can be decompressed by the usual tools.
+""",
+    )
+)
 option_registry.register(
     Option(
         "gpg_signing_key",
@@ -3361,6 +3435,21 @@ uncommitted changes before sending a merge directive.
 """,
     )
 )
+option_registry.register(
+    Option(
+        "repository.defer_autopack",
+        default=False,
+        from_unicode=bool_from_store,
+        help="""\
+Leave combining pack files for later?
+
+If true, committing to a pack repository only writes the new pack file
+instead of combining existing pack files when there are too many of them.
+The packs are combined later by ``brz pack --incremental``, or inline once
+the repository has ``repository.max_packs`` pack files.
+""",
+    )
+)
 option_registry.register(
     Option(
         "repository.fdatasync",
@@ -3375,6 +3464,18 @@ lost if the machine crashes.  See also dirstate.fdatasync.
 """,
     )
 )
+option_registry.register(
+    Option(
+        "repository.max_packs",
+        default=100,
+        from_unicode=int_from_store,
+        help="""\
+Number of pack files at which packing is no longer deferred.
+
+See repository.defer_autopack.
+""",
+    )
+)
 option_registry.register_lazy("smtp_server", "breezy.smtp_connection", "smtp_server")
 option_registry.register_lazy(
     "smtp_password", "breezy.smtp_connection", "smtp_password"
@@ -3414,6 +3515,55 @@ option_registry.register(
         " X seconds, consider the client idle, and hangup.",
     )
 )
+option_registry.register(
+    Option(
+        "serve.engine",
+        default="threads",
+        help="""\
+How ``brz serve`` handles TCP connections for the bzr protocol.
+
+``threads`` serves every connection from its own thread. ``async`` watches
+idle connections from a single thread and only uses one of at most
+``serve.max_concurrency`` worker threads while a request is being processed.
+""",
+    )
+)
+option_registry.register(
+    Option(
+        "serve.listen_backlog",
+        default=1,
+        from_unicode=int_from_store,
+        help="Number of pending TCP connections the operating system queues"
+        " for ``brz serve`` before refusing new ones.",
+    )
+)
+option_registry.register(
+    Option(
+        "serve.max_concurrency",
+        default=8,
+        from_unicode=int_from_store,
+        help="Maximum number of requests processed at the same time when"
+        " ``serve.engine`` is ``async``.",
+    )
+)
+option_registry.register(
+    Option(
+        "serve.parent_map_cache_size",
+        default=100000,
+        from_unicode=int_from_store,
+        help="Number of revisions per repository for which the smart server"
+        " keeps parent data in memory between requests.",
+    )
+)
+option_registry.register(
+    Option(
+        "serve.inventory_cache_size",
+        default="10MB",
+        from_unicode=int_SI_from_store,
+        help="Amount of memory the smart server uses to keep"
+        " inventories between requests.",
+    )
+)
 option_registry.register(
     Option(
         "ssh", default=None, override_from_env=["BRZ_SSH"], help="SSH vendor to use."
@@ -3856,17 +4006,91 @@ class CommandLineStore(Store):
         yield self, self.readonly_section_class(None, self.options)
 
 
+class ParsedConfigCache:
+    """A process wide cache of parsed configuration files.
+
+    Stores that load the same file share a single parse of it as long as the
+    file doesn't change. Entries are keyed by (path, mtime, size); the
+    ConfigObj instances they hold are shared and must not be modified.
+
+    :ivar hits: The number of parses that were avoided.
+    :ivar misses: The number of files that had to be parsed.
+    """
+
+    def __init__(self, max_size=100):
+        """Create an empty cache.
+
+        Args:
+          max_size: The maximum number of parsed files to keep.
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Get the (content, config_obj) cached for key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def add(self, key, content, config_obj):
+        """Cache the parse of a file.
+
+        Args:
+          key: The (path, mtime, size) of the file.
+          content: The bytes that were parsed.
+          config_obj: The resulting ConfigObj.
+        """
+        with self._lock:
+            self._entries[key] = (content, config_obj)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, path):
+        """Forget the parses of the file at path."""
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == path]:
+                del self._entries[key]
+
+    def clear(self):
+        """Forget all parses and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+parsed_config_cache = ParsedConfigCache()
+
+# Files modified less than this many seconds ago are not cached, as they may
+# be modified again without their mtime changing on file systems with a
+# coarse timestamp resolution.
+_PARSED_CONFIG_RACY_SECONDS = 2
+
+
 class IniFileStore(Store):
     """A config Store using ConfigObj for storage.
 
     :ivar _config_obj: Private member to hold the ConfigObj instance used to
         serialize/deserialize the config file.
+
+    :ivar _shared_content: The content _config_obj was parsed from when
+        _config_obj is shared through the parsed config cache, None otherwise.
     """
 
     def __init__(self):
         """A config Store using ConfigObj for storage."""
         super().__init__()
         self._config_obj = None
+        self._shared_content = None
 
     def is_loaded(self):
         """Check if the store has been loaded.
@@ -3882,8 +4106,31 @@ class IniFileStore(Store):
         Sets the config object to None and clears any dirty sections.
         """
         self._config_obj = None
+        self._shared_content = None
         self.dirty_sections = {}
 
+    def _cache_key(self):
+        """Return the key of the file in the parsed config cache.
+
+        This can be provided by subclasses whose files can be checked for
+        changes cheaply.
+
+        Returns:
+          A (path, mtime, size) tuple, or None if the file can't be cached.
+        """
+        return None
+
+    def _unshare(self):
+        """Replace a config object shared with other stores by a copy.
+
+        This has to be done before the config object is modified.
+        """
+        if self._shared_content is not None:
+            content = self._shared_content
+            self._shared_content = None
+            self._config_obj = None
+            self._load_from_string(content)
+
     def _load_content(self):
         """Load the config file bytes.
 
@@ -3908,8 +4155,16 @@ class IniFileStore(Store):
         """Load the store from the associated file."""
         if self.is_loaded():
             return
-        content = self._load_content()
-        self._load_from_string(content)
+        key = self._cache_key()
+        cached = None if key is None else parsed_config_cache.get(key)
+        if cached is not None:
+            self._shared_content, self._config_obj = cached
+        else:
+            content = self._load_content()
+            self._load_from_string(content)
+            if key is not None:
+                parsed_config_cache.add(key, content, self._config_obj)
+                self._shared_content = content
         for hook in ConfigHooks["load"]:
             hook(self)
 
@@ -4003,6 +4258,7 @@ class IniFileStore(Store):
         except NoSuchFile:
             # The file doesn't exist, let's pretend it was empty
             self._load_from_string(b"")
+        self._unshare()
         if section_id in self.dirty_sections:
             # We already created a mutable section for this id
             return self.dirty_sections[section_id]
@@ -4024,6 +4280,7 @@ class IniFileStore(Store):
         Returns:
             The quoted value suitable for storage.
         """
+        self._unshare()
         try:
             # configobj conflates automagical list values and quoting
             self._config_obj.list_values = True
@@ -4078,6 +4335,30 @@ class TransportIniFileStore(IniFileStore):
         self.transport = transport
         self.file_name = file_name
 
+    def _local_path(self):
+        """Return the local path of the config file, or None."""
+        try:
+            return self.transport.local_abspath(self.file_name)
+        except (transport_errors.NotLocalUrl, transport_errors.TransportNotPossible):
+            return None
+
+    def _cache_key(self):
+        """Return the key of the file in the parsed config cache.
+
+        Only local files that haven't been modified very recently can be
+        cached.
+        """
+        path = self._local_path()
+        if path is None:
+            return None
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        if time.time() - st.st_mtime < _PARSED_CONFIG_RACY_SECONDS:
+            return None
+        return (path, st.st_mtime_ns, st.st_size)
+
     def _load_content(self):
         """Load the configuration file content from transport.
 
@@ -4103,6 +4384,9 @@ class TransportIniFileStore(IniFileStore):
             content: Bytes content to write to the configuration file.
         """
         self.transport.put_bytes(self.file_name, content)
+        path = self._local_path()
+        if path is not None:
+            parsed_config_cache.invalidate(path)
 
     def external_url(self):
         """Return the external URL for this transport-based store.
@@ -4452,6 +4736,19 @@ class LocationMatcher(SectionMatcher):
             self.branch_name = urlutils.basename(self.location)
         else:
             self.branch_name = urlutils.unescape(branch_name)
+        # The section names seen last and the sections among them that match
+        # the location, so that they are only matched again when the store
+        # content changes.
+        self._filtered = (None, None)
+
+    def _filter_sections(self, section_ids):
+        """Return the (section_id, extra_path, length) matching the location."""
+        section_ids = tuple(section_ids)
+        seen_ids, filtered = self._filtered
+        if seen_ids != section_ids:
+            filtered = list(_iter_for_location_by_parts(section_ids, self.location))
+            self._filtered = (section_ids, filtered)
+        return filtered
 
     def _get_matching_sections(self):
         """Get all sections matching ``location``."""
@@ -4468,9 +4765,7 @@ class LocationMatcher(SectionMatcher):
                 all_sections.append(section)
         # Unfortunately _iter_for_location_by_parts deals with section names so
         # we have to resync.
-        filtered_sections = _iter_for_location_by_parts(
-            [s.id for s in all_sections], self.location
-        )
+        filtered_sections = self._filter_sections(s.id for s in all_sections)
         iter_all_sections = iter(all_sections)
         matching_sections = []
         if no_name_section is not None:
@@ -32,6 +32,7 @@ def export(
     per_file_timestamps=False,
     fileobj=None,
     recurse_nested=False,
+    jobs=1,
 ):
     """Export the given Tree to the specific destination.
 
@@ -54,6 +55,7 @@ def export(
           rather than now(). This will do a revision lookup for every file so will
           be significantly slower.
       fileobj: Optional file object to use
+      jobs: Number of threads to compress archives with
     """
     if format is None and dest is not None:
         format = guess_format(dest)
@@ -97,6 +99,7 @@ def export(
             subdir=subdir,
             force_mtime=force_mtime,
             recurse_nested=recurse_nested,
+            jobs=jobs,
         )
         if dest == "-":
             for chunk in chunks:
@@ -373,6 +373,7 @@ def _command_helps(exporter, plugin_name=None):
         note(gettext("Exporting messages from builtin command: %s"), cmd_name)
         _write_command_help(exporter, command)
 
+    _mod_plugin.load_deferred_plugins()
     plugins = _mod_plugin.plugins()
     if plugin_name is not None and plugin_name not in plugins:
         raise errors.BzrError(gettext("Plugin {} is not loaded").format(plugin_name))
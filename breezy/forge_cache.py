@@ -0,0 +1,401 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Helpers for talking to the REST APIs of forges.
+
+Forge APIs are mostly read, and most of what is read does not change between
+two runs of brz. Responses to GET requests that carry an ETag are kept on
+disk; the next request for the same URL sends If-None-Match and, when the
+server answers 304 Not Modified, the stored response is used. Forges such as
+GitHub do not count such requests against the rate limit.
+
+Responses are keyed by URL and by the credentials they were requested with,
+so that users sharing a cache directory do not see each other's data. The
+directory and the entries in it are only accessible by their owner.
+
+Entries that have not been used for MAX_ENTRY_AGE seconds are removed, as
+are the least recently used entries once the cache grows beyond
+MAX_CACHE_SIZE bytes.
+"""
+
+import collections
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import osutils, trace
+
+CACHE_DIR_NAME = "forge-http"
+
+# Version of the on-disk entry format; entries with another version are
+# ignored.
+_FORMAT = 1
+
+# The number of pages of a listing to fetch at once.
+PAGE_JOBS = 4
+
+# The total size of the entries to keep, in bytes.
+MAX_CACHE_SIZE = 20 * 1024 * 1024
+
+# The time after which unused entries are removed, in seconds.
+MAX_ENTRY_AGE = 30 * 24 * 60 * 60
+
+# The number of entries to store between prunes of the cache.
+_PRUNE_INTERVAL = 100
+
+
+class CachedResponse:
+    """A response to a GET request, as kept in a ResponseCache.
+
+    This provides the parts of the HTTP response interface that the forge
+    implementations use.
+    """
+
+    def __init__(self, status, headers, data):
+        """Create a response.
+
+        Args:
+            status: The HTTP status code.
+            headers: A list of (name, value) tuples.
+            data: The body of the response, as bytes.
+        """
+        self.status = status
+        self._headers = list(headers)
+        self.data = data
+
+    def __repr__(self):
+        """Return a string representation of the response."""
+        return f"<{self.__class__.__name__}({self.status})>"
+
+    @property
+    def text(self):
+        """The body of the response, decoded as UTF-8."""
+        return self.data.decode("utf-8")
+
+    def getheader(self, name, default=None):
+        """Return the value of a header, or default if it is not present."""
+        name = name.lower()
+        for key, value in self._headers:
+            if key.lower() == name:
+                return value
+        return default
+
+    def getheaders(self):
+        """Return the headers as a list of (name, value) tuples."""
+        return list(self._headers)
+
+
+class ResponseCache:
+    """On-disk cache of forge API responses that carry an ETag.
+
+    Attributes:
+      hits: The number of requests answered from the cache after the
+        server confirmed the stored response was current.
+      misses: The number of requests that had to fetch the response.
+    """
+
+    def __init__(self, path, max_size=MAX_CACHE_SIZE, max_age=MAX_ENTRY_AGE):
+        """Create a cache keeping its entries in the directory at path.
+
+        The directory is created when the first entry is stored.
+
+        Args:
+            path: The directory to keep the entries in.
+            max_size: The total size of the entries to keep, in bytes.
+            max_age: The time after which unused entries are removed, in
+                seconds.
+        """
+        self.path = path
+        self.max_size = max_size
+        self.max_age = max_age
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Prune when the first entry is stored.
+        self._stores_until_prune = 1
+
+    def __repr__(self):
+        """Return a string representation of the cache."""
+        return f"{self.__class__.__name__}({self.path!r})"
+
+    @classmethod
+    def open(cls):
+        """Open the response cache of the current user."""
+        from .bedding import cache_dir
+
+        return cls(osutils.pathjoin(cache_dir(), CACHE_DIR_NAME))
+
+    def _entry_path(self, url, identity):
+        key = hashlib.sha256(
+            b"\0".join([(identity or "").encode("utf-8"), url.encode("utf-8")])
+        )
+        return os.path.join(self.path, key.hexdigest())
+
+    def lookup(self, url, identity=None):
+        """Return the stored response for url, or None.
+
+        Args:
+            url: The URL that was requested.
+            identity: The credentials the response was requested with.
+        """
+        try:
+            with open(self._entry_path(url, identity), "rb") as f:
+                header, data = f.read().split(b"\n", 1)
+            meta = json.loads(header)
+        except (OSError, ValueError):
+            return None
+        if meta.get("format") != _FORMAT or meta.get("url") != url:
+            return None
+        return CachedResponse(200, [tuple(h) for h in meta["headers"]], data)
+
+    def store(self, url, response, identity=None):
+        """Store a successful response to a GET request for url.
+
+        Responses without an ETag can not be revalidated and are not
+        stored.
+
+        Returns:
+            A CachedResponse with the contents of response.
+        """
+        cached = CachedResponse(response.status, response.getheaders(), response.data)
+        if cached.status != 200 or cached.getheader("ETag") is None:
+            return cached
+        path = self._entry_path(url, identity)
+        header = json.dumps(
+            {"format": _FORMAT, "url": url, "headers": cached.getheaders()}
+        )
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            os.makedirs(self.path, mode=0o700, exist_ok=True)
+            fd = os.open(
+                tmp_path,
+                os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0),
+                0o600,
+            )
+            with os.fdopen(fd, "wb") as f:
+                f.write(header.encode("utf-8") + b"\n" + cached.data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            trace.mutter("unable to store forge response for %s: %s", url, e)
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+        with self._lock:
+            self._stores_until_prune -= 1
+            prune = self._stores_until_prune <= 0
+            if prune:
+                self._stores_until_prune = _PRUNE_INTERVAL
+        if prune:
+            self.prune()
+        return cached
+
+    def prune(self):
+        """Remove old entries, and the least recently used beyond max_size.
+
+        Returns:
+            The number of entries removed.
+        """
+        try:
+            names = os.listdir(self.path)
+        except OSError:
+            return 0
+        now = time.time()
+        entries = []
+        removed = 0
+        for name in names:
+            path = os.path.join(self.path, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            if now - st.st_mtime > self.max_age:
+                removed += self._remove(path)
+            elif not name.endswith(".tmp"):
+                entries.append((st.st_mtime, st.st_size, path))
+        total = sum(size for (_mtime, size, _path) in entries)
+        for _mtime, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            removed += self._remove(path)
+            total -= size
+        return removed
+
+    def _remove(self, path):
+        try:
+            os.unlink(path)
+        except OSError as e:
+            trace.mutter("unable to remove forge response %s: %s", path, e)
+            return 0
+        return 1
+
+    def request(self, transport, url, headers=None, identity=None, **kwargs):
+        """Make a GET request, revalidating any stored response.
+
+        Args:
+            transport: The HTTP transport to make the request with.
+            url: The URL to get.
+            headers: Headers to send with the request.
+            identity: The credentials sent with the request, if any. Only
+                responses that were requested with the same credentials are
+                used.
+            kwargs: Further arguments for transport.request().
+
+        Returns:
+            The response; a CachedResponse if it was stored.
+        """
+        headers = dict(headers or {})
+        cached = self.lookup(url, identity)
+        if cached is not None:
+            headers["If-None-Match"] = cached.getheader("ETag")
+        response = transport.request("GET", url, headers=headers, **kwargs)
+        if response.status == 304 and cached is not None:
+            with self._lock:
+                self.hits += 1
+            # Record the use of the entry, so that pruning keeps it.
+            try:
+                os.utime(self._entry_path(url, identity))
+            except OSError:
+                pass
+            return cached
+        with self._lock:
+            self.misses += 1
+        if response.status != 200:
+            return response
+        return self.store(url, response, identity)
+
+
+class ThreadTransports:
+    """Connections to the location of a transport, one per thread.
+
+    Transports can not be shared between threads; threads other than the
+    one that created this get their own connection, which is disconnected
+    by disconnect() once the thread is done with it.
+    """
+
+    def __init__(self, transport):
+        """Create a set of connections to the location of transport."""
+        self._transport = transport
+        self._owner = threading.get_ident()
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        # Maps the idents of threads to the transports opened for them.
+        self._opened = {}
+
+    def get(self):
+        """Return the transport to use on the current thread."""
+        if threading.get_ident() == self._owner:
+            return self._transport
+        transport = getattr(self._local, "transport", None)
+        if transport is None:
+            from .transport import get_transport_from_url
+
+            transport = get_transport_from_url(self._transport.base)
+            self._local.transport = transport
+            with self._lock:
+                self._opened[threading.get_ident()] = transport
+        return transport
+
+    def disconnect(self, threads):
+        """Disconnect the connections of threads that have finished.
+
+        Args:
+            threads: The idents of the threads.
+        """
+        with self._lock:
+            transports = [
+                self._opened.pop(thread) for thread in threads if thread in self._opened
+            ]
+        for transport in transports:
+            transport.disconnect()
+
+
+def map_concurrently(fn, items, jobs=None, transports=None):
+    """Call fn on each of items, several at a time.
+
+    Only a few more calls than there are jobs are started ahead of the
+    results that have been consumed, so that callers that stop iterating
+    early do not cause every call to be made.
+
+    Args:
+        fn: The function to call.
+        items: The arguments to call fn with.
+        jobs: The number of calls to make at once; defaults to PAGE_JOBS.
+        transports: The ThreadTransports that fn gets its transport from,
+            if any. The connections opened for the threads that made the
+            calls are disconnected once they are done.
+
+    Returns:
+        An iterator over the results, in the order of items.
+    """
+    if jobs is None:
+        jobs = PAGE_JOBS
+    items = iter(items)
+    if jobs <= 1:
+        yield from map(fn, items)
+        return
+    threads = set()
+
+    def call(item):
+        threads.add(threading.get_ident())
+        return fn(item)
+
+    try:
+        with ThreadPoolExecutor(
+            max_workers=jobs, thread_name_prefix="forge"
+        ) as executor:
+            pending = collections.deque()
+            try:
+                for item in items:
+                    pending.append(executor.submit(call, item))
+                    if len(pending) >= jobs * 2:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+    finally:
+        if transports is not None:
+            transports.disconnect(threads)
+
+
+_LINK_LAST_RE = re.compile(r'<([^>]*)>\s*;\s*rel="last"')
+_PAGE_PARAMETER_RE = re.compile(r"[?&;]page=(\d+)")
+
+
+def last_page_from_link(link):
+    """Find the number of the last page in an RFC 8288 Link header.
+
+    Args:
+        link: The value of the Link header, or None.
+
+    Returns:
+        The page number the "last" link points at, or None.
+    """
+    if not link:
+        return None
+    m = _LINK_LAST_RE.search(link)
+    if m is None:
+        return None
+    m = _PAGE_PARAMETER_RE.search(m.group(1))
+    if m is None:
+        return None
+    return int(m.group(1))
@@ -648,7 +648,13 @@ install_lazy_named_hook(
 )
 
 
-from ..config import Option, bool_from_store, option_registry
+from ..config import (
+    Option,
+    bool_from_store,
+    int_from_store,
+    int_SI_from_store,
+    option_registry,
+)
 
 option_registry.register(
     Option(
@@ -663,6 +669,65 @@ This enables support for fetching Git packs over HTTP in Loggerhead.
 """,
     )
 )
+option_registry.register(
+    Option(
+        "git.cache_format",
+        default="default",
+        help="""\
+Format to use when creating a new cache of the mapping between Git and
+Bazaar objects.
+
+One of ``index``, ``sqlite``, ``tdb`` or ``mmap``. Existing caches keep
+their format. ``mmap`` stores sorted fixed-width records in memory-mapped
+files, which are cheap to open and share memory between processes.
+""",
+    )
+)
+
+option_registry.register(
+    Option(
+        "git.fetch_jobs",
+        default=1,
+        from_unicode=int_from_store,
+        help="""\
+Number of threads to use for reading Git objects when fetching from Git.
+
+When larger than one, the Git objects needed by the next revisions are
+read and decompressed by this many threads while the current revision is
+being converted.
+""",
+    )
+)
+
+option_registry.register(
+    Option(
+        "git.tree_cache_size",
+        default=None,
+        from_unicode=int_SI_from_store,
+        override_from_env=["BRZ_GIT_TREE_CACHE_SIZE"],
+        help="""\
+Maximum amount of memory to use for caching revision trees while converting
+between Git and Bazaar revisions. Defaults to 50MiB.
+
+The memory used by each tree is estimated from the number of entries in
+its inventory.
+""",
+    )
+)
+
+option_registry.register(
+    Option(
+        "git.tree_cache_lazy",
+        default=False,
+        from_unicode=bool_from_store,
+        help="""\
+Only keep the root of CHK inventories in the revision tree cache.
+
+Trees are recreated when they are accessed and load inventory pages as
+they are needed, rather than keeping whole inventories in memory.
+""",
+    )
+)
 
 
 def test_suite():
@@ -1306,6 +1306,16 @@ class LocalGitBranch(GitBranch):
         except KeyError:
             return None
 
+    def _merge_sort_cache_location(self):
+        from .cache import get_control_cache_transport
+
+        if self.ref is None:
+            return None
+        transport = get_control_cache_transport(self.controldir)
+        if transport is None:
+            return None
+        return transport, "merge-sort-" + urlutils.escape(self.ref, safe="")
+
     def _read_last_revision_info(self):
         last_revid = self.last_revision()
         graph = self.repository.get_graph()
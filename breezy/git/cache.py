@@ -18,7 +18,9 @@
 
 import contextlib
 import hashlib
+import mmap
 import os
+import struct
 import threading
 
 from bzrformats import btree_index as _mod_btree_index
@@ -53,8 +55,35 @@ def get_remote_cache_transport(repository):
     return get_transport_from_path(path)
 
 
+def get_control_cache_transport(controldir):
+    """Retrieve the transport for caches kept inside a local git directory.
+
+    Args:
+        controldir: Git control directory to keep the caches in.
+
+    Returns:
+        Transport for the ``breezy`` directory in the git control directory,
+        or None if that is not a writable local directory.
+    """
+    from dromedary.local import LocalTransport
+
+    transport = controldir.control_transport
+    if not isinstance(transport, LocalTransport):
+        return None
+    try:
+        with contextlib.suppress(FileExists):
+            transport.mkdir("breezy")
+    except (transport_errors.TransportNotPossible, transport_errors.PermissionDenied):
+        return None
+    return transport.clone("breezy")
+
+
 _mapdbs = threading.local()
 
+# Maximum number of parameters to pass in a single SQLite "in" clause; older
+# versions of SQLite do not allow more than 999 parameters per statement.
+_SQLITE_BATCH_SIZE = 500
+
 
 def mapdbs():
     """Get a cache for this thread's database connections.
@@ -86,6 +115,23 @@ class GitShaMap:
         """
         raise NotImplementedError(self.lookup_git_sha)
 
+    def lookup_git_shas(self, shas):
+        """Lookup multiple Git shas in the database.
+
+        Args:
+            shas: Iterable of Git object shas.
+
+        Returns:
+            dict mapping each sha that was found to a list of (type, type_data)
+            tuples, as returned by lookup_git_sha. Shas that are not present
+            are left out.
+        """
+        ret = {}
+        for sha in shas:
+            with contextlib.suppress(KeyError):
+                ret[sha] = list(self.lookup_git_sha(sha))
+        return ret
+
     def lookup_blob_id(self, file_id, revision):
         """Retrieve a Git blob SHA by file id.
 
@@ -121,6 +167,22 @@ class GitShaMap:
         """
         raise NotImplementedError(self.lookup_commit)
 
+    def lookup_commits(self, revids):
+        """Retrieve the Git commit SHAs for multiple Bazaar revision ids.
+
+        Args:
+            revids: Iterable of Bazaar revision IDs to look up.
+
+        Returns:
+            dict mapping revision ids to Git commit SHAs. Revisions that are
+            not present are left out.
+        """
+        ret = {}
+        for revid in revids:
+            with contextlib.suppress(KeyError):
+                ret[revid] = self.lookup_commit(revid)
+        return ret
+
     def revids(self):
         """List the revision ids known.
 
@@ -255,7 +317,9 @@ class BzrGitCacheFormat:
             format_name = transport.get_bytes("format")
             format = formats.get(format_name)
         except NoSuchFile:
-            format = formats.get("default")
+            from ..config import GlobalStack
+
+            format = formats.get(GlobalStack().get("git.cache_format"))
             format.initialize(transport)
         return format.open(transport)
 
@@ -723,6 +787,40 @@ class SqliteGitShaMap(GitShaMap):
             return row[0]
         raise KeyError
 
+    def _select_in(self, query, values):
+        """Run a query with an ``in (...)`` clause for a batch of values.
+
+        Args:
+            query: SQL query with a single ``%s`` placeholder for the
+                parameter list.
+            values: Values to pass as parameters.
+
+        Yields:
+            Rows returned for all batches of values.
+        """
+        values = list(values)
+        for start in range(0, len(values), _SQLITE_BATCH_SIZE):
+            batch = values[start : start + _SQLITE_BATCH_SIZE]
+            yield from self.db.execute(
+                query % ", ".join("?" * len(batch)),
+                batch,
+            )
+
+    def lookup_commits(self, revids):
+        """Retrieve the Git commit SHAs for multiple Bazaar revision IDs.
+
+        Args:
+            revids: Iterable of Bazaar revision IDs to look up.
+
+        Returns:
+            dict mapping revision IDs to Git commit SHAs as hex strings.
+        """
+        return dict(
+            self._select_in(
+                "select revid, sha1 from commits where revid in (%s)", revids
+            )
+        )
+
     def commit_write_group(self):
         """Commit any pending SQLite database changes.
 
@@ -803,6 +901,34 @@ class SqliteGitShaMap(GitShaMap):
         if not found:
             raise KeyError(sha)
 
+    def lookup_git_shas(self, shas):
+        """Lookup multiple Git shas in the database.
+
+        Args:
+            shas: Iterable of Git object shas.
+
+        Returns:
+            dict mapping each sha that was found to a list of (type, type_data)
+            tuples, as returned by lookup_git_sha.
+        """
+        shas = list(shas)
+        ret = {}
+        for row in self._select_in(
+            "select sha1, revid, tree_sha, testament3_sha1 from commits "
+            "where sha1 in (%s)",
+            shas,
+        ):
+            verifiers = {"testament3-sha1": row[3]} if row[3] is not None else {}
+            ret.setdefault(row[0], []).append(("commit", (row[1], row[2], verifiers)))
+        for table in ("blobs", "trees"):
+            kind = table[:-1]
+            for row in self._select_in(
+                f"select sha1, fileid, revid from {table} where sha1 in (%s)",  # noqa: S608
+                shas,
+            ):
+                ret.setdefault(row[0], []).append((kind, row[1:]))
+        return ret
+
     def revids(self):
         """List the revision IDs known in the SQLite cache.
 
@@ -1071,6 +1197,43 @@ class TdbGitShaMap(GitShaMap):
         if len(sha) == 40:
             sha = hex_to_sha(sha)
         value = self.db[b"git\0" + sha]
+        yield from self._parse_git_value(value)
+
+    def lookup_git_shas(self, shas):
+        """Lookup multiple Git shas in the database.
+
+        Args:
+            shas: Iterable of Git object shas.
+
+        Returns:
+            dict mapping each sha that was found to a list of (type, type_data)
+            tuples, as returned by lookup_git_sha.
+        """
+        ret = {}
+        for sha in shas:
+            value = self.db.get(b"git\0" + (hex_to_sha(sha) if len(sha) == 40 else sha))
+            if value is not None:
+                ret[sha] = list(self._parse_git_value(value))
+        return ret
+
+    def lookup_commits(self, revids):
+        """Retrieve the Git commit SHAs for multiple Bazaar revision IDs.
+
+        Args:
+            revids: Iterable of Bazaar revision IDs to look up.
+
+        Returns:
+            dict mapping revision IDs to Git commit SHAs as hex strings.
+        """
+        ret = {}
+        for revid in revids:
+            value = self.db.get(b"commit\0" + revid)
+            if value is not None:
+                ret[revid] = sha_to_hex(value[:20])
+        return ret
+
+    def _parse_git_value(self, value):
+        """Parse a "git <sha1>" entry into (type, type_data) tuples."""
         for data in value.splitlines():
             data = data.split(b"\0")
             type_name = data[0].decode("ascii")
@@ -1458,6 +1621,27 @@ class IndexGitShaMap(GitShaMap):
             except StopIteration as err:
                 raise KeyError from err
 
+    def _get_entries(self, keys):
+        """Get multiple entries from the index.
+
+        The keys are looked up in the index with a single call, which sorts
+        them and bisects each btree once, rather than once per key.
+
+        Args:
+            keys: Index keys to look up.
+
+        Returns:
+            dict mapping the keys that were found to their values.
+        """
+        keys = set(keys)
+        ret = {key: value for (_, key, value) in self._index.iter_entries(keys)}
+        if self._builder is not None and len(ret) < len(keys):
+            ret.update(
+                (key, value)
+                for (_, key, value) in self._builder.iter_entries(keys.difference(ret))
+            )
+        return ret
+
     def _iter_entries_prefix(self, prefix):
         """Iterate entries matching a prefix.
 
@@ -1487,6 +1671,18 @@ class IndexGitShaMap(GitShaMap):
         """
         return self._get_entry((b"commit", revid, b"X"))[:40]
 
+    def lookup_commits(self, revids):
+        """Retrieve the Git commit SHAs for multiple Bazaar revision IDs.
+
+        Args:
+            revids: Iterable of Bazaar revision IDs to look up.
+
+        Returns:
+            dict mapping revision IDs to Git commit SHAs.
+        """
+        entries = self._get_entries((b"commit", revid, b"X") for revid in revids)
+        return {key[1]: value[:40] for (key, value) in entries.items()}
+
     def _add_git_sha(self, hexsha, type, type_data):
         """Add a Git SHA mapping to the index.
 
@@ -1541,15 +1737,37 @@ class IndexGitShaMap(GitShaMap):
         if len(sha) == 20:
             sha = sha_to_hex(sha)
         value = self._get_entry((b"git", sha, b"X"))
+        yield self._parse_git_value(value)
+
+    def lookup_git_shas(self, shas):
+        """Lookup multiple Git SHAs in the index.
+
+        Args:
+            shas: Iterable of Git object SHAs as bytes or hex strings.
+
+        Returns:
+            dict mapping each SHA that was found to a list of (type, type_data)
+            tuples, as returned by lookup_git_sha.
+        """
+        keys = {}
+        for sha in shas:
+            keys[(b"git", sha_to_hex(sha) if len(sha) == 20 else sha, b"X")] = sha
+        return {
+            keys[key]: [self._parse_git_value(value)]
+            for (key, value) in self._get_entries(keys).items()
+        }
+
+    def _parse_git_value(self, value):
+        """Parse a ("git", <sha1>) entry into a (type, type_data) tuple."""
         data = value.split(b" ", 3)
         if data[0] == b"commit":
             try:
                 verifiers = {"testament3-sha1": data[3]} if data[3] else {}
             except IndexError:
                 verifiers = {}
-            yield ("commit", (data[1], data[2], verifiers))
+            return ("commit", (data[1], data[2], verifiers))
         else:
-            yield (data[0].decode("ascii"), tuple(data[1:]))
+            return (data[0].decode("ascii"), tuple(data[1:]))
 
     def revids(self):
         """List the revision IDs known in the index.
@@ -1586,12 +1804,590 @@ class IndexGitShaMap(GitShaMap):
             yield key[1]
 
 
+class MmapCacheUpdater(CacheUpdater):
+    """Cache updater for memory-mapped segment caches."""
+
+    def __init__(self, cache, rev):
+        """Initialize MmapCacheUpdater.
+
+        Args:
+            cache: BzrGitCache instance.
+            rev: Revision object being processed.
+        """
+        self.cache = cache
+        self.revid = rev.revision_id
+        self._commit = None
+
+    def add_object(self, obj, bzr_key_data, path):
+        """Add a Git object to the pending segment.
+
+        Args:
+            obj: Git object (commit, blob, or tree) or tuple of (type_name, hexsha).
+            bzr_key_data: Bazaar key data or testament SHA for commits.
+            path: Path of the object (optional, currently unused).
+
+        Raises:
+            TypeError: If bzr_key_data has wrong type for commits.
+            AssertionError: If object type is not supported.
+        """
+        if isinstance(obj, tuple):
+            (type_name, hexsha) = obj
+        else:
+            type_name = obj.type_name.decode("ascii")
+            hexsha = obj.id
+        if type_name == "commit":
+            self._commit = obj
+            if not isinstance(bzr_key_data, dict):
+                raise TypeError(bzr_key_data)
+            value = (self.revid, obj.tree)
+            with contextlib.suppress(KeyError):
+                value += (bzr_key_data["testament3-sha1"],)
+        elif type_name in ("blob", "tree"):
+            value = bzr_key_data
+        else:
+            raise AssertionError
+        if hexsha is not None:
+            self.cache.idmap._add_entry(
+                hex_to_sha(hexsha), _MMAP_TYPE_NUMS[type_name], b"\0".join(value)
+            )
+
+    def finish(self):
+        """Complete the cache update operation.
+
+        Returns:
+            The commit object that was added.
+        """
+        return self._commit
+
+
+def MmapBzrGitCache(path):
+    """Create a BzrGitCache using memory-mapped segments.
+
+    Args:
+        path: Directory to store the segment files in.
+
+    Returns:
+        BzrGitCache instance using memory-mapped segments.
+    """
+    return BzrGitCache(MmapGitShaMap(path), MmapCacheUpdater)
+
+
+class MmapGitCacheFormat(BzrGitCacheFormat):
+    """Cache format using memory-mapped segments of fixed-width records."""
+
+    def get_format_string(self):
+        """Return the format string for the memory-mapped cache format.
+
+        Returns:
+            bytes: Format identification string for memory-mapped caches.
+        """
+        return b"bzr-git sha map version 1 using mmapped segments\n"
+
+    def initialize(self, transport):
+        """Initialize a memory-mapped cache format on the transport.
+
+        Args:
+            transport: Transport to initialize cache on.
+        """
+        super().initialize(transport)
+        with contextlib.suppress(FileExists):
+            transport.mkdir("segments")
+
+    def open(self, transport):
+        """Open a memory-mapped cache on the given transport.
+
+        Args:
+            transport: Transport to open cache on.
+
+        Returns:
+            BzrGitCache instance using memory-mapped segments.
+        """
+        try:
+            basepath = transport.local_abspath(".")
+        except transport_errors.NotLocalUrl:
+            basepath = get_cache_dir()
+        return MmapBzrGitCache(os.path.join(basepath, "segments"))
+
+
+_MMAP_TYPE_NUMS = {"commit": 1, "tree": 2, "blob": 3}
+_MMAP_TYPE_NAMES = {num: name for (name, num) in _MMAP_TYPE_NUMS.items()}
+
+_SEGMENT_MAGIC = b"bzr-git sha map segment version 1\n"
+_SEGMENT_HEADER = struct.Struct(">IIII")
+# binary sha, type number, offset of the value in the string table
+_SEGMENT_RECORD = struct.Struct(">20sBI")
+# sha1 of the revision id (or file id and revision id), record number
+_SEGMENT_KEY = struct.Struct(">20sI")
+_SEGMENT_STRING_LENGTH = struct.Struct(">I")
+
+
+def _write_segment(path, entries):
+    """Write a segment file.
+
+    Args:
+        path: Path of the segment file to write.
+        entries: Iterable of (binary sha, type number, value) tuples.
+
+    Returns:
+        The name of the file that was written, derived from its contents.
+    """
+    entries = sorted(set(entries))
+    records = []
+    commit_keys = []
+    path_keys = []
+    strings = []
+    offset = 0
+    for i, (sha, type_num, value) in enumerate(entries):
+        records.append(_SEGMENT_RECORD.pack(sha, type_num, offset))
+        strings.append(_SEGMENT_STRING_LENGTH.pack(len(value)))
+        strings.append(value)
+        offset += _SEGMENT_STRING_LENGTH.size + len(value)
+        if type_num == _MMAP_TYPE_NUMS["commit"]:
+            key = value.split(b"\0", 1)[0]
+            commit_keys.append((hashlib.sha1(key).digest(), i))  # noqa: S324
+        else:
+            path_keys.append((hashlib.sha1(value).digest(), i))  # noqa: S324
+    chunks = [
+        _SEGMENT_MAGIC,
+        _SEGMENT_HEADER.pack(len(records), len(commit_keys), len(path_keys), offset),
+    ]
+    chunks.extend(records)
+    chunks.extend(_SEGMENT_KEY.pack(*key) for key in sorted(commit_keys))
+    chunks.extend(_SEGMENT_KEY.pack(*key) for key in sorted(path_keys))
+    chunks.extend(strings)
+    data = b"".join(chunks)
+    name = hashlib.sha1(data).hexdigest() + ".seg"  # noqa: S324
+    tmp_path = os.path.join(path, name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, os.path.join(path, name))
+    return name
+
+
+class _ShaMapSegment:
+    """A read-only, memory-mapped segment of a MmapGitShaMap.
+
+    A segment consists of a header, a table of fixed-width records sorted by
+    binary Git SHA, two tables of fixed-width keys that map the sha1 of a
+    revision id (or file id and revision id) to a record, and a table with
+    the variable-length values of the records.
+    """
+
+    def __init__(self, path, name):
+        self.name = name
+        with open(os.path.join(path, name), "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[: len(_SEGMENT_MAGIC)] != _SEGMENT_MAGIC:
+            raise bzr_errors.BzrError(f"invalid sha map segment {name}")
+        offset = len(_SEGMENT_MAGIC)
+        (
+            self._num_records,
+            self._num_commits,
+            self._num_paths,
+            _strings_size,
+        ) = _SEGMENT_HEADER.unpack_from(self._map, offset)
+        self._records_offset = offset + _SEGMENT_HEADER.size
+        self._commits_offset = (
+            self._records_offset + self._num_records * _SEGMENT_RECORD.size
+        )
+        self._paths_offset = (
+            self._commits_offset + self._num_commits * _SEGMENT_KEY.size
+        )
+        self._strings_offset = self._paths_offset + self._num_paths * _SEGMENT_KEY.size
+
+    def _bisect(self, offset, count, size, key):
+        """Find the first fixed-width entry in a table that is >= key."""
+        lo, hi = 0, count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            pos = offset + mid * size
+            if self._map[pos : pos + 20] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def _record(self, index):
+        sha, type_num, value_offset = _SEGMENT_RECORD.unpack_from(
+            self._map, self._records_offset + index * _SEGMENT_RECORD.size
+        )
+        pos = self._strings_offset + value_offset
+        (length,) = _SEGMENT_STRING_LENGTH.unpack_from(self._map, pos)
+        pos += _SEGMENT_STRING_LENGTH.size
+        return sha, type_num, self._map[pos : pos + length]
+
+    def lookup_sha(self, sha):
+        """Yield the (type number, value) pairs recorded for a binary sha."""
+        index = self._bisect(
+            self._records_offset, self._num_records, _SEGMENT_RECORD.size, sha
+        )
+        while index < self._num_records:
+            record_sha, type_num, value = self._record(index)
+            if record_sha != sha:
+                break
+            yield type_num, value
+            index += 1
+
+    def _lookup_key(self, offset, count, key):
+        digest = hashlib.sha1(key).digest()  # noqa: S324
+        index = self._bisect(offset, count, _SEGMENT_KEY.size, digest)
+        while index < count:
+            entry_digest, record = _SEGMENT_KEY.unpack_from(
+                self._map, offset + index * _SEGMENT_KEY.size
+            )
+            if entry_digest != digest:
+                break
+            yield self._record(record)
+            index += 1
+
+    def lookup_commit(self, revid):
+        """Return the binary sha of the commit for revid, or None."""
+        for sha, _type_num, value in self._lookup_key(
+            self._commits_offset, self._num_commits, revid
+        ):
+            if value.split(b"\0", 1)[0] == revid:
+                return sha
+        return None
+
+    def lookup_path(self, type_num, fileid, revision):
+        """Return the binary sha of the blob or tree for a file id, or None."""
+        key = b"\0".join((fileid, revision))
+        for sha, record_type_num, value in self._lookup_key(
+            self._paths_offset, self._num_paths, key
+        ):
+            if value == key and record_type_num == type_num:
+                return sha
+        return None
+
+    def iter_records(self):
+        """Iterate over all (binary sha, type number, value) records."""
+        for index in range(self._num_records):
+            yield self._record(index)
+
+
+class MmapGitShaMap(GitShaMap):
+    """SHA Map that stores fixed-width records in memory-mapped segments.
+
+    Every committed write group adds an immutable segment file; segments
+    are never modified. Lookups bisect the sorted records of each segment,
+    so opening the map is cheap and its memory is shared with the page
+    cache. Once there are more than MAX_SEGMENTS segments they are merged
+    into a single one in a background thread.
+    """
+
+    MAX_SEGMENTS = 16
+
+    def __init__(self, path):
+        """Initialize MmapGitShaMap.
+
+        Args:
+            path: Directory with the segment files.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending = None
+        self._pending_keys = None
+        self._merge_thread = None
+        if not os.path.isdir(path):
+            os.mkdir(path)
+        self._segments = self._load_segments()
+
+    def __repr__(self):
+        """Return string representation of MmapGitShaMap.
+
+        Returns:
+            str: String representation showing class name and directory.
+        """
+        return f"{self.__class__.__name__}({self.path!r})"
+
+    def _load_segments(self):
+        """Open all segments."""
+        segments = []
+        for name in sorted(os.listdir(self.path)):
+            if not name.endswith(".seg"):
+                continue
+            try:
+                segments.append(_ShaMapSegment(self.path, name))
+            except FileNotFoundError:
+                # Removed by a concurrent merge; the merged segment has
+                # the same records.
+                return self._load_segments()
+        return segments
+
+    def start_write_group(self):
+        """Start collecting records for a new segment.
+
+        Raises:
+            BzrError: If a write group is already active.
+        """
+        if self._pending is not None:
+            raise bzr_errors.BzrError("write group already active")
+        self._pending = {}
+        self._pending_keys = {}
+
+    def commit_write_group(self):
+        """Write the records added in this write group as a new segment.
+
+        Raises:
+            BzrError: If no write group is active.
+        """
+        if self._pending is None:
+            raise bzr_errors.BzrError("no write group active")
+        entries = [
+            (sha, type_num, value)
+            for (sha, records) in self._pending.items()
+            for (type_num, value) in records
+        ]
+        self._pending = None
+        self._pending_keys = None
+        if not entries:
+            return
+        name = _write_segment(self.path, entries)
+        with self._lock:
+            self._segments.insert(0, _ShaMapSegment(self.path, name))
+            merge = (
+                len(self._segments) > self.MAX_SEGMENTS and self._merge_thread is None
+            )
+            if merge:
+                self._merge_thread = threading.Thread(
+                    target=self._merge_segments, args=(list(self._segments),)
+                )
+                self._merge_thread.daemon = True
+        if merge:
+            self._merge_thread.start()
+
+    def abort_write_group(self):
+        """Discard the records added in this write group.
+
+        Raises:
+            BzrError: If no write group is active.
+        """
+        if self._pending is None:
+            raise bzr_errors.BzrError("no write group active")
+        self._pending = None
+        self._pending_keys = None
+
+    def _merge_segments(self, segments):
+        """Merge segments into a single new segment."""
+        try:
+            entries = []
+            for segment in segments:
+                entries.extend(segment.iter_records())
+            name = _write_segment(self.path, entries)
+            merged = _ShaMapSegment(self.path, name)
+            with self._lock:
+                self._segments = [
+                    segment for segment in self._segments if segment not in segments
+                ]
+                self._segments.append(merged)
+            for segment in segments:
+                if segment.name != name:
+                    with contextlib.suppress(OSError):
+                        os.remove(os.path.join(self.path, segment.name))
+        finally:
+            self._merge_thread = None
+
+    def repack(self):
+        """Merge all segments into one, waiting for it to finish."""
+        merge_thread = self._merge_thread
+        if merge_thread is not None:
+            merge_thread.join()
+        with self._lock:
+            segments = list(self._segments)
+        if len(segments) > 1:
+            self._merge_segments(segments)
+
+    def _add_entry(self, sha, type_num, value):
+        """Add a record to the current write group.
+
+        Args:
+            sha: Binary Git SHA.
+            type_num: Git type number of the object.
+            value: NUL-separated type data.
+        """
+        records = self._pending.setdefault(sha, [])
+        if (type_num, value) not in records:
+            records.append((type_num, value))
+        if type_num == _MMAP_TYPE_NUMS["commit"]:
+            value = value.split(b"\0", 1)[0]
+        self._pending_keys[(type_num, value)] = sha
+
+    def _iter_sha(self, sha):
+        """Iterate over the (type number, value) pairs for a binary sha."""
+        seen = set()
+        if self._pending is not None:
+            for record in self._pending.get(sha, []):
+                seen.add(record)
+                yield record
+        with self._lock:
+            segments = list(self._segments)
+        for segment in segments:
+            for record in segment.lookup_sha(sha):
+                if record not in seen:
+                    seen.add(record)
+                    yield record
+
+    def lookup_git_sha(self, sha):
+        """Lookup a Git SHA in the segments.
+
+        Args:
+            sha: Git object SHA as bytes or hex string.
+
+        Yields:
+            tuple: (type, type_data) with type_data being:
+                - commit: (revid, tree_sha, verifiers)
+                - blob/tree: (fileid, revid)
+
+        Raises:
+            KeyError: If SHA is not found.
+        """
+        if len(sha) == 40:
+            sha = hex_to_sha(sha)
+        found = False
+        for type_num, value in self._iter_sha(sha):
+            found = True
+            data = value.split(b"\0")
+            type_name = _MMAP_TYPE_NAMES[type_num]
+            if type_name == "commit":
+                verifiers = {"testament3-sha1": data[2]} if len(data) > 2 else {}
+                yield (type_name, (data[0], data[1], verifiers))
+            else:
+                yield (type_name, tuple(data))
+        if not found:
+            raise KeyError(sha)
+
+    def _lookup_pending_key(self, type_num, key):
+        if self._pending_keys is None:
+            return None
+        return self._pending_keys.get((type_num, key))
+
+    def lookup_commit(self, revid):
+        """Retrieve a Git commit SHA by Bazaar revision ID.
+
+        Args:
+            revid: Bazaar revision ID to look up.
+
+        Returns:
+            bytes: Git commit SHA as hex string.
+
+        Raises:
+            KeyError: If the revision ID is not found.
+        """
+        with self._lock:
+            segments = list(self._segments)
+        for segment in segments:
+            sha = segment.lookup_commit(revid)
+            if sha is not None:
+                return sha_to_hex(sha)
+        sha = self._lookup_pending_key(_MMAP_TYPE_NUMS["commit"], revid)
+        if sha is not None:
+            return sha_to_hex(sha)
+        raise KeyError(revid)
+
+    def _lookup_path(self, type_name, fileid, revision):
+        type_num = _MMAP_TYPE_NUMS[type_name]
+        with self._lock:
+            segments = list(self._segments)
+        for segment in segments:
+            sha = segment.lookup_path(type_num, fileid, revision)
+            if sha is not None:
+                return sha_to_hex(sha)
+        sha = self._lookup_pending_key(type_num, b"\0".join((fileid, revision)))
+        if sha is not None:
+            return sha_to_hex(sha)
+        raise KeyError(fileid)
+
+    def lookup_blob_id(self, fileid, revision):
+        """Retrieve a Git blob SHA by file ID and revision.
+
+        Args:
+            fileid: File ID to look up.
+            revision: Revision to look up blob in.
+
+        Returns:
+            bytes: Git blob SHA as hex string.
+
+        Raises:
+            KeyError: If the file ID or revision is not found.
+        """
+        return self._lookup_path("blob", fileid, revision)
+
+    def lookup_tree_id(self, fileid, revision):
+        """Retrieve a Git tree SHA by file ID and revision.
+
+        Args:
+            fileid: File ID to look up.
+            revision: Revision to look up tree in.
+
+        Returns:
+            bytes: Git tree SHA as hex string.
+
+        Raises:
+            KeyError: If the file ID or revision is not found.
+        """
+        return self._lookup_path("tree", fileid, revision)
+
+    def missing_revisions(self, revids):
+        """Return set of all the revisions that are not present.
+
+        Args:
+            revids: Collection of revision IDs to check.
+
+        Returns:
+            set: Set of revision IDs that are missing from the segments.
+        """
+        revids = set(revids)
+        return revids.difference(self.lookup_commits(revids))
+
+    def _iter_records(self):
+        if self._pending is not None:
+            for sha, records in self._pending.items():
+                for type_num, value in records:
+                    yield sha, type_num, value
+        with self._lock:
+            segments = list(self._segments)
+        for segment in segments:
+            yield from segment.iter_records()
+
+    def revids(self):
+        """List the revision IDs known in the segments.
+
+        Yields:
+            bytes: Bazaar revision IDs for all commits.
+        """
+        seen = set()
+        for _sha, type_num, value in self._iter_records():
+            if type_num == _MMAP_TYPE_NUMS["commit"]:
+                revid = value.split(b"\0", 1)[0]
+                if revid not in seen:
+                    seen.add(revid)
+                    yield revid
+
+    def sha1s(self):
+        """List the SHA1s stored in the segments.
+
+        Yields:
+            bytes: All Git SHA1s as hex strings.
+        """
+        seen = set()
+        for sha, _type_num, _value in self._iter_records():
+            if sha not in seen:
+                seen.add(sha)
+                yield sha_to_hex(sha)
+
+
 formats = registry.Registry[str, BzrGitCacheFormat, None]()
 formats.register(TdbGitCacheFormat().get_format_string(), TdbGitCacheFormat())
 formats.register(SqliteGitCacheFormat().get_format_string(), SqliteGitCacheFormat())
 formats.register(IndexGitCacheFormat().get_format_string(), IndexGitCacheFormat())
+formats.register(MmapGitCacheFormat().get_format_string(), MmapGitCacheFormat())
 # In the future, this will become the default:
 formats.register("default", IndexGitCacheFormat())
+# Names that can be used for the git.cache_format option:
+formats.register("tdb", TdbGitCacheFormat())
+formats.register("sqlite", SqliteGitCacheFormat())
+formats.register("index", IndexGitCacheFormat())
+formats.register("mmap", MmapGitCacheFormat())
 
 
 def migrate_ancient_formats(repo_transport):
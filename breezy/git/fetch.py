@@ -16,8 +16,11 @@
 
 """Fetching from git into bzr."""
 
+import collections
 import posixpath
 import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 from bzrformats.inventory import (
     InventoryDirectory,
@@ -28,11 +31,12 @@ from bzrformats.inventory import (
 from bzrformats.inventory_delta import InventoryDelta
 from bzrformats.versionedfile import ChunkedContentFactory
 from dromedary.errors import NoSuchFile
-from dulwich.object_store import tree_lookup_path
+from dulwich.object_store import DiskObjectStore, tree_lookup_path
 from dulwich.objects import S_IFGITLINK, S_ISGITLINK, ZERO_SHA, Commit, Tag, Tree
+from dulwich.pack import Pack
 from vcsgraph.tsort import topo_sort
 
-from .. import debug, osutils, trace
+from .. import debug, lru_cache, osutils, trace
 from ..bzr.inventorytree import InventoryRevisionTree
 from ..bzr.testament import StrictTestament3
 from ..errors import BzrError
@@ -46,6 +50,10 @@ from .mapping import (
     warn_unusual_mode,
 )
 from .object_store import LRUTreeCache, _tree_to_objects
+from .transportgit import TransportObjectStore
+
+# Maximum size of the git objects kept around by _ObjectPrefetcher
+MAX_PREFETCH_CACHE_SIZE = 64 * 1024 * 1024
 
 
 def import_git_blob(
@@ -632,14 +640,230 @@ def import_git_commit(
         )
 
 
+def _independent_reader(object_store):
+    """Return a callable that opens another reader for object_store.
+
+    Readers opened this way have their own file handles, so unlike
+    object_store itself they can safely be used from another thread.
+
+    :return: A callable taking no arguments, or None if object_store can
+        not be reopened.
+    """
+    if isinstance(object_store, TransportObjectStore):
+        return lambda: TransportObjectStore(object_store.transport)
+    if isinstance(object_store, DiskObjectStore):
+        return lambda: DiskObjectStore(object_store.path)
+    if isinstance(object_store, Pack):
+        # External references of thin packs are left for the importer to
+        # resolve, as resolving them may involve the target repository.
+        return lambda: Pack(
+            object_store._basename, object_format=object_store.object_format
+        )
+    return None
+
+
+class _ObjectPrefetcher:
+    """Read the git objects needed by upcoming commits in worker threads.
+
+    Reading an object from a pack involves zlib inflation, delta
+    application and SHA1 calculation, which largely happen without holding
+    the GIL. The prefetcher reads the commits of the revisions that are about
+    to be imported, and the trees and blobs that changed relative to their
+    first parent, using one independent object reader per worker thread. The
+    objects are kept in a size-bounded cache that the importer - which
+    remains the only thread writing to the repository - consults first.
+
+    Objects that a worker can not find are left for the importer to look
+    up; any other error in a worker is raised in the importing thread.
+    The readers opened by the workers are closed on exit.
+    """
+
+    def __init__(self, open_reader, jobs, max_size=MAX_PREFETCH_CACHE_SIZE):
+        self._open_reader = open_reader
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._cache = lru_cache.LRUSizeCache(
+            max_size=max_size,
+            after_cleanup_size=None,
+            compute_size=lambda obj: obj.raw_length(),
+        )
+        self._executor = ThreadPoolExecutor(
+            max_workers=jobs, thread_name_prefix="git-prefetch"
+        )
+        self._submitted = 0
+        self._pending = collections.deque()
+        self._readers = []
+        self.window = jobs * 4
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._executor.shutdown(wait=True, cancel_futures=True)
+        for reader in self._readers:
+            reader.close()
+        self._readers = []
+        if exc_type is None:
+            self._check_finished(wait=True)
+        return False
+
+    def _check_finished(self, wait=False):
+        """Raise the error of any prefetch that failed.
+
+        :param wait: If True, check all prefetches; otherwise only those at
+            the front of the queue that have finished.
+        """
+        while self._pending and (wait or self._pending[0].done()):
+            future = self._pending.popleft()
+            if not future.cancelled():
+                future.result()
+
+    def get(self, sha):
+        """Return a prefetched object.
+
+        :raise KeyError: if sha has not been prefetched
+        """
+        with self._lock:
+            return self._cache[sha]
+
+    def prefetch_ahead(self, revision_ids, position):
+        """Make sure the commits up to window past position are being read."""
+        self._check_finished()
+        end = min(len(revision_ids), position + self.window)
+        while self._submitted < end:
+            self._pending.append(
+                self._executor.submit(
+                    self._prefetch_commit, revision_ids[self._submitted]
+                )
+            )
+            self._submitted += 1
+
+    def _read(self, sha):
+        with self._lock:
+            obj = self._cache.get(sha)
+        if obj is None:
+            reader = getattr(self._local, "reader", None)
+            if reader is None:
+                reader = self._local.reader = self._open_reader()
+                with self._lock:
+                    self._readers.append(reader)
+            obj = reader[sha]
+            with self._lock:
+                self._cache[sha] = obj
+        return obj
+
+    def _prefetch_commit(self, sha):
+        try:
+            commit = self._read(sha)
+            if commit.parents:
+                base_tree = self._read(commit.parents[0]).tree
+            else:
+                base_tree = None
+            self._prefetch_tree_changes(base_tree, commit.tree)
+        except KeyError:
+            # Objects that can not be read here (e.g. because they are
+            # external references in a thin pack) are looked up by the
+            # importer itself.
+            pass
+
+    def _prefetch_tree_changes(self, base_tree_sha, tree_sha):
+        todo = [(base_tree_sha, tree_sha)]
+        while todo:
+            base_tree_sha, tree_sha = todo.pop()
+            base_entries = {}
+            if base_tree_sha is not None:
+                for entry in self._read(base_tree_sha).iteritems():
+                    base_entries[entry.path] = (entry.mode, entry.sha)
+            for name, mode, hexsha in self._read(tree_sha).iteritems():
+                base_mode, base_hexsha = base_entries.get(name, (None, None))
+                if hexsha == base_hexsha or S_ISGITLINK(mode):
+                    continue
+                if stat.S_ISDIR(mode):
+                    if base_mode is None or not stat.S_ISDIR(base_mode):
+                        base_hexsha = None
+                    todo.append((base_hexsha, hexsha))
+                else:
+                    self._read(hexsha)
+
+
+def _find_missing_commits(repo, mapping, lookup_object, heads, pb=None):
+    """Find the commits reachable from heads that are not yet in repo.
+
+    The history is walked one generation at a time, and the presence of
+    all commits in a generation is checked with a single has_revisions
+    call, so the number of repository lookups is proportional to the depth
+    of the new history rather than to the number of commits in it.
+
+    :param repo: Target Bazaar repository
+    :param mapping: Mapping to use
+    :param lookup_object: Callable that returns the Git object for a SHA,
+        raising KeyError if it is not available.
+    :param heads: Git SHAs to start from; commits or tags.
+    :return: List of (sha, parent shas) tuples for the missing commits
+    """
+    graph = []
+    checked = set()
+    frontier = set(heads)
+    depth = 0
+    while frontier:
+        if pb is not None:
+            pb.update(f"finding revisions to fetch (depth {depth})", len(graph), None)
+        commits = []
+        next_frontier = set()
+        for head in frontier:
+            if head == ZERO_SHA:
+                continue
+            if not isinstance(head, bytes):
+                raise TypeError(head)
+            try:
+                o = lookup_object(head)
+            except KeyError:
+                continue
+            if isinstance(o, Commit):
+                rev, roundtrip_revid, _verifiers = mapping.import_commit(
+                    o, mapping.revision_id_foreign_to_bzr, strict=True
+                )
+                commits.append((o, rev.revision_id, roundtrip_revid))
+            elif isinstance(o, Tag):
+                if o.object[1] not in checked:
+                    next_frontier.add(o.object[1])
+            else:
+                trace.warning(f"Unable to import head object {o!r}")
+            checked.add(o.id)
+        candidates = set()
+        for _o, revid, roundtrip_revid in commits:
+            candidates.add(revid)
+            if roundtrip_revid:
+                candidates.add(roundtrip_revid)
+        present = repo.has_revisions(candidates) if candidates else set()
+        for o, revid, roundtrip_revid in commits:
+            if revid in present or (roundtrip_revid and roundtrip_revid in present):
+                continue
+            graph.append((o.id, o.parents))
+            next_frontier.update(p for p in o.parents if p not in checked)
+        frontier = next_frontier.difference(checked)
+        depth += 1
+    return graph
+
+
 def import_git_objects(
-    repo, mapping, object_iter, target_git_object_retriever, heads, pb=None, limit=None
+    repo,
+    mapping,
+    object_iter,
+    target_git_object_retriever,
+    heads,
+    pb=None,
+    limit=None,
+    jobs=1,
 ):
     """Import a set of git objects into a bzr repository.
 
     :param repo: Target Bazaar repository
     :param mapping: Mapping to use
     :param object_iter: Iterator over Git objects.
+    :param jobs: Number of threads to use for reading git objects ahead of
+        the import. The revisions are always added to repo by the calling
+        thread.
     :return: Tuple with pack hints and last imported revision id
     """
 
@@ -649,47 +873,60 @@ def import_git_objects(
         except KeyError:
             return target_git_object_retriever[sha]
 
-    graph = []
-    checked = set()
-    heads = list(set(heads))
-    trees_cache = LRUTreeCache(repo)
-    # Find and convert commit objects
-    while heads:
-        if pb is not None:
-            pb.update("finding revisions to fetch", len(graph), None)
-        head = heads.pop()
-        if head == ZERO_SHA:
-            continue
-        if not isinstance(head, bytes):
-            raise TypeError(head)
-        try:
-            o = lookup_object(head)
-        except KeyError:
-            continue
-        if isinstance(o, Commit):
-            rev, roundtrip_revid, _verifiers = mapping.import_commit(
-                o, mapping.revision_id_foreign_to_bzr, strict=True
-            )
-            if repo.has_revision(rev.revision_id) or (
-                roundtrip_revid and repo.has_revision(roundtrip_revid)
-            ):
-                continue
-            graph.append((o.id, o.parents))
-            heads.extend([p for p in o.parents if p not in checked])
-        elif isinstance(o, Tag):
-            if o.object[1] not in checked:
-                heads.append(o.object[1])
-        else:
-            trace.warning(f"Unable to import head object {o!r}")
-        checked.add(o.id)
-    del checked
+    graph = _find_missing_commits(repo, mapping, lookup_object, heads, pb=pb)
     # Order the revisions
-    # Create the inventory objects
-    batch_size = 1000
     revision_ids = topo_sort(graph)
-    pack_hints = []
     if limit is not None:
         revision_ids = revision_ids[:limit]
+    open_reader = _independent_reader(object_iter)
+    if jobs <= 1 or open_reader is None or len(revision_ids) < 2:
+        return _import_git_commits(
+            repo,
+            mapping,
+            revision_ids,
+            lookup_object,
+            target_git_object_retriever,
+            pb,
+        )
+    with _ObjectPrefetcher(open_reader, jobs) as prefetcher:
+
+        def lookup_prefetched_object(sha):
+            try:
+                return prefetcher.get(sha)
+            except KeyError:
+                return lookup_object(sha)
+
+        return _import_git_commits(
+            repo,
+            mapping,
+            revision_ids,
+            lookup_prefetched_object,
+            target_git_object_retriever,
+            pb,
+            prefetcher,
+        )
+
+
+def _import_git_commits(
+    repo,
+    mapping,
+    revision_ids,
+    lookup_object,
+    target_git_object_retriever,
+    pb=None,
+    prefetcher=None,
+):
+    """Import git commits into a bzr repository, in order.
+
+    :param revision_ids: Git SHAs of the commits to import, parents first.
+    :param prefetcher: Optional _ObjectPrefetcher to keep busy reading the
+        objects for the commits that follow.
+    :return: Tuple with pack hints and last imported revision id
+    """
+    trees_cache = LRUTreeCache(repo)
+    # Create the inventory objects
+    batch_size = 1000
+    pack_hints = []
     last_imported = None
     for offset in range(0, len(revision_ids), batch_size):
         target_git_object_retriever.start_write_group()
@@ -699,6 +936,8 @@ def import_git_objects(
                 for i, head in enumerate(revision_ids[offset : offset + batch_size]):
                     if pb is not None:
                         pb.update("fetching revisions", offset + i, len(revision_ids))
+                    if prefetcher is not None:
+                        prefetcher.prefetch_ahead(revision_ids, offset + i)
                     import_git_commit(
                         repo,
                         mapping,
@@ -721,6 +960,7 @@ def import_git_objects(
             raise
         else:
             target_git_object_retriever.commit_write_group()
+    trees_cache.report_stats()
     return pack_hints, last_imported
 
 
@@ -118,14 +118,13 @@ class InterToGitRepository(InterRepository):
         if if_present_ids:
             todo.extend(revision_ids)
         with self.source_store.lock_read():
-            for revid in revision_ids:
-                if revid == NULL_REVISION:
-                    continue
+            revids = [revid for revid in revision_ids if revid != NULL_REVISION]
+            revid_shas = self.source_store._lookup_revision_sha1s(revids)
+            for revid in revids:
                 try:
-                    git_sha = self.source_store._lookup_revision_sha1(revid)
+                    git_shas.append(revid_shas[revid])
                 except KeyError as err:
                     raise NoSuchRevision(revid, self.source) from err
-                git_shas.append(git_sha)
             walker = Walker(
                 self.source_store,
                 include=git_shas,
@@ -138,10 +137,11 @@ class InterToGitRepository(InterRepository):
                 ],
             )
             missing_revids = set()
-            for entry in walker:
-                for kind, type_data in self.source_store.lookup_git_sha(
-                    entry.commit.id
-                ):
+            entries = self.source_store.lookup_git_shas(
+                entry.commit.id for entry in walker
+            )
+            for type_data_list in entries.values():
+                for kind, type_data in type_data_list:
                     if kind == "commit":
                         missing_revids.add(type_data[0])
             return self.source.revision_ids_to_search_result(missing_revids)
@@ -220,6 +220,13 @@ class InterToLocalGitRepository(InterToGitRepository):
         with ui.ui_factory.nested_progress_bar() as pb:
             while stop_revids:
                 new_stop_revids = []
+                revid_sha_map.update(
+                    self.source_store._lookup_revision_sha1s(
+                        revid
+                        for revid in stop_revids
+                        if revid not in missing and revid not in revid_sha_map
+                    )
+                )
                 for revid in stop_revids:
                     sha1 = revid_sha_map.get(revid)
                     if revid not in missing and self._revision_needs_fetching(
@@ -240,22 +247,23 @@ class InterToLocalGitRepository(InterToGitRepository):
         :return: Dictionary with reference names as keys and tuples
             with Git SHA, Bazaar revid as values.
         """
-        bzr_refs = {}
+        refs = {}
         for k in self.target._git.refs.allkeys():
             try:
-                v = self.target._git.refs.read_ref(k)
+                refs[k] = self.target._git.refs.read_ref(k)
             except KeyError:
                 # broken symref?
                 continue
+        entries = self.source_store.lookup_git_shas(
+            {v for v in refs.values() if v and not v.startswith(SYMREF)}
+        )
+        bzr_refs = {}
+        for k, v in refs.items():
             revid = None
-            if v and not v.startswith(SYMREF):
-                try:
-                    for kind, type_data in self.source_store.lookup_git_sha(v):
-                        if kind == "commit" and self.source.has_revision(type_data[0]):
-                            revid = type_data[0]
-                            break
-                except KeyError:
-                    pass
+            for kind, type_data in entries.get(v, []):
+                if kind == "commit" and self.source.has_revision(type_data[0]):
+                    revid = type_data[0]
+                    break
             bzr_refs[k] = (v, revid)
         return bzr_refs
 
@@ -718,7 +726,7 @@ class InterRemoteGitNonGitRepository(InterGitNonGitRepository):
         with store.lock_write():
             heads = self.get_target_heads()
             graph_walker = ObjectStoreGraphWalker(
-                [store._lookup_revision_sha1(head) for head in heads],
+                list(store._lookup_revision_sha1s(heads).values()),
                 lambda sha: store[sha].parents,
             )
             wants_recorder = DetermineWantsRecorder(determine_wants)
@@ -736,6 +744,7 @@ class InterRemoteGitNonGitRepository(InterGitNonGitRepository):
                     wants_recorder.wants,
                     pb,
                     limit,
+                    jobs=config.GlobalStack().get("git.fetch_jobs"),
                 )
                 return (pack_hint, last_rev, wants_recorder.remote_refs)
 
@@ -773,6 +782,7 @@ class InterLocalGitNonGitRepository(InterGitNonGitRepository):
                     wants,
                     pb,
                     limit,
+                    jobs=config.GlobalStack().get("git.fetch_jobs"),
                 )
                 return (pack_hint, last_rev, remote_refs)
             finally:
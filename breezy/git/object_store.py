@@ -17,16 +17,17 @@
 
 """Map from Git sha's to Bazaar objects."""
 
-import contextlib
 import posixpath
 import stat
+import sys
 from collections.abc import Iterable, Iterator, Set
 
+from bzrformats.inventory import CHKInventory
 from dulwich.object_store import BaseObjectStore
 from dulwich.objects import ZERO_SHA, Blob, Commit, ObjectID, Tree, sha_to_hex
 from dulwich.pack import Pack, PackData, UnpackedObject, pack_objects_to_data
 
-from .. import errors, lru_cache, osutils, trace, ui
+from .. import debug, errors, lru_cache, osutils, trace, ui
 from ..bzr.testament import StrictTestament3
 from ..lock import LogicalLockResult
 from ..revision import NULL_REVISION
@@ -66,28 +67,134 @@ def get_object_store(repo, mapping=None):
 
 MAX_TREE_CACHE_SIZE = 50 * 1024 * 1024
 
+# Number of inventory entries to look at when estimating the memory used by
+# a single entry.
+_ENTRY_SIZE_SAMPLE = 32
+
+# Estimated memory used by an inventory entry of a CHK inventory, including
+# its share of the CHK pages and caches, for when no entry has been loaded
+# yet that could be measured.
+_CHK_ENTRY_SIZE = 400
+
+
+def _measure_entries(entries, count):
+    """Estimate the memory held by ``count`` inventory entries.
+
+    The average size is measured on a sample taken from ``entries``.
+    """
+    sample_size = 0
+    sampled = 0
+    for ie in entries:
+        sample_size += sys.getsizeof(ie) + len(ie.name) + len(ie.file_id)
+        if ie.revision is not None:
+            sample_size += len(ie.revision)
+        sampled += 1
+        if sampled >= _ENTRY_SIZE_SAMPLE:
+            break
+    if not sampled:
+        return 0
+    return (sample_size * count) // sampled
+
+
+def _lines_size(lines):
+    return sum(sys.getsizeof(line) for line in lines)
+
+
+def _inventory_memory(inv):
+    """Estimate the memory held by an inventory once it is fully loaded.
+
+    CHK inventories load their entries as they are accessed, which mostly
+    happens after the tree has been added to the cache, so they are sized
+    from their number of entries; that is stored in the root page. The size
+    of an entry is measured on the entries loaded so far, if any.
+    """
+    if isinstance(inv, CHKInventory):
+        count = len(inv)
+        size = _measure_entries(inv._fileid_to_entry_cache.values(), count)
+        if not size:
+            size = count * _CHK_ENTRY_SIZE
+        return _lines_size(inv.to_lines()) + size
+    return _measure_entries((ie for (_path, ie) in inv.iter_entries()), len(inv))
+
 
 class LRUTreeCache:
-    """LRU cache for revision trees."""
+    """LRU cache for revision trees.
+
+    The amount of memory used by the cache is bounded by the
+    ``git.tree_cache_size`` option. When ``git.tree_cache_lazy`` is enabled,
+    only the root of CHK inventories is kept and trees are recreated on
+    access, loading CHK pages as they are needed.
+    """
 
-    def __init__(self, repository):
+    def __init__(self, repository, max_size=None, lazy=None):
         """Initialize LRUTreeCache.
 
         Args:
             repository: The repository to cache trees from.
+            max_size: Maximum amount of memory (in bytes) to use; defaults
+                to the ``git.tree_cache_size`` option, or
+                MAX_TREE_CACHE_SIZE if that is not set.
+            lazy: Whether to only keep the root of CHK inventories; defaults
+                to the ``git.tree_cache_lazy`` option.
         """
-
-        def approx_tree_size(tree):
-            # Very rough estimate, 250 per inventory entry
-            return len(tree.root_inventory) * 250
-
+        from ..config import GlobalStack
+
+        if max_size is None or lazy is None:
+            conf = GlobalStack()
+            if max_size is None:
+                max_size = conf.get("git.tree_cache_size")
+            if lazy is None:
+                lazy = conf.get("git.tree_cache_lazy")
+        if max_size is None:
+            max_size = MAX_TREE_CACHE_SIZE
         self.repository = repository
+        self._lazy = lazy and getattr(repository, "chk_bytes", None) is not None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
         self._cache = lru_cache.LRUSizeCache(
-            max_size=MAX_TREE_CACHE_SIZE,
+            max_size=max_size,
             after_cleanup_size=None,
-            compute_size=approx_tree_size,
+            compute_size=self._compute_size,
         )
 
+    def _compute_size(self, value):
+        if isinstance(value, tuple):
+            return _lines_size(value)
+        return _inventory_memory(value.root_inventory)
+
+    def _get(self, revid):
+        value = self._cache[revid]
+        if isinstance(value, tuple):
+            from ..bzr.inventorytree import InventoryRevisionTree
+
+            inv = self.repository._deserialise_inventory(revid, value)
+            return InventoryRevisionTree(self.repository, inv, revid)
+        return value
+
+    def _lookup(self, revid):
+        try:
+            tree = self._get(revid)
+        except KeyError:
+            self.misses += 1
+            raise
+        self.hits += 1
+        return tree
+
+    def report_stats(self):
+        """Log the cache statistics when -Dcache is enabled."""
+        if debug.debug_flag_enabled("cache"):
+            trace.mutter(
+                "git tree cache: %d hits, %d misses, %d evictions, "
+                "%d trees using %d of %d bytes",
+                self.hits,
+                self.misses,
+                self.evictions,
+                len(self._cache),
+                self._cache._value_size,
+                self._cache._max_size,
+            )
+
     def revision_tree(self, revid):
         """Get a revision tree, using cache if available.
 
@@ -98,7 +205,7 @@ class LRUTreeCache:
             The revision tree.
         """
         try:
-            tree = self._cache[revid]
+            tree = self._lookup(revid)
         except KeyError:
             tree = self.repository.revision_tree(revid)
             self.add(tree)
@@ -117,7 +224,7 @@ class LRUTreeCache:
         todo = []
         for revid in revids:
             try:
-                tree = self._cache[revid]
+                tree = self._lookup(revid)
             except KeyError:
                 todo.append(revid)
             else:
@@ -150,7 +257,19 @@ class LRUTreeCache:
         Args:
             tree: The revision tree to cache.
         """
-        self._cache[tree.get_revision_id()] = tree
+        revid = tree.get_revision_id()
+        value = tree
+        if self._lazy:
+            inv = getattr(tree, "root_inventory", None)
+            if isinstance(inv, CHKInventory):
+                value = tuple(inv.to_lines())
+        new = revid not in self._cache
+        size_before = len(self._cache)
+        self._cache[revid] = value
+        evicted = size_before - len(self._cache)
+        if new and revid in self._cache:
+            evicted += 1
+        self.evictions += max(evicted, 0)
 
 
 def _find_missing_bzr_revids(graph, want, have, shallow=None):
@@ -718,6 +837,34 @@ class BazaarObjectStore(BaseObjectStore):
                 self._update_sha_map(revid)
                 return self._cache.idmap.lookup_commit(revid)
 
+    def _lookup_revision_sha1s(self, revids):
+        """Return the SHA1s matching multiple Bazaar revisions.
+
+        :param revids: Iterable of Bazaar revision ids
+        :return: dict mapping revision ids to Git commit SHA1s; revisions
+            that can not be found are left out
+        """
+        ret = {}
+        todo = set()
+        for revid in revids:
+            if revid == NULL_REVISION:
+                ret[revid] = ZERO_SHA
+            else:
+                todo.add(revid)
+        found = self._cache.idmap.lookup_commits(todo)
+        ret.update(found)
+        unconverted = set()
+        for revid in todo.difference(found):
+            try:
+                ret[revid] = mapping_registry.parse_revision_id(revid)[0]
+            except errors.InvalidRevisionId:
+                unconverted.add(revid)
+        if unconverted:
+            for revid in unconverted:
+                self._update_sha_map(revid)
+            ret.update(self._cache.idmap.lookup_commits(unconverted))
+        return ret
+
     def get_raw(self, sha):
         """Get the raw representation of a Git object by SHA1.
 
@@ -790,6 +937,7 @@ class BazaarObjectStore(BaseObjectStore):
         """Release any locks held on this object store."""
         self._locked = None
         self._map_updated = False
+        self.tree_cache.report_stats()
         self.repository.unlock()
 
     def lookup_git_shas(self, shas: Iterable[ObjectID]) -> dict[ObjectID, list]:
@@ -802,18 +950,21 @@ class BazaarObjectStore(BaseObjectStore):
             Dictionary mapping SHA1s to lists of (type, type_data) tuples.
         """
         ret: dict[ObjectID, list] = {}
+        todo = set()
         for sha in shas:
             if sha == ZERO_SHA:
                 ret[sha] = [("commit", (NULL_REVISION, None, {}))]
-                continue
-            try:
-                ret[sha] = list(self._cache.idmap.lookup_git_sha(sha))
-            except KeyError:
-                # if not, see if there are any unconverted revisions and
-                # add them to the map, search for sha in map again
-                self._update_sha_map()
-                with contextlib.suppress(KeyError):
-                    ret[sha] = list(self._cache.idmap.lookup_git_sha(sha))
+            else:
+                todo.add(sha)
+        if not todo:
+            return ret
+        found = self._cache.idmap.lookup_git_shas(todo)
+        ret.update(found)
+        if len(found) < len(todo):
+            # if not, see if there are any unconverted revisions and
+            # add them to the map, search for the shas in map again
+            self._update_sha_map()
+            ret.update(self._cache.idmap.lookup_git_shas(todo.difference(found)))
         return ret
 
     def lookup_git_sha(self, sha):
@@ -1506,6 +1506,7 @@ class GitRemoteRevisionTree(RevisionTree):
         subdir=None,
         force_mtime=None,
         recurse_nested=False,
+        jobs=1,
     ):
         """Create an archive of this tree.
 
@@ -1513,6 +1514,7 @@ class GitRemoteRevisionTree(RevisionTree):
         :param name: target file name
         :param root: Root directory name (or None)
         :param subdir: Subdirectory to export (or None)
+        :param jobs: Ignored; the archive is created by the server
         :return: Iterator over archive chunks
         """
         if recurse_nested:
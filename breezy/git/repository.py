@@ -344,6 +344,11 @@ class LocalGitRepository(GitRepository):
         self._file_change_scanner = GitFileLastChangeScanner(self)
         self._transaction = None
 
+    def _log_index_transport(self):
+        from .cache import get_control_cache_transport
+
+        return get_control_cache_transport(self.controldir)
+
     def get_commit_builder(
         self,
         branch,
@@ -569,13 +574,22 @@ class LocalGitRepository(GitRepository):
             raise errors.NoSuchRevision(self, revision_id)
         return commit.gpgsig
 
-    def check(self, revision_ids=None, callback_refs=None, check_repo=True):
+    def check(
+        self,
+        revision_ids=None,
+        callback_refs=None,
+        check_repo=True,
+        jobs=1,
+        incremental=False,
+    ):
         """Check the consistency of the repository.
 
         Args:
             revision_ids: Specific revision IDs to check (unused).
             callback_refs: Callback references for progress.
             check_repo: Whether to check the repository.
+            jobs: Number of processes to check in (unused).
+            incremental: Whether to only check new contents (unused).
 
         Returns:
             GitCheck: The check result object.
@@ -22,13 +22,18 @@ import stat
 
 from dulwich.objects import Blob, Commit, Tree
 
+from ... import config
 from ...revision import Revision
 from ...tests import TestCase, TestCaseInTempDir, UnavailableFeature
 from ...transport import get_transport
 from ..cache import (
+    BzrGitCacheFormat,
     DictBzrGitCache,
     IndexBzrGitCache,
     IndexGitCacheFormat,
+    MmapBzrGitCache,
+    MmapGitCacheFormat,
+    MmapGitShaMap,
     SqliteBzrGitCache,
     TdbBzrGitCache,
 )
@@ -84,6 +89,69 @@ class TestGitShaMap:
         )
         self.assertEqual(c.id, self.map.lookup_commit(b"myrevid"))
 
+    def test_lookup_git_shas(self):
+        self.map.start_write_group()
+        updater = self.cache.get_updater(
+            Revision(
+                b"myrevid",
+                parent_ids=[],
+                message="",
+                committer="",
+                timezone=0,
+                timestamp=0,
+                properties={},
+                inventory_sha1=None,
+            )
+        )
+        c = self._get_test_commit()
+        updater.add_object(c, {"testament3-sha1": b"testament"}, None)
+        b = Blob()
+        b.data = b"TEH BLOB"
+        updater.add_object(b, (b"myfileid", b"myrevid"), None)
+        updater.finish()
+        self.map.commit_write_group()
+        self.assertEqual(
+            {
+                c.id: [
+                    (
+                        "commit",
+                        (
+                            b"myrevid",
+                            b"cc9462f7f8263ef5adfbeff2fb936bb36b504cba",
+                            {"testament3-sha1": b"testament"},
+                        ),
+                    )
+                ],
+                b.id: [("blob", (b"myfileid", b"myrevid"))],
+            },
+            self.map.lookup_git_shas(
+                [c.id, b.id, b"5686645d49063c73d35436192dfc9a160c672301"]
+            ),
+        )
+        self.assertEqual({}, self.map.lookup_git_shas([]))
+
+    def test_lookup_commits(self):
+        self.map.start_write_group()
+        updater = self.cache.get_updater(
+            Revision(
+                b"myrevid",
+                parent_ids=[],
+                message="",
+                committer="",
+                timezone=0,
+                timestamp=0,
+                properties={},
+                inventory_sha1=None,
+            )
+        )
+        c = self._get_test_commit()
+        updater.add_object(c, {"testament3-sha1": b"testament"}, None)
+        updater.finish()
+        self.map.commit_write_group()
+        self.assertEqual(
+            {b"myrevid": c.id}, self.map.lookup_commits([b"myrevid", b"otherrevid"])
+        )
+
     def test_lookup_notfound(self):
         self.assertRaises(
             KeyError,
@@ -220,3 +288,86 @@ class IndexGitShaMapTests(TestCaseInTempDir, TestGitShaMap):
         IndexGitCacheFormat().initialize(transport)
         self.cache = IndexBzrGitCache(transport)
         self.map = self.cache.idmap
+
+
+class MmapGitShaMapTests(TestCaseInTempDir, TestGitShaMap):
+    def setUp(self):
+        TestCaseInTempDir.setUp(self)
+        self.path = os.path.join(self.test_dir, "segments")
+        self.cache = MmapBzrGitCache(self.path)
+        self.map = self.cache.idmap
+
+    def add_revision(self, revid, message):
+        updater = self.cache.get_updater(
+            Revision(
+                revid,
+                parent_ids=[],
+                message="",
+                committer="",
+                timezone=0,
+                timestamp=0,
+                properties={},
+                inventory_sha1=None,
+            )
+        )
+        c = self._get_test_commit()
+        c.message = message
+        updater.add_object(c, {"testament3-sha1": b"testament"}, None)
+        b = Blob()
+        b.data = message
+        updater.add_object(b, (b"fileid", revid), None)
+        updater.finish()
+        return c, b
+
+    def test_lookup_in_write_group(self):
+        self.map.start_write_group()
+        c, b = self.add_revision(b"myrevid", b"msg")
+        self.assertEqual(c.id, self.map.lookup_commit(b"myrevid"))
+        self.assertEqual(b.id, self.map.lookup_blob_id(b"fileid", b"myrevid"))
+        self.map.abort_write_group()
+        self.assertRaises(KeyError, self.map.lookup_commit, b"myrevid")
+        self.assertEqual([], os.listdir(self.path))
+
+    def test_reopen(self):
+        self.map.start_write_group()
+        c, b = self.add_revision(b"myrevid", b"msg")
+        self.map.commit_write_group()
+        idmap = MmapBzrGitCache(self.path).idmap
+        self.assertEqual(c.id, idmap.lookup_commit(b"myrevid"))
+        self.assertEqual(
+            [("blob", (b"fileid", b"myrevid"))], list(idmap.lookup_git_sha(b.id))
+        )
+
+    def test_repack(self):
+        commits = {}
+        for i in range(3):
+            self.map.start_write_group()
+            revid = b"rev%d" % i
+            commits[revid] = self.add_revision(revid, b"msg %d" % i)[0].id
+            self.map.commit_write_group()
+        self.assertLength(3, os.listdir(self.path))
+        self.map.repack()
+        self.assertLength(1, os.listdir(self.path))
+        self.assertEqual(commits, self.map.lookup_commits(list(commits)))
+        self.assertEqual(set(commits), set(self.map.revids()))
+
+    def test_merge_in_background(self):
+        self.map.MAX_SEGMENTS = 2
+        for i in range(3):
+            self.map.start_write_group()
+            self.add_revision(b"rev%d" % i, b"msg %d" % i)
+            self.map.commit_write_group()
+        self.map.repack()
+        self.assertLength(1, os.listdir(self.path))
+        self.assertEqual(set(), self.map.missing_revisions([b"rev0", b"rev2"]))
+
+
+class CacheFormatTests(TestCaseInTempDir):
+    def test_configured_format(self):
+        config.GlobalStack().set("git.cache_format", "mmap")
+        transport = get_transport(self.test_dir)
+        cache = BzrGitCacheFormat.from_transport(transport)
+        self.assertEqual(
+            MmapGitCacheFormat().get_format_string(), transport.get_bytes("format")
+        )
+        self.assertIsInstance(cache.idmap, MmapGitShaMap)
@@ -22,15 +22,22 @@ import time
 
 from bzrformats import knit, versionedfile
 from bzrformats.inventory import Inventory
-from dulwich.objects import S_IFGITLINK, Blob, Tag, Tree
+from dulwich.object_store import MemoryObjectStore
+from dulwich.objects import S_IFGITLINK, Blob, Commit, Tag, Tree
 from dulwich.repo import Repo as GitRepo
 
-from ... import osutils
+from ... import config, osutils
 from ...branch import Branch
 from ...controldir import ControlDir
 from ...repository import Repository
 from ...tests import TestCaseWithTransport
-from ..fetch import import_git_blob, import_git_submodule, import_git_tree
+from ..fetch import (
+    _find_missing_commits,
+    _ObjectPrefetcher,
+    import_git_blob,
+    import_git_submodule,
+    import_git_tree,
+)
 from ..mapping import DEFAULT_FILE_MODE, BzrGitMappingv1
 from . import GitBranchBuilder
 
@@ -285,6 +292,151 @@ class LocalRepositoryFetchTests(RepositoryFetchTests, TestCaseWithTransport):
         return Repository.open(path)
 
 
+class PrefetchingLocalRepositoryFetchTests(LocalRepositoryFetchTests):
+    def setUp(self):
+        super().setUp()
+        config.GlobalStack().set("git.fetch_jobs", 3)
+
+
+class ObjectPrefetcherTests(TestCaseWithTransport):
+    def test_prefetches_changed_objects(self):
+        store = MemoryObjectStore()
+        unchanged = Blob.from_string(b"unchanged")
+        old = Blob.from_string(b"old")
+        new = Blob.from_string(b"new")
+        old_tree = Tree()
+        old_tree.add(b"a", 0o100644, unchanged.id)
+        old_tree.add(b"b", 0o100644, old.id)
+        new_tree = Tree()
+        new_tree.add(b"a", 0o100644, unchanged.id)
+        new_tree.add(b"b", 0o100644, new.id)
+        commits = []
+        for tree in (old_tree, new_tree):
+            c = Commit()
+            c.tree = tree.id
+            c.message = b"msg"
+            c.committer = c.author = b"Somebody <somebody@someorg.org>"
+            c.commit_time = c.author_time = 4
+            c.commit_timezone = c.author_timezone = 0
+            c.parents = [commit.id for commit in commits]
+            commits.append(c)
+        for obj in [unchanged, old, new, old_tree, new_tree] + commits:
+            store.add_object(obj)
+        with _ObjectPrefetcher(lambda: store, 2) as prefetcher:
+            prefetcher.prefetch_ahead([commits[1].id], 0)
+        self.assertEqual(new, prefetcher.get(new.id))
+        self.assertEqual(new_tree, prefetcher.get(new_tree.id))
+        self.assertEqual(commits[1], prefetcher.get(commits[1].id))
+        # Blobs that did not change in the commit are not read.
+        self.assertRaises(KeyError, prefetcher.get, unchanged.id)
+        self.assertRaises(KeyError, prefetcher.get, old.id)
+
+    def test_readers_closed(self):
+        readers = []
+
+        class Reader(MemoryObjectStore):
+            closed = False
+
+            def close(self):
+                self.closed = True
+
+        def open_reader():
+            readers.append(Reader())
+            return readers[-1]
+
+        with _ObjectPrefetcher(open_reader, 2) as prefetcher:
+            prefetcher.prefetch_ahead([b"a" * 40, b"b" * 40], 0)
+        self.assertNotEqual([], readers)
+        self.assertTrue(all(reader.closed for reader in readers))
+
+    def test_error_raised(self):
+        def open_reader():
+            raise OSError("unreadable pack")
+
+        def prefetch():
+            with _ObjectPrefetcher(open_reader, 2) as prefetcher:
+                prefetcher.prefetch_ahead([b"a" * 40], 0)
+
+        self.assertRaises(OSError, prefetch)
+
+
+class RecordingRepository:
+    """Minimal repository that records presence checks."""
+
+    def __init__(self, present):
+        self.present = set(present)
+        self.calls = []
+
+    def has_revisions(self, revision_ids):
+        self.calls.append(set(revision_ids))
+        return self.present.intersection(revision_ids)
+
+
+class FindMissingCommitsTests(TestCaseWithTransport):
+    def setUp(self):
+        super().setUp()
+        self.mapping = BzrGitMappingv1()
+        self.objects = {}
+
+    def make_commit(self, message, parents=()):
+        c = Commit()
+        c.tree = Tree().id
+        c.message = message
+        c.committer = c.author = b"Somebody <somebody@someorg.org>"
+        c.commit_time = c.author_time = 4
+        c.commit_timezone = c.author_timezone = 0
+        c.parents = list(parents)
+        self.objects[c.id] = c
+        return c
+
+    def revid(self, commit):
+        return self.mapping.revision_id_foreign_to_bzr(commit.id)
+
+    def find(self, repo, heads):
+        return _find_missing_commits(
+            repo, self.mapping, self.objects.__getitem__, heads
+        )
+
+    def test_one_lookup_per_generation(self):
+        base = self.make_commit(b"base")
+        left = self.make_commit(b"left", [base.id])
+        right = self.make_commit(b"right", [base.id])
+        merge = self.make_commit(b"merge", [left.id, right.id])
+        repo = RecordingRepository([])
+        graph = self.find(repo, [merge.id])
+        self.assertEqual(
+            {merge.id, left.id, right.id, base.id}, {sha for (sha, _) in graph}
+        )
+        self.assertEqual(
+            [
+                {self.revid(merge)},
+                {self.revid(left), self.revid(right)},
+                {self.revid(base)},
+            ],
+            repo.calls,
+        )
+
+    def test_stops_at_present_revisions(self):
+        base = self.make_commit(b"base")
+        tip = self.make_commit(b"tip", [base.id])
+        repo = RecordingRepository([self.revid(base)])
+        self.assertEqual([(tip.id, [base.id])], self.find(repo, [tip.id]))
+        self.assertEqual(2, len(repo.calls))
+
+    def test_follows_tags(self):
+        base = self.make_commit(b"base")
+        tag = Tag()
+        tag.name = b"v1"
+        tag.object = (Commit, base.id)
+        tag.tagger = b"Somebody <somebody@someorg.org>"
+        tag.tag_time = 4
+        tag.tag_timezone = 0
+        tag.message = b"tag"
+        self.objects[tag.id] = tag
+        repo = RecordingRepository([])
+        self.assertEqual([(base.id, [])], self.find(repo, [tag.id]))
+
+
 class DummyStoreUpdater:
     def add_object(self, obj, ie, path):
         pass
@@ -30,6 +30,7 @@ from ...tests import TestCase, TestCaseWithTransport
 from ...tests.features import SymlinkFeature
 from ..cache import DictGitShaMap
 from ..object_store import (
+    MAX_TREE_CACHE_SIZE,
     BazaarObjectStore,
     LRUTreeCache,
     _check_expected_sha,
@@ -119,6 +120,79 @@ class LRUTreeCacheTests(TestCaseWithTransport):
         tree = self.cache.revision_tree(revid)
         self.assertEqual(revid, tree.get_revision_id())
 
+    def build_revisions(self, count):
+        bb = BranchBuilder(branch=self.branch)
+        bb.start_series()
+        revids = [
+            bb.build_snapshot(
+                None,
+                [
+                    ("add", ("", None, "directory", None)),
+                    ("add", ("foo", b"foo-id", "file", b"a\nb\nc\nd\ne\n")),
+                ],
+            )
+        ]
+        for i in range(1, count):
+            revids.append(
+                bb.build_snapshot(None, [("modify", ("foo", b"content %d\n" % i))])
+            )
+        bb.finish_series()
+        return revids
+
+    def test_counters(self):
+        (revid,) = self.build_revisions(1)
+        self.cache.revision_tree(revid)
+        self.assertEqual((0, 1), (self.cache.hits, self.cache.misses))
+        self.cache.revision_tree(revid)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+        list(self.cache.iter_revision_trees([revid, revid]))
+        self.assertEqual((3, 1), (self.cache.hits, self.cache.misses))
+        self.assertEqual(0, self.cache.evictions)
+
+    def test_evictions(self):
+        revids = self.build_revisions(3)
+        tree = self.branch.repository.revision_tree(revids[0])
+        size = self.cache._compute_size(tree)
+        self.assertNotEqual(0, size)
+        cache = LRUTreeCache(self.branch.repository, max_size=size * 2 + 1)
+        for revid in revids:
+            cache.revision_tree(revid)
+        self.assertNotEqual(0, cache.evictions)
+        self.assertEqual(3, cache.evictions + len(cache._cache))
+
+    def test_size_counts_entries_not_loaded(self):
+        bb = BranchBuilder(branch=self.branch)
+        bb.start_series()
+        small = bb.build_snapshot(None, [("add", ("", None, "directory", None))])
+        large = bb.build_snapshot(
+            None, [("add", (f"f{i}", None, "file", b"x\n")) for i in range(20)]
+        )
+        bb.finish_series()
+        repo = self.branch.repository
+        small_size = self.cache._compute_size(repo.revision_tree(small))
+        large_size = self.cache._compute_size(repo.revision_tree(large))
+        self.assertGreater(large_size, small_size * 2)
+
+    def test_max_size_default(self):
+        cache = LRUTreeCache(self.branch.repository)
+        self.assertEqual(MAX_TREE_CACHE_SIZE, cache._cache._max_size)
+
+    def test_max_size_from_config(self):
+        self.overrideEnv("BRZ_GIT_TREE_CACHE_SIZE", "1M")
+        cache = LRUTreeCache(self.branch.repository)
+        self.assertEqual(1000000, cache._cache._max_size)
+
+    def test_lazy(self):
+        revids = self.build_revisions(2)
+        cache = LRUTreeCache(self.branch.repository, lazy=True)
+        tree = cache.revision_tree(revids[1])
+        self.assertIsInstance(cache._cache[revids[1]], tuple)
+        self.assertEqual(revids[1], tree.get_revision_id())
+        tree = cache.revision_tree(revids[1])
+        self.assertEqual(revids[1], tree.get_revision_id())
+        self.assertEqual(b"content 1\n", tree.get_file_text("foo"))
+        self.assertEqual(1, cache.hits)
+
 
 class BazaarObjectStoreTests(TestCaseWithTransport):
     def setUp(self):
@@ -17,6 +17,7 @@
 
 """Tests for Git working trees."""
 
+import dataclasses
 import os
 import stat
 
@@ -120,6 +121,72 @@ class GitWorkingTreeTests(TestCaseWithTransport):
         self.assertEqual([], list(subtree.unknowns()))
 
 
+class GitWorkingTreeStatTests(TestCaseWithTransport):
+    def setUp(self):
+        super().setUp()
+        self.tree = self.make_branch_and_tree(".", format="git")
+
+    def add_old_file(self, path, content=b"contents\n"):
+        self.build_tree_contents([(path, content)])
+        # Well before the index is written, so the entry is not racy.
+        os.utime(path, (1000000000, 1000000000))
+        self.tree.add([path])
+
+    def test_unchanged_stat_uses_index(self):
+        self.add_old_file("a")
+        with self.tree.lock_read():
+            # The file is not read when its stat matches the index entry.
+            self.tree.index[b"a"] = dataclasses.replace(
+                self.tree.index[b"a"], sha=b"f" * 40
+            )
+            self.assertEqual(b"f" * 40, self.tree._live_entry(b"a").sha)
+            self.assertEqual((1, 0), (self.tree._stat_skipped, self.tree._stat_hashed))
+
+    def test_changed_stat_is_hashed(self):
+        self.add_old_file("a")
+        self.build_tree_contents([("a", b"other contents\n")])
+        with self.tree.lock_read():
+            self.assertEqual(
+                Blob.from_string(b"other contents\n").id,
+                self.tree._live_entry(b"a").sha,
+            )
+            self.assertEqual((0, 1), (self.tree._stat_skipped, self.tree._stat_hashed))
+
+    def test_racy_entry_is_hashed(self):
+        self.build_tree_contents([("a", b"contents\n")])
+        # Modified after the index was written.
+        os.utime("a", (4000000000, 4000000000))
+        self.tree.add(["a"])
+        with self.tree.lock_read():
+            self.tree._live_entry(b"a")
+            self.assertEqual((0, 1), (self.tree._stat_skipped, self.tree._stat_hashed))
+
+    def test_refresh_stat_when_write_locked(self):
+        self.add_old_file("a")
+        os.utime("a", (1100000000, 1100000000))
+        with self.tree.lock_read():
+            self.tree._live_entry(b"a")
+            self.assertFalse(self.tree._index_dirty)
+        with self.tree.lock_tree_write():
+            self.tree._live_entry(b"a")
+            self.assertTrue(self.tree._index_dirty)
+            self.assertEqual(1100000000, self.tree.index[b"a"].mtime[0])
+        with self.tree.lock_read():
+            self.tree._live_entry(b"a")
+            self.assertEqual((1, 0), (self.tree._stat_skipped, self.tree._stat_hashed))
+
+    def test_reset_state_hashes_files(self):
+        self.add_old_file("a")
+        self.tree.commit("add a")
+        # Same size and mtime as the committed text.
+        self.build_tree_contents([("a", b"contentz\n")])
+        os.utime("a", (1000000000, 1000000000))
+        self.tree.reset_state()
+        self.assertEqual(
+            ["a"], [c.path[1] for c in self.tree.iter_changes(self.tree.basis_tree())]
+        )
+
+
 class GitWorkingTreeFileTests(TestCaseWithTransport):
     def setUp(self):
         super().setUp()
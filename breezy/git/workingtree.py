@@ -31,6 +31,7 @@ resolution, and tree operations.
 """
 
 import contextlib
+import dataclasses
 import itertools
 import os
 import posixpath
@@ -51,7 +52,9 @@ from dulwich.index import (
     Index,
     IndexEntry,
     SHA1Writer,
+    blob_from_path_and_stat,
     build_index_from_tree,
+    cleanup_mode,
     index_entry_from_path,
     index_entry_from_stat,
     read_submodule_head,
@@ -59,12 +62,22 @@ from dulwich.index import (
     write_index_dict,
 )
 from dulwich.object_store import iter_tree_contents
-from dulwich.objects import S_ISGITLINK
+from dulwich.objects import S_ISGITLINK, Blob
 
 from .. import branch as _mod_branch
 from .. import conflicts as _mod_conflicts
 from .. import controldir as _mod_controldir
-from .. import errors, globbing, lock, osutils, trace, tree, urlutils, workingtree
+from .. import (
+    debug,
+    errors,
+    globbing,
+    lock,
+    osutils,
+    trace,
+    tree,
+    urlutils,
+    workingtree,
+)
 from .. import revision as _mod_revision
 from .. import transport as _mod_transport
 from ..decorators import only_raises
@@ -507,6 +520,42 @@ class _GitAttributesRulesSearcher:
         return None
 
 
+def _stat_time_matches(st_time_ns, entry_time):
+    if isinstance(entry_time, tuple):
+        sec, nsec = entry_time
+        return st_time_ns == sec * 1_000_000_000 + nsec
+    return st_time_ns // 1_000_000_000 == int(entry_time)
+
+
+def _entry_seconds(entry_time):
+    if isinstance(entry_time, tuple):
+        return entry_time[0]
+    return int(entry_time)
+
+
+def _modes_match(mode, entry_mode, trust_executable):
+    if trust_executable:
+        return mode == entry_mode
+    return stat.S_IFMT(mode) == stat.S_IFMT(entry_mode)
+
+
+def _stat_matches_entry(st, entry, trust_executable=True):
+    """Check whether a file is unchanged since its index entry was written.
+
+    This compares the same stat fields as ``git status`` does. The index
+    stores inode and size truncated to 32 bits.
+    """
+    return (
+        _stat_time_matches(st.st_mtime_ns, entry.mtime)
+        and _stat_time_matches(st.st_ctime_ns, entry.ctime)
+        and (st.st_size & 0xFFFFFFFF) == entry.size
+        and (st.st_ino & 0xFFFFFFFF) == entry.ino
+        and st.st_uid == entry.uid
+        and st.st_gid == entry.gid
+        and _modes_match(cleanup_mode(st.st_mode), entry.mode, trust_executable)
+    )
+
+
 class GitWorkingTree(MutableGitIndexTree, workingtree.WorkingTree):
     """A Git working tree."""
 
@@ -668,8 +717,15 @@ class GitWorkingTree(MutableGitIndexTree, workingtree.WorkingTree):
 
         This loads the index from disk and marks it as clean.
         """
-        self.index = Index(self.control_transport.local_abspath("index"))
+        index_path = self.control_transport.local_abspath("index")
+        self.index = Index(index_path)
         self._index_dirty = False
+        try:
+            self._index_mtime = int(os.stat(index_path).st_mtime)
+        except FileNotFoundError:
+            self._index_mtime = None
+        self._stat_skipped = 0
+        self._stat_hashed = 0
 
     def _get_submodule_index(self, relpath):
         """Get the index for a submodule.
@@ -821,6 +877,14 @@ class GitWorkingTree(MutableGitIndexTree, workingtree.WorkingTree):
             self._lock_count -= 1
             if self._lock_count > 0:
                 return
+            if debug.debug_flag_enabled("hashcache") and (
+                self._stat_skipped or self._stat_hashed
+            ):
+                trace.mutter(
+                    "git index: %d files unchanged by stat, %d files hashed",
+                    self._stat_skipped,
+                    self._stat_hashed,
+                )
             if self._index_file is not None:
                 if self._index_dirty:
                     self._flush(self._index_file)
@@ -1507,9 +1571,31 @@ class GitWorkingTree(MutableGitIndexTree, workingtree.WorkingTree):
         """
         return os.lstat(self.abspath(path))
 
+    def _index_entry_for_stat(self, path):
+        """Get the index entry of path that can be compared to its stat.
+
+        Returns:
+            The IndexEntry, or None if path has no plain file or symlink
+            entry in the top-level index.
+        """
+        try:
+            entry = self.index[path]
+        except KeyError:
+            return None
+        if not isinstance(entry, IndexEntry) or S_ISGITLINK(entry.mode):
+            return None
+        return entry
+
     def _live_entry(self, path):
         """Create an index entry from the current state of a file.
 
+        Files whose stat data still matches their index entry are not read;
+        the sha stored in the index is used instead. Like git, entries that
+        were modified in the same second the index was written ("racily
+        clean" entries) are always hashed. When the tree is write locked,
+        the stat data of files that were hashed but turned out to be
+        unchanged is refreshed in the index.
+
         Args:
             path: The Git-encoded path to create an entry for.
 
@@ -1517,51 +1603,61 @@ class GitWorkingTree(MutableGitIndexTree, workingtree.WorkingTree):
             An IndexEntry representing the current file state.
         """
         encoded_path = os.fsencode(self.abspath(decode_git_path(path)))
-        entry = index_entry_from_path(encoded_path)
+        st = os.lstat(encoded_path)
+        if not (stat.S_ISREG(st.st_mode) or stat.S_ISLNK(st.st_mode)):
+            return index_entry_from_path(encoded_path)
+
+        trust_executable = self._supports_executable()
+        index_entry = self._index_entry_for_stat(path)
+        if (
+            index_entry is not None
+            and self._index_mtime is not None
+            and _entry_seconds(index_entry.mtime) < self._index_mtime
+            and _stat_matches_entry(st, index_entry, trust_executable)
+        ):
+            self._stat_skipped += 1
+            return index_entry_from_stat(st, index_entry.sha)
+
+        self._stat_hashed += 1
+        if debug.debug_flag_enabled("hashcache"):
+            trace.mutter("git index: hashing %s", decode_git_path(path))
 
         # If content filtering is enabled, we need to calculate the SHA
         # of the filtered content, not the raw file content
+        filters = None
+        if stat.S_ISREG(st.st_mode) and self.supports_content_filtering():
+            filters = self._content_filter_stack(decode_git_path(path))
+        if filters:
+            with open(encoded_path, "rb") as f:
+                chunks = [f.read()]
+
+            # Apply the read converters (clean filters)
+            for filter in filters:
+                if filter.reader is not None:
+                    chunks = filter.reader(chunks)
+
+            blob = Blob.from_string(b"".join(chunks))
+        else:
+            blob = blob_from_path_and_stat(encoded_path, st)
+        entry = index_entry_from_stat(st, blob.id)
+
         if (
-            entry is not None
-            and stat.S_ISREG(entry.mode)
-            and self.supports_content_filtering()
+            self._lock_mode == "w"
+            and index_entry is not None
+            and index_entry.sha == entry.sha
+            and _modes_match(entry.mode, index_entry.mode, trust_executable)
         ):
-            decoded_path = decode_git_path(path)
-            filters = self._content_filter_stack(decoded_path)
-            if filters:
-                from dulwich.object_store import Blob
-
-                # Read the file and apply filters
-                with open(encoded_path, "rb") as f:
-                    chunks = [f.read()]
-
-                # Apply the read converters (clean filters)
-                for filter in filters:
-                    if filter.reader is not None:
-                        chunks = filter.reader(chunks)
-
-                filtered_data = b"".join(chunks)
-
-                # Calculate SHA of the filtered content
-                blob = Blob()
-                blob.data = filtered_data
-
-                # Update the entry with the filtered SHA
-                from dulwich.index import IndexEntry
-
-                entry = IndexEntry(
-                    entry.ctime,
-                    entry.mtime,
-                    entry.dev,
-                    entry.ino,
-                    entry.mode,
-                    entry.uid,
-                    entry.gid,
-                    entry.size,
-                    blob.id,
-                    entry.flags,
-                )
-
+            self.index[path] = dataclasses.replace(
+                index_entry,
+                ctime=entry.ctime,
+                mtime=entry.mtime,
+                dev=entry.dev,
+                ino=entry.ino,
+                uid=entry.uid,
+                gid=entry.gid,
+                size=entry.size,
+            )
+            self._index_dirty = True
         return entry
 
     def is_executable(self, path):
@@ -2237,8 +2333,12 @@ class GitWorkingTree(MutableGitIndexTree, workingtree.WorkingTree):
                                 )
                             )
                     (index, subpath) = self._lookup_index(entry.path)
-                    index[subpath] = index_entry_from_stat(
-                        st, entry.sha, mode=entry.mode
+                    # The sha comes from the tree rather than the file, so
+                    # clear the times to make sure the file gets hashed.
+                    index[subpath] = dataclasses.replace(
+                        index_entry_from_stat(st, entry.sha, mode=entry.mode),
+                        ctime=(0, 0),
+                        mtime=(0, 0),
                     )
 
     def _update_git_tree(
@@ -21,6 +21,8 @@ in a Breezy repository, including support for searching through history.
 """
 
 import re
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from io import BytesIO
 
 from .lazy_import import lazy_import
@@ -70,6 +72,8 @@ class GrepOptions:
     files_without_match = False
     color = None
     diff = False
+    jobs = 1
+    bulk_read = False
 
     # derived options
     recursive = None
@@ -418,24 +422,30 @@ def versioned_grep(opts):
         # GZ 2010-06-02: Shouldn't be smuggling this on opts, but easy for now
         opts.outputter = _Outputter(opts, use_cache=True)
 
-        for revid, revno, merge_depth in given_revs:
-            if opts.levels == 1 and merge_depth != 0:
-                # with level=1 show only top level
-                continue
-
-            rev = RevisionSpec_revid.from_string("revid:" + revid.decode("utf-8"))
-            tree = rev.as_tree(branch)
-            for path in opts.path_list:
-                tree_path = osutils.pathjoin(relpath, path)
-                if not tree.has_filename(tree_path):
-                    trace.warning("Skipped unknown file '%s'.", path)
+        with _VersionedScanner(
+            opts, branch.repository, jobs=opts.jobs, bulk_read=opts.bulk_read
+        ) as scanner:
+            for revid, revno, merge_depth in given_revs:
+                if opts.levels == 1 and merge_depth != 0:
+                    # with level=1 show only top level
                     continue
 
-                if osutils.isdir(path):
-                    path_prefix = path
-                    dir_grep(tree, path, relpath, opts, revno, path_prefix)
-                else:
-                    versioned_file_grep(tree, tree_path, ".", path, opts, revno)
+                rev = RevisionSpec_revid.from_string("revid:" + revid.decode("utf-8"))
+                tree = rev.as_tree(branch)
+                for path in opts.path_list:
+                    tree_path = osutils.pathjoin(relpath, path)
+                    if not tree.has_filename(tree_path):
+                        trace.warning("Skipped unknown file '%s'.", path)
+                        continue
+
+                    if osutils.isdir(path):
+                        path_prefix = path
+                        dir_grep(tree, path, relpath, opts, revno, path_prefix, scanner)
+                    else:
+                        versioned_file_grep(
+                            tree, tree_path, ".", path, opts, revno, scanner=scanner
+                        )
+            scanner.flush()
 
 
 def workingtree_grep(opts):
@@ -473,7 +483,7 @@ def _skip_file(include, exclude, path):
     return bool(exclude and _path_in_glob_list(path, exclude))
 
 
-def dir_grep(tree, path, relpath, opts, revno, path_prefix):
+def dir_grep(tree, path, relpath, opts, revno, path_prefix, scanner=None):
     """Search for pattern in files within a directory.
 
     Args:
@@ -483,6 +493,8 @@ def dir_grep(tree, path, relpath, opts, revno, path_prefix):
         opts: GrepOptions object containing search parameters.
         revno: Revision number (if applicable).
         path_prefix: Prefix to add to displayed paths.
+        scanner: _VersionedScanner shared by the revisions being searched
+            (only used when revno is given).
     """
     # setup relpath to open files relative to cwd
     if relpath:
@@ -493,12 +505,13 @@ def dir_grep(tree, path, relpath, opts, revno, path_prefix):
         # start searching recursively from root
         from_dir = None
 
+    own_scanner = False
+    if revno is not None and scanner is None:
+        scanner = _VersionedScanner(opts)
+        own_scanner = True
+
     to_grep = []
     to_grep_append = to_grep.append
-    # GZ 2010-06-05: The cache dict used to be recycled every call to dir_grep
-    #                and hits manually refilled. Could do this again if it was
-    #                for a good reason, otherwise cache might want purging.
-    outputter = opts.outputter
     for fp, fc, fkind, _entry in tree.list_files(
         include_root=False, from_dir=from_dir, recursive=opts.recursive
     ):
@@ -508,17 +521,12 @@ def dir_grep(tree, path, relpath, opts, revno, path_prefix):
         if fc == "V" and fkind == "file":
             tree_path = osutils.pathjoin(from_dir if from_dir else "", fp)
             if revno is not None:
-                # If old result is valid, print results immediately.
-                # Otherwise, add file info to to_grep so that the
-                # loop later will get chunks and grep them
-                cache_id = tree.get_file_revision(tree_path)
-                if cache_id in outputter.cache:
-                    # GZ 2010-06-05: Not really sure caching and re-outputting
-                    #                the old path is really the right thing,
-                    #                but it's what the old code seemed to do
-                    outputter.write_cached_lines(cache_id, revno)
-                else:
-                    to_grep_append((tree_path, (fp, tree_path)))
+                # The scanner replays the results for texts it has seen in
+                # earlier revisions, so only new texts need to be read.
+                key = (tree.path2id(tree_path), tree.get_file_revision(tree_path))
+                display_path = _make_display_path(relpath, fp)
+                if scanner.add(key, display_path, revno, path_prefix):
+                    to_grep_append((tree_path, key))
             else:
                 # we are grepping working tree.
                 if from_dir is None:
@@ -535,16 +543,10 @@ def dir_grep(tree, path, relpath, opts, revno, path_prefix):
                         _file_grep(f.read(), fp, opts, revno, path_prefix)
 
     if revno is not None:  # grep versioned files
-        for (path, tree_path), chunks in tree.iter_files_bytes(to_grep):
-            path = _make_display_path(relpath, path)
-            _file_grep(
-                b"".join(chunks),
-                path,
-                opts,
-                revno,
-                path_prefix,
-                tree.get_file_revision(tree_path),
-            )
+        for key, chunks in tree.iter_files_bytes(to_grep):
+            scanner.set_text(key, b"".join(chunks))
+        if own_scanner:
+            scanner.flush()
 
 
 def _make_display_path(relpath, path):
@@ -562,11 +564,22 @@ def _make_display_path(relpath, path):
     return path
 
 
-def versioned_file_grep(tree, tree_path, relpath, path, opts, revno, path_prefix=None):
-    """Create a file object for the specified id and pass it on to _file_grep."""
+def versioned_file_grep(
+    tree, tree_path, relpath, path, opts, revno, path_prefix=None, scanner=None
+):
+    """Grep the text of a versioned file.
+
+    If a scanner is given, the text is only read and searched if the scanner
+    has not seen it in an earlier revision.
+    """
     path = _make_display_path(relpath, path)
-    file_text = tree.get_file_text(tree_path)
-    _file_grep(file_text, path, opts, revno, path_prefix)
+    if scanner is None:
+        file_text = tree.get_file_text(tree_path)
+        _file_grep(file_text, path, opts, revno, path_prefix)
+        return
+    key = (tree.path2id(tree_path), tree.get_file_revision(tree_path))
+    if scanner.add(key, path, revno, path_prefix):
+        scanner.set_text(key, tree.get_file_text(tree_path))
 
 
 def _path_in_glob_list(path, glob_list) -> bool:
@@ -716,9 +729,116 @@ class _Outputter:
         return _line_writer_fixed_highlighted
 
 
-def _file_grep(file_text, path, opts, revno, path_prefix=None, cache_id=None):
-    # test and skip binary files
-    if b"\x00" in file_text[:1024]:
+class _TextMatcher:
+    """Find the lines of a file text that match the pattern.
+
+    Only the options needed for matching are kept, so that a matcher can be
+    pickled and run in a worker process.
+    """
+
+    def __init__(self, opts):
+        self.pattern = opts.pattern.encode(_user_encoding, "replace")
+        self.patternc = opts.patternc
+        self.fixed_string = opts.fixed_string
+        self.line_number = opts.line_number
+        self.files_with_matches = opts.files_with_matches
+        self.files_without_match = opts.files_without_match
+
+    def __call__(self, file_text):
+        """Match file_text.
+
+        Returns:
+            None for binary files, otherwise a list with the keyword arguments
+            for the line writer, one dict per matching line. When only
+            listing files, the list holds a single empty dict if the file
+            should be listed.
+        """
+        # test and skip binary files
+        if b"\x00" in file_text[:1024]:
+            return None
+
+        # GZ 2010-06-07: There's no actual guarentee the file contents will be
+        #                in the user encoding, but we have to guess something
+        #                and it is a reasonable default without a better
+        #                mechanism.
+        file_encoding = _user_encoding
+        pattern = self.pattern
+        matches = []
+        add_match = matches.append
+
+        if self.files_with_matches or self.files_without_match:
+            if self.fixed_string:
+                found = pattern in file_text
+            else:
+                search = self.patternc.search
+                if b"$" not in pattern:
+                    found = search(file_text) is not None
+                else:
+                    for line in file_text.splitlines():
+                        if search(line):
+                            found = True
+                            break
+                    else:
+                        found = False
+            if (self.files_with_matches and found) or (
+                self.files_without_match and not found
+            ):
+                add_match({})
+        elif self.fixed_string:
+            # Fast path for no match, search through the entire file at once
+            # rather than a line at a time.
+            # <http://effbot.org/zone/stringlib.htm>
+            i = file_text.find(pattern)
+            if i == -1:
+                return matches
+            b = file_text.rfind(b"\n", 0, i) + 1
+            if self.line_number:
+                start = file_text.count(b"\n", 0, b) + 1
+            file_text = file_text[b:]
+            if self.line_number:
+                for index, line in enumerate(file_text.splitlines()):
+                    if pattern in line:
+                        line = line.decode(file_encoding, "replace")
+                        add_match({"lineno": index + start, "line": line})
+            else:
+                for line in file_text.splitlines():
+                    if pattern in line:
+                        line = line.decode(file_encoding, "replace")
+                        add_match({"line": line})
+        else:
+            # Fast path on no match, the re module avoids bad behaviour in most
+            # standard cases, but perhaps could try and detect backtracking
+            # patterns here and avoid whole text search in those cases
+            search = self.patternc.search
+            if b"$" not in pattern:
+                # GZ 2010-06-05: Grr, re.MULTILINE can't save us when searching
+                #                through revisions as bazaar returns binary mode
+                #                and trailing \r breaks $ as line ending match
+                m = search(file_text)
+                if m is None:
+                    return matches
+                b = file_text.rfind(b"\n", 0, m.start()) + 1
+                if self.line_number:
+                    start = file_text.count(b"\n", 0, b) + 1
+                file_text = file_text[b:]
+            else:
+                start = 1
+            if self.line_number:
+                for index, line in enumerate(file_text.splitlines()):
+                    if search(line):
+                        line = line.decode(file_encoding, "replace")
+                        add_match({"lineno": index + start, "line": line})
+            else:
+                for line in file_text.splitlines():
+                    if search(line):
+                        line = line.decode(file_encoding, "replace")
+                        add_match({"line": line})
+        return matches
+
+
+def _write_matches(matches, path, opts, revno, path_prefix=None, cache_id=None):
+    """Write the matches found by a _TextMatcher."""
+    if matches is None:
         if opts.verbose:
             trace.warning("Binary file '%s' skipped.", path)
         return
@@ -727,77 +847,135 @@ def _file_grep(file_text, path, opts, revno, path_prefix=None, cache_id=None):
         # user has passed a dir arg, show that as result prefix
         path = osutils.pathjoin(path_prefix, path)
 
-    # GZ 2010-06-07: There's no actual guarentee the file contents will be in
-    #                the user encoding, but we have to guess something and it
-    #                is a reasonable default without a better mechanism.
-    file_encoding = _user_encoding
-    pattern = opts.pattern.encode(_user_encoding, "replace")
-
     writeline = opts.outputter.get_writer(path, revno, cache_id)
+    for kwargs in matches:
+        writeline(**kwargs)
 
-    if opts.files_with_matches or opts.files_without_match:
-        if opts.fixed_string:
-            found = pattern in file_text
-        else:
-            search = opts.patternc.search
-            if b"$" not in pattern:
-                found = search(file_text) is not None
-            else:
-                for line in file_text.splitlines():
-                    if search(line):
-                        found = True
-                        break
-                else:
-                    found = False
-        if (opts.files_with_matches and found) or (
-            opts.files_without_match and not found
-        ):
-            writeline()
-    elif opts.fixed_string:
-        # Fast path for no match, search through the entire file at once rather
-        # than a line at a time. <http://effbot.org/zone/stringlib.htm>
-        i = file_text.find(pattern)
-        if i == -1:
-            return
-        b = file_text.rfind(b"\n", 0, i) + 1
-        if opts.line_number:
-            start = file_text.count(b"\n", 0, b) + 1
-        file_text = file_text[b:]
-        if opts.line_number:
-            for index, line in enumerate(file_text.splitlines()):
-                if pattern in line:
-                    line = line.decode(file_encoding, "replace")
-                    writeline(lineno=index + start, line=line)
-        else:
-            for line in file_text.splitlines():
-                if pattern in line:
-                    line = line.decode(file_encoding, "replace")
-                    writeline(line=line)
-    else:
-        # Fast path on no match, the re module avoids bad behaviour in most
-        # standard cases, but perhaps could try and detect backtracking
-        # patterns here and avoid whole text search in those cases
-        search = opts.patternc.search
-        if b"$" not in pattern:
-            # GZ 2010-06-05: Grr, re.MULTILINE can't save us when searching
-            #                through revisions as bazaar returns binary mode
-            #                and trailing \r breaks $ as line ending match
-            m = search(file_text)
-            if m is None:
-                return
-            b = file_text.rfind(b"\n", 0, m.start()) + 1
-            if opts.line_number:
-                start = file_text.count(b"\n", 0, b) + 1
-            file_text = file_text[b:]
+
+def _file_grep(file_text, path, opts, revno, path_prefix=None, cache_id=None):
+    matches = _TextMatcher(opts)(file_text)
+    _write_matches(matches, path, opts, revno, path_prefix, cache_id)
+
+
+class _VersionedScanner:
+    """Grep the file texts of a range of revisions, matching each text once.
+
+    Texts are identified by their (file_id, revision) key. A text that was
+    seen in an earlier revision is neither read nor matched again; the
+    results cached by the outputter are written out for the new revision.
+
+    Texts can be matched by a pool of worker processes, and read from the
+    repository in batches with iter_files_bytes rather than per revision
+    tree. Results are always written in the order the files were added.
+    """
+
+    # Number of texts to read from the repository at once with bulk_read.
+    BULK_READ_TEXTS = 200
+
+    def __init__(self, opts, repository=None, jobs=1, bulk_read=False):
+        """Create a scanner.
+
+        Args:
+            opts: GrepOptions, with an outputter that caches results.
+            repository: Repository to read texts from if bulk_read is set.
+            jobs: Number of processes to match texts in. With one job texts
+                are matched in this process.
+            bulk_read: Read texts from repository in batches of
+                BULK_READ_TEXTS, rather than letting the caller supply them.
+        """
+        self.opts = opts
+        self._repository = repository
+        self._matcher = _TextMatcher(opts)
+        self._bulk_read = bulk_read and repository is not None
+        # Keys of all texts added so far, and of those that were binary
+        self._seen = set()
+        self._binary = set()
+        # (key, path, revno, path_prefix, replay) in output order
+        self._queue = deque()
+        # key -> list of matches, or Future while being matched
+        self._results = {}
+        self._unread = []
+        if jobs > 1:
+            self._executor = ProcessPoolExecutor(max_workers=jobs)
+            self._window = jobs * 8
         else:
-            start = 1
-        if opts.line_number:
-            for index, line in enumerate(file_text.splitlines()):
-                if search(line):
-                    line = line.decode(file_encoding, "replace")
-                    writeline(lineno=index + start, line=line)
+            self._executor = None
+            self._window = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+        return False
+
+    def add(self, key, path, revno, path_prefix=None):
+        """Add a file of a revision to the output.
+
+        Returns:
+            True if the caller should supply the text with set_text; False
+            if the text was seen before or will be read by the scanner.
+        """
+        if key in self._seen:
+            self._queue.append((key, path, revno, path_prefix, True))
+            self._write_ready()
+            return False
+        self._seen.add(key)
+        self._queue.append((key, path, revno, path_prefix, False))
+        if not self._bulk_read:
+            return True
+        self._unread.append(key)
+        if len(self._unread) >= self.BULK_READ_TEXTS:
+            self._read_unread()
+        return False
+
+    def set_text(self, key, text):
+        """Supply the text for a key that add() asked for."""
+        if self._executor is not None:
+            self._results[key] = self._executor.submit(self._matcher, text)
         else:
-            for line in file_text.splitlines():
-                if search(line):
-                    line = line.decode(file_encoding, "replace")
-                    writeline(line=line)
+            self._results[key] = self._matcher(text)
+        self._write_ready()
+
+    def flush(self):
+        """Read and match all outstanding texts and write their results."""
+        self._read_unread()
+        self._write_ready(block=True)
+
+    def _read_unread(self):
+        keys, self._unread = self._unread, []
+        if not keys:
+            return
+        desired = [key + (key,) for key in keys]
+        for key, chunks in self._repository.iter_files_bytes(desired):
+            self.set_text(key, b"".join(chunks))
+
+    def _write_ready(self, block=False):
+        queue = self._queue
+        outputter = self.opts.outputter
+        while queue:
+            key, path, revno, path_prefix, replay = queue[0]
+            if replay:
+                # The first occurrence of key is ahead in the queue, so its
+                # results have been written and cached by now.
+                queue.popleft()
+                if key in self._binary:
+                    _write_matches(None, path, self.opts, revno)
+                else:
+                    outputter.write_cached_lines(key, revno)
+                continue
+            try:
+                result = self._results[key]
+            except KeyError:
+                # The text has not been supplied yet.
+                break
+            if isinstance(result, Future):
+                if not (block or result.done() or len(queue) > self._window):
+                    break
+                result = result.result()
+            del self._results[key]
+            queue.popleft()
+            if result is None:
+                self._binary.add(key)
+            _write_matches(result, path, self.opts, revno, path_prefix, key)
@@ -69,7 +69,9 @@ from breezy import (
     diff,
     foreign,
     lazy_regex,
+    log_index,
     )
+import sqlite3
 from breezy.i18n import gettext, ngettext
 """,
 )
@@ -1111,6 +1113,11 @@ def _generate_deltas(repository, log_rev_iterator, delta_type, files, direction)
     if check_files:
         file_set = set(files)
         stop_on = "add" if direction == "reverse" else "remove"
+        file_history = log_index.FileHistoryIndex.open(repository)
+        if file_history is not None:
+            log_rev_iterator = _filter_by_file_history(
+                repository, file_history, log_rev_iterator, file_set
+            )
     else:
         file_set = None
     for revs in log_rev_iterator:
@@ -1148,6 +1155,40 @@ def _generate_deltas(repository, log_rev_iterator, delta_type, files, direction)
         yield new_revs
 
 
+def _filter_by_file_history(repository, file_history, log_rev_iterator, files):
+    """Drop the revisions that can not have touched files from a log iterator.
+
+    The revisions are looked up in the file history index, after adding any
+    that it is missing. If the index can not be used, nothing is dropped.
+
+    :param repository: The repository the revisions are in.
+    :param file_history: The FileHistoryIndex of the repository.
+    :param log_rev_iterator: An input iterator containing all revisions that
+        could be displayed, in lists.
+    :param files: The set of files to match; it is updated by the caller as
+        it follows the files through renames.
+    :return: An iterator over lists of ((rev_id, revno, merge_depth), rev,
+        delta).
+    """
+    candidates = None
+    try:
+        for revs in log_rev_iterator:
+            revision_ids = [rev[0][0] for rev in revs if rev[1] is not None]
+            try:
+                if file_history.update(repository, revision_ids) or candidates is None:
+                    candidates = file_history.find_revisions(files)
+            except sqlite3.Error as e:
+                trace.mutter("not using file history index: %s", e)
+                yield revs
+                yield from log_rev_iterator
+                return
+            revs = [rev for rev in revs if rev[0][0] in candidates]
+            if revs:
+                yield revs
+    finally:
+        file_history.close()
+
+
 def _update_files(delta, files, stop_on):
     """Update the set of files to search based on file lifecycle events.
 
@@ -0,0 +1,236 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""An index of the paths changed by each revision in a repository.
+
+``brz log FILE`` has to find the revisions that changed FILE, which without
+an index means computing a tree delta for every revision in the history. The
+file history index records, for every indexed revision, the paths that
+changed relative to its left hand parent, so that only the revisions that
+may have touched FILE need a delta.
+
+The index is optional. It is created by ``brz log-index`` and, once it
+exists, ``brz log`` adds the revisions it has not seen yet before using it.
+It is kept in an SQLite database next to the repository.
+"""
+
+import os
+import sqlite3
+
+from dromedary import errors as transport_errors
+
+from . import osutils, trace, ui
+
+INDEX_NAME = "log-index.db"
+
+# The number of revisions to compute deltas for at once while indexing.
+_DELTA_BATCH_SIZE = 100
+
+# Maximum number of parameters to pass in a single SQLite "in" clause; older
+# SQLite versions limit the number of host parameters to 999.
+_SQLITE_MAX_PARAMS = 500
+
+
+def _index_path(repository):
+    transport = repository._log_index_transport()
+    if transport is None:
+        return None
+    try:
+        return transport.local_abspath(INDEX_NAME)
+    except transport_errors.NotLocalUrl:
+        return None
+
+
+class FileHistoryIndex:
+    """The paths changed by each indexed revision of a repository.
+
+    Renames and copies are recorded in both directions, so that history can
+    be followed across them.
+    """
+
+    def __init__(self, path):
+        """Open or create the index database at path."""
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(
+            """
+        create table if not exists revisions(
+            revid blob primary key
+        );
+        create table if not exists changes(
+            revid blob not null,
+            path text not null,
+            other_path text
+        );
+        create index if not exists changes_path on changes(path);
+"""
+        )
+
+    def __repr__(self):
+        """Return a string representation of the index."""
+        return f"{self.__class__.__name__}({self.path!r})"
+
+    @classmethod
+    def open(cls, repository, create=False):
+        """Open the file history index of a repository.
+
+        Args:
+          repository: The repository to open the index for.
+          create: Whether to create the index if it does not exist yet.
+        Returns: A FileHistoryIndex, or None if the repository has no index
+            and create is False, or can not have one.
+        """
+        path = _index_path(repository)
+        if path is None or (not create and not os.path.exists(path)):
+            return None
+        try:
+            return cls(path)
+        except sqlite3.Error as e:
+            trace.mutter("unable to open file history index %s: %s", path, e)
+            return None
+
+    @staticmethod
+    def exists(repository):
+        """Check whether a repository has a file history index."""
+        path = _index_path(repository)
+        return path is not None and os.path.exists(path)
+
+    def close(self):
+        """Close the database."""
+        self.db.close()
+
+    def _select_in(self, query, values):
+        values = list(values)
+        for start in range(0, len(values), _SQLITE_MAX_PARAMS):
+            batch = values[start : start + _SQLITE_MAX_PARAMS]
+            yield from self.db.execute(query % ",".join("?" * len(batch)), batch)
+
+    def missing_revisions(self, revision_ids):
+        """Return the revisions that have not been indexed yet.
+
+        Args:
+          revision_ids: The revision ids to check.
+        Returns: A list of the revision ids that are not in the index, in
+            the order they were given.
+        """
+        present = {
+            row[0]
+            for row in self._select_in(
+                "select revid from revisions where revid in (%s)", revision_ids
+            )
+        }
+        return [revid for revid in revision_ids if revid not in present]
+
+    def add_revisions(self, repository, revision_ids):
+        """Index revisions.
+
+        Args:
+          repository: The repository the revisions are in.
+          revision_ids: The revisions to index.
+        """
+        with ui.ui_factory.nested_progress_bar() as pb:
+            for start in range(0, len(revision_ids), _DELTA_BATCH_SIZE):
+                pb.update("indexing file history", start, len(revision_ids))
+                batch = revision_ids[start : start + _DELTA_BATCH_SIZE]
+                revisions = repository.get_revisions(batch)
+                rows = []
+                for revid, delta in zip(
+                    batch, repository.get_revision_deltas(revisions), strict=True
+                ):
+                    rows.extend(_delta_rows(revid, delta))
+                with self.db:
+                    self.db.executemany(
+                        "insert into changes (revid, path, other_path) values (?, ?, ?)",
+                        rows,
+                    )
+                    self.db.executemany(
+                        "insert into revisions (revid) values (?)",
+                        [(revid,) for revid in batch],
+                    )
+
+    def update(self, repository, revision_ids):
+        """Index those of revision_ids that have not been indexed yet.
+
+        Returns: The number of revisions that were added.
+        """
+        missing = self.missing_revisions(revision_ids)
+        if missing:
+            self.add_revisions(repository, missing)
+        return len(missing)
+
+    def _iter_changes_touching(self, path):
+        """Yield (revid, path, other_path) rows for changes related to path.
+
+        These are changes to path itself, to anything inside it and to the
+        directories containing it.
+        """
+        if not path:
+            # Everything is inside the root.
+            yield from self.db.execute("select revid, path, other_path from changes")
+            return
+        ancestors = []
+        parent = path
+        while parent:
+            parent = parent.rpartition("/")[0]
+            ancestors.append(parent)
+        query = (
+            "select revid, path, other_path from changes "
+            "where path = ? or (path > ? and path < ?) or path in (%s)"
+        )
+        yield from self.db.execute(
+            query % ",".join("?" * len(ancestors)),
+            [path, path + "/", path + "0"] + ancestors,
+        )
+
+    def find_revisions(self, paths):
+        """Find the indexed revisions that may have changed any of paths.
+
+        The result may include revisions that did not change paths, but
+        includes every revision whose delta against its left hand parent
+        does: changes to the paths, to their contents if they are
+        directories, and to the directories containing them. Renames and
+        copies of the paths are followed.
+
+        Args:
+          paths: The paths to look for.
+        Returns: A set of revision ids.
+        """
+        result = set()
+        seen = set(paths)
+        pending = list(paths)
+        while pending:
+            path = pending.pop()
+            for revid, changed_path, other_path in self._iter_changes_touching(path):
+                result.add(revid)
+                if other_path is not None and osutils.is_inside(changed_path, path):
+                    other = other_path + path[len(changed_path) :]
+                    if other not in seen:
+                        seen.add(other)
+                        pending.append(other)
+        return result
+
+
+def _delta_rows(revid, delta):
+    """Return the (revid, path, other_path) rows for a tree delta."""
+    rows = []
+    for change in delta.added + delta.modified + delta.kind_changed:
+        rows.append((revid, change.path[1], None))
+    for change in delta.removed:
+        rows.append((revid, change.path[0], None))
+    for change in delta.renamed + delta.copied:
+        rows.append((revid, change.path[1], change.path[0]))
+        rows.append((revid, change.path[0], change.path[1]))
+    return rows
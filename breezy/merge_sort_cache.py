@@ -0,0 +1,268 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""A persistent cache of the merge sorted ancestry of a branch tip.
+
+Merge sorting the whole ancestry of a branch is needed for dotted revnos
+and for ``brz log -n0``, and is done again by every new process. The result
+only depends on the tip, so it can be stored next to the branch and reused.
+
+When the branch tip moves forward, the stored result for the old tip is a
+suffix of the result for the new tip: only the revisions that are not in the
+ancestry of the old tip need to be sorted and numbered, continuing from the
+state left behind by the old ones. When the tip moves backwards along the
+mainline, the result for the new tip is a suffix of the stored one. Any other
+change of tip means the whole ancestry has to be sorted again.
+
+Nodes are ``(revision_id, merge_depth, revno, end_of_merge)`` tuples, in the
+order returned by ``KnownGraph.merge_sort``.
+"""
+
+import zlib
+
+import vcsgraph.errors
+
+from . import revision as _mod_revision
+
+FORMAT_STRING = b"Breezy merge sort cache v1\n"
+
+
+def serialise(tip_revision_id, nodes):
+    """Serialise a merge sorted ancestry.
+
+    Args:
+      tip_revision_id: The revision id of the branch tip.
+      nodes: The merge sorted nodes for tip_revision_id.
+    Returns: The compressed bytes to store.
+    """
+    lines = [FORMAT_STRING, tip_revision_id + b"\n"]
+    for revision_id, merge_depth, revno, end_of_merge in nodes:
+        lines.append(
+            b"%d %s %d %s\n"
+            % (
+                merge_depth,
+                b".".join(b"%d" % n for n in revno),
+                end_of_merge,
+                revision_id,
+            )
+        )
+    return zlib.compress(b"".join(lines))
+
+
+def deserialise(data):
+    """Read back the output of serialise().
+
+    Returns: A (tip_revision_id, nodes) tuple, or None if data is not a
+        valid cache.
+    """
+    try:
+        lines = zlib.decompress(data).split(b"\n")
+    except zlib.error:
+        return None
+    if len(lines) < 2 or lines[0] + b"\n" != FORMAT_STRING or lines.pop() != b"":
+        return None
+    nodes = []
+    try:
+        for line in lines[2:]:
+            merge_depth, revno, end_of_merge, revision_id = line.split(b" ", 3)
+            nodes.append(
+                (
+                    revision_id,
+                    int(merge_depth),
+                    tuple(int(n) for n in revno.split(b".")),
+                    end_of_merge == b"1",
+                )
+            )
+    except ValueError:
+        return None
+    return lines[1], nodes
+
+
+def update_merge_sort(repository, tip_revision_id, nodes):
+    """Derive the merge sorted ancestry of a tip from that of another tip.
+
+    Args:
+      repository: The repository to read parents from.
+      tip_revision_id: The tip to merge sort.
+      nodes: The merge sorted nodes of the previous tip.
+    Returns: The merge sorted nodes for tip_revision_id, or None if the
+        previous tip is neither a left hand ancestor nor a left hand
+        descendant of tip_revision_id.
+    """
+    if not nodes:
+        return None
+    if nodes[0][0] == tip_revision_id:
+        return nodes
+    for index, node in enumerate(nodes):
+        if node[0] == tip_revision_id:
+            if node[1] != 0:
+                # A merged revision; its numbering depends on what merged it.
+                return None
+            # The tip moved backwards along the mainline, which leaves the
+            # sorting and numbering of its ancestry untouched.
+            return nodes[index:]
+    parent_map = find_new_ancestry(repository, tip_revision_id, nodes)
+    if parent_map is None:
+        return None
+    return extend_merge_sort(nodes, tip_revision_id, parent_map)
+
+
+def find_new_ancestry(repository, tip_revision_id, nodes):
+    """Find the revisions that a tip adds on top of cached nodes.
+
+    Args:
+      repository: The repository to read parents from.
+      tip_revision_id: The new tip.
+      nodes: The merge sorted nodes of the old tip.
+    Returns: A parent map of the revisions in the ancestry of
+        tip_revision_id but not in nodes, or None if the old tip is not a
+        left hand ancestor of the new tip.
+    """
+    known = {node[0] for node in nodes}
+    graph = repository.get_graph()
+    mainline = []
+    try:
+        for revision_id in graph.iter_lefthand_ancestry(tip_revision_id):
+            if revision_id in known:
+                if revision_id != nodes[0][0]:
+                    return None
+                break
+            mainline.append(revision_id)
+        else:
+            return None
+    except vcsgraph.errors.RevisionNotPresent:
+        return None
+    parent_map = {}
+    pending = set(mainline)
+    while pending:
+        this_parent_map = graph.get_parent_map(pending)
+        pending = set()
+        for revision_id, parents in this_parent_map.items():
+            if parents == (_mod_revision.NULL_REVISION,):
+                parents = ()
+            parent_map[revision_id] = parents
+            pending.update(parents)
+        pending.difference_update(known)
+        pending.difference_update(parent_map)
+        pending.discard(_mod_revision.NULL_REVISION)
+    return parent_map
+
+
+def extend_merge_sort(nodes, tip_revision_id, parent_map):
+    """Merge sort a tip on top of the merge sorted ancestry of an old tip.
+
+    This gives the same result as ``KnownGraph.merge_sort`` over the full
+    ancestry of tip_revision_id, but only visits the new revisions.
+
+    Args:
+      nodes: The merge sorted nodes of a left hand ancestor of the tip.
+      tip_revision_id: The new tip.
+      parent_map: The parents of every revision in the ancestry of
+        tip_revision_id that is not in nodes, as returned by
+        find_new_ancestry(). Parents that are in neither are ghosts.
+    Returns: The merge sorted nodes for tip_revision_id.
+    """
+    revnos = {}
+    used_revnos = set()
+    branch_counts = {}
+    for revision_id, _merge_depth, revno, _end_of_merge in nodes:
+        revnos[revision_id] = revno
+        used_revnos.add(revno)
+        if len(revno) == 1:
+            if revno == (1,):
+                branch_counts.setdefault(0, 0)
+        else:
+            branch_counts[revno[0]] = max(branch_counts.get(revno[0], 0), revno[1])
+    # Revisions that have already handed out their first child revno, on top
+    # of the cached ones whose successor revno is in use.
+    claimed = set()
+
+    def claim_first_child(parent):
+        if parent in claimed:
+            return False
+        claimed.add(parent)
+        revno = revnos.get(parent)
+        if revno is None:
+            return True
+        return revno[:-1] + (revno[-1] + 1,) not in used_revnos
+
+    def push(revision_id, merge_depth):
+        parents = parent_map[revision_id]
+        first_child = None
+        if parents and (parents[0] in parent_map or parents[0] in revnos):
+            first_child = claim_first_child(parents[0])
+        stack.append((revision_id, merge_depth, list(parents), first_child))
+        on_stack.add(revision_id)
+
+    # Each stack entry is (revision_id, merge_depth, pending_parents,
+    # first_child); the left hand parent is always visited first.
+    stack = []
+    on_stack = set()
+    scheduled = []
+    push(tip_revision_id, 0)
+    left_pushed = set()
+    while stack:
+        revision_id, merge_depth, pending_parents, first_child = stack[-1]
+        while pending_parents:
+            if revision_id not in left_pushed:
+                left_pushed.add(revision_id)
+                next_revision_id = pending_parents.pop(0)
+                next_merge_depth = merge_depth
+            else:
+                # Merged parents are visited right to left, so they come
+                # out left to right.
+                next_revision_id = pending_parents.pop()
+                next_merge_depth = merge_depth + 1
+            if next_revision_id in revnos or next_revision_id not in parent_map:
+                # Already numbered, or a ghost.
+                continue
+            if next_revision_id in on_stack:
+                raise vcsgraph.errors.GraphCycleError(on_stack)
+            push(next_revision_id, next_merge_depth)
+            break
+        else:
+            stack.pop()
+            on_stack.discard(revision_id)
+            parents = parent_map[revision_id]
+            parent_revno = revnos.get(parents[0]) if parents else None
+            if parent_revno is None:
+                root_count = branch_counts.get(0, -1) + 1
+                branch_counts[0] = root_count
+                revno = (0, root_count, 1) if root_count else (1,)
+            elif first_child:
+                revno = parent_revno[:-1] + (parent_revno[-1] + 1,)
+            else:
+                branch_count = branch_counts.get(parent_revno[0], 0) + 1
+                branch_counts[parent_revno[0]] = branch_count
+                revno = (parent_revno[0], branch_count, 1)
+            revnos[revision_id] = revno
+            scheduled.append((revision_id, merge_depth, revno))
+    result = []
+    following = nodes[0] if nodes else None
+    for revision_id, merge_depth, revno in scheduled:
+        if following is None or following[1] < merge_depth:
+            end_of_merge = True
+        elif following[1] == merge_depth and (
+            following[0] not in parent_map[revision_id]
+        ):
+            end_of_merge = True
+        else:
+            end_of_merge = False
+        following = (revision_id, merge_depth, revno, end_of_merge)
+        result.append(following)
+    result.reverse()
+    result.extend(nodes)
+    return result
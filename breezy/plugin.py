@@ -261,9 +261,24 @@ def _install_importer_if_needed(plugin_details):
 
 
 def _load_plugins(state, paths):
-    """Do the importing all plugins from paths."""
+    """Do the importing all plugins from paths.
+
+    Plugins that the plugin manifest knows to only register things lazily
+    are not imported; their registrations are replayed instead, and their
+    names recorded in state.deferred_plugins.
+    """
+    from . import plugin_manifest
+
+    manifest = plugin_manifest.read_manifest(paths, _MODULE_PREFIX)
+    if manifest is None:
+        candidates = list(_iter_possible_plugins(paths))
+        deferrable = None
+        recorded = {}
+    else:
+        candidates, deferrable = manifest
+    state.deferred_plugins = {}
     imported_names = set()
-    for name, path in _iter_possible_plugins(paths):
+    for name, path in candidates:
         if name not in imported_names:
             if not valid_plugin_name(name):
                 sanitised_name = sanitise_plugin_name(name)
@@ -273,10 +288,107 @@ def _load_plugins(state, paths):
                     f"it to {sanitised_name!r}."
                 )
                 continue
-            msg = _load_plugin_module(name, path)
+            if deferrable is None:
+                msg, registrations = _record_plugin_module(name, path)
+                if registrations is not None:
+                    recorded[name] = registrations
+            elif name in deferrable and _defer_plugin_module(name, deferrable[name]):
+                state.deferred_plugins[name] = path
+                msg = None
+            else:
+                msg = _load_plugin_module(name, path)
             if msg is not None:
                 state.plugin_warnings.setdefault(name, []).append(msg)
             imported_names.add(name)
+    if deferrable is None:
+        plugin_manifest.write_manifest(paths, _MODULE_PREFIX, candidates, recorded)
+    elif state.deferred_plugins:
+        sys.meta_path.insert(
+            0,
+            plugin_manifest.DeferredPluginFinder(
+                _MODULE_PREFIX,
+                {name: deferrable[name] for name in state.deferred_plugins},
+            ),
+        )
+
+
+def _get_plugin_file(name, path):
+    """Get the file that defines the plugin name found at path, or None."""
+    if os.path.isfile(path):
+        return path
+    if os.path.basename(path) == name:
+        init_path = _get_package_init(path)
+        if init_path is not None:
+            return init_path
+    for ext in (".py", COMPILED_EXT):
+        module_path = osutils.pathjoin(path, name + ext)
+        if os.path.isfile(module_path):
+            return module_path
+    return None
+
+
+def _record_plugin_module(name, path):
+    """Load a plugin, recording what it registers for the plugin manifest.
+
+    Returns: A tuple with the warning from _load_plugin_module(), and
+        either None if the plugin has to be imported at startup, or a tuple
+        with the file that defines the plugin and its registrations.
+    """
+    from . import plugin_manifest
+
+    with plugin_manifest.Registrations(
+        _MODULE_PREFIX + name, _MODULE_PREFIX
+    ) as registrations:
+        msg = _load_plugin_module(name, path)
+    if msg is not None or not registrations.replayable or not registrations.entries:
+        return msg, None
+    filename = _get_plugin_file(name, path)
+    if filename is None or not filename.endswith(".py"):
+        return msg, None
+    try:
+        with open(filename, "rb") as f:
+            source = f.read()
+    except OSError:
+        return msg, None
+    if not plugin_manifest.registers_lazily_only(source):
+        return msg, None
+    return msg, (filename, registrations.entries)
+
+
+def _defer_plugin_module(name, registrations):
+    """Make the registrations of a plugin without importing it.
+
+    Returns: True if the plugin was deferred.
+    """
+    from . import plugin_manifest
+
+    if _MODULE_PREFIX + name in sys.modules:
+        # Already loaded, or blocked.
+        return False
+    return plugin_manifest.replay(registrations)
+
+
+def load_deferred_plugins(state=None):
+    """Import the plugins whose loading was deferred.
+
+    Plugins that only register things lazily are not imported at startup;
+    see breezy.plugin_manifest. This imports them, for callers that need
+    all plugin modules.
+
+    Args:
+      state: The library state object that records loaded plugins.
+    """
+    if state is None:
+        state = breezy.get_global_state()
+    deferred = getattr(state, "deferred_plugins", None)
+    if not deferred:
+        return
+    state.deferred_plugins = {}
+    for name, path in deferred.items():
+        msg = _load_plugin_module(name, path)
+        if msg is not None:
+            state.plugin_warnings.setdefault(name, []).append(msg)
+    state.plugins = plugins()
 
 
 def _block_plugins(names):
@@ -344,6 +456,7 @@ def describe_plugins(show_paths=False, state=None):
     """
     if state is None:
         state = breezy.get_global_state()
+    load_deferred_plugins(state)
     loaded_plugins = getattr(state, "plugins", {})
     plugin_warnings = set(getattr(state, "plugin_warnings", []))
     all_names = sorted(set(loaded_plugins.keys()).union(plugin_warnings))
@@ -504,6 +617,7 @@ def format_concise_plugin_list(state=None):
     """Return a string holding a concise list of plugins and their version."""
     if state is None:
         state = breezy.get_global_state()
+    load_deferred_plugins(state)
     items = []
     for name, a_plugin in sorted(getattr(state, "plugins", {}).items()):
         items.append(f"{name}[{a_plugin.__version__}]")
@@ -533,6 +647,8 @@ class PluginsHelpIndex:
             return []
         if topic.startswith(self.prefix):
             topic = topic[len(self.prefix) :]
+        if topic in getattr(breezy.get_global_state(), "deferred_plugins", {}):
+            load_deferred_plugins()
         plugin_module_name = _MODULE_PREFIX + topic
         try:
             module = sys.modules[plugin_module_name]
@@ -0,0 +1,601 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""A cache of the lazy registrations made by plugins.
+
+Importing every plugin is a large part of the time brz takes to start. Most
+plugins do little more on import than register commands, options, formats
+and hooks lazily, pointing at modules that are only imported when the
+registered object is used.
+
+The plugin manifest records those registrations the first time the plugins
+are loaded. Later runs replay them instead of importing the plugin, which
+is then imported by the first use of anything it registered, or by
+breezy.plugin.load_deferred_plugins() for callers that need the module.
+
+Only plugins whose top level code is known to do nothing but lazy
+registrations are deferred; see registers_lazily_only(). The manifest is
+kept in the cache directory and is invalidated when the plugin search path,
+a plugin directory or the file defining a deferred plugin changes.
+"""
+
+import importlib
+import json
+import os
+import sys
+
+import breezy
+
+from . import hooks, trace
+from . import registry as _mod_registry
+
+MANIFEST_NAME = "plugin-manifest.json"
+
+# Version of the manifest format; manifests with another version are ignored.
+_FORMAT = 1
+
+# Functions that register an object lazily, and that plugins may call at the
+# top level without losing the ability to be deferred.
+_LAZY_REGISTRATION_FUNCTIONS = ("register_lazy", "install_lazy_named_hook")
+
+
+def manifest_path():
+    """Return the path of the plugin manifest."""
+    from .bedding import cache_dir
+
+    return os.path.join(cache_dir(), MANIFEST_NAME)
+
+
+def _stat_key(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+def _manifest_key(paths, prefix):
+    return {
+        "version": breezy.__version__,
+        "prefix": prefix,
+        "paths": list(paths),
+        "blocked": list(getattr(paths, "blocked_names", [])),
+        "extra": [list(detail) for detail in getattr(paths, "extra_details", [])],
+    }
+
+
+def read_manifest(paths, prefix, path=None):
+    """Read the plugin manifest for a plugin search path.
+
+    Args:
+      paths: The plugin search path, as returned by plugin.extend_path().
+      prefix: The module prefix plugins are imported under.
+      path: Path of the manifest; defaults to manifest_path().
+    Returns: A tuple with the list of (name, path) of the possible plugins,
+        in the order they were found, and a dictionary mapping the names of
+        the plugins that can be deferred to their registrations; or None if
+        there is no valid manifest for paths.
+    """
+    if path is None:
+        path = manifest_path()
+    try:
+        with open(path, "rb") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    try:
+        if manifest["format"] != _FORMAT:
+            return None
+        if manifest["key"] != _manifest_key(paths, prefix):
+            return None
+        for stat_path, stat in manifest["stats"].items():
+            if _stat_key(stat_path) != stat:
+                return None
+        candidates = [(name, plugin_path) for name, plugin_path in manifest["plugins"]]
+        deferred = {
+            name: details["registrations"]
+            for name, details in manifest["deferred"].items()
+        }
+    except (KeyError, TypeError, ValueError):
+        trace.mutter("ignoring invalid plugin manifest %s", path)
+        return None
+    return candidates, deferred
+
+
+def write_manifest(paths, prefix, candidates, deferred, path=None):
+    """Write the plugin manifest for a plugin search path.
+
+    Failing to write the manifest is not an error; plugins are then loaded
+    the slow way next time as well.
+
+    Args:
+      paths: The plugin search path, as returned by plugin.extend_path().
+      prefix: The module prefix plugins are imported under.
+      candidates: List of (name, path) of the possible plugins.
+      deferred: Dictionary mapping the names of the plugins that can be
+        deferred to a tuple with the file that defines the plugin and its
+        registrations.
+      path: Path of the manifest; defaults to manifest_path().
+    """
+    if path is None:
+        path = manifest_path()
+    stats = {search_path: _stat_key(search_path) for search_path in paths}
+    for filename, _registrations in deferred.values():
+        stats[filename] = _stat_key(filename)
+    manifest = {
+        "format": _FORMAT,
+        "key": _manifest_key(paths, prefix),
+        "stats": stats,
+        "plugins": [[name, plugin_path] for name, plugin_path in candidates],
+        "deferred": {
+            name: {"file": filename, "registrations": registrations}
+            for name, (filename, registrations) in deferred.items()
+        },
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        trace.mutter("unable to write plugin manifest %s: %s", path, e)
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
+
+def _runs_calls(node):
+    """Check whether evaluating node may call anything.
+
+    Function bodies are not evaluated when the function is defined, so only
+    their decorators, defaults and annotations are looked at.
+    """
+    import ast
+
+    if isinstance(node, ast.Call):
+        return True
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+        if node.decorator_list:
+            return True
+        if isinstance(node, ast.ClassDef):
+            children = node.bases + node.keywords + node.body
+        else:
+            children = [node.args]
+            if node.returns is not None:
+                children.append(node.returns)
+        return any(_runs_calls(child) for child in children)
+    if isinstance(node, ast.Lambda):
+        return _runs_calls(node.args)
+    return any(_runs_calls(child) for child in ast.iter_child_nodes(node))
+
+
+class _LazyRegistrationChecker:
+    """Checks the top level code of a plugin for registrations only."""
+
+    def __init__(self, tree):
+        import ast
+
+        self.functions = {
+            node.name: node for node in tree.body if isinstance(node, ast.FunctionDef)
+        }
+        self._checking = set()
+
+    def check_statements(self, statements):
+        return all(self.check_statement(statement) for statement in statements)
+
+    def check_statement(self, node):
+        import ast
+
+        if isinstance(node, ast.Expr):
+            if isinstance(node.value, ast.Constant):
+                # Docstrings
+                return True
+            return isinstance(node.value, ast.Call) and self.check_call(node.value)
+        if isinstance(node, ast.Import):
+            return True
+        if isinstance(node, ast.ImportFrom):
+            # Relative imports from within the plugin may run arbitrary code
+            # in the plugin.
+            return node.level == 0 or node.level >= 3
+        if isinstance(node, ast.For):
+            return (
+                not node.orelse
+                and isinstance(node.iter, (ast.List, ast.Tuple))
+                and not _runs_calls(node.iter)
+                and self.check_statements(node.body)
+            )
+        if isinstance(node, ast.Assign) and all(
+            isinstance(target, ast.Name)
+            and (
+                (target.id.startswith("__") and target.id.endswith("__"))
+                or target.id == "version_info"
+            )
+            for target in node.targets
+        ):
+            # Module metadata such as __version__
+            return True
+        if isinstance(
+            node,
+            (
+                ast.Assign,
+                ast.AnnAssign,
+                ast.FunctionDef,
+                ast.AsyncFunctionDef,
+                ast.ClassDef,
+                ast.Pass,
+            ),
+        ):
+            return not _runs_calls(node)
+        return False
+
+    def check_call(self, call):
+        import ast
+
+        if any(_runs_calls(arg) for arg in call.args + call.keywords):
+            return False
+        func = call.func
+        if isinstance(func, ast.Attribute):
+            return func.attr in _LAZY_REGISTRATION_FUNCTIONS
+        if not isinstance(func, ast.Name):
+            return False
+        if func.id in _LAZY_REGISTRATION_FUNCTIONS:
+            return True
+        function = self.functions.get(func.id)
+        if function is None or func.id in self._checking:
+            return False
+        self._checking.add(func.id)
+        try:
+            return self.check_statements(function.body)
+        finally:
+            self._checking.discard(func.id)
+
+
+def registers_lazily_only(source):
+    """Check whether the top level code of a plugin only registers lazily.
+
+    This is deliberately conservative: besides imports from outside the
+    plugin and definitions that run no code, the only calls allowed are to
+    register_lazy() and install_lazy_named_hook(), directly, from loops
+    over literal values or from functions in the plugin that do no more.
+
+    Args:
+      source: The source code of the plugin module.
+    Returns: True if importing the plugin has no other effects.
+    """
+    import ast
+
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return False
+    return _LazyRegistrationChecker(tree).check_statements(tree.body)
+
+
+def _json_roundtrips(value):
+    try:
+        return json.loads(json.dumps(value)) == value
+    except (TypeError, ValueError):
+        return False
+
+
+# The stack of Registrations that are intercepting calls.
+_active = []
+
+# The functions replaced while registrations are intercepted, as a list of
+# (owner, name, original) tuples.
+_patched = []
+
+
+def _intercepting(frame):
+    """Return the Registrations intercepting calls made from frame, if any."""
+    module_name = frame.f_globals.get("__name__", "")
+    for registrations in reversed(_active):
+        if module_name == registrations.package_name or module_name.startswith(
+            registrations.package_name + "."
+        ):
+            return registrations
+    return None
+
+
+def _wrap_register_lazy(original):
+    def register_lazy(self, *args, **kwargs):
+        registrations = _intercepting(sys._getframe(1))
+        if registrations is not None and not registrations.registry_call(
+            self, args, kwargs
+        ):
+            return None
+        return original(self, *args, **kwargs)
+
+    register_lazy.__doc__ = original.__doc__
+    return register_lazy
+
+
+def _wrap_install_lazy_named_hook(original):
+    def install_lazy_named_hook(
+        hookpoints_module, hookpoints_name, hook_name, a_callable, name
+    ):
+        registrations = _intercepting(sys._getframe(1))
+        if registrations is not None and not registrations.hook_call(
+            [hookpoints_module, hookpoints_name, hook_name], a_callable, name
+        ):
+            return None
+        return original(hookpoints_module, hookpoints_name, hook_name, a_callable, name)
+
+    install_lazy_named_hook.__doc__ = original.__doc__
+    return install_lazy_named_hook
+
+
+def _iter_registry_classes():
+    pending = [_mod_registry.Registry]
+    seen = set()
+    while pending:
+        cls = pending.pop()
+        if cls in seen:
+            continue
+        seen.add(cls)
+        if "register_lazy" in vars(cls):
+            yield cls
+        pending.extend(cls.__subclasses__())
+
+
+def _patch():
+    for cls in _iter_registry_classes():
+        original = vars(cls)["register_lazy"]
+        _patched.append((cls, "register_lazy", original))
+        cls.register_lazy = _wrap_register_lazy(original)
+    original = hooks.install_lazy_named_hook
+    _patched.append((hooks, "install_lazy_named_hook", original))
+    hooks.install_lazy_named_hook = _wrap_install_lazy_named_hook(original)
+
+
+def _unpatch():
+    while _patched:
+        owner, name, original = _patched.pop()
+        setattr(owner, name, original)
+
+
+class Registrations:
+    """The lazy registrations made while importing a plugin.
+
+    While used as a context manager, calls to register_lazy() and
+    install_lazy_named_hook() made by the modules of the plugin are
+    intercepted. When recording, they are collected in a form that can be
+    stored in the manifest and replayed. When replayed registrations are
+    given, the calls that match them are skipped instead, as they have
+    already been made.
+
+    Attributes:
+      entries: The registrations recorded.
+      replayable: Whether all of the registrations can be replayed.
+    """
+
+    def __init__(self, package_name, prefix, replayed=None):
+        """Create a Registrations.
+
+        Args:
+          package_name: Name of the plugin module.
+          prefix: The module prefix plugins are imported under. Registries
+            are not looked up in plugin modules.
+          replayed: Registrations of the plugin that have been replayed.
+        """
+        self.package_name = package_name
+        self.prefix = prefix
+        self.entries = []
+        self.replayable = True
+        self._registry_names = {}
+        if replayed is None:
+            self._replayed = None
+        else:
+            self._replayed = [
+                (self._resolve_registry(entry), entry) for entry in replayed
+            ]
+
+    def __enter__(self):
+        """Start intercepting the registrations of the plugin."""
+        if not _active:
+            _patch()
+        _active.append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        """Stop intercepting the registrations of the plugin."""
+        _active.remove(self)
+        if not _active:
+            _unpatch()
+        return False
+
+    @staticmethod
+    def _resolve_registry(entry):
+        if "registry" not in entry:
+            return None
+        module_name, attribute = entry["registry"]
+        return getattr(sys.modules.get(module_name), attribute, None)
+
+    def _find_registry(self, registry):
+        """Find the module attribute that holds registry.
+
+        Returns: A [module_name, attribute] list, or None.
+        """
+        key = id(registry)
+        if key in self._registry_names:
+            return self._registry_names[key]
+        found = None
+        for module_name in sorted(sys.modules):
+            module = sys.modules[module_name]
+            if module is None or not (
+                module_name == "breezy" or module_name.startswith("breezy.")
+            ):
+                continue
+            if module_name.startswith((self.prefix, "breezy.plugins.")):
+                continue
+            for attribute, value in list(vars(module).items()):
+                if value is registry:
+                    found = [module_name, attribute]
+                    break
+            if found is not None:
+                break
+        self._registry_names[key] = found
+        return found
+
+    def _skip_replayed(self, matches):
+        for i, (registry, entry) in enumerate(self._replayed):
+            if matches(registry, entry):
+                del self._replayed[i]
+                return True
+        return False
+
+    def registry_call(self, registry, args, kwargs):
+        """Handle a call to registry.register_lazy().
+
+        Returns: Whether the call should go ahead.
+        """
+        args = list(args)
+        if self._replayed is not None:
+            return not self._skip_replayed(
+                lambda replayed, entry: (
+                    replayed is registry
+                    and entry["args"] == args
+                    and entry["kwargs"] == kwargs
+                )
+            )
+        location = None
+        if _json_roundtrips(args) and _json_roundtrips(kwargs):
+            location = self._find_registry(registry)
+        if location is None:
+            self.replayable = False
+        else:
+            self.entries.append({"registry": location, "args": args, "kwargs": kwargs})
+        return True
+
+    def hook_call(self, hook, a_callable, label):
+        """Handle a call to hooks.install_lazy_named_hook().
+
+        Returns: Whether the call should go ahead.
+        """
+        module_name = getattr(a_callable, "__module__", None)
+        member_name = getattr(a_callable, "__qualname__", "")
+        entry = {"hook": hook, "callable": [module_name, member_name], "label": label}
+        if self._replayed is not None:
+            return not self._skip_replayed(lambda replayed, other: other == entry)
+        if (
+            module_name is not None
+            and (
+                module_name == self.package_name
+                or module_name.startswith(self.package_name + ".")
+            )
+            and "." not in member_name
+            and getattr(sys.modules.get(module_name), member_name, None) is a_callable
+            and _json_roundtrips(entry)
+        ):
+            self.entries.append(entry)
+        else:
+            self.replayable = False
+        return True
+
+
+def replay(registrations):
+    """Make the registrations of a plugin without importing it.
+
+    Args:
+      registrations: The registrations, as recorded by Registrations.
+    Returns: True if the registrations were made, False if they can not be
+        replayed any more, in which case none of them were made.
+    """
+    calls = []
+    try:
+        for entry in registrations:
+            if "registry" in entry:
+                module_name, attribute = entry["registry"]
+                registry = getattr(importlib.import_module(module_name), attribute)
+                calls.append((registry.register_lazy, entry["args"], entry["kwargs"]))
+            else:
+                calls.append((_install_lazy_hook, entry["hook"], entry))
+    except (ImportError, AttributeError, KeyError, ValueError) as e:
+        trace.mutter("unable to replay plugin registrations: %s", e)
+        return False
+    for func, args, kwargs in calls:
+        if func is _install_lazy_hook:
+            func(args, kwargs["callable"], kwargs["label"])
+        else:
+            func(*args, **kwargs)
+    return True
+
+
+def _install_lazy_hook(hook, callable_name, label):
+    getter = _mod_registry._LazyObjectGetter(*callable_name)
+    hooks._lazy_hooks.setdefault(tuple(hook), []).append((getter, label))
+
+
+class _ReplayedLoader:
+    """Loader that imports a plugin whose registrations were replayed."""
+
+    def __init__(self, loader, prefix, registrations):
+        self._loader = loader
+        self._prefix = prefix
+        self._registrations = registrations
+
+    def __getattr__(self, name):
+        return getattr(self._loader, name)
+
+    def create_module(self, spec):
+        return self._loader.create_module(spec)
+
+    def exec_module(self, module):
+        with Registrations(module.__name__, self._prefix, replayed=self._registrations):
+            self._loader.exec_module(module)
+
+
+class DeferredPluginFinder:
+    """Meta path finder for plugins whose registrations were replayed.
+
+    The plugins are found by the other finders; their loader is wrapped so
+    that the registrations are not made a second time.
+    """
+
+    def __init__(self, prefix, deferred):
+        """Create a DeferredPluginFinder.
+
+        Args:
+          prefix: The module prefix plugins are imported under.
+          deferred: Dictionary mapping the names of the deferred plugins to
+            their replayed registrations.
+        """
+        self.prefix = prefix
+        self.deferred = {prefix + name: entries for name, entries in deferred.items()}
+
+    def __repr__(self):
+        """Return a string representation of the finder."""
+        return f"<{self.__class__.__name__} {self.prefix!r}>"
+
+    def find_spec(self, fullname, paths, target=None):
+        """Find the spec of a deferred plugin."""
+        registrations = self.deferred.pop(fullname, None)
+        if registrations is None:
+            return None
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, "find_spec", None)
+            if finder is self or find_spec is None:
+                continue
+            spec = find_spec(fullname, paths, target)
+            if spec is not None:
+                break
+        else:
+            return None
+        if spec.loader is not None:
+            spec.loader = _ReplayedLoader(spec.loader, self.prefix, registrations)
+        return spec
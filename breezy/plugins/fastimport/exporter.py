@@ -66,6 +66,10 @@ from fastimport import commands
 
 REVISIONS_CHUNK_SIZE = 1000
 
+# The maximum number of exported blobs to remember the marks of, so that
+# identical contents can be referred to rather than exported again.
+MAX_BLOB_MARKS = 100000
+
 
 def _get_output_stream(destination):
     """Get the appropriate output stream for the given destination.
@@ -187,6 +191,8 @@ class BzrFastExporter:
         baseline: Whether to export a baseline of the first revision.
         verbose: Whether to output verbose progress information.
         revid_to_mark: Mapping from Bazaar revision IDs to git marks.
+        blob_marks: LRU cache mapping file content verifiers to the marks of
+            the blobs exported for them.
         branch_names: Mapping of branch names.
         tree_cache: LRU cache for revision trees.
     """
@@ -247,11 +253,18 @@ class BzrFastExporter:
 
         # Load the marks and initialise things accordingly
         self.revid_to_mark = {}
+        self.blob_marks = lru_cache.LRUCache(max_cache=MAX_BLOB_MARKS)
+        self._mark_count = 0
+        self._pending_blobs = []
         self.branch_names = {}
         if self.import_marks_file:
             marks_info = marks_file.import_marks(self.import_marks_file)
             if marks_info is not None:
-                self.revid_to_mark = {r: m for m, r in marks_info.items()}
+                revision_ids, blobs = marks_file.split_blob_marks(marks_info)
+                self.revid_to_mark = {r: m for m, r in revision_ids.items()}
+                for verifier, mark in blobs:
+                    self.blob_marks[verifier] = mark
+                self._mark_count = max((int(m) for m in marks_info), default=0)
                 # These are no longer included in the marks file
                 # self.branch_names = marks_info[1]
 
@@ -303,7 +316,8 @@ class BzrFastExporter:
         """Emit commit commands for all interesting revisions.
 
         Processes revisions in chunks for better performance, first preprocessing
-        them to determine required trees, then emitting the actual commit commands.
+        them to determine required trees, then emitting the blobs for the
+        new file contents in the chunk and finally the commit commands.
 
         Args:
             interesting: List of revision IDs to emit commits for.
@@ -316,21 +330,29 @@ class BzrFastExporter:
             history = dict(self.branch.repository.iter_revisions(chunk))
             trees_needed = set()
             trees = {}
+            to_emit = []
             for revid in chunk:
-                trees_needed.update(
-                    self.preprocess_commit(revid, history[revid], self.ref)
-                )
+                needed = self.preprocess_commit(revid, history[revid], self.ref)
+                if needed:
+                    trees_needed.update(needed)
+                    to_emit.append(revid)
 
             for tree in self._get_revision_trees(trees_needed):
                 trees[tree.get_revision_id()] = tree
 
-            for revid in chunk:
+            commits = []
+            for revid in to_emit:
                 revobj = history[revid]
                 if len(revobj.parent_ids) == 0:
                     parent = breezy.revision.NULL_REVISION
                 else:
                     parent = revobj.parent_ids[0]
-                self.emit_commit(revobj, self.ref, trees[parent], trees[revid])
+                file_cmds = list(self._get_filecommands(trees[parent], trees[revid]))
+                commits.append((revobj, trees[parent], trees[revid], file_cmds))
+            # Retrieve the texts for all commits in the chunk at once.
+            self._emit_blobs()
+            for revobj, tree_old, tree_new, file_cmds in commits:
+                self.emit_commit(revobj, self.ref, tree_old, tree_new, file_cmds)
 
     def run(self):
         """Execute the export process.
@@ -429,6 +451,9 @@ class BzrFastExporter:
         """
         if self.export_marks_file:
             revision_ids = {m: r for r, m in self.revid_to_mark.items()}
+            # LRUCache.items() returns a dict with a snapshot of the cache.
+            for verifier, mark in dict(self.blob_marks.items()).items():
+                revision_ids[mark] = marks_file.blob_mark_value(verifier)
             marks_file.export_marks(self.export_marks_file, revision_ids)
 
     def is_empty_dir(self, tree, path):
@@ -473,11 +498,12 @@ class BzrFastExporter:
             ref: The git reference to reset and commit to.
         """
         # Emit a full source tree of the first commit's parent
-        mark = 1
-        self.revid_to_mark[revobj.revision_id] = b"%d" % mark
+        mark = self._new_mark()
+        self.revid_to_mark[revobj.revision_id] = mark
         tree_old = self.branch.repository.revision_tree(breezy.revision.NULL_REVISION)
         [tree_new] = list(self._get_revision_trees([revobj.revision_id]))
-        file_cmds = self._get_filecommands(tree_old, tree_new)
+        file_cmds = list(self._get_filecommands(tree_old, tree_new))
+        self._emit_blobs()
         self.print_cmd(commands.ResetCommand(ref, None))
         self.print_cmd(self._get_commit_command(ref, mark, revobj, file_cmds))
 
@@ -512,10 +538,15 @@ class BzrFastExporter:
             parent = revobj.parent_ids[0]
 
         # Print the commit
-        self.revid_to_mark[revobj.revision_id] = b"%d" % (len(self.revid_to_mark) + 1)
+        self.revid_to_mark[revobj.revision_id] = self._new_mark()
         return [parent, revobj.revision_id]
 
-    def emit_commit(self, revobj, ref, tree_old, tree_new):
+    def _new_mark(self):
+        """Allocate a mark for a commit or blob."""
+        self._mark_count += 1
+        return b"%d" % self._mark_count
+
+    def emit_commit(self, revobj, ref, tree_old, tree_new, file_cmds=None):
         """Emit a commit command with file changes.
 
         Generates and outputs a commit command including all file modifications,
@@ -526,13 +557,19 @@ class BzrFastExporter:
             ref: The git reference for this commit.
             tree_old: The tree of the parent revision.
             tree_new: The tree of the current revision.
+            file_cmds: The file commands for the commit, as returned by
+                _get_filecommands, if the blobs they refer to have already
+                been emitted.
         """
+        if file_cmds is None:
+            file_cmds = list(self._get_filecommands(tree_old, tree_new))
+            self._emit_blobs()
+
         # For parentless commits we need to issue reset command first, otherwise
         # git-fast-import will assume previous commit was this one's parent
         if tree_old.get_revision_id() == breezy.revision.NULL_REVISION:
             self.print_cmd(commands.ResetCommand(ref, None))
 
-        file_cmds = self._get_filecommands(tree_old, tree_new)
         mark = self.revid_to_mark[revobj.revision_id]
         self.print_cmd(self._get_commit_command(ref, mark, revobj, file_cmds))
 
@@ -695,6 +732,10 @@ class BzrFastExporter:
         changes including additions, modifications, deletions, renames, and
         kind changes.
 
+        File contents are referred to by the mark of a blob. Contents that
+        have not been exported before are queued for _emit_blobs, which
+        has to be called before the commands are printed.
+
         Args:
             tree_old: The old tree to compare from.
             tree_new: The new tree to compare to.
@@ -717,7 +758,9 @@ class BzrFastExporter:
 
         # Map kind changes to a delete followed by an add
         for change in changes.kind_changed:
-            path = self._adjust_path_for_renames(
+            # Only called for the notes it emits; the adjusted path is not
+            # needed unless the delete below is restored.
+            self._adjust_path_for_renames(
                 change.path[0], renamed, tree_new.get_revision_id()
             )
             # IGC: I don't understand why a delete is needed here.
@@ -727,16 +770,15 @@ class BzrFastExporter:
             my_modified.append(change)
 
         # Record modifications
-        files_to_get = []
+        file_modifies = []
         for change in changes.added + changes.copied + my_modified + rd_modifies:
             if change.kind[1] == "file":
-                files_to_get.append(
-                    (
-                        change.path[1],
-                        (
-                            change.path[1],
-                            helpers.kind_to_mode("file", change.executable[1]),
-                        ),
+                file_modifies.append(
+                    commands.FileModifyCommand(
+                        change.path[1].encode("utf-8"),
+                        helpers.kind_to_mode("file", change.executable[1]),
+                        b":%s" % self._get_blob_mark(tree_new, change.path[1]),
+                        None,
                     )
                 )
             elif change.kind[1] == "symlink":
@@ -759,12 +801,39 @@ class BzrFastExporter:
                     f"cannot export '{change.path[1]}' of kind {change.kind[1]} yet - ignoring"
                 )
 
-        # TODO(jelmer): Improve performance on remote repositories
-        # by using Repository.iter_files_bytes for bzr repositories here.
-        for (path, mode), chunks in tree_new.iter_files_bytes(files_to_get):
-            yield commands.FileModifyCommand(
-                path.encode("utf-8"), mode, None, b"".join(chunks)
+        yield from file_modifies
+
+    def _get_blob_mark(self, tree, path):
+        """Get the mark of the blob with the contents of a file.
+
+        Args:
+            tree: The tree containing the file.
+            path: The path of the file in tree.
+
+        Returns:
+            bytes: The mark of the blob. If the contents have not been
+                exported yet, they are queued for _emit_blobs.
+        """
+        verifier = tree.get_file_verifier(path)
+        mark = self.blob_marks.get(verifier)
+        if mark is None:
+            mark = self._new_mark()
+            self.blob_marks[verifier] = mark
+            self._pending_blobs.append(
+                (tree.path2id(path), tree.get_file_revision(path), mark)
             )
+        return mark
+
+    def _emit_blobs(self):
+        """Emit blob commands for the queued file contents.
+
+        The texts are retrieved with a single call to
+        Repository.iter_files_bytes.
+        """
+        pending = self._pending_blobs
+        self._pending_blobs = []
+        for mark, chunks in self.branch.repository.iter_files_bytes(pending):
+            self.print_cmd(commands.BlobCommand(mark, b"".join(chunks)))
 
     def _process_renames_and_deletes(self, renames, deletes, revision_id, tree_old):
         """Process renames and deletes in the correct order.
@@ -77,3 +77,36 @@ def export_marks(filename, revision_ids):
             f.write(b":%s %s\n" % (mark.lstrip(b":"), revid))
     finally:
         f.close()
+
+
+def blob_mark_value(verifier):
+    """Return the marks file value for a blob.
+
+    Revision ids can not contain spaces, so blob values can not be mistaken
+    for them.
+
+    :param verifier: (kind, data) tuple identifying the blob contents, as
+        returned by Tree.get_file_verifier
+    """
+    kind, data = verifier
+    return b"blob %s %s" % (kind.encode("ascii"), data)
+
+
+def split_blob_marks(marks):
+    """Separate the blob marks from the revision marks.
+
+    :param marks: dictionary mapping marks to values, as returned by
+        import_marks
+    :return: tuple with a dictionary mapping marks to revision ids and a list
+        of (verifier, mark) tuples for blobs, ordered by mark
+    """
+    revision_ids = {}
+    blobs = []
+    for mark, value in marks.items():
+        if value.startswith(b"blob "):
+            _, kind, data = value.split(b" ", 2)
+            blobs.append(((kind.decode("ascii"), data), mark))
+        else:
+            revision_ids[mark] = value
+    blobs.sort(key=lambda blob: int(blob[1]))
+    return revision_ids, blobs
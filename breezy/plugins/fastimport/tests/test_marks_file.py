@@ -55,3 +55,20 @@ class TestMarksFile(tests.TestCaseWithTransport):
 """,
             "marks",
         )
+
+    def test_blob_marks(self):
+        marks_file.export_marks(
+            "marks",
+            {
+                b"1": b"jelmer@jelmer-rev1",
+                b"2": marks_file.blob_mark_value(("SHA1", b"ab" * 20)),
+                b"10": marks_file.blob_mark_value(("GIT", b"cd" * 20)),
+            },
+        )
+        self.assertEqual(
+            (
+                {b"1": b"jelmer@jelmer-rev1"},
+                [(("SHA1", b"ab" * 20), b"2"), (("GIT", b"cd" * 20), b"10")],
+            ),
+            marks_file.split_blob_marks(marks_file.import_marks("marks")),
+        )
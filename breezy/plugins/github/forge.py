@@ -16,6 +16,7 @@
 
 """Support for GitHub."""
 
+import functools
 import json
 import os
 from datetime import datetime
@@ -39,6 +40,12 @@ from ...forge import (
     UnsupportedForge,
     determine_title,
 )
+from ...forge_cache import (
+    ResponseCache,
+    ThreadTransports,
+    last_page_from_link,
+    map_concurrently,
+)
 from ...git.urls import git_url_to_bzr_url
 from ...i18n import gettext
 from ...trace import mutter, note
@@ -791,6 +798,132 @@ class _LazyDict(dict):
         raise NotImplementedError
 
 
+class _PullRequestBatch:
+    """The full data of a set of pull requests, retrieved together.
+
+    Nothing is retrieved until the data of one of the pull requests is
+    needed; then that of all of them is.
+    """
+
+    def __init__(self, gh, urls):
+        """Initialize the batch.
+
+        Args:
+            gh: The GitHub instance to retrieve the pull requests from.
+            urls: The API URLs of the pull requests.
+        """
+        self._gh = gh
+        self._urls = urls
+        self._pulls = None
+
+    def get(self, url):
+        """Return the full data of the pull request at url.
+
+        Args:
+            url: The API URL of the pull request.
+
+        Returns:
+            A dictionary shaped like the pull request objects of GitHub's
+            REST API.
+        """
+        if self._pulls is None:
+            self._pulls = self._gh._get_pulls(self._urls)
+        return self._pulls[url]
+
+
+_GRAPHQL_PULL_REQUEST_FRAGMENTS = """
+fragment repositoryFields on Repository {
+  name
+  nameWithOwner
+  url
+  sshUrl
+  owner { login }
+}
+fragment pullRequestFields on PullRequest {
+  id
+  number
+  title
+  body
+  state
+  url
+  isDraft
+  mergedAt
+  mergeable
+  author { login }
+  mergedBy { login }
+  headRefName
+  headRefOid
+  headRepository { ...repositoryFields }
+  baseRefName
+  baseRefOid
+  baseRepository { ...repositoryFields }
+}
+"""
+
+# The number of pull requests to look up in a single GraphQL query.
+_GRAPHQL_BATCH_SIZE = 50
+
+_GRAPHQL_MERGEABLE = {"MERGEABLE": True, "CONFLICTING": False}
+
+
+def _repo_from_graphql(repo):
+    """Convert a GraphQL repository to the shape of the REST API."""
+    if repo is None:
+        return None
+    (_scheme, rest) = repo["url"].split(":", 1)
+    return {
+        "name": repo["name"],
+        "full_name": repo["nameWithOwner"],
+        "owner": {"login": repo["owner"]["login"]},
+        "html_url": repo["url"],
+        "clone_url": repo["url"] + ".git",
+        "ssh_url": repo["sshUrl"],
+        "git_url": "git:" + rest + ".git",
+    }
+
+
+def _pull_from_graphql(url, comments_url, pr):
+    """Convert a GraphQL pull request to the shape of the REST API.
+
+    Only the fields that GitHubMergeProposal uses are converted.
+
+    Args:
+        url: The API URL of the pull request.
+        comments_url: The API URL of the comments on the pull request.
+        pr: The pull request, as returned by the GraphQL API.
+    """
+
+    def user(actor):
+        return None if actor is None else {"login": actor["login"]}
+
+    return {
+        "url": url,
+        "html_url": pr["url"],
+        "comments_url": comments_url,
+        "node_id": pr["id"],
+        "number": pr["number"],
+        "title": pr["title"],
+        "body": pr["body"],
+        "state": "open" if pr["state"] == "OPEN" else "closed",
+        "draft": pr["isDraft"],
+        "merged": pr["mergedAt"] is not None,
+        "merged_at": pr["mergedAt"],
+        "merged_by": user(pr["mergedBy"]),
+        "mergeable": _GRAPHQL_MERGEABLE.get(pr["mergeable"]),
+        "user": user(pr["author"]),
+        "head": {
+            "ref": pr["headRefName"],
+            "sha": pr["headRefOid"],
+            "repo": _repo_from_graphql(pr["headRepository"]),
+        },
+        "base": {
+            "ref": pr["baseRefName"],
+            "sha": pr["baseRefOid"],
+            "repo": _repo_from_graphql(pr["baseRepository"]),
+        },
+    }
+
+
 class GraphqlErrors(Exception):
     """Exception raised when GitHub GraphQL API returns errors.
 
@@ -885,7 +1018,8 @@ class GitHub(Forge):
             body: Optional request body data.
 
         Returns:
-            The HTTP response object.
+            The HTTP response object. GET requests are revalidated against
+            the response cache, which may answer them.
 
         Raises:
             GitHubLoginRequired: If the request requires authentication and
@@ -898,14 +1032,17 @@ class GitHub(Forge):
         }
         if self._token:
             headers["Authorization"] = f"token {self._token}"
+        url = urlutils.join(self.transport.base, path)
+        transport = self._transports.get()
         try:
-            response = self.transport.request(
-                method,
-                urlutils.join(self.transport.base, path),
-                headers=headers,
-                body=body,
-                retries=3,
-            )
+            if method == "GET" and body is None:
+                response = self._response_cache.request(
+                    transport, url, headers=headers, identity=self._token, retries=3
+                )
+            else:
+                response = transport.request(
+                    method, url, headers=headers, body=body, retries=3
+                )
         except UnexpectedHttpStatus as e:
             if e.code == 401:
                 raise GitHubLoginRequired(self.base_url) from e
@@ -966,6 +1103,111 @@ class GitHub(Forge):
             return json.loads(response.text)
         raise UnexpectedHttpStatus(path, response.status, headers=response.getheaders())
 
+    def _get_pull(self, url):
+        """Get a pull request from GitHub's REST API.
+
+        Args:
+            url: The API URL of the pull request.
+
+        Returns:
+            A dictionary containing the pull request data from GitHub's API.
+
+        Raises:
+            UnexpectedHttpStatus: If the API request fails.
+        """
+        response = self._api_request("GET", url)
+        if response.status != 200:
+            raise UnexpectedHttpStatus(
+                url, response.status, headers=response.getheaders()
+            )
+        return json.loads(response.text)
+
+    def _get_pulls(self, urls):
+        """Get several pull requests.
+
+        When logged in, the pull requests are looked up with batched GraphQL
+        queries. Otherwise, or when a query fails, they are retrieved from
+        the REST API, several at a time.
+
+        Args:
+            urls: The API URLs of the pull requests.
+
+        Returns:
+            A dictionary mapping the URLs to the pull request data.
+        """
+        pulls = {}
+        remaining = list(urls)
+        if self._token:
+            for start in range(0, len(remaining), _GRAPHQL_BATCH_SIZE):
+                batch = remaining[start : start + _GRAPHQL_BATCH_SIZE]
+                try:
+                    pulls.update(self._query_pulls(batch))
+                except GraphqlErrors as e:
+                    mutter("unable to look up pull requests with graphql: %r", e.errors)
+            remaining = [url for url in remaining if url not in pulls]
+        pulls.update(
+            zip(
+                remaining,
+                map_concurrently(
+                    self._get_pull, remaining, transports=self._transports
+                ),
+                strict=True,
+            )
+        )
+        return pulls
+
+    def _query_pulls(self, urls):
+        """Look up pull requests with a single GraphQL query.
+
+        Args:
+            urls: The API URLs of the pull requests.
+
+        Returns:
+            A dictionary mapping the URLs of the pull requests that were
+            found to their data, in the shape of the REST API.
+
+        Raises:
+            GraphqlErrors: If the query fails.
+        """
+        definitions = []
+        selections = []
+        variables = {}
+        for i, url in enumerate(urls):
+            (owner, name, _pulls, number) = url.rstrip("/").split("/")[-4:]
+            definitions.append(
+                f"$owner{i}: String!, $name{i}: String!, $number{i}: Int!"
+            )
+            selections.append(
+                f"  pr{i}: repository(owner: $owner{i}, name: $name{i}) {{\n"
+                f"    pullRequest(number: $number{i}) {{ ...pullRequestFields }}\n"
+                "  }"
+            )
+            variables.update(
+                {f"owner{i}": owner, f"name{i}": name, f"number{i}": int(number)}
+            )
+        query = (
+            "query ("
+            + ", ".join(definitions)
+            + ") {\n"
+            + "\n".join(selections)
+            + "\n}\n"
+            + _GRAPHQL_PULL_REQUEST_FRAGMENTS
+        )
+        data = self._graphql_request(query, **variables)
+        pulls = {}
+        for i, url in enumerate(urls):
+            repository = data.get(f"pr{i}")
+            if repository is None or repository["pullRequest"] is None:
+                continue
+            (owner, name, _pulls, number) = url.rstrip("/").split("/")[-4:]
+            comments_url = urlutils.join(
+                self.transport.base, f"repos/{owner}/{name}/issues/{number}/comments"
+            )
+            pulls[url] = _pull_from_graphql(
+                url, comments_url, repository["pullRequest"]
+            )
+        return pulls
+
     def _create_pull(
         self,
         path,
@@ -1096,6 +1338,9 @@ class GitHub(Forge):
     def _list_paged(self, path, parameters=None, per_page=None):
         """Make paginated requests to GitHub's API.
 
+        Once the first page has been retrieved, the Link header tells how
+        many pages there are and the remaining ones are fetched concurrently.
+
         Args:
             path: The API endpoint path.
             parameters: Optional dictionary of query parameters.
@@ -1110,41 +1355,53 @@ class GitHub(Forge):
         parameters = {} if parameters is None else dict(parameters.items())
         if per_page:
             parameters["per_page"] = str(per_page)
-        page = 1
-        while path:
-            parameters["page"] = str(page)
+
+        def get_page(page):
+            page_parameters = dict(parameters, page=str(page))
             response = self._api_request(
                 "GET",
                 path
                 + "?"
                 + ";".join(
-                    [f"{k}={urlutils.quote(v)}" for (k, v) in parameters.items()]
+                    [f"{k}={urlutils.quote(v)}" for (k, v) in page_parameters.items()]
                 ),
             )
             if response.status != 200:
                 raise UnexpectedHttpStatus(
                     path, response.status, headers=response.getheaders()
                 )
+            return response
+
+        response = get_page(1)
+        data = json.loads(response.text)
+        if not data:
+            return
+        yield data
+        # Without a "last" link, the first page is the only one.
+        last_page = last_page_from_link(response.getheader("Link")) or 1
+        for response in map_concurrently(
+            get_page, range(2, last_page + 1), transports=self._transports
+        ):
             data = json.loads(response.text)
             if not data:
                 break
             yield data
-            page += 1
 
-    def _search_issues(self, query):
+    def _search_issue_pages(self, query):
         """Search for issues/pull requests using GitHub's search API.
 
         Args:
             query: The search query string.
 
         Yields:
-            Individual issue/pull request objects from the search results.
+            Lists of issue/pull request objects, one for each page of the
+            search results.
         """
         path = "search/issues"
         for page in self._list_paged(path, {"q": query}, per_page=DEFAULT_PER_PAGE):
             if not page["items"]:
                 break
-            yield from page["items"]
+            yield page["items"]
 
     def _create_fork(self, path, owner=None):
         """Create a fork of a repository.
@@ -1188,6 +1445,8 @@ class GitHub(Forge):
         if self._token is None:
             note("Accessing GitHub anonymously. To log in, run 'brz gh-login'.")
         self.transport = transport
+        self._transports = ThreadTransports(transport)
+        self._response_cache = ResponseCache.open()
         self._current_user = None
 
     @property
@@ -1485,6 +1744,8 @@ class GitHub(Forge):
 
         Yields:
             GitHubMergeProposal instances representing the user's pull requests.
+            The full data of the pull requests on a page of search results is
+            retrieved at once, the first time it is needed.
         """
         query = ["is:pr"]
         if status == "open":
@@ -1499,29 +1760,18 @@ class GitHub(Forge):
         if author is None:
             author = self.current_user["login"]
         query.append(f"author:{author}")
-        for issue in self._search_issues(query=" ".join(query)):
-
-            def retrieve_full():
-                """Lazy loader function to retrieve full pull request data.
-
-                Returns:
-                    Complete pull request data from GitHub's API.
-
-                Raises:
-                    UnexpectedHttpStatus: If the API request fails.
-                """
-                response = self._api_request("GET", issue["pull_request"]["url"])  # noqa: B023
-                if response.status != 200:
-                    raise UnexpectedHttpStatus(
-                        issue["pull_request"]["url"],  # noqa: B023
-                        response.status,
-                        headers=response.getheaders(),
-                    )
-                return json.loads(response.text)
-
-            yield GitHubMergeProposal(
-                self, _LazyDict(issue["pull_request"], retrieve_full)
+        for issues in self._search_issue_pages(query=" ".join(query)):
+            batch = _PullRequestBatch(
+                self, [issue["pull_request"]["url"] for issue in issues]
             )
+            for issue in issues:
+                yield GitHubMergeProposal(
+                    self,
+                    _LazyDict(
+                        issue["pull_request"],
+                        functools.partial(batch.get, issue["pull_request"]["url"]),
+                    ),
+                )
 
     def get_proposal_by_url(self, url):
         """Get a merge proposal by its GitHub URL.
@@ -16,10 +16,12 @@
 
 """Tests for GitHub."""
 
+import json
 from datetime import datetime
 
 from ....tests import TestCase
-from ..forge import parse_timestring
+from ....tests.test_forge_cache import TestCaseWithForgeAPIServer
+from ..forge import GitHub, parse_timestring
 
 
 class ParseTimestringTests(TestCase):
@@ -27,3 +29,132 @@ class ParseTimestringTests(TestCase):
         self.assertEqual(
             datetime(2011, 1, 26, 19, 1, 12), parse_timestring("2011-01-26T19:01:12Z")
         )
+
+
+def graphql_pull(number, merged=False):
+    repo = {
+        "name": "repo",
+        "nameWithOwner": "owner/repo",
+        "url": "https://github.com/owner/repo",
+        "sshUrl": "git@github.com:owner/repo.git",
+        "owner": {"login": "owner"},
+    }
+    return {
+        "id": f"PR_{number}",
+        "number": number,
+        "title": "Title",
+        "body": "Description",
+        "state": "MERGED" if merged else "OPEN",
+        "url": f"https://github.com/owner/repo/pull/{number}",
+        "isDraft": False,
+        "mergedAt": "2011-01-26T19:01:12Z" if merged else None,
+        "mergeable": "UNKNOWN" if merged else "MERGEABLE",
+        "author": {"login": "jane"},
+        "mergedBy": {"login": "owner"} if merged else None,
+        "headRefName": "feature",
+        "headRefOid": "a" * 40,
+        "headRepository": repo,
+        "baseRefName": "main",
+        "baseRefOid": "b" * 40,
+        "baseRepository": repo,
+    }
+
+
+class GitHubAPITests(TestCaseWithForgeAPIServer):
+    def setUp(self):
+        super().setUp()
+        self.gh = GitHub(self.transport)
+
+    def pull_url(self, number):
+        return self.server.get_url() + f"repos/owner/repo/pulls/{number}"
+
+    def add_pull(self, number):
+        self.server.add_response(
+            f"/repos/owner/repo/pulls/{number}",
+            json.dumps({"number": number, "title": "REST"}).encode("utf-8"),
+        )
+
+    def test_list_paged(self):
+        last = '<https://api.github.com/users/jane/repos?per_page=2&page=3>; rel="last"'
+        for page, repos in enumerate([["a", "b"], ["c", "d"], ["e"]], 1):
+            self.server.add_response(
+                f"/users/jane/repos?per_page=2;page={page}",
+                json.dumps(
+                    [{"full_name": f"jane/{name}", "fork": True} for name in repos]
+                ).encode("utf-8"),
+                headers=[("Link", last)] if page < 3 else [],
+            )
+        self.assertEqual(
+            [["jane/a", "jane/b"], ["jane/c", "jane/d"], ["jane/e"]],
+            [
+                [repo["full_name"] for repo in page]
+                for page in self.gh._list_paged("/users/jane/repos", per_page=2)
+            ],
+        )
+        self.assertEqual(
+            [f"/users/jane/repos?per_page=2;page={page}" for page in [1, 2, 3]],
+            sorted(path for (method, path, etag) in self.server.requests),
+        )
+
+    def test_single_page(self):
+        self.server.add_response(
+            "/users/jane/repos?per_page=100;page=1",
+            json.dumps([{"full_name": "jane/a", "fork": True}]).encode("utf-8"),
+        )
+        self.assertEqual(["jane/a"], list(self.gh.iter_my_forks("jane")))
+        self.assertLength(1, self.server.requests)
+
+    def test_get_pulls_anonymous(self):
+        for number in [1, 2, 3]:
+            self.add_pull(number)
+        urls = [self.pull_url(number) for number in [1, 2, 3]]
+        pulls = self.gh._get_pulls(urls)
+        self.assertEqual([1, 2, 3], [pulls[url]["number"] for url in urls])
+        self.assertNotIn(
+            "POST", [method for (method, path, etag) in self.server.requests]
+        )
+
+    def test_get_pulls_graphql(self):
+        self.gh._token = "token"
+        self.server.add_response(
+            "/graphql",
+            json.dumps(
+                {
+                    "data": {
+                        "pr0": {"pullRequest": graphql_pull(1)},
+                        "pr1": {"pullRequest": graphql_pull(2, merged=True)},
+                        "pr2": {"pullRequest": None},
+                    }
+                }
+            ).encode("utf-8"),
+            method="POST",
+        )
+        self.add_pull(3)
+        urls = [self.pull_url(number) for number in [1, 2, 3]]
+        pulls = self.gh._get_pulls(urls)
+        # The pull request that was not found is retrieved with the REST API.
+        self.assertEqual(
+            [("POST", "/graphql"), ("GET", "/repos/owner/repo/pulls/3")],
+            [(method, path) for (method, path, etag) in self.server.requests],
+        )
+        self.assertEqual("REST", pulls[urls[2]]["title"])
+        pull = pulls[urls[0]]
+        self.assertEqual(urls[0], pull["url"])
+        self.assertEqual("https://github.com/owner/repo/pull/1", pull["html_url"])
+        self.assertEqual(
+            self.server.get_url() + "repos/owner/repo/issues/1/comments",
+            pull["comments_url"],
+        )
+        self.assertEqual("open", pull["state"])
+        self.assertTrue(pull["mergeable"])
+        self.assertEqual(
+            "git@github.com:owner/repo.git", pull["head"]["repo"]["ssh_url"]
+        )
+        self.assertEqual(
+            "https://github.com/owner/repo.git", pull["base"]["repo"]["clone_url"]
+        )
+        self.assertEqual("owner/repo", pull["base"]["repo"]["full_name"])
+        merged = pulls[urls[1]]
+        self.assertEqual("closed", merged["state"])
+        self.assertEqual("owner", merged["merged_by"]["login"])
+        self.assertIs(None, merged["mergeable"])
@@ -38,6 +38,7 @@ from ...forge import (
     UnsupportedForge,
     determine_title,
 )
+from ...forge_cache import ResponseCache, ThreadTransports, map_concurrently
 from ...git.urls import git_url_to_bzr_url
 from ...trace import mutter
 from ...transport import get_transport
@@ -926,11 +927,21 @@ class GitLab(Forge):
             body: Optional request body
 
         Returns:
-            The HTTP response object from the GitLab API
-        """
-        return self.transport.request(
+            The HTTP response object from the GitLab API. GET requests are
+            revalidated against the response cache, which may answer them.
+        """
+        url = urlutils.join(self.base_url, "api", "v4", path)
+        transport = self._transports.get()
+        if method == "GET" and fields is None and body is None:
+            return self._response_cache.request(
+                transport,
+                url,
+                headers=self.headers,
+                identity=self.headers["Private-Token"],
+            )
+        return transport.request(
             method,
-            urlutils.join(self.base_url, "api", "v4", path),
+            url,
             headers=self.headers,
             fields=fields,
             body=body,
@@ -944,6 +955,8 @@ class GitLab(Forge):
             private_token: GitLab private access token for authentication
         """
         self.transport = transport
+        self._transports = ThreadTransports(transport)
+        self._response_cache = ResponseCache.open()
         self.headers = {"Private-Token": private_token}
         self._current_user = None
 
@@ -1207,25 +1220,42 @@ class GitLab(Forge):
             UnexpectedHttpStatus: If the API request fails
 
         Note:
-            This method automatically handles GitLab's pagination by following
-            the X-Next-Page header until all results are retrieved.
+            This method automatically handles GitLab's pagination. Once the
+            first page has been retrieved, the X-Total-Pages header tells how
+            many pages there are and the remaining ones are fetched
+            concurrently; when GitLab does not provide it, the X-Next-Page
+            header is followed until all results are retrieved.
         """
         parameters = {} if parameters is None else dict(parameters.items())
         if per_page:
             parameters["per_page"] = str(per_page)
-        page = "1"
-        while page:
-            parameters["page"] = page
+
+        def get_page(page):
+            page_parameters = dict(parameters, page=str(page))
             response = self._api_request(
                 "GET",
                 path
                 + "?"
-                + "&".join(["{}={}".format(*item) for item in parameters.items()]),
+                + "&".join(["{}={}".format(*item) for item in page_parameters.items()]),
             )
             if response.status == 403:
                 raise transport_errors.PermissionDenied(response.text)
             if response.status != 200:
                 _unexpected_status(path, response)
+            return response
+
+        response = get_page(1)
+        yield from json.loads(response.data)
+        total_pages = response.getheader("X-Total-Pages")
+        if total_pages:
+            for response in map_concurrently(
+                get_page, range(2, int(total_pages) + 1), transports=self._transports
+            ):
+                yield from json.loads(response.data)
+            return
+        page = response.getheader("X-Next-Page")
+        while page:
+            response = get_page(page)
             page = response.getheader("X-Next-Page")
             yield from json.loads(response.data)
 
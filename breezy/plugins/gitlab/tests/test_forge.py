@@ -14,11 +14,14 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+import json
 from datetime import datetime
 
 from breezy.tests import TestCase
+from breezy.tests.test_forge_cache import TestCaseWithForgeAPIServer
 
 from ..forge import (
+    GitLab,
     NotGitLabUrl,
     NotMergeRequestUrl,
     parse_gitlab_merge_request_url,
@@ -68,3 +71,49 @@ class ParseTimestringTests(TestCase):
             datetime(2018, 9, 7, 11, 16, 17, 520000),
             parse_timestring("2018-09-07T11:16:17.520Z"),
         )
+
+
+class ListPagedTests(TestCaseWithForgeAPIServer):
+    def setUp(self):
+        super().setUp()
+        self.gl = GitLab(self.transport, "token")
+
+    def add_pages(self, pages, headers):
+        for page, items in enumerate(pages, 1):
+            self.server.add_response(
+                f"/api/v4/projects?per_page=2&page={page}",
+                json.dumps(items).encode("utf-8"),
+                headers=headers(page),
+            )
+
+    def requested_pages(self):
+        return sorted(path for (method, path, etag) in self.server.requests)
+
+    def test_total_pages(self):
+        self.add_pages(
+            [[1, 2], [3, 4], [5]],
+            lambda page: [("X-Total-Pages", "3"), ("X-Next-Page", str(page + 1))],
+        )
+        self.assertEqual(
+            [1, 2, 3, 4, 5], list(self.gl._list_paged("projects", per_page=2))
+        )
+        self.assertEqual(
+            [f"/api/v4/projects?per_page=2&page={page}" for page in [1, 2, 3]],
+            self.requested_pages(),
+        )
+
+    def test_next_page(self):
+        self.add_pages(
+            [[1, 2], [3, 4], [5]],
+            lambda page: [("X-Next-Page", str(page + 1))] if page < 3 else [],
+        )
+        self.assertEqual(
+            [1, 2, 3, 4, 5], list(self.gl._list_paged("projects", per_page=2))
+        )
+
+    def test_revalidated(self):
+        self.add_pages([[1, 2], [3]], lambda page: [("X-Total-Pages", "2")])
+        list(self.gl._list_paged("projects", per_page=2))
+        self.assertEqual([1, 2, 3], list(self.gl._list_paged("projects", per_page=2)))
+        self.assertEqual(2, self.gl._response_cache.hits)
+        self.assertTrue(all(etag for (method, path, etag) in self.server.requests[2:]))
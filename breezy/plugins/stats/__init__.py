@@ -47,6 +47,7 @@ def load_tests(loader, basic_tests, pattern):
             "test_blackbox",
             "test_classify",
             "test_stats",
+            "test_store",
         ]
     ]
     for module_name in testmod_names:
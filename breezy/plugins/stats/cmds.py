@@ -15,11 +15,14 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 """A Simple bzr plugin to generate statistics about the history."""
 
+import json
+
 import vcsgraph.tsort as tsort
 
 from ... import branch, commands, config, errors, option, trace, ui, workingtree
 from ...revision import NULL_REVISION
 from .classify import classify_delta
+from .store import StatisticsStore
 
 
 def collapse_by_person(revisions, canonical_committer):
@@ -212,6 +215,48 @@ def get_revisions_and_committers(a_repo, revids):
     )
 
 
+def collapse_author_counts(author_counts):
+    """Collapse author counts by person.
+
+    This gives the same statistics as combining get_revisions_and_committers()
+    and collapse_by_person(), from the number of revisions of each author
+    rather than from the revisions themselves.
+
+    Args:
+        author_counts: Iterable of (author, count) tuples, where author is
+            as returned by Revision.get_apparent_authors() and count is the
+            number of revisions it appears in.
+
+    Returns:
+        List of tuples in format (commit_count, authors_list, emails_dict,
+        fullnames_dict) sorted by commit count in descending order, where
+        authors_list contains the authors that were collapsed together.
+    """
+    email_users = {}
+    combo_count = {}
+    author_combos = []
+    for author, count in author_counts:
+        username, email = config.parse_username(author)
+        email_users.setdefault(email, set()).add(username)
+        combo = (username, email)
+        combo_count[combo] = combo_count.get(combo, 0) + count
+        author_combos.append((author, combo, count))
+    canonical_committer = collapse_email_and_users(email_users, combo_count)
+    committer_to_info = {}
+    for author, (username, email), count in author_combos:
+        if len(username) == 0 and len(email) == 0:
+            continue
+        canon_author = canonical_committer[(username, email)]
+        info = committer_to_info.setdefault(canon_author, [0, [], {}, {}])
+        info[0] += count
+        info[1].append(author)
+        info[2][email] = info[2].get(email, 0) + count
+        info[3][username] = info[3].get(username, 0) + count
+    res = [tuple(info) for info in committer_to_info.values()]
+    res.sort(reverse=True, key=lambda item: (item[0], list(item[2].keys())))
+    return res
+
+
 def get_info(a_repo, revision):
     """Get comprehensive statistics information for a particular revision.
 
@@ -318,6 +363,79 @@ def display_info(info, to_file, gather_class_stats=None):
                 to_file.write(f"     {float(count) / total * 100.0:4.0f}% {name}\n")
 
 
+def display_info_json(info, to_file, gather_class_stats=None):
+    """Display committer statistics information as JSON.
+
+    Args:
+        info: Committer statistics, as for display_info().
+        to_file: File-like object to write output to.
+        gather_class_stats: Optional callable, as for display_info().
+    """
+    committers = []
+    for count, revs, emails, fullnames in info:
+        committer = {
+            "name": max(fullnames.items(), key=lambda item: (item[1], item[0]))[0],
+            "email": max(emails.items(), key=lambda item: (item[1], item[0]))[0],
+            "commits": count,
+            "names": fullnames,
+            "emails": emails,
+        }
+        if gather_class_stats is not None:
+            classes, _total = gather_class_stats(revs)
+            committer["contributions"] = {
+                "unknown" if name is None else name: count
+                for name, count in classes.items()
+            }
+        committers.append(committer)
+    json.dump(committers, to_file, indent=2, sort_keys=True)
+    to_file.write("\n")
+
+
+def _open_location(location):
+    """Open the branch at location and find the revision to look at.
+
+    Returns:
+        Tuple of the branch and the last revision of the working tree at
+        location, or of the branch if there is no working tree.
+    """
+    try:
+        wt = workingtree.WorkingTree.open_containing(location)[0]
+    except errors.NoWorkingTree:
+        a_branch = branch.Branch.open(location)
+        return a_branch, a_branch.last_revision()
+    return wt.branch, wt.last_revision()
+
+
+def _select_revisions(store, a_branch, last_rev, alternate_rev=None):
+    """Select the revisions to gather statistics about in a store.
+
+    Args:
+        store: The StatisticsStore of a_branch.
+        a_branch: The branch being analyzed.
+        last_rev: The revision whose ancestry to select.
+        alternate_rev: If not None, only select the revisions in the ancestry
+            of alternate_rev that are not in the ancestry of last_rev.
+    """
+    a_repo = a_branch.repository
+    graph = a_repo.get_graph()
+    if alternate_rev is not None:
+        trace.note("getting ancestry diff")
+        store.select(a_repo, graph.find_difference(last_rev, alternate_rev)[1])
+    elif last_rev == a_branch.last_revision():
+        trace.note("getting ancestry")
+        store.select_ancestry(a_repo, a_branch.name or "", last_rev)
+    else:
+        trace.note("getting ancestry")
+        store.select(
+            a_repo,
+            (
+                r
+                for (r, ps) in graph.iter_ancestry([last_rev])
+                if ps is not None and r != NULL_REVISION
+            ),
+        )
+
+
 class cmd_committer_statistics(commands.Command):
     """Generate statistics for LOCATION.
 
@@ -328,6 +446,10 @@ class cmd_committer_statistics(commands.Command):
     The statistics can be generated for the entire history or for a specific
     revision range, helping to understand contributor patterns and activity.
 
+    The authors of each revision, and the classes of the changes it makes,
+    are remembered in a statistics store kept in the branch, so later runs
+    only have to look at new revisions.
+
     Attributes:
         aliases: Alternative command names 'stats' and 'committer-stats'.
         takes_args: Accepts optional location argument.
@@ -340,11 +462,17 @@ class cmd_committer_statistics(commands.Command):
     takes_options = [
         "revision",
         option.Option("show-class", help="Show the class of contributions."),
+        option.RegistryOption.from_kwargs(
+            "format",
+            help="Output format.",
+            text="Human readable output (default).",
+            json="JSON output, for use by other programs.",
+        ),
     ]
 
     encoding_type = "replace"
 
-    def run(self, location=".", revision=None, show_class=False):
+    def run(self, location=".", revision=None, show_class=False, format=None):
         """Execute the committer statistics command.
 
         Args:
@@ -354,16 +482,10 @@ class cmd_committer_statistics(commands.Command):
                 revision or a range of two revisions.
             show_class: Whether to show contribution class statistics
                 (code, documentation, art, translation).
+            format: Output format, "text" (the default) or "json".
         """
         alternate_rev = None
-        try:
-            wt = workingtree.WorkingTree.open_containing(location)[0]
-        except errors.NoWorkingTree:
-            a_branch = branch.Branch.open(location)
-            last_rev = a_branch.last_revision()
-        else:
-            a_branch = wt.branch
-            last_rev = wt.last_revision()
+        a_branch, last_rev = _open_location(location)
 
         if revision is not None:
             last_rev = revision[0].in_history(a_branch).rev_id
@@ -371,25 +493,21 @@ class cmd_committer_statistics(commands.Command):
                 alternate_rev = revision[1].in_history(a_branch).rev_id
 
         with a_branch.lock_read():
-            if alternate_rev:
-                info = get_diff_info(a_branch.repository, last_rev, alternate_rev)
-            else:
-                info = get_info(a_branch.repository, last_rev)
-        if show_class:
-
-            def fetch_class_stats(revs):
-                """Fetch contribution class statistics for revisions.
-
-                Args:
-                    revs: List of revision objects to analyze.
-
-                Returns:
-                    Tuple of (classes_dict, total_count) for contribution statistics.
-                """
-                return gather_class_stats(a_branch.repository, revs)
-        else:
-            fetch_class_stats = None
-        display_info(info, self.outf, fetch_class_stats)
+            store = StatisticsStore.open(a_branch)
+            try:
+                _select_revisions(store, a_branch, last_rev, alternate_rev)
+                info = collapse_author_counts(store.iter_author_counts())
+                if show_class:
+                    store.classify(a_branch.repository)
+                    fetch_class_stats = store.get_class_counts
+                else:
+                    fetch_class_stats = None
+                if format == "json":
+                    display_info_json(info, self.outf, fetch_class_stats)
+                else:
+                    display_info(info, self.outf, fetch_class_stats)
+            finally:
+                store.close()
 
 
 class cmd_ancestor_growth(commands.Command):
@@ -422,22 +540,28 @@ class cmd_ancestor_growth(commands.Command):
             location: Path to the branch or working tree to analyze.
                 Defaults to current directory.
         """
-        try:
-            wt = workingtree.WorkingTree.open_containing(location)[0]
-        except errors.NoWorkingTree:
-            a_branch = branch.Branch.open(location)
-            last_rev = a_branch.last_revision()
-        else:
-            a_branch = wt.branch
-            last_rev = wt.last_revision()
+        a_branch, last_rev = _open_location(location)
 
         with a_branch.lock_read():
-            graph = a_branch.repository.get_graph()
+            if last_rev == a_branch.last_revision():
+                # The branch keeps the merge sorted ancestry of its tip.
+                depths = (
+                    depth
+                    for (_revid, depth, _revno, _isend) in (
+                        a_branch.iter_merge_sorted_revisions(direction="forward")
+                    )
+                )
+            else:
+                graph = a_branch.repository.get_graph()
+                sorted_graph = tsort.merge_sort(
+                    graph.iter_ancestry([last_rev]), last_rev
+                )
+                depths = (
+                    depth
+                    for (_num, _node_name, depth, _isend) in reversed(sorted_graph)
+                )
             revno = 0
-            sorted_graph = tsort.merge_sort(graph.iter_ancestry([last_rev]), last_rev)
-            for cur_parents, (_num, _node_name, depth, _isend) in enumerate(
-                reversed(sorted_graph), 1
-            ):
+            for cur_parents, depth in enumerate(depths, 1):
                 if depth == 0:
                     revno += 1
                     self.outf.write("%4d, %4d\n" % (revno, cur_parents))
@@ -519,6 +643,51 @@ def display_credits(credits, to_file):
     print_section("Translations", translators)
 
 
+def display_credits_json(credits, to_file):
+    """Display contributor credits as JSON.
+
+    Args:
+        credits: Credits, as for display_credits().
+        to_file: File-like object to write output to.
+    """
+    (coders, documenters, artists, translators) = credits
+    json.dump(
+        {
+            "code": coders,
+            "documentation": documenters,
+            "art": artists,
+            "translation": translators,
+        },
+        to_file,
+        indent=2,
+        sort_keys=True,
+    )
+    to_file.write("\n")
+
+
+def find_stored_credits(store):
+    """Find the credits of the contributors to the selected revisions.
+
+    This gives the same result as find_credits(), from a statistics store
+    whose selected revisions have been classified.
+
+    Args:
+        store: A StatisticsStore.
+
+    Returns:
+        Tuple containing four lists:
+            (coders, documenters, artists, translators)
+    """
+    ret = {"documentation": {}, "code": {}, "art": {}, "translation": {}}
+    for name, author, count in store.iter_credit_counts():
+        if name in ret:
+            ret[name][author] = count
+    return tuple(
+        [author for author, _ in sorted(ret[name].items(), key=classify_key)]
+        for name in ("code", "documentation", "art", "translation")
+    )
+
+
 def find_credits(repository, revid):
     """Find the credits of the contributors to a revision.
 
@@ -590,11 +759,19 @@ class cmd_credits(commands.Command):
     """
 
     takes_args = ["location?"]
-    takes_options = ["revision"]
+    takes_options = [
+        "revision",
+        option.RegistryOption.from_kwargs(
+            "format",
+            help="Output format.",
+            text="Human readable output (default).",
+            json="JSON output, for use by other programs.",
+        ),
+    ]
 
     encoding_type = "replace"
 
-    def run(self, location=".", revision=None):
+    def run(self, location=".", revision=None, format=None):
         """Execute the credits analysis command.
 
         Analyzes the repository to determine credits for contributors
@@ -605,19 +782,22 @@ class cmd_credits(commands.Command):
                 Defaults to current directory.
             revision: Optional specific revision to analyze credits for.
                 If not provided, uses the last revision.
+            format: Output format, "text" (the default) or "json".
         """
-        try:
-            wt = workingtree.WorkingTree.open_containing(location)[0]
-        except errors.NoWorkingTree:
-            a_branch = branch.Branch.open(location)
-            last_rev = a_branch.last_revision()
-        else:
-            a_branch = wt.branch
-            last_rev = wt.last_revision()
+        a_branch, last_rev = _open_location(location)
 
         if revision is not None:
             last_rev = revision[0].in_history(a_branch).rev_id
 
         with a_branch.lock_read():
-            credits = find_credits(a_branch.repository, last_rev)
+            store = StatisticsStore.open(a_branch)
+            try:
+                _select_revisions(store, a_branch, last_rev)
+                store.classify(a_branch.repository)
+                credits = find_stored_credits(store)
+            finally:
+                store.close()
+        if format == "json":
+            display_credits_json(credits, self.outf)
+        else:
             display_credits(credits, self.outf)
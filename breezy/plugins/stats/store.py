@@ -0,0 +1,335 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""A persistent store of the statistics of the revisions of a branch.
+
+The authors of each revision, and the classes of the changes it makes, only
+depend on the revision. They are kept in an SQLite database next to the
+branch, keyed by revision id, so that they are only extracted from the
+repository once. The store also remembers the ancestry of the branch tip it
+last saw; when the tip moves forward only the new revisions are added.
+
+Statistics are aggregated by the database from the revisions that have been
+selected, so the revisions never need to be held in memory all at once.
+
+Several processes may fill the same store at once. The rows only derive from
+the revisions, so rows that another process added first are left alone.
+"""
+
+import collections
+import sqlite3
+
+from dromedary import errors as transport_errors
+
+from ... import trace, ui
+from ...revision import NULL_REVISION
+from .classify import classify_delta
+
+STORE_NAME = "stats.db"
+
+# The number of revisions to read from the repository at once.
+_BATCH_SIZE = 500
+
+# Maximum number of parameters to pass in a single SQLite "in" clause; older
+# SQLite versions limit the number of host parameters to 999.
+_SQLITE_MAX_PARAMS = 500
+
+
+def _iter_batches(values, size):
+    for start in range(0, len(values), size):
+        yield values[start : start + size]
+
+
+class StatisticsStore:
+    """The authors and change classes of revisions.
+
+    Queries are done on the selected revisions; see select() and
+    select_ancestry().
+    """
+
+    def __init__(self, path=":memory:"):
+        """Open or create the store database at path."""
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(
+            """
+        create table if not exists revisions(
+            revid blob primary key,
+            merge integer not null,
+            classified integer not null default 0
+        );
+        create table if not exists authors(
+            revid blob not null,
+            author text not null,
+            primary key (revid, author)
+        );
+        create table if not exists classes(
+            revid blob not null,
+            class text,
+            count integer not null,
+            primary key (revid, class)
+        );
+        create table if not exists tips(
+            branch text primary key,
+            revid blob not null
+        );
+        create table if not exists ancestry(
+            branch text not null,
+            revid blob not null,
+            primary key (branch, revid)
+        );
+        create temporary table selected(
+            revid blob primary key
+        );
+        create temporary table wanted_authors(
+            author text primary key
+        );
+"""
+        )
+
+    def __repr__(self):
+        """Return a string representation of the store."""
+        return f"{self.__class__.__name__}({self.path!r})"
+
+    @classmethod
+    def open(cls, branch):
+        """Open the statistics store of a branch.
+
+        Branches that can not keep a store on disk get one in memory.
+        """
+        try:
+            path = branch.control_transport.local_abspath(STORE_NAME)
+        except transport_errors.NotLocalUrl:
+            return cls()
+        try:
+            return cls(path)
+        except sqlite3.Error as e:
+            trace.mutter("unable to open statistics store %s: %s", path, e)
+            return cls()
+
+    def close(self):
+        """Close the database."""
+        self.db.close()
+
+    def _select_in(self, query, values):
+        values = list(values)
+        for batch in _iter_batches(values, _SQLITE_MAX_PARAMS):
+            yield from self.db.execute(query % ",".join("?" * len(batch)), batch)
+
+    def missing_revisions(self, revision_ids):
+        """Return the revisions that are not in the store yet."""
+        revision_ids = list(dict.fromkeys(revision_ids))
+        present = {
+            row[0]
+            for row in self._select_in(
+                "select revid from revisions where revid in (%s)", revision_ids
+            )
+        }
+        return [revid for revid in revision_ids if revid not in present]
+
+    def add_revisions(self, repository, revision_ids):
+        """Add the authors of revisions to the store.
+
+        Args:
+            repository: The repository the revisions are in.
+            revision_ids: The revisions to add. Revisions that are not
+                present in the repository are skipped.
+
+        Returns:
+            The set of revision ids that are not present in the repository.
+        """
+        ghosts = set()
+        with ui.ui_factory.nested_progress_bar() as pb:
+            for start, batch in enumerate(_iter_batches(revision_ids, _BATCH_SIZE)):
+                pb.update("getting revisions", start * _BATCH_SIZE, len(revision_ids))
+                revision_rows = []
+                author_rows = []
+                for revid, rev in repository.iter_revisions(batch):
+                    if rev is None:
+                        ghosts.add(revid)
+                        continue
+                    revision_rows.append((revid, len(rev.parent_ids) > 1))
+                    author_rows.extend(
+                        (revid, author) for author in rev.get_apparent_authors()
+                    )
+                with self.db:
+                    self.db.executemany(
+                        "insert or ignore into revisions (revid, merge) values (?, ?)",
+                        revision_rows,
+                    )
+                    self.db.executemany(
+                        "insert or ignore into authors (revid, author) values (?, ?)",
+                        author_rows,
+                    )
+        return ghosts
+
+    def update_ancestry(self, repository, branch_name, tip):
+        """Bring the recorded ancestry of a branch up to date.
+
+        When tip descends from the tip seen last time, only the revisions
+        that are new are looked at.
+
+        Args:
+            repository: The repository of the branch.
+            branch_name: Name identifying the branch in the store.
+            tip: The revision id of the branch tip.
+
+        Returns:
+            The number of revisions added to the ancestry.
+        """
+        row = self.db.execute(
+            "select revid from tips where branch = ?", (branch_name,)
+        ).fetchone()
+        old_tip = row[0] if row is not None else None
+        if old_tip == tip:
+            return 0
+        graph = repository.get_graph()
+        if old_tip is not None and graph.is_ancestor(old_tip, tip):
+            new = list(graph.find_difference(old_tip, tip)[1])
+        else:
+            with self.db:
+                self.db.execute("delete from ancestry where branch = ?", (branch_name,))
+            new = [
+                revid
+                for (revid, parents) in graph.iter_ancestry([tip])
+                if parents is not None and revid != NULL_REVISION
+            ]
+        ghosts = self.add_revisions(repository, self.missing_revisions(new))
+        with self.db:
+            self.db.executemany(
+                "insert or ignore into ancestry (branch, revid) values (?, ?)",
+                [(branch_name, revid) for revid in new if revid not in ghosts],
+            )
+            self.db.execute(
+                "insert or replace into tips (branch, revid) values (?, ?)",
+                (branch_name, tip),
+            )
+        return len(new) - len(ghosts)
+
+    def select(self, repository, revision_ids):
+        """Select revisions to aggregate statistics over.
+
+        Revisions that are not in the store yet are added first.
+        """
+        revision_ids = list(revision_ids)
+        ghosts = self.add_revisions(repository, self.missing_revisions(revision_ids))
+        with self.db:
+            self.db.execute("delete from selected")
+            self.db.executemany(
+                "insert or ignore into selected (revid) values (?)",
+                [(revid,) for revid in revision_ids if revid not in ghosts],
+            )
+
+    def select_ancestry(self, repository, branch_name, tip):
+        """Select the ancestry of a branch tip.
+
+        See update_ancestry().
+        """
+        self.update_ancestry(repository, branch_name, tip)
+        with self.db:
+            self.db.execute("delete from selected")
+            self.db.execute(
+                "insert into selected (revid) select revid from ancestry "
+                "where branch = ?",
+                (branch_name,),
+            )
+
+    def classify(self, repository):
+        """Classify the changes of the selected revisions.
+
+        Only the revisions that have not been classified before need a
+        delta.
+        """
+        revision_ids = [
+            row[0]
+            for row in self.db.execute(
+                "select revid from selected join revisions using (revid) "
+                "where not classified"
+            )
+        ]
+        with ui.ui_factory.nested_progress_bar() as pb, repository.lock_read():
+            for start, batch in enumerate(_iter_batches(revision_ids, _BATCH_SIZE)):
+                pb.update("classifying commits", start * _BATCH_SIZE, len(revision_ids))
+                revs = repository.get_revisions(batch)
+                rows = []
+                for rev, delta in zip(
+                    revs, repository.get_revision_deltas(revs), strict=True
+                ):
+                    counts = collections.Counter(classify_delta(delta))
+                    rows.extend(
+                        (rev.revision_id, name, count) for name, count in counts.items()
+                    )
+                with self.db:
+                    self.db.executemany(
+                        "insert or ignore into classes (revid, class, count) "
+                        "values (?, ?, ?)",
+                        rows,
+                    )
+                    self.db.executemany(
+                        "update revisions set classified = 1 where revid = ?",
+                        [(revid,) for revid in batch],
+                    )
+
+    def iter_author_counts(self):
+        """Yield (author, count) for the authors of the selected revisions.
+
+        Authors are counted once for every revision they appear in.
+        """
+        return self.db.execute(
+            "select author, count(*) from selected join authors using (revid) "
+            "group by author order by author"
+        )
+
+    def get_class_counts(self, authors):
+        """Count the classes of the changes made by some authors.
+
+        Each revision is counted once, even if several of the authors
+        appear in it. classify() has to be called first.
+
+        Args:
+            authors: The authors whose selected revisions to look at.
+
+        Returns:
+            A tuple with a dictionary mapping class names to counts, and the
+            total count.
+        """
+        with self.db:
+            self.db.execute("delete from wanted_authors")
+            self.db.executemany(
+                "insert or ignore into wanted_authors (author) values (?)",
+                [(author,) for author in authors],
+            )
+        classes = dict(
+            self.db.execute(
+                "select class, sum(count) from classes where revid in ("
+                "select revid from selected join authors using (revid) "
+                "join wanted_authors using (author)) group by class"
+            )
+        )
+        return classes, sum(classes.values())
+
+    def iter_credit_counts(self):
+        """Yield (class, author, count) for the selected revisions.
+
+        Merges are not counted, and each class of change is counted once per
+        revision. classify() has to be called first.
+        """
+        return self.db.execute(
+            "select class, author, count(*) from selected "
+            "join revisions using (revid) join authors using (revid) "
+            "join classes using (revid) where not merge "
+            "group by class, author order by class, author"
+        )
@@ -1,12 +1,14 @@
 """Blackbox tests for the stats plugin."""
 
+import json
+
 from ...tests import TestCaseWithTransport
 
 
 class TestBlackbox(TestCaseWithTransport):
     def setUp(self):
         super().setUp()
-        wt = self.make_branch_and_tree(".")
+        self.wt = wt = self.make_branch_and_tree(".")
         self.build_tree_contents([("foo.c", "#include <stdio.h>\n")])
         wt.add("foo.c")
         wt.commit(message="1", committer="Fero <fero@example.com>", rev_id=b"1")
@@ -44,3 +46,55 @@ Fero <fero@example.com>
 
 """,
         )
+
+    def test_stats_json(self):
+        (out, _err) = self.run_bzr("stats --format=json")
+        self.assertEqual(
+            [
+                {
+                    "commits": 3,
+                    "email": "fero@example.com",
+                    "emails": {"fero@example.com": 3},
+                    "name": "Fero",
+                    "names": {"Fero": 2, "Ferko": 1},
+                },
+                {
+                    "commits": 1,
+                    "email": "vinco@example.com",
+                    "emails": {"vinco@example.com": 1},
+                    "name": "Vinco",
+                    "names": {"Vinco": 1},
+                },
+                {
+                    "commits": 1,
+                    "email": "jano@example.com",
+                    "emails": {"jano@example.com": 1},
+                    "name": "Jano",
+                    "names": {"Jano": 1},
+                },
+            ],
+            json.loads(out),
+        )
+
+    def test_stats_show_class(self):
+        (out, _err) = self.run_bzr("stats --show-class")
+        self.assertContainsRe(out, "     Contributions:\n     100% code\n")
+
+    def test_stats_updated(self):
+        self.run_bzr("stats")
+        self.assertPathExists(".bzr/branch/stats.db")
+        self.wt.commit(message="6", committer="Jano <jano@example.com>", rev_id=b"6")
+        (out, _err) = self.run_bzr("stats")
+        self.assertContainsRe(out, "   2 Jano <jano@example.com>\n")
+
+    def test_credits_json(self):
+        (out, _err) = self.run_bzr("credits --format=json")
+        self.assertEqual(
+            {
+                "art": [],
+                "code": ["Fero <fero@example.com>"],
+                "documentation": [],
+                "translation": [],
+            },
+            json.loads(out),
+        )
@@ -2,7 +2,11 @@
 
 from ...revision import Revision
 from ...tests import TestCase, TestCaseWithTransport
-from .cmds import collapse_by_person, get_revisions_and_committers
+from .cmds import (
+    collapse_author_counts,
+    collapse_by_person,
+    get_revisions_and_committers,
+)
 
 
 class TestGetRevisionsAndCommitters(TestCaseWithTransport):
@@ -227,3 +231,39 @@ class TestCollapseByPerson(TestCase):
         self.assertEqual(3, info[0][0])
         self.assertEqual({"foo@example.com": 2, "bar@example.com": 1}, info[0][2])
         self.assertEqual({"Foo": 2, "FOO": 1}, info[0][3])
+
+
+class TestCollapseAuthorCounts(TestCase):
+    def test_no_conflicts(self):
+        info = collapse_author_counts(
+            [("Bar <bar@example.com>", 2), ("Foo <foo@example.com>", 1)]
+        )
+        self.assertEqual(
+            [
+                (2, ["Bar <bar@example.com>"], {"bar@example.com": 2}, {"Bar": 2}),
+                (1, ["Foo <foo@example.com>"], {"foo@example.com": 1}, {"Foo": 1}),
+            ],
+            info,
+        )
+
+    def test_different_email(self):
+        info = collapse_author_counts(
+            [("Foo <bar@example.com>", 2), ("Foo <foo@example.com>", 1)]
+        )
+        self.assertEqual(1, len(info))
+        self.assertEqual(3, info[0][0])
+        self.assertEqual(["Foo <bar@example.com>", "Foo <foo@example.com>"], info[0][1])
+        self.assertEqual({"foo@example.com": 1, "bar@example.com": 2}, info[0][2])
+        self.assertEqual({"Foo": 3}, info[0][3])
+
+    def test_different_name_case(self):
+        info = collapse_author_counts(
+            [("FOO <bar@example.com>", 1), ("Foo <foo@example.com>", 2)]
+        )
+        self.assertEqual(1, len(info))
+        self.assertEqual(3, info[0][0])
+        self.assertEqual({"foo@example.com": 2, "bar@example.com": 1}, info[0][2])
+        self.assertEqual({"Foo": 2, "FOO": 1}, info[0][3])
+
+    def test_unknown_author(self):
+        self.assertEqual([], collapse_author_counts([("", 1)]))
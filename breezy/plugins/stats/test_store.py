@@ -0,0 +1,123 @@
+"""Tests for the statistics store."""
+
+from ...tests import TestCaseWithTransport
+from .store import StatisticsStore
+
+
+class TestStatisticsStore(TestCaseWithTransport):
+    def setUp(self):
+        super().setUp()
+        self.wt = self.make_branch_and_tree(".")
+        self.build_tree_contents([("foo.c", "int main;\n"), ("README", "Read me\n")])
+        self.wt.add(["foo.c"])
+        self.wt.commit(message="1", committer="Fero <fero@example.com>", rev_id=b"1")
+        self.wt.add(["README"])
+        self.wt.commit(
+            message="2",
+            committer="Jano <jano@example.com>",
+            authors=["Vinco <vinco@example.com>", "Jano <jano@example.com>"],
+            rev_id=b"2",
+        )
+        self.repository = self.wt.branch.repository
+        self.repository.lock_read()
+        self.addCleanup(self.repository.unlock)
+
+    def open_store(self):
+        store = StatisticsStore.open(self.wt.branch)
+        self.addCleanup(store.close)
+        return store
+
+    def test_open_creates_file(self):
+        self.open_store()
+        self.assertPathExists(".bzr/branch/stats.db")
+
+    def test_update_ancestry(self):
+        store = self.open_store()
+        self.assertEqual(1, store.update_ancestry(self.repository, "", b"1"))
+        self.assertEqual(0, store.update_ancestry(self.repository, "", b"1"))
+        self.assertEqual(1, store.update_ancestry(self.repository, "", b"2"))
+        self.assertEqual([], store.missing_revisions([b"1", b"2"]))
+
+    def test_update_ancestry_backwards(self):
+        store = self.open_store()
+        store.select_ancestry(self.repository, "", b"2")
+        store.select_ancestry(self.repository, "", b"1")
+        self.assertEqual(
+            [("Fero <fero@example.com>", 1)], list(store.iter_author_counts())
+        )
+
+    def test_author_counts(self):
+        store = self.open_store()
+        store.select_ancestry(self.repository, "", b"2")
+        self.assertEqual(
+            [
+                ("Fero <fero@example.com>", 1),
+                ("Jano <jano@example.com>", 1),
+                ("Vinco <vinco@example.com>", 1),
+            ],
+            list(store.iter_author_counts()),
+        )
+
+    def test_persistent(self):
+        self.open_store().update_ancestry(self.repository, "", b"2")
+        store = self.open_store()
+        self.assertEqual([], store.missing_revisions([b"1", b"2"]))
+        self.assertEqual(0, store.update_ancestry(self.repository, "", b"2"))
+
+    def test_select_skips_ghosts(self):
+        store = self.open_store()
+        store.select(self.repository, [b"2", b"ghost"])
+        self.assertEqual(
+            [("Jano <jano@example.com>", 1), ("Vinco <vinco@example.com>", 1)],
+            list(store.iter_author_counts()),
+        )
+
+    def test_classify(self):
+        store = self.open_store()
+        store.select_ancestry(self.repository, "", b"2")
+        store.classify(self.repository)
+        self.assertEqual(
+            ({"documentation": 1}, 1),
+            store.get_class_counts(["Vinco <vinco@example.com>"]),
+        )
+        self.assertEqual(
+            [
+                ("code", "Fero <fero@example.com>", 1),
+                ("documentation", "Jano <jano@example.com>", 1),
+                ("documentation", "Vinco <vinco@example.com>", 1),
+            ],
+            list(store.iter_credit_counts()),
+        )
+
+    def test_class_counts_revision_once(self):
+        store = self.open_store()
+        store.select_ancestry(self.repository, "", b"2")
+        store.classify(self.repository)
+        self.assertEqual(
+            ({"documentation": 1}, 1),
+            store.get_class_counts(
+                ["Vinco <vinco@example.com>", "Jano <jano@example.com>"]
+            ),
+        )
+
+    def test_added_concurrently(self):
+        store = self.open_store()
+        other = self.open_store()
+        store.select_ancestry(self.repository, "", b"2")
+        store.classify(self.repository)
+        other.add_revisions(self.repository, [b"1", b"2"])
+        other.select_ancestry(self.repository, "", b"2")
+        other.db.execute("update revisions set classified = 0")
+        other.classify(self.repository)
+        self.assertEqual(
+            [
+                ("Fero <fero@example.com>", 1),
+                ("Jano <jano@example.com>", 1),
+                ("Vinco <vinco@example.com>", 1),
+            ],
+            list(other.iter_author_counts()),
+        )
+        self.assertEqual(
+            ({"documentation": 1}, 1),
+            other.get_class_counts(["Vinco <vinco@example.com>"]),
+        )
@@ -16,6 +16,12 @@
 
 """bzr-upload command implementations."""
 
+import collections
+import contextlib
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
 from dromedary import errors as transport_errors
 from dromedary.errors import NoSuchFile
 
@@ -96,6 +102,129 @@ branch.conf file:
 # 'upload_revid_location'
 
 
+class _UploadPool:
+    """Run upload operations over several connections at once.
+
+    Transports can not be shared between threads, so each worker thread
+    uses its own connection to the upload location. Those connections are
+    opened up front, on the calling thread, with the credentials of the
+    upload transport. With a single job, operations are run as soon as they
+    are submitted, on the calling thread.
+    """
+
+    def __init__(self, to_transport, jobs):
+        """Initialize the pool.
+
+        Args:
+            to_transport: Transport for the upload location.
+            jobs: Number of operations to run concurrently.
+        """
+        self._transport = to_transport
+        self._local = threading.local()
+        self._worker_transports = []
+        if jobs > 1:
+            try:
+                for _ in range(jobs):
+                    self._worker_transports.append(self._open_worker_transport())
+            except BaseException:
+                self._disconnect_workers()
+                raise
+            self._idle_transports = collections.deque(self._worker_transports)
+            self._executor = ThreadPoolExecutor(
+                max_workers=jobs, thread_name_prefix="upload"
+            )
+        else:
+            self._executor = None
+        self._pending = collections.deque()
+        # Bound the number of texts waiting to be uploaded.
+        self._window = jobs * 4
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None:
+                self.wait()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown(wait=True, cancel_futures=True)
+            self._disconnect_workers()
+        return False
+
+    def _open_worker_transport(self):
+        """Open a transport for a worker thread.
+
+        Connected transports get a connection of their own, established
+        right away so that any credentials prompt happens here rather than
+        concurrently in the worker threads.
+        """
+        main = self._transport
+        if not isinstance(main, transport.ConnectedTransport):
+            return main.clone()
+        # clone() would share the connection of the main transport, so
+        # build a new transport and hand it the credentials already known.
+        worker = main.__class__(main.base)
+        worker._parsed_url.password = main._parsed_url.password
+        worker._parsed_url.quoted_password = main._parsed_url.quoted_password
+        worker._update_credentials(main._get_credentials())
+        worker.has(".")
+        return worker
+
+    def _disconnect_workers(self):
+        while self._worker_transports:
+            self._worker_transports.pop().disconnect()
+
+    def worker_transport(self):
+        """Return the transport of the current worker thread, if any."""
+        return getattr(self._local, "transport", None)
+
+    def _run(self, fn, args):
+        if self.worker_transport() is None:
+            # There are as many transports as worker threads.
+            self._local.transport = self._idle_transports.popleft()
+        return fn(*args)
+
+    def submit(self, fn, *args, callback=None):
+        """Run fn(*args), possibly in a worker thread.
+
+        Args:
+            fn: The operation to run.
+            args: Arguments for fn.
+            callback: Optional function to call with the result of fn, on
+                the calling thread.
+        """
+        if self._executor is None:
+            result = fn(*args)
+            if callback is not None:
+                callback(result)
+            return
+        self._pending.append((self._executor.submit(self._run, fn, args), callback))
+        while len(self._pending) > self._window:
+            self._collect(*self._pending.popleft())
+
+    def _collect(self, future, callback):
+        result = future.result()
+        if callback is not None:
+            callback(result)
+
+    def wait(self):
+        """Wait for all submitted operations to finish.
+
+        Raises:
+            The error of the first operation that failed, if any.
+        """
+        error = None
+        while self._pending:
+            try:
+                self._collect(*self._pending.popleft())
+            except Exception as e:
+                if error is None:
+                    error = e
+        if error is not None:
+            raise error
+
+
 class BzrUploader:
     """Handles uploading working tree contents to a remote location.
 
@@ -114,13 +243,29 @@ class BzrUploader:
         tree: The revision tree to upload.
         rev_id: The revision ID being uploaded.
         quiet: Whether to suppress progress output.
+        jobs: Number of uploads to run concurrently.
+        skip_unchanged: Whether full uploads skip files whose remote copy
+            already has the right contents.
         _pending_deletions: List of directories to delete later.
         _pending_renames: List of pending rename operations.
         _uploaded_revid: The last uploaded revision ID (cached).
+        _uploaded_sha1s: Dict mapping the paths of the files in the last
+            uploaded revision to their SHA-1, when skipping unchanged files.
         _ignored: Globster object for ignored file patterns.
+        _pool: The _UploadPool used while uploading files.
     """
 
-    def __init__(self, branch, to_transport, outf, tree, rev_id, quiet=False):
+    def __init__(
+        self,
+        branch,
+        to_transport,
+        outf,
+        tree,
+        rev_id,
+        quiet=False,
+        jobs=1,
+        skip_unchanged=False,
+    ):
         """Initialize the BzrUploader.
 
         Args:
@@ -130,6 +275,12 @@ class BzrUploader:
             tree: The revision tree to upload.
             rev_id: The revision ID to upload.
             quiet: Whether to suppress progress output. Defaults to False.
+            jobs: Number of uploads to run concurrently, each over its own
+                connection. Defaults to 1.
+            skip_unchanged: Whether full uploads skip the remote files that
+                are unchanged. Files with the right size and mode are
+                compared with the last uploaded revision, and are only read
+                back when it does not have them. Defaults to False.
         """
         self.branch = branch
         self.to_transport = to_transport
@@ -137,10 +288,22 @@ class BzrUploader:
         self.tree = tree
         self.rev_id = rev_id
         self.quiet = quiet
+        self.jobs = jobs
+        self.skip_unchanged = skip_unchanged
         self._pending_deletions = []
         self._pending_renames = []
         self._uploaded_revid = None
+        self._uploaded_sha1s = {}
         self._ignored = None
+        self._pool = None
+
+    def _get_transport(self):
+        """Return the transport to use on the current thread."""
+        if self._pool is not None:
+            worker_transport = self._pool.worker_transport()
+            if worker_transport is not None:
+                return worker_transport
+        return self.to_transport
 
     def _up_stat(self, relpath):
         """Get file statistics from the remote location.
@@ -151,7 +314,7 @@ class BzrUploader:
         Returns:
             stat_result: File statistics object.
         """
-        return self.to_transport.stat(urlutils.escape(relpath))
+        return self._get_transport().stat(urlutils.escape(relpath))
 
     def _up_rename(self, old_path, new_path):
         """Rename a file or directory on the remote location.
@@ -163,7 +326,7 @@ class BzrUploader:
         Returns:
             Result of the rename operation.
         """
-        return self.to_transport.rename(
+        return self._get_transport().rename(
             urlutils.escape(old_path), urlutils.escape(new_path)
         )
 
@@ -176,7 +339,7 @@ class BzrUploader:
         Returns:
             Result of the delete operation.
         """
-        return self.to_transport.delete(urlutils.escape(relpath))
+        return self._get_transport().delete(urlutils.escape(relpath))
 
     def _up_delete_tree(self, relpath):
         """Recursively delete a directory tree on the remote location.
@@ -187,7 +350,7 @@ class BzrUploader:
         Returns:
             Result of the delete tree operation.
         """
-        return self.to_transport.delete_tree(urlutils.escape(relpath))
+        return self._get_transport().delete_tree(urlutils.escape(relpath))
 
     def _up_mkdir(self, relpath, mode):
         """Create a directory on the remote location.
@@ -199,7 +362,7 @@ class BzrUploader:
         Returns:
             Result of the mkdir operation.
         """
-        return self.to_transport.mkdir(urlutils.escape(relpath), mode)
+        return self._get_transport().mkdir(urlutils.escape(relpath), mode)
 
     def _up_rmdir(self, relpath):
         """Remove an empty directory on the remote location.
@@ -210,7 +373,7 @@ class BzrUploader:
         Returns:
             Result of the rmdir operation.
         """
-        return self.to_transport.rmdir(urlutils.escape(relpath))
+        return self._get_transport().rmdir(urlutils.escape(relpath))
 
     def _up_put_bytes(self, relpath, bytes, mode):
         """Write bytes to a file on the remote location.
@@ -220,7 +383,7 @@ class BzrUploader:
             bytes: Content to write to the file.
             mode: Unix file permissions for the file.
         """
-        self.to_transport.put_bytes(urlutils.escape(relpath), bytes, mode)
+        self._get_transport().put_bytes(urlutils.escape(relpath), bytes, mode)
 
     def _up_get_bytes(self, relpath):
         """Read bytes from a file on the remote location.
@@ -231,7 +394,7 @@ class BzrUploader:
         Returns:
             bytes: Content of the file.
         """
-        return self.to_transport.get_bytes(urlutils.escape(relpath))
+        return self._get_transport().get_bytes(urlutils.escape(relpath))
 
     def set_uploaded_revid(self, rev_id):
         """Store the uploaded revision ID on the remote location.
@@ -324,11 +487,135 @@ class BzrUploader:
                 based on executable status (755 for executable, 644 otherwise).
         """
         if mode is None:
-            mode = 509 if self.tree.is_executable(new_relpath) else 436
+            mode = self._file_mode(new_relpath)
         if not self.quiet:
             self.outf.write(f"Uploading {old_relpath}\n")
         self._up_put_bytes(old_relpath, self.tree.get_file_text(new_relpath), mode)
 
+    def _file_mode(self, relpath):
+        """Return the mode to upload the file at relpath with."""
+        return 509 if self.tree.is_executable(relpath) else 436
+
+    def _get_uploaded_sha1s(self):
+        """Get the SHA-1 of the files in the last uploaded revision.
+
+        Returns:
+            dict: Maps paths to SHA-1s; empty if the revision is unknown.
+        """
+        revid = self.get_uploaded_revid()
+        if revid == revision.NULL_REVISION:
+            return {}
+        try:
+            tree = self.branch.repository.revision_tree(revid)
+        except errors.NoSuchRevision:
+            return {}
+        with tree.lock_read():
+            return {
+                relpath: tree.get_file_sha1(relpath)
+                for relpath, ie in tree.iter_entries_by_dir()
+                if ie.kind == "file"
+            }
+
+    def _is_unchanged(self, relpath, st, text, mode):
+        """Check whether a remote file already has the given text and mode.
+
+        The cheap size and mode checks are done first. A remote file that
+        was uploaded from the last uploaded revision is then compared by
+        SHA-1 with the file in that revision, so the remote contents are
+        only read for files that it does not have.
+        """
+        if st.st_size != len(text):
+            return False
+        if (st.st_mode & 0o111) != (mode & 0o111):
+            return False
+        uploaded_sha1 = self._uploaded_sha1s.get(relpath)
+        if uploaded_sha1 is not None:
+            return uploaded_sha1 == osutils.sha_string(text)
+        try:
+            return self._up_get_bytes(relpath) == text
+        except transport_errors.PathError:
+            return False
+
+    def _upload_bytes(self, relpath, text, mode, robustly=False):
+        """Upload a file text, possibly from a worker thread.
+
+        Args:
+            relpath: Path where the file should be uploaded.
+            text: The file contents.
+            mode: Unix file permissions.
+            robustly: Whether to clear the way on the remote side first.
+
+        Returns:
+            bool: False if the remote file was left alone because it was
+                already up to date, True otherwise.
+        """
+        if robustly:
+            st = self._force_clear(relpath)
+            if (
+                st is not None
+                and self.skip_unchanged
+                and self._is_unchanged(relpath, st, text, mode)
+            ):
+                return False
+        self._up_put_bytes(relpath, text, mode)
+        return True
+
+    def _upload_files(self, relpaths, robustly=False):
+        """Upload files, spreading the work over the upload pool.
+
+        The file texts are read from the tree in a single pass.
+
+        Args:
+            relpaths: Paths of the files to upload.
+            robustly: Whether to clear the way on the remote side first.
+        """
+
+        def report(relpath, uploaded):
+            if uploaded and not self.quiet:
+                self.outf.write(f"Uploading {relpath}\n")
+
+        for relpath, chunks in self.tree.iter_files_bytes(
+            (relpath, relpath) for relpath in relpaths
+        ):
+            self._pool.submit(
+                self._upload_bytes,
+                relpath,
+                b"".join(chunks),
+                self._file_mode(relpath),
+                robustly,
+                callback=functools.partial(report, relpath),
+            )
+        self._pool.wait()
+
+    def _make_remote_dirs(self, relpaths, robustly=False):
+        """Create remote directories, spreading the work over the upload pool.
+
+        Parents are created before their children: the directories at a
+        given depth are only submitted once all the shallower ones exist.
+
+        Args:
+            relpaths: Paths of the directories to create.
+            robustly: Whether to clear the way on the remote side first.
+        """
+        make_dir = self.make_remote_dir_robustly if robustly else self.make_remote_dir
+        by_depth = {}
+        for relpath in relpaths:
+            by_depth.setdefault(relpath.count("/"), []).append(relpath)
+        for depth in sorted(by_depth):
+            for relpath in by_depth[depth]:
+                self._pool.submit(make_dir, relpath)
+            self._pool.wait()
+
+    @contextlib.contextmanager
+    def _upload_pool(self):
+        """Set up the pool used to upload files concurrently."""
+        self._pool = _UploadPool(self.to_transport, self.jobs)
+        try:
+            with self._pool:
+                yield self._pool
+        finally:
+            self._pool = None
+
     def _force_clear(self, relpath):
         """Forcefully clear any existing item at the given path.
 
@@ -338,9 +625,15 @@ class BzrUploader:
 
         Args:
             relpath: Relative path to clear on the remote.
+
+        Returns:
+            stat_result: The statistics of the regular file left in place at
+                relpath, or None if there is none.
         """
         try:
             st = self._up_stat(relpath)
+            if stat.S_ISREG(st.st_mode):
+                return st
             if stat.S_ISDIR(st.st_mode):
                 # A simple rmdir may not be enough
                 if not self.quiet:
@@ -356,6 +649,7 @@ class BzrUploader:
                 self._up_delete(relpath)
         except transport_errors.PathError:
             pass
+        return None
 
     def upload_file_robustly(self, relpath, mode=None):
         """Upload a file, clearing the way on the remote side.
@@ -538,10 +832,18 @@ class BzrUploader:
         Performs a complete upload of all files, directories, and symlinks
         in the working tree, respecting ignore patterns. This is used for
         initial uploads or when incremental upload is not possible.
+
+        Directories are created first, then symlinks, then the files are
+        uploaded concurrently.
         """
         self.to_transport.ensure_base()  # XXX: Handle errors (add
         # --create-prefix option ?)
-        with self.tree.lock_read():
+        if self.skip_unchanged:
+            self._uploaded_sha1s = self._get_uploaded_sha1s()
+        with self.tree.lock_read(), self._upload_pool():
+            dirs = []
+            files = []
+            symlinks = []
             for relpath, ie in self.tree.iter_entries_by_dir():
                 if relpath in ("", ".bzrignore", ".bzrignore-upload"):
                     # skip root ('')
@@ -553,20 +855,24 @@ class BzrUploader:
                         self.outf.write(f"Ignoring {relpath}\n")
                     continue
                 if ie.kind == "file":
-                    self.upload_file_robustly(relpath)
+                    files.append(relpath)
                 elif ie.kind == "symlink":
-                    try:
-                        self.upload_symlink_robustly(relpath, ie.symlink_target)
-                    except transport_errors.TransportNotPossible:
-                        if not self.quiet:
-                            target = self.tree.path_content_summary(relpath)[3]
-                            self.outf.write(
-                                f"Not uploading symlink {relpath} -> {target}\n"
-                            )
+                    symlinks.append((relpath, ie.symlink_target))
                 elif ie.kind == "directory":
-                    self.make_remote_dir_robustly(relpath)
+                    dirs.append(relpath)
                 else:
                     raise NotImplementedError
+            self._make_remote_dirs(dirs, robustly=True)
+            for relpath, symlink_target in symlinks:
+                try:
+                    self.upload_symlink_robustly(relpath, symlink_target)
+                except transport_errors.TransportNotPossible:
+                    if not self.quiet:
+                        target = self.tree.path_content_summary(relpath)[3]
+                        self.outf.write(
+                            f"Not uploading symlink {relpath} -> {target}\n"
+                        )
+            self._upload_files(files, robustly=True)
             self.set_uploaded_revid(self.rev_id)
 
     def upload_tree(self):
@@ -598,7 +904,7 @@ class BzrUploader:
         self.to_transport.ensure_base()  # XXX: Handle errors (add
         # --create-prefix option ?)
         changes = self.tree.changes_from(from_tree)
-        with self.tree.lock_read():
+        with self.tree.lock_read(), self._upload_pool():
             for change in changes.removed:
                 if self.is_ignored(change.path[0]):
                     if not self.quiet:
@@ -649,26 +955,35 @@ class BzrUploader:
                 else:
                     raise NotImplementedError
 
+            # Deletions, renames and kind changes above are done in order;
+            # the files that are added or modified can then be uploaded
+            # concurrently.
+            dirs = []
+            files = []
+            symlinks = []
             for change in changes.added + changes.copied:
                 if self.is_ignored(change.path[1]):
                     if not self.quiet:
                         self.outf.write(f"Ignoring {change.path[1]}\n")
                     continue
                 if change.kind[1] == "file":
-                    self.upload_file(change.path[1], change.path[1])
+                    files.append(change.path[1])
                 elif change.kind[1] == "directory":
-                    self.make_remote_dir(change.path[1])
+                    dirs.append(change.path[1])
                 elif change.kind[1] == "symlink":
-                    target = self.tree.get_symlink_target(change.path[1])
-                    try:
-                        self.upload_symlink(change.path[1], target)
-                    except transport_errors.TransportNotPossible:
-                        if not self.quiet:
-                            self.outf.write(
-                                f"Not uploading symlink {change.path[1]} -> {target}\n"
-                            )
+                    symlinks.append(change.path[1])
                 else:
                     raise NotImplementedError
+            self._make_remote_dirs(dirs)
+            for relpath in symlinks:
+                target = self.tree.get_symlink_target(relpath)
+                try:
+                    self.upload_symlink(relpath, target)
+                except transport_errors.TransportNotPossible:
+                    if not self.quiet:
+                        self.outf.write(
+                            f"Not uploading symlink {relpath} -> {target}\n"
+                        )
 
             # XXX: Add a test for exec_change
             for change in changes.modified:
@@ -677,12 +992,13 @@ class BzrUploader:
                         self.outf.write(f"Ignoring {change.path[1]}\n")
                     continue
                 if change.kind[1] == "file":
-                    self.upload_file(change.path[1], change.path[1])
+                    files.append(change.path[1])
                 elif change.kind[1] == "symlink":
                     target = self.tree.get_symlink_target(change.path[1])
                     self.upload_symlink(change.path[1], target)
                 else:
                     raise NotImplementedError
+            self._upload_files(files)
 
             self.set_uploaded_revid(self.rev_id)
 
@@ -739,6 +1055,19 @@ class cmd_upload(commands.Command):
             "auto",
             "Trigger an upload from this branch whenever the tip revision changes.",
         ),
+        option.Option(
+            "jobs",
+            type=int,
+            argname="N",
+            help="Number of files to upload concurrently, each over its own "
+            "connection.",
+        ),
+        option.Option(
+            "skip-unchanged",
+            help="When doing a full upload, do not upload files whose remote "
+            "copy already has the right contents, as recorded by the last "
+            "upload.",
+        ),
     ]
 
     def run(
@@ -751,6 +1080,8 @@ class cmd_upload(commands.Command):
         quiet=False,
         auto=None,
         overwrite=False,
+        jobs=1,
+        skip_unchanged=False,
     ):
         """Execute the upload command.
 
@@ -766,6 +1097,9 @@ class cmd_upload(commands.Command):
             quiet: If True, suppresses progress output.
             auto: If True, enables automatic uploads on branch changes.
             overwrite: If True, allows uploading even if trees have diverged.
+            jobs: Number of files to upload concurrently.
+            skip_unchanged: If True, full uploads skip the files whose
+                remote copy is already up to date.
 
         Raises:
             CommandError: If no upload location is specified or saved.
@@ -826,8 +1160,17 @@ class cmd_upload(commands.Command):
 
             tree = branch.repository.revision_tree(rev_id)
 
+            if jobs < 1:
+                raise errors.CommandError("--jobs must be at least 1")
             uploader = BzrUploader(
-                branch, to_transport, self.outf, tree, rev_id, quiet=quiet
+                branch,
+                to_transport,
+                self.outf,
+                tree,
+                rev_id,
+                quiet=quiet,
+                jobs=jobs,
+                skip_unchanged=skip_unchanged,
             )
 
             if not overwrite:
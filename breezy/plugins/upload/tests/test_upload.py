@@ -618,6 +618,46 @@ class TestFullUpload(tests.TestCaseWithTransport, TestUploadMixin):
         self.assertUpFileEqual(b"baz", "dir/goodbye")
         self.assertUpPathModeEqual("dir", 0o775)
 
+    def test_skip_unchanged(self):
+        self.make_branch_and_working_tree()
+        self.add_file("hello", b"foo")
+        self.add_file("goodbye", b"bar")
+        self.do_full_upload()
+        for path in ("hello", "goodbye"):
+            os.utime(osutils.pathjoin(self.upload_dir, path), (1000, 1000))
+        self.modify_file("goodbye", b"baz")
+
+        self.do_full_upload(skip_unchanged=True)
+
+        self.assertUpFileEqual(b"foo", "hello")
+        self.assertEqual(
+            1000, os.stat(osutils.pathjoin(self.upload_dir, "hello")).st_mtime
+        )
+        self.assertUpFileEqual(b"baz", "goodbye")
+
+    def test_skip_unchanged_compares_with_uploaded_revision(self):
+        self.make_branch_and_working_tree()
+        self.add_file("hello", b"foo")
+        self.do_full_upload()
+        # The remote file is not read back: it is known to be the one that
+        # was uploaded from the last uploaded revision.
+        self.set_file_content("hello", b"fox", base=self.upload_dir)
+
+        self.do_full_upload(skip_unchanged=True)
+
+        self.assertUpFileEqual(b"fox", "hello")
+
+    def test_skip_unchanged_without_uploaded_revision(self):
+        self.make_branch_and_working_tree()
+        self.add_file("hello", b"foo")
+        self.do_full_upload()
+        self.set_file_content("hello", b"fox", base=self.upload_dir)
+        os.remove(osutils.pathjoin(self.upload_dir, ".bzr-upload.revid"))
+
+        self.do_full_upload(skip_unchanged=True)
+
+        self.assertUpFileEqual(b"foo", "hello")
+
 
 class TestIncrementalUpload(tests.TestCaseWithTransport, TestUploadMixin):
     do_upload = TestUploadMixin.do_incremental_upload
@@ -721,6 +761,69 @@ class TestIncrementalUpload(tests.TestCaseWithTransport, TestUploadMixin):
         self.assertUpFileEqual(b"foo", "hello")
 
 
+class ParallelUploadMixin:
+    """Upload with several jobs."""
+
+    jobs = 3
+
+    def do_full_upload(self, *args, **kwargs):
+        kwargs.setdefault("jobs", self.jobs)
+        super().do_full_upload(*args, **kwargs)
+
+    def do_incremental_upload(self, *args, **kwargs):
+        kwargs.setdefault("jobs", self.jobs)
+        super().do_incremental_upload(*args, **kwargs)
+
+
+class TestParallelFullUpload(ParallelUploadMixin, TestFullUpload):
+    do_upload = ParallelUploadMixin.do_full_upload
+
+
+class TestParallelIncrementalUpload(ParallelUploadMixin, TestIncrementalUpload):
+    do_upload = ParallelUploadMixin.do_incremental_upload
+
+
+class _RecordingTransport:
+    """Just enough of a transport for _UploadPool."""
+
+    def __init__(self, log):
+        self.log = log
+
+    def clone(self):
+        t = _RecordingTransport(self.log)
+        self.log.append(("clone", t))
+        return t
+
+    def disconnect(self):
+        self.log.append(("disconnect", self))
+
+
+class TestUploadPool(tests.TestCase):
+    def test_worker_transports_disconnected(self):
+        log = []
+        main = _RecordingTransport(log)
+        used = set()
+        with cmds._UploadPool(main, 2) as pool:
+            for _ in range(10):
+                pool.submit(pool.worker_transport, callback=used.add)
+        clones = [t for (action, t) in log if action == "clone"]
+        self.assertEqual(2, len(clones))
+        self.assertTrue(used.issubset(clones))
+        self.assertEqual(
+            sorted(map(id, clones)),
+            sorted(id(t) for (action, t) in log if action == "disconnect"),
+        )
+
+    def test_single_job_uses_main_transport(self):
+        log = []
+        main = _RecordingTransport(log)
+        used = []
+        with cmds._UploadPool(main, 1) as pool:
+            pool.submit(pool.worker_transport, callback=used.append)
+        self.assertEqual([None], used)
+        self.assertEqual([], log)
+
+
 class TestBranchUploadLocations(per_branch.TestCaseWithBranch):
     def test_get_upload_location_unset(self):
         conf = self.get_branch().get_config_stack()
@@ -24,7 +24,15 @@ The main class RenameMap can analyze a working tree to guess which unversioned
 files are actually renamed versions of missing versioned files.
 """
 
+import bisect
+import collections
 import contextlib
+import itertools
+import multiprocessing
+import operator
+import zlib
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
 
 from bzrformats.inventory import NoSuchId
@@ -33,31 +41,180 @@ from . import osutils, progress, trace
 from .i18n import gettext
 from .ui import ui_factory
 
+# Edge hashes are truncated to this modulus, so that they fit in the high
+# bits of the keys of an EdgeHashIndex.
+_EDGE_HASH_MODULUS = 1024 * 1024 * 10
+
+# The number of candidate files scored at a time by a worker process.
+_SCORE_BATCH_SIZE = 64
+
+# The index used by a worker process to score candidate files.
+_worker_index = None
+
+
+def _score_process_context():
+    """Return the multiprocessing context to score candidates in.
+
+    Workers are forked where possible and spawned elsewhere. The index is
+    handed to each worker through _init_score_worker, pickled if need be, so
+    any start method works.
+    """
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return multiprocessing.get_context("spawn")
+
+
+def _init_score_worker(index):
+    global _worker_index
+    _worker_index = index
+
+
+def _score_in_worker(candidates, threshold):
+    """Score a batch of candidate files in a worker process.
+
+    :param candidates: List of (path, edge hashes) tuples.
+    :return: A list of tuples of count, path, tag.
+    """
+    return [
+        (count, path, tag)
+        for path, hashes in candidates
+        for count, tag in _worker_index.matches(hashes, threshold)
+    ]
+
+
+class EdgeHashIndex:
+    """Compact index from edge hashes to the tags of the texts containing them.
+
+    Every (hash, tag) pair is packed into a single 64-bit key, with the hash
+    in the high bits, and the keys are kept in one sorted array that is
+    searched by bisection.  This takes 8 bytes per distinct edge of each
+    text, where a dict of sets takes well over a hundred.
+    """
+
+    def __init__(self):
+        """Create an empty index."""
+        self._tags = []
+        self._tag_numbers = {}
+        # The number of edges of the texts added for each tag.
+        self._edge_counts = array("q")
+        self._keys = array("q")
+        # Keys added since the index was last searched.
+        self._new_keys = array("q")
+
+    def __getstate__(self):
+        """Sort the keys before the index is pickled for worker processes."""
+        self._sort()
+        return self.__dict__
+
+    def add(self, hashes, tag):
+        """Add the edge hashes of a text.
+
+        :param hashes: The edge hashes of the text.
+        :param tag: A tag uniquely associated with the text (i.e. file-id)
+        """
+        number = self._tag_numbers.get(tag)
+        if number is None:
+            number = self._tag_numbers[tag] = len(self._tags)
+            self._tags.append(tag)
+            self._edge_counts.append(0)
+        self._edge_counts[number] += len(hashes)
+        self._new_keys.extend(h << 32 | number for h in set(hashes))
+
+    def _sort(self):
+        if self._new_keys:
+            # Adding a text for a tag again may repeat keys.
+            keys = sorted(itertools.chain(self._keys, self._new_keys))
+            self._keys = array("q", (key for key, _ in itertools.groupby(keys)))
+            self._new_keys = array("q")
+
+    def _lookup(self, my_hash):
+        """Return the numbers of the tags of the texts containing an edge."""
+        keys = self._keys
+        i = bisect.bisect_left(keys, my_hash << 32)
+        numbers = []
+        while i < len(keys) and keys[i] >> 32 == my_hash:
+            numbers.append(keys[i] & 0xFFFFFFFF)
+            i += 1
+        return numbers
+
+    def get(self, my_hash, default=None):
+        """Return the set of tags of the texts containing an edge."""
+        self._sort()
+        numbers = self._lookup(my_hash)
+        if not numbers:
+            return default
+        return frozenset(self._tags[n] for n in numbers)
+
+    def __getitem__(self, my_hash):
+        """Return the set of tags of the texts containing an edge."""
+        tags = self.get(my_hash)
+        if tags is None:
+            raise KeyError(my_hash)
+        return tags
+
+    def matches(self, hashes, threshold=0.0):
+        """Find the texts that share edges with a text.
+
+        Hits are weighted according to the number of tags the hash is
+        associated with; more tags means that the hash is less rare and should
+        tend to be ignored.
+
+        Each distinct edge of the text is looked up by bisection, in Python,
+        so this takes about as long per text as a dict of sets would.
+
+        :param hashes: The edge hashes of the text.
+        :param threshold: The minimum similarity of a match, from 0 to 1.  The
+            similarity is the hit count divided by the number of edges of the
+            larger of the two texts.
+        :return: A list of (hitcount, tag) tuples.
+        """
+        self._sort()
+        hits = collections.defaultdict(float)
+        # Each distinct edge is only looked up once.
+        for my_hash, count in collections.Counter(hashes).items():
+            numbers = self._lookup(my_hash)
+            if not numbers:
+                continue
+            weight = count / len(numbers)
+            for number in numbers:
+                hits[number] += weight
+        size = len(hashes)
+        return [
+            (count, self._tags[number])
+            for number, count in hits.items()
+            if count >= threshold * max(size, self._edge_counts[number])
+        ]
+
 
 class RenameMap:
     """Determine a mapping of renames."""
 
-    def __init__(self, tree):
+    def __init__(self, tree, threshold=0.0, jobs=1):
         """Initialize a RenameMap for the given tree.
 
         Args:
             tree: The tree to analyze for rename detection.
+            threshold: The minimum similarity, from 0 to 1, of a file to a
+                missing file for it to be considered a rename.
+            jobs: The number of processes to score candidate files in.
         """
         self.tree = tree
-        self.edge_hashes = {}
+        self.threshold = threshold
+        self.jobs = jobs
+        self.edge_hashes = EdgeHashIndex()
 
     @staticmethod
     def iter_edge_hashes(lines):
         """Iterate through the hashes of line pairs (which make up an edge).
 
-        The hash is truncated using a modulus to avoid excessive memory
-        consumption by the hitscount dict.  A modulus of 10Mi means that the
-        maximum number of keys is 10Mi.  (Keys are normally 32 bits, e.g.
-        4 Gi)
+        The hash is truncated using a modulus, so that it can be packed
+        into the keys of an EdgeHashIndex.  The hash does not depend on the
+        process, so that edge hashes can be compared between processes.
         """
-        modulus = 1024 * 1024 * 10
-        for n in range(len(lines)):
-            yield hash(tuple(lines[n : n + 2])) % modulus
+        modulus = _EDGE_HASH_MODULUS
+        next_lines = itertools.chain(itertools.islice(lines, 1, None), [b""])
+        for my_hash in map(zlib.crc32, map(operator.add, lines, next_lines)):
+            yield my_hash % modulus
 
     def add_edge_hashes(self, lines, tag):
         """Update edge_hashes to include the given lines.
@@ -65,8 +222,7 @@ class RenameMap:
         :param lines: The lines to update the hashes for.
         :param tag: A tag uniquely associated with these lines (i.e. file-id)
         """
-        for my_hash in self.iter_edge_hashes(lines):
-            self.edge_hashes.setdefault(my_hash, set()).add(tag)
+        self.edge_hashes.add(array("q", self.iter_edge_hashes(lines)), tag)
 
     def add_file_edge_hashes(self, tree, file_ids):
         """Update to reflect the hashes for files in the tree.
@@ -94,31 +250,109 @@ class RenameMap:
         :param lines: The lines to calculate hashes of.
         :return: a dict of {tag: hitcount}
         """
-        hits = {}
-        for my_hash in self.iter_edge_hashes(lines):
-            tags = self.edge_hashes.get(my_hash)
-            if tags is None:
-                continue
-            taglen = len(tags)
-            for tag in tags:
-                if tag not in hits:
-                    hits[tag] = 0
-                hits[tag] += 1.0 / taglen
-        return hits
+        hashes = array("q", self.iter_edge_hashes(lines))
+        return {tag: count for count, tag in self.edge_hashes.matches(hashes)}
+
+    def hash_candidates(self, paths):
+        """Read the listed paths in the tree and calculate their hashes.
+
+        :return: A dict mapping paths to (sha1, edge hashes) tuples.
+        """
+        candidates = {}
+        with ui_factory.nested_progress_bar() as task:
+            for num, path in enumerate(paths):
+                task.update(gettext("Calculating hashes"), num, len(paths))
+                lines = self.tree.get_file_lines(path)
+                candidates[path] = (
+                    osutils.sha_strings(lines),
+                    array("q", self.iter_edge_hashes(lines)),
+                )
+        return candidates
 
     def get_all_hits(self, paths):
         """Find all the hit counts for the listed paths in the tree.
 
         :return: A list of tuples of count, path, file_id.
         """
+        candidates = self.hash_candidates(paths)
+        return self.get_candidate_hits(
+            [(path, hashes) for path, (sha1, hashes) in candidates.items()]
+        )
+
+    def get_candidate_hits(self, candidates):
+        """Find all the hit counts for candidate files.
+
+        Matches weaker than the threshold are left out.  With more than one
+        job, the candidates are scored in a pool of processes.
+
+        :param candidates: A list of (path, edge hashes) tuples.
+        :return: A list of tuples of count, path, file_id.
+        """
+        if self.jobs <= 1 or len(candidates) <= _SCORE_BATCH_SIZE:
+            all_hits = []
+            with ui_factory.nested_progress_bar() as task:
+                for num, (path, hashes) in enumerate(candidates):
+                    task.update(gettext("Determining hash hits"), num, len(candidates))
+                    all_hits.extend(
+                        (count, path, tag)
+                        for count, tag in self.edge_hashes.matches(
+                            hashes, self.threshold
+                        )
+                    )
+            return all_hits
+        batches = [
+            candidates[i : i + _SCORE_BATCH_SIZE]
+            for i in range(0, len(candidates), _SCORE_BATCH_SIZE)
+        ]
         all_hits = []
-        with ui_factory.nested_progress_bar() as task:
-            for num, path in enumerate(paths):
-                task.update(gettext("Determining hash hits"), num, len(paths))
-                hits = self.hitcounts(self.tree.get_file_lines(path))
-                all_hits.extend((v, path, k) for k, v in hits.items())
+        with (
+            ui_factory.nested_progress_bar() as task,
+            ProcessPoolExecutor(
+                max_workers=self.jobs,
+                mp_context=_score_process_context(),
+                initializer=_init_score_worker,
+                initargs=(self.edge_hashes,),
+            ) as executor,
+        ):
+            futures = [
+                executor.submit(_score_in_worker, batch, self.threshold)
+                for batch in batches
+            ]
+            for num, future in enumerate(futures):
+                task.update(gettext("Determining hash hits"), num, len(futures))
+                all_hits.extend(future.result())
         return all_hits
 
+    @staticmethod
+    def match_exact(from_tree, file_ids, candidates):
+        """Match missing files to candidate files with the same contents.
+
+        Only contents that belong to a single missing file and a single
+        candidate are matched; other files are left to be matched by their
+        edge hashes.  Empty files are never matched.
+
+        :param from_tree: The tree containing the missing files.
+        :param file_ids: The file ids of the missing files.
+        :param candidates: A dict mapping the paths of candidate files to
+            (sha1, edge hashes) tuples, as returned by hash_candidates.
+        :return: A dict mapping paths to file ids.
+        """
+        missing = {}
+        for file_id in file_ids:
+            path = from_tree.id2path(file_id)
+            if from_tree.get_file_size(path):
+                missing.setdefault(from_tree.get_file_sha1(path), []).append(file_id)
+        found = {}
+        for path, (sha1, hashes) in candidates.items():
+            if len(hashes) > 0:
+                found.setdefault(sha1, []).append(path)
+        matches = {}
+        for sha1, paths in found.items():
+            missing_ids = missing.get(sha1, ())
+            if len(paths) == 1 and len(missing_ids) == 1:
+                matches[paths[0]] = missing_ids[0]
+        return matches
+
     def file_match(self, paths):
         """Return a mapping from file_ids to the supplied paths."""
         return self._match_hits(self.get_all_hits(paths))
@@ -211,20 +445,26 @@ class RenameMap:
         return missing_files, missing_parents, candidate_files
 
     @classmethod
-    def guess_renames(klass, from_tree, to_tree, dry_run=False):
+    def guess_renames(klass, from_tree, to_tree, dry_run=False, threshold=0.0, jobs=1):
         """Guess which files to rename, and perform the rename.
 
         We assume that unversioned files and missing files indicate that
         versioned files have been renamed outside of Bazaar.
 
+        Files with the same contents as a missing file are matched first;
+        only the remaining missing files are indexed by their edge hashes.
+
         :param from_tree: A tree to compare from
         :param to_tree: A write-locked working tree.
+        :param threshold: The minimum similarity, from 0 to 1, of a file to a
+            missing file for it to be considered a rename.
+        :param jobs: The number of processes to score candidate files in.
         """
         required_parents = {}
         with ui_factory.nested_progress_bar() as task:
             pp = progress.ProgressPhase("Guessing renames", 4, task)
             with from_tree.lock_read():
-                rn = klass(to_tree)
+                rn = klass(to_tree, threshold=threshold, jobs=jobs)
                 pp.next_phase()
                 (
                     missing_files,
@@ -232,9 +472,23 @@ class RenameMap:
                     candidate_files,
                 ) = rn._find_missing_files(from_tree)
                 pp.next_phase()
-                rn.add_file_edge_hashes(from_tree, missing_files)
+                candidates = rn.hash_candidates(sorted(candidate_files))
+                matches = rn.match_exact(from_tree, missing_files, candidates)
+                rn.add_file_edge_hashes(
+                    from_tree, missing_files.difference(matches.values())
+                )
             pp.next_phase()
-            matches = rn.file_match(candidate_files)
+            matches.update(
+                rn._match_hits(
+                    rn.get_candidate_hits(
+                        [
+                            (path, hashes)
+                            for path, (sha1, hashes) in candidates.items()
+                            if path not in matches
+                        ]
+                    )
+                )
+            )
             parents_matches = matches
             while len(parents_matches) > 0:
                 required_parents = rn.get_required_parents(parents_matches)
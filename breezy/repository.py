@@ -984,6 +984,16 @@ class Repository(controldir.ControlComponent, _RelockDebugMixin):
             r = self.get_revision(revision_id)
             return list(self.get_revision_deltas([r]))[0]
 
+    def _log_index_transport(self):
+        """Return the transport for the file history index of this repository.
+
+        See breezy.log_index.
+
+        Returns: A transport, or None if this repository can not have a file
+            history index.
+        """
+        return None
+
     def get_revision_deltas(self, revisions, specific_files=None):
         """Produce a generator of revision deltas.
 
@@ -1151,6 +1161,14 @@ class Repository(controldir.ControlComponent, _RelockDebugMixin):
             the pack operation.
         """
 
+    def autopack(self):
+        """Incrementally compress the data within the repository.
+
+        Unlike pack(), this only does the cheap packing that repositories may
+        do automatically when new data is added, such as combining small pack
+        files. For repository types that do not need this it is a no-op.
+        """
+
     def get_transaction(self):
         """Return the current transaction from the control files."""
         return self.control_files.get_transaction()
@@ -1273,7 +1291,14 @@ class Repository(controldir.ControlComponent, _RelockDebugMixin):
         """Return the text for a signature."""
         raise NotImplementedError(self.get_signature_text)
 
-    def check(self, revision_ids=None, callback_refs=None, check_repo=True):
+    def check(
+        self,
+        revision_ids=None,
+        callback_refs=None,
+        check_repo=True,
+        jobs=1,
+        incremental=False,
+    ):
         """Check consistency of all history of given revision_ids.
 
         Different repository implementations should override _check().
@@ -1286,14 +1311,27 @@ class Repository(controldir.ControlComponent, _RelockDebugMixin):
             see breezy.check.
           check_repo: If False do not check the repository contents, just
             calculate the data callback_refs requires and call them back.
+          jobs: The number of processes to verify the repository contents
+            in, where the repository supports it.
+          incremental: Only verify the contents added since the last
+            successful incremental check, where the repository supports it.
         """
         return self._check(
             revision_ids=revision_ids,
             callback_refs=callback_refs,
             check_repo=check_repo,
+            jobs=jobs,
+            incremental=incremental,
         )
 
-    def _check(self, revision_ids=None, callback_refs=None, check_repo=True):
+    def _check(
+        self,
+        revision_ids=None,
+        callback_refs=None,
+        check_repo=True,
+        jobs=1,
+        incremental=False,
+    ):
         raise NotImplementedError(self.check)
 
     def _warn_if_deprecated(self, branch=None):
@@ -127,6 +127,7 @@ isolated_environ = {
     "HOME": None,
     "GNUPGHOME": None,
     "XDG_CONFIG_HOME": None,
+    "XDG_CACHE_HOME": None,  # the plugin manifest is kept there
     # brz now uses the Win32 API and doesn't rely on APPDATA, but the
     # tests do check our impls match APPDATA
     "BRZ_EDITOR": None,  # test_msgeditor manipulates this variable
@@ -4184,6 +4185,7 @@ def _test_suite_testmod_names():
         "breezy.tests.test_filter_tree",
         "breezy.tests.test_foreign",
         "breezy.tests.test_forge",
+        "breezy.tests.test_forge_cache",
         "breezy.tests.test_generate_docs",
         "breezy.tests.test_globbing",
         "breezy.tests.test_gpg",
@@ -4207,6 +4209,7 @@ def _test_suite_testmod_names():
         "breezy.tests.test_lock",
         "breezy.tests.test_lockdir",
         "breezy.tests.test_log",
+        "breezy.tests.test_log_index",
         "breezy.tests.test_lru_cache",
         "breezy.tests.test_lsprof",
         "breezy.tests.test_mail_client",
@@ -4217,6 +4220,7 @@ def _test_suite_testmod_names():
         "breezy.tests.test_mergeable",
         "breezy.tests.test_merge_core",
         "breezy.tests.test_merge_directive",
+        "breezy.tests.test_merge_sort_cache",
         "breezy.tests.test_mergetools",
         "breezy.tests.test_missing",
         "breezy.tests.test_msgeditor",
@@ -4229,6 +4233,7 @@ def _test_suite_testmod_names():
         "breezy.tests.test_patch",
         "breezy.tests.test_patches",
         "breezy.tests.test_permissions",
+        "breezy.tests.test_plugin_manifest",
         "breezy.tests.test_plugins",
         "breezy.tests.test_progress",
         "breezy.tests.test_reconcile",
@@ -4371,6 +4376,7 @@ def test_suite(keep_only=None, starting_with=None):
         suite.addTest(doc_suite)
 
     default_encoding = sys.getdefaultencoding()
+    _mod_plugin.load_deferred_plugins()
     for name, plugin in _mod_plugin.plugins().items():
         if not interesting_module(plugin.module.__name__):
             continue
@@ -59,6 +59,25 @@ class TestCheck(TestCaseWithTransport):
             r"     [01] file-ids\n",
         )
 
+    def test_check_repository_jobs(self):
+        tree = self.make_branch_and_tree(".")
+        tree.commit("foo")
+        _out, err = self.run_bzr("check --repo --jobs 2")
+        self.assertContainsRe(err, r"checked repository.*\n     1 revisions\n")
+
+    def test_check_jobs_must_be_positive(self):
+        self.make_branch_and_tree(".")
+        self.run_bzr_error(["--jobs must be at least 1"], "check --jobs 0")
+
+    def test_check_repository_incremental(self):
+        tree = self.make_branch_and_tree(".")
+        tree.commit("foo")
+        self.run_bzr("check --repo --incremental")
+        self.assertPathExists(".bzr/repository/verified-packs")
+        tree.commit("bar")
+        _out, err = self.run_bzr("check --repo --incremental")
+        self.assertContainsRe(err, r"checked repository.*\n     2 revisions\n")
+
     def test_check_tree(self):
         tree = self.make_branch_and_tree(".")
         tree.commit("foo")
@@ -187,6 +187,18 @@ class TestExport(TestCaseWithTransport):
     def test_tbz2_export(self):
         self.run_tar_export_disk_and_stdout("tbz2", "bz2")
 
+    def test_tgz_export_jobs(self):
+        self.make_basic_tree()
+        self.run_bzr("export -d tree --jobs 2 test.tgz")
+        with tarfile.open("test.tgz", mode="r|gz") as ball:
+            self.assertTarANameAndContent(ball, root="test/")
+
+    def test_export_jobs_must_be_positive(self):
+        self.make_basic_tree()
+        self.run_bzr_error(
+            ["--jobs must be at least 1"], "export -d tree --jobs 0 test.tgz"
+        )
+
     def test_zip_export_unicode(self):
         self.requireFeature(features.UnicodeFilenameFeature)
         tree = self.make_branch_and_tree("zip")
@@ -19,7 +19,7 @@
 
 import os
 
-from breezy import branchbuilder, errors, log, osutils, tests
+from breezy import branchbuilder, errors, log, log_index, osutils, tests
 from breezy.tests import features, test_log
 
 
@@ -996,6 +996,43 @@ class TestLogMultiple(TestLogWithLogCatcher):
         self.assertLogRevnos(["dir2", "file5"], ["5", "3"])
 
 
+class TestLogFileWithIndex(TestLogFile):
+    """Log single files with the file history index."""
+
+    def prepare_tree(self, complex=False):
+        super().prepare_tree(complex=complex)
+        self.run_bzr("log-index")
+
+    def test_index_extended(self):
+        self.prepare_tree()
+        self.build_tree_contents([("file1", b"changed")])
+        self.run_bzr("commit -m change-file1")
+        self.assertLogRevnos(["file1"], ["5", "1"])
+
+
+class TestLogMultipleWithIndex(TestLogMultiple):
+    """Log files and directories with the file history index."""
+
+    def prepare_tree(self):
+        super().prepare_tree()
+        self.run_bzr("log-index")
+
+
+class TestLogIndex(tests.TestCaseWithTransport):
+    def test_create_and_remove(self):
+        tree = self.make_branch_and_tree(".")
+        tree.commit("one")
+        tree.commit("two")
+        out, err = self.run_bzr("log-index")
+        self.assertEqual("", out)
+        self.assertEqual("Indexed 2 revisions.\n", err)
+        self.assertTrue(log_index.FileHistoryIndex.exists(tree.branch.repository))
+        out, err = self.run_bzr("log-index")
+        self.assertEqual("Indexed 0 revisions.\n", err)
+        self.run_bzr("log-index --remove")
+        self.assertFalse(log_index.FileHistoryIndex.exists(tree.branch.repository))
+
+
 class MainlineGhostTests(TestLogWithLogCatcher):
     def setUp(self):
         super().setUp()
@@ -499,6 +499,31 @@ class TestMove(TestCaseWithTransport):
         _out, err = self.run_bzr("mv --auto --after", working_dir="tree", retcode=3)
         self.assertEqual("brz: ERROR: --after cannot be specified with --auto.\n", err)
 
+    def test_mv_auto_jobs(self):
+        self.make_abcd_tree()
+        out, err = self.run_bzr("mv --auto --jobs 2", working_dir="tree")
+        self.assertEqual(out, "")
+        self.assertEqual(err, "a => b\nc => d\n")
+
+    def test_mv_auto_jobs_must_be_positive(self):
+        self.make_abcd_tree()
+        _out, err = self.run_bzr("mv --auto --jobs 0", working_dir="tree", retcode=3)
+        self.assertEqual("brz: ERROR: --jobs must be at least 1.\n", err)
+
+    def test_mv_auto_similarity(self):
+        self.make_abcd_tree()
+        _out, err = self.run_bzr(
+            "mv --auto --similarity 101", working_dir="tree", retcode=3
+        )
+        self.assertEqual("brz: ERROR: --similarity must be between 0 and 100.\n", err)
+
+    def test_mv_no_auto_similarity(self):
+        self.make_abcd_tree()
+        _out, err = self.run_bzr(
+            "mv c d --similarity 50", working_dir="tree", retcode=3
+        )
+        self.assertEqual("brz: ERROR: --similarity and --jobs require --auto.\n", err)
+
     def test_mv_quiet(self):
         tree = self.make_branch_and_tree(".")
         self.build_tree(["aaa"])
@@ -79,3 +79,18 @@ class TestPack(tests.TestCaseWithTransport):
 
         pack_names = t.list_dir("repository/obsolete_packs")
         self.assertEqual(len(pack_names), 0)
+
+    def test_pack_incremental(self):
+        """--incremental combines packs that commits left alone."""
+        wt = self.make_branch_and_tree(".")
+        t = wt.branch.repository.controldir.transport
+        self.run_bzr(["config", "--scope", "breezy", "repository.defer_autopack=True"])
+        self._make_versioned_file("file0.txt")
+        for i in range(9):
+            self._update_file("file0.txt", "HELLO %d\n" % i)
+        self.assertLength(10, t.list_dir("repository/packs"))
+
+        out, err = self.run_bzr(["pack", "--incremental"])
+        self.assertEqual("", out)
+        self.assertEqual("", err)
+        self.assertLength(1, t.list_dir("repository/packs"))
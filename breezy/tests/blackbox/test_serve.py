@@ -246,6 +246,15 @@ class TestBzrServe(TestBzrServeBase):
         self.make_read_requests(branch)
         self.assertServerFinishesCleanly(process)
 
+    def test_bzr_serve_engine_requires_bzr_protocol(self):
+        self.make_branch(".")
+        _out, err = self.run_bzr(
+            ["serve", "--protocol=git", "--engine=async"], retcode=3
+        )
+        self.assertEqual(
+            "brz: ERROR: --engine is only supported by the bzr protocol.\n", err
+        )
+
     def test_bzr_serve_dhpss(self):
         # This is a smoke test that the server doesn't crash when run with
         # -Dhpss, and does drop some hpss logging to the file.
@@ -214,8 +214,9 @@ class PluginLoadedFeature(Feature):
         self.plugin_name = plugin_name
 
     def _probe(self):
-        from ..plugin import get_loaded_plugin
+        from ..plugin import get_loaded_plugin, load_deferred_plugins
 
+        load_deferred_plugins()
         return get_loaded_plugin(self.plugin_name) is not None
 
     @property
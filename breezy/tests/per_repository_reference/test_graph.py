@@ -70,13 +70,13 @@ class TestGraph(TestCaseWithRepository):
         for c in self.hpss_calls:
             # Right now, the only RPCs that get called are get_parent_map. If
             # this changes in the future, we can change this to:
-            # if c.call.method != 'Repository.get_parent_map':
+            # if c.call.method != 'Repository.get_parent_map_stream':
             #    continue
-            self.assertEqual(b"Repository.get_parent_map", c.call.method)
+            self.assertEqual(b"Repository.get_parent_map_stream", c.call.method)
             args = c.call.args
             location = args[0]
-            self.assertEqual(b"include-missing:", args[1])
-            revisions = sorted(args[2:])
+            self.assertEqual(b"include-missing:", args[2])
+            revisions = sorted(args[3:])
             get_parent_map_calls.append((location, revisions))
         self.assertEqual(expected, get_parent_map_calls)
 
@@ -41,6 +41,7 @@ from .. import (
     osutils,
     tests,
     trace,
+    transport,
     ui,
     urlutils,
 )
@@ -2981,6 +2982,65 @@ foo_in_qux=quux
         )
 
 
+class TestParsedConfigCache(TestStore):
+    def setUp(self):
+        super().setUp()
+        self.cache = config.ParsedConfigCache()
+        self.overrideAttr(config, "parsed_config_cache", self.cache)
+        self.write_config(b"foo=bar\n")
+
+    def write_config(self, content):
+        self.build_tree_contents([("foo.conf", content)])
+        # Recently modified files are not cached
+        mtime = os.stat("foo.conf").st_mtime - 10
+        os.utime("foo.conf", (mtime, mtime))
+
+    def get_store(self):
+        store = config.TransportIniFileStore(self.get_transport(), "foo.conf")
+        store.load()
+        return store
+
+    def test_parse_shared(self):
+        store1 = self.get_store()
+        store2 = self.get_store()
+        self.assertIs(store1._config_obj, store2._config_obj)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+
+    def test_modified_file_parsed(self):
+        store1 = self.get_store()
+        self.write_config(b"foo=quux\n")
+        store2 = self.get_store()
+        self.assertIsNot(store1._config_obj, store2._config_obj)
+        self.assertEqual("quux", store2._config_obj["foo"])
+        self.assertEqual((0, 2), (self.cache.hits, self.cache.misses))
+
+    def test_recently_modified_file_not_cached(self):
+        self.build_tree_contents([("foo.conf", b"foo=qux\n")])
+        self.get_store()
+        self.get_store()
+        self.assertEqual((0, 0), (self.cache.hits, self.cache.misses))
+
+    def test_mutable_section_not_shared(self):
+        store1 = self.get_store()
+        store2 = self.get_store()
+        store1.get_mutable_section(None).set("foo", "qux")
+        self.assertEqual("qux", store1._config_obj["foo"])
+        self.assertEqual("bar", store2._config_obj["foo"])
+        self.assertEqual("bar", self.get_store()._config_obj["foo"])
+
+    def test_save_invalidates(self):
+        store = config.LockableIniFileStore(self.get_transport(), "foo.conf")
+        store.get_mutable_section(None).set("foo", "qux")
+        store.save()
+        self.assertEqual([], list(self.cache._entries))
+
+    def test_memory_transport_not_cached(self):
+        t = transport.get_transport_from_url("memory:///")
+        t.put_bytes("foo.conf", b"foo=bar\n")
+        config.TransportIniFileStore(t, "foo.conf").load()
+        self.assertEqual((0, 0), (self.cache.hits, self.cache.misses))
+
+
 class TestLockableIniFileStore(TestStore):
     def test_create_store_in_created_dir(self):
         self.assertPathDoesNotExist("dir")
@@ -3227,6 +3287,44 @@ section=/foo/bar
             ["baz", "bar/baz"], [section.extra_path for section in sections]
         )
 
+    def test_sections_added_after_matching(self):
+        store = self.get_store(self)
+        store._load_from_string(
+            b"""
+[/foo]
+section=/foo
+"""
+        )
+        matcher = config.LocationMatcher(store, "/foo/bar")
+        self.assertEqual(
+            ["/foo"], [section.id for _, section in matcher.get_sections()]
+        )
+        store.get_mutable_section("/foo/bar").set("section", "/foo/bar")
+        self.assertEqual(
+            ["/foo/bar", "/foo"], [section.id for _, section in matcher.get_sections()]
+        )
+
+    def test_glob_sections(self):
+        store = self.get_store(self)
+        store._load_from_string(
+            b"""
+[/foo/*]
+section=/foo/*
+[/foo/b?r/baz]
+section=/foo/b?r/baz
+[/foo/q*]
+section=/foo/q*
+"""
+        )
+        matcher = config.LocationMatcher(store, "/foo/bar/baz/qux")
+        sections = [section for _, section in matcher.get_sections()]
+        self.assertEqual(
+            ["/foo/b?r/baz", "/foo/*"], [section.id for section in sections]
+        )
+        self.assertEqual(
+            ["qux", "baz/qux"], [section.extra_path for section in sections]
+        )
+
     def test_appendpath_in_no_name_section(self):
         # It's a bit weird to allow appendpath in a no-name section, but
         # someone may found a use for it
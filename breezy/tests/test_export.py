@@ -24,6 +24,7 @@ import zipfile
 from io import BytesIO
 
 from .. import errors, export, tests
+from ..archive import tar
 from ..archive.tar import tarball_generator
 from ..export import get_root_name
 from . import features
@@ -270,6 +271,67 @@ class TarExporterTests(tests.TestCaseWithTransport):
         tf = tarfile.open("target.tar.bz2")
         self.assertEqual(["target/a"], tf.getnames())
 
+    def make_tree_with_files(self, timestamp=None):
+        wt = self.make_branch_and_tree(".")
+        self.build_tree_contents(
+            [
+                ("a", b"a" * 10000),
+                ("b/",),
+                ("b/c", b"c content\n"),
+                ("d", b""),
+                ("e", bytes(range(256)) * 100),
+            ]
+        )
+        wt.add(["a", "b", "b/c", "d", "e"])
+        wt.commit("1", timestamp=timestamp)
+        return wt
+
+    def assertTarballContents(self, wt, tf):
+        self.assertEqual(
+            ["target/a", "target/b", "target/d", "target/e", "target/b/c"],
+            tf.getnames(),
+        )
+        for path in ["a", "b/c", "d", "e"]:
+            self.assertEqual(
+                wt.get_file_text(path), tf.extractfile("target/" + path).read()
+            )
+
+    def test_texts_in_batches(self):
+        # Texts are retrieved in batches, and kept in temporary files when
+        # they are large, without changing the tarball.
+        wt = self.make_tree_with_files()
+        self.overrideAttr(tar, "_TEXT_BATCH_SIZE", 2)
+        self.overrideAttr(tar, "_SPOOL_SIZE", 100)
+        with wt.lock_read():
+            export.export(wt, "target.tar", format="tar")
+            with tarfile.open("target.tar") as tf:
+                self.assertTarballContents(wt, tf)
+
+    def test_jobs(self):
+        # With several jobs, the tarball is compressed in independent blocks.
+        wt = self.make_tree_with_files()
+        self.overrideAttr(
+            tar, "_COMPRESSION_BLOCK_SIZES", {"gz": 1000, "bz2": 1000, "xz": 1000}
+        )
+        formats = [("tgz", "gz"), ("tbz2", "bz2")]
+        if features.lzma.available():
+            formats.append(("txz", "xz"))
+        with wt.lock_read():
+            for format, extension in formats:
+                export.export(wt, "target", format=format, jobs=3)
+                with tarfile.open("target", f"r:{extension}") as tf:
+                    self.assertTarballContents(wt, tf)
+
+    def test_tgz_jobs_consistent_mtime(self):
+        timestamp = 1547400500
+        wt = self.make_tree_with_files(timestamp=timestamp)
+        self.overrideAttr(tar, "_COMPRESSION_BLOCK_SIZES", {"gz": 1000})
+        revtree = wt.branch.repository.revision_tree(wt.last_revision())
+        export.export(revtree, "target.tar.gz", format="tgz", jobs=2)
+        with gzip.GzipFile("target.tar.gz", "r") as f:
+            f.read()
+            self.assertEqual(int(f.mtime), timestamp)
+
     def test_export_tarball_generator(self):
         wt = self.make_branch_and_tree(".")
         self.build_tree(["a"])
@@ -0,0 +1,309 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Tests for the forge API response cache."""
+
+import hashlib
+import os
+import stat
+import threading
+import time
+
+from dromedary.tests import http_server
+
+from .. import forge_cache, tests
+from .. import transport as _mod_transport
+from . import features, http_utils
+
+
+class ForgeAPIRequestHandler(http_server.TestingHTTPRequestHandler):
+    """Answer requests with the canned responses of a ForgeAPIServer.
+
+    Responses carry an ETag derived from their body, unless the server has
+    etags disabled, and conditional requests for an unchanged body get 304.
+    """
+
+    def _respond(self, method):
+        tcs = self.server.test_case_server
+        if_none_match = self.headers.get("If-None-Match")
+        with tcs.lock:
+            tcs.requests.append((method, self.path, if_none_match))
+        try:
+            headers, body = tcs.responses[(method, self.path)]
+        except KeyError:
+            self.send_error(404)
+            return
+        etag = f'"{hashlib.sha256(body).hexdigest()}"'
+        if tcs.etags and if_none_match == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        for name, value in headers:
+            self.send_header(name, value)
+        if tcs.etags:
+            self.send_header("ETag", etag)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        self._respond("GET")
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        self._respond("POST")
+
+
+class ForgeAPIServer(http_server.HttpServer):
+    """A stub forge API server.
+
+    Attributes:
+      responses: Dictionary mapping (method, path) to (headers, body).
+      requests: The (method, path, If-None-Match) of the requests received.
+      etags: Whether to send ETags and honour If-None-Match.
+    """
+
+    def __init__(self, protocol_version=None):
+        http_server.HttpServer.__init__(
+            self, ForgeAPIRequestHandler, protocol_version=protocol_version
+        )
+        self.responses = {}
+        self.requests = []
+        self.etags = True
+        self.lock = threading.Lock()
+
+    def add_response(self, path, body, headers=(), method="GET"):
+        self.responses[(method, path)] = (list(headers), body)
+
+
+class TestCaseWithForgeAPIServer(http_utils.TestCaseWithWebserver):
+    def create_transport_readonly_server(self):
+        return ForgeAPIServer(protocol_version=self._protocol_version)
+
+    def setUp(self):
+        super().setUp()
+        self.server = self.get_readonly_server()
+        self.transport = self.get_readonly_transport()
+
+
+class TestResponseCache(TestCaseWithForgeAPIServer):
+    def setUp(self):
+        super().setUp()
+        self.cache = forge_cache.ResponseCache("cache")
+        self.server.add_response("/thing", b'{"a": 1}')
+        self.url = self.server.get_url() + "thing"
+
+    def test_first_request_fetches(self):
+        response = self.cache.request(self.transport, self.url)
+        self.assertEqual(200, response.status)
+        self.assertEqual('{"a": 1}', response.text)
+        self.assertEqual((0, 1), (self.cache.hits, self.cache.misses))
+        self.assertEqual([("GET", "/thing", None)], self.server.requests)
+        self.assertLength(1, os.listdir("cache"))
+
+    def test_revalidated(self):
+        self.cache.request(self.transport, self.url)
+        response = self.cache.request(self.transport, self.url)
+        self.assertEqual(200, response.status)
+        self.assertEqual(b'{"a": 1}', response.data)
+        self.assertEqual((1, 1), (self.cache.hits, self.cache.misses))
+        etag = response.getheader("etag")
+        self.assertEqual(("GET", "/thing", etag), self.server.requests[1])
+
+    def test_changed(self):
+        self.cache.request(self.transport, self.url)
+        self.server.add_response("/thing", b'{"a": 2}')
+        response = self.cache.request(self.transport, self.url)
+        self.assertEqual('{"a": 2}', response.text)
+        self.assertEqual((0, 2), (self.cache.hits, self.cache.misses))
+        response = self.cache.request(self.transport, self.url)
+        self.assertEqual('{"a": 2}', response.text)
+        self.assertEqual((1, 2), (self.cache.hits, self.cache.misses))
+
+    def test_shared_between_instances(self):
+        self.cache.request(self.transport, self.url)
+        cache = forge_cache.ResponseCache("cache")
+        self.assertEqual('{"a": 1}', cache.request(self.transport, self.url).text)
+        self.assertEqual((1, 0), (cache.hits, cache.misses))
+
+    def test_identity(self):
+        self.cache.request(self.transport, self.url, identity="alice")
+        self.cache.request(self.transport, self.url, identity="bob")
+        self.assertEqual((0, 2), (self.cache.hits, self.cache.misses))
+        self.assertIs(None, self.server.requests[1][2])
+        self.cache.request(self.transport, self.url, identity="alice")
+        self.assertEqual((1, 2), (self.cache.hits, self.cache.misses))
+
+    def test_without_etag(self):
+        self.server.etags = False
+        self.cache.request(self.transport, self.url)
+        self.assertFalse(os.path.exists("cache"))
+        self.cache.request(self.transport, self.url)
+        self.assertEqual((0, 2), (self.cache.hits, self.cache.misses))
+
+    def test_error_not_stored(self):
+        response = self.cache.request(self.transport, self.server.get_url() + "nope")
+        self.assertEqual(404, response.status)
+        self.assertFalse(os.path.exists("cache"))
+
+    def test_private(self):
+        self.requireFeature(features.posix_permissions_feature)
+        self.cache.request(self.transport, self.url)
+        self.assertEqual(0o700, stat.S_IMODE(os.stat("cache").st_mode))
+        [name] = os.listdir("cache")
+        self.assertEqual(
+            0o600, stat.S_IMODE(os.stat(os.path.join("cache", name)).st_mode)
+        )
+
+    def test_corrupt_entry(self):
+        self.cache.request(self.transport, self.url)
+        [name] = os.listdir("cache")
+        with open(os.path.join("cache", name), "wb") as f:
+            f.write(b"garbage")
+        response = self.cache.request(self.transport, self.url)
+        self.assertEqual('{"a": 1}', response.text)
+        self.assertEqual((0, 2), (self.cache.hits, self.cache.misses))
+
+
+class TestPrune(tests.TestCaseInTempDir):
+    def setUp(self):
+        super().setUp()
+        os.mkdir("cache")
+        self.cache = forge_cache.ResponseCache("cache", max_size=250, max_age=3600)
+
+    def make_entry(self, name, size, age):
+        path = os.path.join("cache", name)
+        with open(path, "wb") as f:
+            f.write(b"x" * size)
+        mtime = time.time() - age
+        os.utime(path, (mtime, mtime))
+
+    def test_old_entries(self):
+        self.make_entry("new", 10, 60)
+        self.make_entry("old", 10, 7200)
+        self.make_entry("old.tmp", 10, 7200)
+        self.assertEqual(2, self.cache.prune())
+        self.assertEqual(["new"], os.listdir("cache"))
+
+    def test_least_recently_used(self):
+        self.make_entry("a", 100, 30)
+        self.make_entry("b", 100, 20)
+        self.make_entry("c", 100, 10)
+        self.assertEqual(1, self.cache.prune())
+        self.assertEqual(["b", "c"], sorted(os.listdir("cache")))
+
+    def test_missing_directory(self):
+        os.rmdir("cache")
+        self.assertEqual(0, self.cache.prune())
+
+
+class TestMapConcurrently(tests.TestCase):
+    def test_order(self):
+        self.assertEqual(
+            [x * 2 for x in range(20)],
+            list(forge_cache.map_concurrently(lambda x: x * 2, range(20), jobs=3)),
+        )
+
+    def test_single_job(self):
+        threads = set()
+
+        def record(x):
+            threads.add(threading.get_ident())
+            return x
+
+        self.assertEqual(
+            [0, 1, 2], list(forge_cache.map_concurrently(record, range(3), jobs=1))
+        )
+        self.assertEqual({threading.get_ident()}, threads)
+
+    def test_error(self):
+        def fail(x):
+            if x == 3:
+                raise ValueError(x)
+            return x
+
+        results = forge_cache.map_concurrently(fail, range(10), jobs=2)
+        self.assertEqual([0, 1, 2], [next(results) for i in range(3)])
+        self.assertRaises(ValueError, next, results)
+
+
+class _RecordingTransport:
+    base = "https://example.com/"
+
+    def __init__(self):
+        self.disconnected = False
+
+    def disconnect(self):
+        self.disconnected = True
+
+
+class TestThreadTransports(tests.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.opened = []
+
+        def get_transport_from_url(url):
+            transport = _RecordingTransport()
+            self.opened.append(transport)
+            return transport
+
+        self.overrideAttr(
+            _mod_transport, "get_transport_from_url", get_transport_from_url
+        )
+
+    def test_owner_uses_transport(self):
+        main = _RecordingTransport()
+        transports = forge_cache.ThreadTransports(main)
+        self.assertIs(main, transports.get())
+        self.assertEqual([], self.opened)
+
+    def test_disconnected_after_map(self):
+        main = _RecordingTransport()
+        transports = forge_cache.ThreadTransports(main)
+        used = list(
+            forge_cache.map_concurrently(
+                lambda x: transports.get(), range(10), jobs=3, transports=transports
+            )
+        )
+        self.assertNotIn(main, used)
+        self.assertTrue(set(used).issubset(self.opened))
+        self.assertTrue(all(t.disconnected for t in self.opened))
+        self.assertFalse(main.disconnected)
+
+
+class TestLastPageFromLink(tests.TestCase):
+    def test_last(self):
+        self.assertEqual(
+            7,
+            forge_cache.last_page_from_link(
+                '<https://api.github.com/user/repos?per_page=100&page=2>; rel="next", '
+                '<https://api.github.com/user/repos?per_page=100&page=7>; rel="last"'
+            ),
+        )
+
+    def test_no_last(self):
+        self.assertIs(
+            None,
+            forge_cache.last_page_from_link(
+                '<https://api.github.com/user/repos?page=1>; rel="prev"'
+            ),
+        )
+
+    def test_no_link(self):
+        self.assertIs(None, forge_cache.last_page_from_link(None))
@@ -1504,6 +1504,58 @@ class TestGrep(GrepTestBase):
         self.assertNotContainsRe(out, "file0.txt~6:v3", flags=TestGrep._reflags)
         self.assertEqual(len(out.splitlines()), 3)
 
+    def test_revno_range_files_changed_together(self):
+        """Files last changed in the same revision keep their own results."""
+        wd = "foobar0"
+        self.make_branch_and_tree(wd)
+        os.chdir(wd)
+        self._mk_file("file0.txt", "aline", 2, versioned=False)
+        self._mk_file("file1.txt", "bline", 2, versioned=False)
+        self.run_bzr(["add", "file0.txt", "file1.txt"])
+        self.run_bzr(["ci", "-m", "both"])  # rev1
+        self._mk_versioned_file("file2.txt", total_lines=2)  # rev2
+
+        out, _err = self.run_bzr(["grep", "--color=never", "-r", "1..", "line1"])
+        self.assertContainsRe(out, "^file0.txt~1:aline1$", flags=TestGrep._reflags)
+        self.assertContainsRe(out, "^file1.txt~1:bline1$", flags=TestGrep._reflags)
+        self.assertContainsRe(out, "^file0.txt~2:aline1$", flags=TestGrep._reflags)
+        self.assertContainsRe(out, "^file1.txt~2:bline1$", flags=TestGrep._reflags)
+        self.assertContainsRe(out, "^file2.txt~2:line1$", flags=TestGrep._reflags)
+        self.assertEqual(len(out.splitlines()), 5)
+
+    def test_revno_range_jobs_and_bulk_read(self):
+        """Matching in processes or reading in bulk gives the same output."""
+        wd = "foobar0"
+        self.make_branch_and_tree(wd)
+        os.chdir(wd)
+        self._mk_versioned_dir("dir0")  # rev1
+        self._mk_versioned_file("dir0/file0.txt")  # rev2
+        self._mk_versioned_file("file1.txt")  # rev3
+        self._update_file("dir0/file0.txt", "v4 text\n")  # rev4
+        self._update_file("file1.txt", "v5 text\n")  # rev5
+
+        expected, _err = self.run_bzr(
+            ["grep", "--color=never", "-n", "-r", "1..", "v[45]"]
+        )
+        self.assertEqual(len(expected.splitlines()), 3)
+        for extra in (["--jobs=2"], ["--bulk-read"], ["--jobs=2", "--bulk-read"]):
+            out, _err = self.run_bzr(
+                ["grep", "--color=never", "-n", "-r", "1..", "v[45]"] + extra
+            )
+            self.assertEqual(expected, out)
+            out, _err = self.run_bzr(
+                ["grep", "--color=never", "-r", "1..", "v5", "file1.txt"] + extra
+            )
+            self.assertEqual("file1.txt~5:v5 text\n", out)
+
+    def test_jobs_must_be_positive(self):
+        """--jobs=0 is rejected."""
+        self.make_branch_and_tree(".")
+        self._mk_versioned_file("file0.txt")
+        self.run_bzr_error(
+            ["--jobs must be at least 1"], ["grep", "--jobs=0", "-r", "1", "line1"]
+        )
+
     def test_revno_range_versioned_file_in_dir(self):
         """Grep rev-range for pattern for file withing a dir."""
         wd = "foobar0"
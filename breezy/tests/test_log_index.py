@@ -0,0 +1,87 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Tests for the file history index."""
+
+from .. import log_index, tests
+
+
+class TestFileHistoryIndex(tests.TestCaseWithTransport):
+    def make_indexed_tree(self):
+        tree = self.make_branch_and_tree(".")
+        self.build_tree(["a", "dir/", "dir/b"])
+        tree.add(["a", "dir", "dir/b"])
+        tree.commit("add", rev_id=b"rev-add")
+        self.build_tree_contents([("a", b"changed")])
+        tree.commit("change a", rev_id=b"rev-change-a")
+        tree.rename_one("dir", "newdir")
+        tree.commit("rename dir", rev_id=b"rev-rename-dir")
+        self.build_tree_contents([("newdir/b", b"changed")])
+        tree.commit("change b", rev_id=b"rev-change-b")
+        tree.rename_one("a", "c")
+        tree.commit("rename a", rev_id=b"rev-rename-a")
+        index = log_index.FileHistoryIndex.open(tree.branch.repository, create=True)
+        self.addCleanup(index.close)
+        self.assertEqual(
+            5,
+            index.update(
+                tree.branch.repository,
+                [
+                    b"rev-add",
+                    b"rev-change-a",
+                    b"rev-rename-dir",
+                    b"rev-change-b",
+                    b"rev-rename-a",
+                ],
+            ),
+        )
+        return tree, index
+
+    def test_open_without_create(self):
+        tree = self.make_branch_and_tree(".")
+        self.assertIs(None, log_index.FileHistoryIndex.open(tree.branch.repository))
+        self.assertFalse(log_index.FileHistoryIndex.exists(tree.branch.repository))
+
+    def test_missing_revisions(self):
+        tree, index = self.make_indexed_tree()
+        self.assertEqual(
+            [b"rev-unknown"], index.missing_revisions([b"rev-add", b"rev-unknown"])
+        )
+        self.assertEqual(0, index.update(tree.branch.repository, [b"rev-add"]))
+
+    def test_file(self):
+        _tree, index = self.make_indexed_tree()
+        self.assertEqual(
+            {b"rev-add", b"rev-change-a", b"rev-rename-a"}, index.find_revisions(["c"])
+        )
+
+    def test_file_in_renamed_directory(self):
+        _tree, index = self.make_indexed_tree()
+        self.assertEqual(
+            {b"rev-add", b"rev-rename-dir", b"rev-change-b"},
+            index.find_revisions(["newdir/b"]),
+        )
+
+    def test_directory(self):
+        _tree, index = self.make_indexed_tree()
+        self.assertEqual(
+            {b"rev-add", b"rev-rename-dir", b"rev-change-b"},
+            index.find_revisions(["newdir"]),
+        )
+
+    def test_unknown_path(self):
+        _tree, index = self.make_indexed_tree()
+        self.assertEqual(set(), index.find_revisions(["unknown"]))
@@ -0,0 +1,231 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Tests for the persistent merge sort cache."""
+
+from vcsgraph.known_graph import KnownGraph
+
+from .. import branch as _mod_branch
+from .. import merge_sort_cache, tests
+
+# A graph with merges of merges, a ghost and two roots:
+#
+#   A   G
+#   |\  |
+#   B C |
+#   | |\|
+#   | D E
+#   |/ /
+#   F /
+#   |/
+#   H
+#   |\
+#   I J (J also merges the ghost "X")
+#   |/
+#   K
+PARENT_MAP = {
+    b"A": (),
+    b"B": (b"A",),
+    b"C": (b"A",),
+    b"G": (),
+    b"D": (b"C",),
+    b"E": (b"C", b"G"),
+    b"F": (b"B", b"D"),
+    b"H": (b"F", b"E"),
+    b"I": (b"H",),
+    b"J": (b"H", b"X"),
+    b"K": (b"I", b"J"),
+}
+
+
+def merge_sort(tip):
+    return [
+        (node.key, node.merge_depth, node.revno, node.end_of_merge)
+        for node in KnownGraph(PARENT_MAP).merge_sort(tip)
+    ]
+
+
+def ancestry(tip):
+    return {node[0] for node in merge_sort(tip)}
+
+
+class TestSerialisation(tests.TestCase):
+    def test_roundtrip(self):
+        nodes = merge_sort(b"K")
+        self.assertEqual(
+            (b"K", nodes),
+            merge_sort_cache.deserialise(merge_sort_cache.serialise(b"K", nodes)),
+        )
+
+    def test_revision_id_with_spaces(self):
+        nodes = [(b"a revision", 0, (1,), True)]
+        self.assertEqual(
+            (b"a revision", nodes),
+            merge_sort_cache.deserialise(
+                merge_sort_cache.serialise(b"a revision", nodes)
+            ),
+        )
+
+    def test_invalid(self):
+        self.assertIs(None, merge_sort_cache.deserialise(b"garbage"))
+        self.assertIs(
+            None,
+            merge_sort_cache.deserialise(
+                merge_sort_cache.serialise(b"K", merge_sort(b"K"))[:-4]
+            ),
+        )
+
+
+class TestExtendMergeSort(tests.TestCase):
+    def assertExtends(self, old_tip, new_tip):
+        old_ancestry = ancestry(old_tip)
+        parent_map = {
+            revision_id: parents
+            for revision_id, parents in PARENT_MAP.items()
+            if revision_id in ancestry(new_tip) and revision_id not in old_ancestry
+        }
+        self.assertEqual(
+            merge_sort(new_tip),
+            merge_sort_cache.extend_merge_sort(
+                merge_sort(old_tip), new_tip, parent_map
+            ),
+        )
+
+    def test_one_revision(self):
+        self.assertExtends(b"H", b"I")
+
+    def test_merge(self):
+        self.assertExtends(b"I", b"K")
+
+    def test_nested_merges(self):
+        self.assertExtends(b"B", b"F")
+        self.assertExtends(b"F", b"K")
+
+    def test_from_root(self):
+        self.assertExtends(b"A", b"K")
+
+
+class TestUpdateMergeSort(tests.TestCaseWithMemoryTransport):
+    def make_repository_with_graph(self):
+        builder = self.make_branch_builder("branch")
+        builder.start_series()
+        self.addCleanup(builder.finish_series)
+        builder.build_snapshot(
+            None, [("add", ("", b"root-id", "directory", None))], revision_id=b"A"
+        )
+        builder.build_snapshot([b"A"], [], revision_id=b"B")
+        builder.build_snapshot([b"A"], [], revision_id=b"C")
+        builder.build_snapshot([b"B", b"C"], [], revision_id=b"D")
+        builder.build_snapshot([b"D"], [], revision_id=b"E")
+        return builder.get_branch().repository
+
+    def full_merge_sort(self, repository, tip):
+        return [
+            (node.key, node.merge_depth, node.revno, node.end_of_merge)
+            for node in repository.get_known_graph_ancestry([tip]).merge_sort(tip)
+        ]
+
+    def test_forward(self):
+        repository = self.make_repository_with_graph()
+        self.assertEqual(
+            self.full_merge_sort(repository, b"E"),
+            merge_sort_cache.update_merge_sort(
+                repository, b"E", self.full_merge_sort(repository, b"B")
+            ),
+        )
+
+    def test_backward(self):
+        repository = self.make_repository_with_graph()
+        self.assertEqual(
+            self.full_merge_sort(repository, b"B"),
+            merge_sort_cache.update_merge_sort(
+                repository, b"B", self.full_merge_sort(repository, b"E")
+            ),
+        )
+
+    def test_sideways(self):
+        repository = self.make_repository_with_graph()
+        self.assertIs(
+            None,
+            merge_sort_cache.update_merge_sort(
+                repository, b"C", self.full_merge_sort(repository, b"E")
+            ),
+        )
+        self.assertIs(
+            None,
+            merge_sort_cache.update_merge_sort(
+                repository, b"E", self.full_merge_sort(repository, b"C")
+            ),
+        )
+
+
+class TestBranchMergeSortCache(tests.TestCaseWithTransport):
+    def make_branch_with_merge(self):
+        tree = self.make_branch_and_tree("tree")
+        tree.commit("one", rev_id=b"rev-1")
+        other = tree.controldir.sprout("other").open_workingtree()
+        other.commit("other", rev_id=b"rev-1.1.1")
+        tree.commit("two", rev_id=b"rev-2")
+        tree.merge_from_branch(other.branch)
+        tree.commit("three", rev_id=b"rev-3")
+        return tree
+
+    def get_revno_map(self, location):
+        branch = _mod_branch.Branch.open(location)
+        with branch.lock_read():
+            return branch.get_revision_id_to_revno_map()
+
+    def test_cache_written(self):
+        tree = self.make_branch_with_merge()
+        self.assertEqual(
+            {
+                b"rev-1": (1,),
+                b"rev-1.1.1": (1, 1, 1),
+                b"rev-2": (2,),
+                b"rev-3": (3,),
+            },
+            self.get_revno_map("tree"),
+        )
+        cached = merge_sort_cache.deserialise(
+            tree.branch.control_transport.get_bytes("merge-sort-cache")
+        )
+        self.assertEqual(b"rev-3", cached[0])
+        self.assertEqual(
+            [b"rev-3", b"rev-1.1.1", b"rev-2", b"rev-1"],
+            [node[0] for node in cached[1]],
+        )
+
+    def test_cache_extended(self):
+        tree = self.make_branch_with_merge()
+        self.get_revno_map("tree")
+        tree.commit("four", rev_id=b"rev-4")
+        self.assertEqual((4,), self.get_revno_map("tree")[b"rev-4"])
+        cached = merge_sort_cache.deserialise(
+            tree.branch.control_transport.get_bytes("merge-sort-cache")
+        )
+        self.assertEqual(b"rev-4", cached[0])
+
+    def test_cache_replaced_on_uncommit(self):
+        tree = self.make_branch_with_merge()
+        self.get_revno_map("tree")
+        with tree.branch.lock_write():
+            tree.branch.set_last_revision_info(2, b"rev-2")
+        self.assertEqual({b"rev-1": (1,), b"rev-2": (2,)}, self.get_revno_map("tree"))
+
+    def test_corrupt_cache_ignored(self):
+        tree = self.make_branch_with_merge()
+        tree.branch.control_transport.put_bytes("merge-sort-cache", b"garbage")
+        self.assertEqual((1, 1, 1), self.get_revno_map("tree")[b"rev-1.1.1"])
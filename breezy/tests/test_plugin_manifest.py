@@ -0,0 +1,249 @@
+# Copyright (C) 2026 Breezy Developers
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""Tests for the plugin manifest."""
+
+import os
+import sys
+
+from .. import hooks, plugin, plugin_manifest, registry, tests
+from .test_plugins import BaseTestPlugins
+
+# The registry the test plugins register with.
+lazy_registry = registry.Registry()
+
+LAZY_PLUGIN = """\
+'''A plugin that only registers lazily.'''
+
+from breezy import hooks
+from breezy.tests import test_plugin_manifest
+
+
+def hook(params):
+    pass
+
+
+def register(key):
+    test_plugin_manifest.lazy_registry.register_lazy(
+        key, "breezy.testingplugins.lazy.impl", "value"
+    )
+
+
+register("one")
+for key in ["two", "three"]:
+    register(key)
+hooks.install_lazy_named_hook(
+    "breezy.tests.test_plugin_manifest", "fake_hooks", "fake", hook, "lazy hook"
+)
+"""
+
+
+class TestRegistersLazilyOnly(tests.TestCase):
+    def assertLazy(self, source):
+        self.assertTrue(plugin_manifest.registers_lazily_only(source))
+
+    def assertNotLazy(self, source):
+        self.assertFalse(plugin_manifest.registers_lazily_only(source))
+
+    def test_lazy_plugin(self):
+        self.assertLazy(LAZY_PLUGIN)
+
+    def test_docstring_only(self):
+        self.assertLazy("'''A plugin.'''\n")
+
+    def test_version(self):
+        self.assertLazy(
+            "from breezy import _format_version_tuple, version_info\n"
+            "__version__ = _format_version_tuple(version_info)\n"
+        )
+
+    def test_relative_import_from_plugin(self):
+        self.assertNotLazy("from .cmds import cmd_foo\n")
+        self.assertNotLazy("from .. import other_plugin\n")
+        self.assertLazy("from ...commands import plugin_cmds\n")
+
+    def test_other_calls(self):
+        self.assertNotLazy("print('hello')\n")
+        self.assertNotLazy("registry.register('key', 'value')\n")
+        self.assertNotLazy("x = object()\n")
+
+    def test_call_in_arguments(self):
+        self.assertNotLazy("registry.register_lazy(make_key(), 'module', 'member')\n")
+
+    def test_decorated_function(self):
+        self.assertNotLazy("@decorator\ndef f():\n    pass\n")
+
+    def test_conditional(self):
+        self.assertNotLazy("if x:\n    registry.register_lazy('key', 'module', 'm')\n")
+
+    def test_loop_over_call(self):
+        self.assertNotLazy(
+            "for key in keys():\n    registry.register_lazy(key, 'module', 'm')\n"
+        )
+
+    def test_function_doing_more(self):
+        self.assertNotLazy("def f():\n    print('hello')\n\nf()\n")
+
+    def test_recursive_function(self):
+        self.assertNotLazy("def f():\n    f()\n\nf()\n")
+
+    def test_syntax_error(self):
+        self.assertNotLazy("def (\n")
+
+
+class TestManifest(tests.TestCaseInTempDir):
+    def setUp(self):
+        super().setUp()
+        os.mkdir("plugins")
+        with open("lazy.py", "w") as f:
+            f.write(LAZY_PLUGIN)
+        self.paths = plugin._Path(
+            "breezy.plugins", [], [], [os.path.abspath("plugins")]
+        )
+        self.registrations = [
+            {"registry": ["breezy.commands", "plugin_cmds"], "args": [], "kwargs": {}}
+        ]
+
+    def write(self, prefix="breezy.plugins."):
+        plugin_manifest.write_manifest(
+            self.paths,
+            prefix,
+            [("lazy", "plugins"), ("eager", "plugins")],
+            {"lazy": (os.path.abspath("lazy.py"), self.registrations)},
+            path="manifest.json",
+        )
+
+    def read(self, prefix="breezy.plugins."):
+        return plugin_manifest.read_manifest(self.paths, prefix, path="manifest.json")
+
+    def test_roundtrip(self):
+        self.write()
+        self.assertEqual(
+            (
+                [("lazy", "plugins"), ("eager", "plugins")],
+                {"lazy": self.registrations},
+            ),
+            self.read(),
+        )
+
+    def test_missing(self):
+        self.assertIs(None, self.read())
+
+    def test_corrupt(self):
+        self.build_tree_contents([("manifest.json", b"{garbage")])
+        self.assertIs(None, self.read())
+
+    def test_other_prefix(self):
+        self.write()
+        self.assertIs(None, self.read(prefix="breezy.testingplugins."))
+
+    def test_plugin_directory_changed(self):
+        self.write()
+        st = os.stat("plugins")
+        os.utime("plugins", ns=(st.st_atime_ns, st.st_mtime_ns + 1000))
+        self.assertIs(None, self.read())
+
+    def test_deferred_plugin_changed(self):
+        self.write()
+        with open("lazy.py", "a") as f:
+            f.write("\n")
+        self.assertIs(None, self.read())
+
+
+class TestDeferredPlugins(BaseTestPlugins):
+    def setUp(self):
+        super().setUp()
+        self.overrideAttr(hooks, "_lazy_hooks", {})
+        self.reset_registry()
+        os.mkdir("plugins")
+        self.create_plugin_package("lazy", dir="plugins/lazy", source=LAZY_PLUGIN)
+        self.create_plugin("impl", "value = 'lazy value'", dir="plugins/lazy")
+
+    def reset_registry(self):
+        self.overrideAttr(sys.modules[__name__], "lazy_registry", registry.Registry())
+        hooks._lazy_hooks.clear()
+
+    def load_twice(self):
+        """Load the plugins, creating the manifest, and load them again."""
+        self.load_with_paths(["plugins"])
+        self.reset()
+        self.reset_registry()
+        self.load_with_paths(["plugins"])
+
+    def get_lazy_hooks(self):
+        return hooks._lazy_hooks[
+            ("breezy.tests.test_plugin_manifest", "fake_hooks", "fake")
+        ]
+
+    def test_first_load_imports(self):
+        self.load_with_paths(["plugins"])
+        self.assertIn("breezy.testingplugins.lazy", sys.modules)
+        self.assertEqual({}, self.deferred_plugins)
+        self.assertEqual(["one", "three", "two"], sorted(lazy_registry.keys()))
+
+    def test_registrations_replayed(self):
+        self.load_twice()
+        self.assertNotIn("breezy.testingplugins.lazy", sys.modules)
+        self.assertEqual(
+            {"lazy": os.path.abspath("plugins/lazy")}, self.deferred_plugins
+        )
+        self.assertEqual(["one", "three", "two"], sorted(lazy_registry.keys()))
+        self.assertEqual(1, len(self.get_lazy_hooks()))
+
+    def test_imported_on_use(self):
+        self.load_twice()
+        self.assertEqual("lazy value", lazy_registry.get("one"))
+        self.assertIn("breezy.testingplugins.lazy", sys.modules)
+        # The registrations made by the plugin were not repeated.
+        self.assertEqual(["one", "three", "two"], sorted(lazy_registry.keys()))
+        self.assertEqual(1, len(self.get_lazy_hooks()))
+
+    def test_hook_imports_plugin(self):
+        self.load_twice()
+        getter, label = self.get_lazy_hooks()[0]
+        self.assertEqual("lazy hook", label)
+        hook = getter.get_obj()
+        self.assertIs(sys.modules["breezy.testingplugins.lazy"].hook, hook)
+
+    def test_load_deferred_plugins(self):
+        self.load_twice()
+        self.assertNotIn("lazy", self.plugins)
+        plugin.load_deferred_plugins(state=self)
+        self.assertIn("lazy", self.plugins)
+        self.assertEqual({}, self.deferred_plugins)
+        self.assertEqual(["one", "three", "two"], sorted(lazy_registry.keys()))
+
+    def test_eager_plugin(self):
+        self.create_plugin(
+            "eager",
+            "from breezy.tests import test_plugin_manifest\n"
+            "test_plugin_manifest.lazy_registry.register('eager', 'value')\n",
+            dir="plugins",
+        )
+        self.load_twice()
+        self.assertIn("breezy.testingplugins.eager", sys.modules)
+        self.assertEqual(["lazy"], list(self.deferred_plugins))
+        self.assertEqual("value", lazy_registry.get("eager"))
+
+    def test_changed_plugin_imported(self):
+        self.load_with_paths(["plugins"])
+        self.reset()
+        self.reset_registry()
+        with open("plugins/lazy/__init__.py", "a") as f:
+            f.write("register('four')\n")
+        self.load_with_paths(["plugins"])
+        self.assertIn("breezy.testingplugins.lazy", sys.modules)
+        self.assertEqual(["four", "one", "three", "two"], sorted(lazy_registry.keys()))
@@ -16,8 +16,9 @@
 
 
 import os
+import zlib
 
-from breezy import trace
+from breezy import rename_map, trace
 from breezy.tests import TestCaseWithTransport
 
 from ..rename_map import RenameMap
@@ -25,7 +26,7 @@ from ..rename_map import RenameMap
 
 def myhash(val):
     """This the hash used by RenameMap."""
-    return hash(val) % (1024 * 1024 * 10)
+    return zlib.crc32(b"".join(val)) % (1024 * 1024 * 10)
 
 
 class TestRenameMap(TestCaseWithTransport):
@@ -35,9 +36,10 @@ class TestRenameMap(TestCaseWithTransport):
     def test_add_edge_hashes(self):
         rn = RenameMap(None)
         rn.add_edge_hashes(self.a_lines, "a")
-        self.assertEqual({"a"}, rn.edge_hashes[myhash(("a\n", "b\n"))])
-        self.assertEqual({"a"}, rn.edge_hashes[myhash(("b\n", "c\n"))])
-        self.assertIs(None, rn.edge_hashes.get(myhash(("c\n", "d\n"))))
+        self.assertEqual({"a"}, rn.edge_hashes[myhash((b"a\n", b"b\n"))])
+        self.assertEqual({"a"}, rn.edge_hashes[myhash((b"b\n", b"c\n"))])
+        self.assertEqual({"a"}, rn.edge_hashes[myhash((b"c\n",))])
+        self.assertIs(None, rn.edge_hashes.get(myhash((b"c\n", b"d\n"))))
 
     def test_add_file_edge_hashes(self):
         tree = self.make_branch_and_tree("tree")
@@ -45,9 +47,9 @@ class TestRenameMap(TestCaseWithTransport):
         tree.add("a", ids=b"a")
         rn = RenameMap(tree)
         rn.add_file_edge_hashes(tree, [b"a"])
-        self.assertEqual({b"a"}, rn.edge_hashes[myhash(("a\n", "b\n"))])
-        self.assertEqual({b"a"}, rn.edge_hashes[myhash(("b\n", "c\n"))])
-        self.assertIs(None, rn.edge_hashes.get(myhash(("c\n", "d\n"))))
+        self.assertEqual({b"a"}, rn.edge_hashes[myhash((b"a\n", b"b\n"))])
+        self.assertEqual({b"a"}, rn.edge_hashes[myhash((b"b\n", b"c\n"))])
+        self.assertIs(None, rn.edge_hashes.get(myhash((b"c\n", b"d\n"))))
 
     def test_hitcounts(self):
         rn = RenameMap(None)
@@ -57,6 +59,83 @@ class TestRenameMap(TestCaseWithTransport):
         self.assertEqual({"a": 1}, rn.hitcounts(self.a_lines[:-1]))
         self.assertEqual({"b": 2.5, "a": 0.5}, rn.hitcounts(self.b_lines))
 
+    def test_hitcounts_repeated_edges(self):
+        rn = RenameMap(None)
+        rn.add_edge_hashes([b"a\n", b"a\n", b"a\n"], "a")
+        rn.add_edge_hashes(self.b_lines, "b")
+        self.assertEqual({"a": 3}, rn.hitcounts([b"a\n", b"a\n", b"a\n"]))
+
+    def test_threshold(self):
+        tree = self.make_branch_and_tree("tree")
+        rn = RenameMap(tree, threshold=0.5)
+        rn.add_edge_hashes(self.a_lines, "aid")
+        rn.add_edge_hashes(self.b_lines, "bid")
+        self.build_tree_contents(
+            [("tree/a", b"".join(self.a_lines)), ("tree/x", b"x\ny\nb\nc\n")]
+        )
+        # x is less than half similar to the texts of both aid and bid.
+        self.assertEqual([(2.5, "a", "aid")], rn.get_all_hits(["a", "x"]))
+
+    def test_get_candidate_hits_jobs(self):
+        self.overrideAttr(rename_map, "_SCORE_BATCH_SIZE", 1)
+        rn = RenameMap(None, jobs=2)
+        rn.add_edge_hashes(self.a_lines, b"aid")
+        rn.add_edge_hashes(self.b_lines, b"bid")
+        candidates = [
+            ("a", list(rn.iter_edge_hashes(self.a_lines))),
+            ("b", list(rn.iter_edge_hashes(self.b_lines))),
+        ]
+        self.assertEqual(
+            [
+                (0.5, "a", b"bid"),
+                (0.5, "b", b"aid"),
+                (2.5, "a", b"aid"),
+                (2.5, "b", b"bid"),
+            ],
+            sorted(rn.get_candidate_hits(candidates)),
+        )
+
+    def test_match_exact(self):
+        tree = self.make_branch_and_tree("tree")
+        self.build_tree_contents(
+            [
+                ("tree/a", b"a\n"),
+                ("tree/b", b"b\n"),
+                ("tree/b2", b"b\n"),
+                ("tree/c", b"c\n"),
+                ("tree/empty", b""),
+            ]
+        )
+        tree.add(
+            ["a", "b", "b2", "c", "empty"],
+            ids=[b"a-id", b"b-id", b"b2-id", b"c-id", b"empty-id"],
+        )
+        tree.commit("add files")
+        self.build_tree_contents(
+            [
+                ("tree/a-new", b"a\n"),
+                ("tree/b-new", b"b\n"),
+                ("tree/c-new", b"c\n"),
+                ("tree/c-copy", b"c\n"),
+                ("tree/empty-new", b""),
+            ]
+        )
+        basis = tree.basis_tree()
+        self.addCleanup(basis.lock_read().unlock)
+        rn = RenameMap(tree)
+        candidates = rn.hash_candidates(
+            ["a-new", "b-new", "c-new", "c-copy", "empty-new"]
+        )
+        # Only contents unique on both sides are matched.
+        self.assertEqual(
+            {"a-new": b"a-id"},
+            rn.match_exact(
+                basis,
+                {b"a-id", b"b-id", b"b2-id", b"c-id", b"empty-id"},
+                candidates,
+            ),
+        )
+
     def test_file_match(self):
         tree = self.make_branch_and_tree("tree")
         rn = RenameMap(tree)
@@ -160,6 +239,36 @@ class TestRenameMap(TestCaseWithTransport):
         RenameMap.guess_renames(tree.basis_tree(), tree)
         self.assertEqual("baz/empty", tree.id2path(b"empty-id"))
 
+    def test_guess_renames_changed_and_unchanged(self):
+        tree = self.make_branch_and_tree("tree")
+        tree.lock_write()
+        self.addCleanup(tree.unlock)
+        self.build_tree_contents(
+            [("tree/file", b"a\nb\nc\nd\n"), ("tree/other", b"e\nf\ng\n")]
+        )
+        tree.add(["file", "other"], ids=[b"file-id", b"other-id"])
+        tree.commit("Added files")
+        os.rename("tree/file", "tree/file2")
+        os.unlink("tree/other")
+        self.build_tree_contents([("tree/other2", b"e\nf\ng\nh\n")])
+        RenameMap.guess_renames(tree.basis_tree(), tree)
+        self.assertEqual("file2", tree.id2path(b"file-id"))
+        self.assertEqual("other2", tree.id2path(b"other-id"))
+
+    def test_guess_renames_threshold(self):
+        tree = self.make_branch_and_tree("tree")
+        tree.lock_write()
+        self.addCleanup(tree.unlock)
+        self.build_tree_contents([("tree/file", b"a\nb\nc\nd\n")])
+        tree.add("file", ids=b"file-id")
+        tree.commit("Added file")
+        os.unlink("tree/file")
+        self.build_tree_contents([("tree/file2", b"a\nb\nx\ny\nz\n")])
+        RenameMap.guess_renames(tree.basis_tree(), tree, threshold=0.5)
+        self.assertFalse(tree.is_versioned("file2"))
+        RenameMap.guess_renames(tree.basis_tree(), tree, threshold=0.1)
+        self.assertEqual("file2", tree.id2path(b"file-id"))
+
     def test_guess_renames_dry_run(self):
         tree = self.make_branch_and_tree("tree")
         tree.lock_write()
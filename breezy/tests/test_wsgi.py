@@ -209,6 +209,112 @@ class TestWSGI(tests.TestCaseInTempDir, WSGITestMixin):
         self.assertEqual("200 OK", self.status)
         self.assertEqual(b"error\x01incomplete request\n", response)
 
+    def test_request_read_incrementally(self):
+        # The protocol is chosen from the first line of the request, and the
+        # rest is passed to the protocol as it is read.
+        transport = FakeTransport()
+        wsgi_app = wsgi.SmartWSGIApp(transport)
+
+        def make_request(transport, write_func, bytes, root_client_path):
+            self.request = ChunkedRequest(transport, write_func, bytes)
+            return self.request
+
+        wsgi_app.make_request = make_request
+        body = b"x" * (wsgi.REQUEST_READ_SIZE * 2 + 10)
+        fake_input = BytesIO(b"first line\n" + body)
+        environ = self.build_environ(
+            {
+                "REQUEST_METHOD": "POST",
+                "CONTENT_LENGTH": len(fake_input.getvalue()),
+                "wsgi.input": fake_input,
+                "breezy.relpath": "foo/bar",
+            }
+        )
+        iterable = wsgi_app(environ, self.start_response)
+        response = self.read_response(iterable)
+        self.assertEqual(b"first line\n", self.request.first_line)
+        self.assertLength(3, self.request.accepted)
+        self.assertEqual(body, b"".join(self.request.accepted))
+        self.assertEqual(b"got %d bytes" % len(body), response)
+
+    def test_response_streamed(self):
+        # The response is returned in the chunks it was written in, without
+        # a Content-Length.
+        transport = FakeTransport()
+        wsgi_app = wsgi.SmartWSGIApp(transport)
+
+        def make_request(transport, write_func, bytes, root_client_path):
+            request = FakeRequest(transport, write_func)
+            for i in range(10):
+                request.accept_bytes(b"%d" % i)
+            return request
+
+        wsgi_app.make_request = make_request
+        fake_input = BytesIO(b"fake request")
+        environ = self.build_environ(
+            {
+                "REQUEST_METHOD": "POST",
+                "CONTENT_LENGTH": len(fake_input.getvalue()),
+                "wsgi.input": fake_input,
+                "breezy.relpath": "foo/bar",
+            }
+        )
+        iterable = wsgi_app(environ, self.start_response)
+        self.assertEqual([b"got bytes: %d" % i for i in range(10)], list(iterable))
+        self.assertEqual("200 OK", self.status)
+        self.assertNotIn("content-length", [h.lower() for h, v in self.headers])
+
+    def test_response_abandoned(self):
+        # The request is no longer served once the response is abandoned.
+        transport = FakeTransport()
+        wsgi_app = wsgi.SmartWSGIApp(transport)
+        written = []
+
+        class StreamingRequest(FakeRequest):
+            def accept_bytes(self, bytes):
+                for i in range(wsgi.RESPONSE_QUEUE_SIZE * 10):
+                    self.write_func(b"%d" % i)
+                    written.append(i)
+
+        def make_request(transport, write_func, bytes, root_client_path):
+            return StreamingRequest(transport, write_func)
+
+        wsgi_app.make_request = make_request
+        fake_input = BytesIO(b"fake\nrequest")
+        environ = self.build_environ(
+            {
+                "REQUEST_METHOD": "POST",
+                "CONTENT_LENGTH": len(fake_input.getvalue()),
+                "wsgi.input": fake_input,
+                "breezy.relpath": "foo/bar",
+            }
+        )
+        iterable = wsgi_app(environ, self.start_response)
+        self.assertEqual(b"0", next(iterable))
+        iterable.close()
+        self.assertLess(len(written), wsgi.RESPONSE_QUEUE_SIZE * 10)
+
+    def test_request_error(self):
+        # Errors serving the request are raised to the WSGI server.
+        transport = FakeTransport()
+        wsgi_app = wsgi.SmartWSGIApp(transport)
+
+        def make_request(transport, write_func, bytes, root_client_path):
+            raise ValueError(bytes)
+
+        wsgi_app.make_request = make_request
+        fake_input = BytesIO(b"fake request")
+        environ = self.build_environ(
+            {
+                "REQUEST_METHOD": "POST",
+                "CONTENT_LENGTH": len(fake_input.getvalue()),
+                "wsgi.input": fake_input,
+                "breezy.relpath": "foo/bar",
+            }
+        )
+        iterable = wsgi_app(environ, self.start_response)
+        self.assertRaises(ValueError, self.read_response, iterable)
+
     def test_protocol_version_detection_one(self):
         # SmartWSGIApp detects requests that don't start with
         # REQUEST_VERSION_TWO as version one.
@@ -329,6 +435,26 @@ class FakeTransport:
         return self
 
 
+class ChunkedRequest:
+    """A request-like object that records the chunks it is given."""
+
+    def __init__(self, transport, write_func, first_line):
+        self.transport = transport
+        self.write_func = write_func
+        self.first_line = first_line
+        self.accepted = []
+        self.length = 0
+
+    def accept_bytes(self, bytes):
+        self.accepted.append(bytes)
+        self.length += len(bytes)
+        if self.next_read_size() == 0:
+            self.write_func(b"got %d bytes" % self.length)
+
+    def next_read_size(self):
+        return max(0, wsgi.REQUEST_READ_SIZE * 2 + 10 - self.length)
+
+
 class IncompleteRequest(FakeRequest):
     """A request-like object that always expects to read more bytes."""
 
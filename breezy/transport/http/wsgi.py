@@ -21,13 +21,25 @@ For more information about WSGI, see PEP 333:
 """
 
 import logging
-from io import BytesIO
+import queue
+import threading
 
 from dromedary import chroot, get_transport_from_url
 from dromedary.urlutils import local_path_to_url
 
 from breezy.bzr.smart import medium
 
+# The size of the reads of request bodies.
+REQUEST_READ_SIZE = 64 * 1024
+
+# The number of chunks of a response that can be waiting to be sent. The
+# smart protocol writes responses in chunks of up to about 1MiB.
+RESPONSE_QUEUE_SIZE = 4
+
+# How often, in seconds, a thread serving a request checks whether the
+# response is still wanted while waiting to queue a chunk of it.
+_POLL_INTERVAL = 0.1
+
 
 def make_app(
     root,
@@ -209,24 +221,84 @@ class SmartWSGIApp:
             raise AssertionError(adjusted_relpath)
 
         transport = self.backing_transport.clone(adjusted_relpath)
-        out_buffer = BytesIO()
         request_data_length = int(environ["CONTENT_LENGTH"])
-        request_data_bytes = environ["wsgi.input"].read(request_data_length)
+        # The length of the response is not known up front, so the server
+        # sends it with chunked transfer-encoding, or by closing the
+        # connection for HTTP/1.0 clients.
+        headers = [("Content-type", "application/octet-stream")]
+        start_response("200 OK", headers)
+        return _iter_response(
+            lambda write_func: self.serve_request(
+                transport,
+                write_func,
+                environ["wsgi.input"],
+                request_data_length,
+                adjusted_rcp,
+            )
+        )
+
+    def serve_request(self, transport, write_func, request_file, request_length, rcp):
+        """Read a smart protocol request and write the response.
+
+        The request body is passed to the protocol decoder as it is read, so
+        that requests with streamed bodies, such as insert_stream, are
+        processed as they arrive.
+
+        Args:
+            transport: The transport to use for the request.
+            write_func (callable): Function to write response data to.
+            request_file: A file-like object to read the request from.
+            request_length (int): The length of the request in bytes.
+            rcp: The root client path for path translation.
+        """
+        # Hold back what the protocol writes until the request is
+        # complete, so that it can be replaced by an error response if the
+        # request turns out to be incomplete.
+        held_back = []
+        smart_protocol_request = None
+
+        def write(data):
+            if (
+                smart_protocol_request is not None
+                and smart_protocol_request.next_read_size() == 0
+            ):
+                for held_data in held_back:
+                    write_func(held_data)
+                del held_back[:]
+                write_func(data)
+            else:
+                held_back.append(data)
+
+        # The protocol is identified from the first line, which is read
+        # before any of the request is processed.
+        first_line = b""
+        while b"\n" not in first_line and request_length > 0:
+            data = request_file.read(min(REQUEST_READ_SIZE, request_length))
+            if not data:
+                break
+            request_length -= len(data)
+            first_line += data
+        first_line, newline, rest = first_line.partition(b"\n")
         smart_protocol_request = self.make_request(
-            transport, out_buffer.write, request_data_bytes, adjusted_rcp
+            transport, write, first_line + newline, rcp
         )
+        if rest:
+            smart_protocol_request.accept_bytes(rest)
+        while request_length > 0 and smart_protocol_request.next_read_size() != 0:
+            data = request_file.read(min(REQUEST_READ_SIZE, request_length))
+            if not data:
+                break
+            request_length -= len(data)
+            smart_protocol_request.accept_bytes(data)
         if smart_protocol_request.next_read_size() != 0:
             # The request appears to be incomplete, or perhaps it's just a
             # newer version we don't understand.  Regardless, all we can do
             # is return an error response in the format of our version of the
             # protocol.
-            response_data = b"error\x01incomplete request\n"
+            write_func(b"error\x01incomplete request\n")
         else:
-            response_data = out_buffer.getvalue()
-        headers = [("Content-type", "application/octet-stream")]
-        headers.append(("Content-Length", str(len(response_data))))
-        start_response("200 OK", headers)
-        return [response_data]
+            for held_data in held_back:
+                write_func(held_data)
 
     def make_request(self, transport, write_func, request_bytes, rcp):
         """Create and process a smart protocol request.
@@ -237,7 +309,9 @@ class SmartWSGIApp:
         Args:
             transport: The transport to use for the request.
             write_func (callable): Function to write response data to.
-            request_bytes (bytes): The raw request data from the client.
+            request_bytes (bytes): The start of the request data from the
+                client, including at least its first line. The rest is
+                passed to accept_bytes of the returned protocol.
             rcp: The root client path for path translation.
 
         Returns:
@@ -251,3 +325,68 @@ class SmartWSGIApp:
         )
         server_protocol.accept_bytes(unused_bytes)
         return server_protocol
+
+
+class _ResponseAbandoned(Exception):
+    """The WSGI server stopped sending a response."""
+
+
+class _ServeFailure:
+    """An exception raised while serving a request."""
+
+    def __init__(self, exception):
+        self.exception = exception
+
+
+def _iter_response(serve):
+    """Serve a request in a thread, yielding the response as it is written.
+
+    At most RESPONSE_QUEUE_SIZE chunks of the response are held in memory;
+    the thread serving the request waits while that many are waiting to be
+    sent. If the WSGI server stops iterating, for example because the client
+    went away, the thread gives up at the next chunk it writes.
+
+    Args:
+        serve (callable): Called in the thread with a function to write
+            chunks of the response to.
+
+    Yields:
+        bytes: Chunks of the response.
+    """
+    chunks = queue.Queue(RESPONSE_QUEUE_SIZE)
+    abandoned = threading.Event()
+
+    def put(item):
+        while not abandoned.is_set():
+            try:
+                chunks.put(item, timeout=_POLL_INTERVAL)
+            except queue.Full:
+                continue
+            return
+        raise _ResponseAbandoned()
+
+    def run():
+        try:
+            try:
+                serve(put)
+            except _ResponseAbandoned:
+                raise
+            except BaseException as e:
+                put(_ServeFailure(e))
+            else:
+                put(None)
+        except _ResponseAbandoned:
+            pass
+
+    thread = threading.Thread(target=run, name="smart-wsgi", daemon=True)
+    thread.start()
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, _ServeFailure):
+                raise chunk.exception
+            yield chunk
+    finally:
+        abandoned.set()
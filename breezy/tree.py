@@ -858,6 +858,7 @@ class Tree:
         subdir: str | None = None,
         force_mtime: int | float | None = None,
         recurse_nested: bool = False,
+        jobs: int = 1,
     ) -> Iterator[bytes]:
         """Create an archive of this tree.
 
@@ -866,6 +867,7 @@ class Tree:
           name: target file name
           root: Root directory name (or None)
           subdir: Subdirectory to export (or None)
+          jobs: Number of threads to compress with
         Returns: Iterator over archive chunks
         """
         from .archive import create_archive
@@ -879,6 +881,7 @@ class Tree:
                 subdir,
                 force_mtime=force_mtime,
                 recurse_nested=recurse_nested,
+                jobs=jobs,
             )
 
     @classmethod